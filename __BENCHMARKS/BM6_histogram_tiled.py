@@ -0,0 +1,61 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Benchmark of the histogram kernels: thread-private histograms, with and
+without a persistent workspace, and the tiled histogram, for an increasing
+number of slices. Run with different values of OMP_NUM_THREADS.
+"""
+
+import timeit
+import numpy as np
+
+from blond.utils import bmath as bm
+
+
+N_m = 1000000               # Number of macro-particles
+N_repeat = 20               # Number of calls per measurement
+n_slices_list = [100, 1000, 10000, 100000, 1000000, 4000000]
+tile_size = 16384           # Slices per tile of the tiled histogram
+chunk_size = 1048576        # Particles bucketed at once by the tiled histogram
+
+cut_left = 0.
+cut_right = 1.
+rng = np.random.default_rng(1)
+dt = rng.normal(0.5, 0.15, N_m).astype(bm.precision.real_t)
+
+print("Threads: %d, macro-particles: %d" % (bm.get_max_threads(), N_m))
+print("%10s %12s %12s %12s" % ("n_slices", "slice [ms]", "workspace",
+                               "tiled"))
+
+for n_slices in n_slices_list:
+    profile = np.zeros(n_slices, dtype=bm.precision.real_t)
+    workspace = np.empty(bm.get_max_threads() * n_slices,
+                         dtype=bm.precision.real_t)
+    indices = np.empty(2 * min(chunk_size, N_m), dtype=np.int32)
+    offsets = np.empty((bm.get_max_threads() + 1) *
+                       (-(-n_slices // tile_size)) + 1, dtype=np.int32)
+
+    t_slice = timeit.timeit(
+        lambda: bm.slice(dt, profile, cut_left, cut_right),
+        number=N_repeat)
+    reference = profile.copy()
+    t_workspace = timeit.timeit(
+        lambda: bm.slice(dt, profile, cut_left, cut_right, workspace),
+        number=N_repeat)
+    t_tiled = timeit.timeit(
+        lambda: bm.slice_tiled(dt, profile, cut_left, cut_right, tile_size,
+                               indices, offsets, chunk_size),
+        number=N_repeat)
+    assert np.array_equal(profile, reference)
+
+    print("%10d %12.3f %12.3f %12.3f" % (n_slices,
+                                         1e3 * t_slice / N_repeat,
+                                         1e3 * t_workspace / N_repeat,
+                                         1e3 * t_tiled / N_repeat))
@@ -0,0 +1,100 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Benchmark of the ramp preprocessing of RingOptions, integrating the turns by
+blocks, against the turn-by-turn integration, for an LHC ramp and the three
+interpolation options. The results must be identical.
+"""
+
+import time as timer
+import numpy as np
+from scipy.constants import c
+from scipy.interpolate import splrep, splev
+
+from blond.input_parameters.ring_options import RingOptions
+
+
+mass = 938.272088e6             # Proton mass [eV]
+circumference = 26658.883       # LHC circumference [m]
+ramp_duration = 1200.           # Ramp duration [s], about 1.3e7 turns
+n_points = 100                  # Number of points of the momentum program
+block_sizes = [1024, 4096, 16384]
+
+# Parabolic-linear-parabolic momentum program, 450 GeV/c to 6.5 TeV/c
+time = np.linspace(0, ramp_duration, n_points)
+x = time / ramp_duration
+momentum = 450e9 + 6.05e12 * np.where(
+    x < 0.2, 2.5*x**2, np.where(x < 0.8, 0.1 + (x - 0.2),
+                                0.9 - 2.5*(1 - x)**2 + 0.1))
+
+
+def turn_by_turn(interpolation):
+    # Turn-by-turn integration of the ramp, the previous implementation of
+    # RingOptions.preprocess (without flat bottom and flat top)
+    beta = np.sqrt(1/(1 + (mass/momentum[0])**2))
+    time_interp = [time[0], time[0] + circumference/(beta*c)]
+    momentum_interp = [momentum[0]]
+    if interpolation == 'linear':
+        i = 0
+        for k in range(1, len(time)):
+            while time_interp[i+1] <= time[k]:
+                momentum_interp.append(
+                    momentum[k-1] + (momentum[k] - momentum[k-1]) *
+                    (time_interp[i+1] - time[k-1]) / (time[k] - time[k-1]))
+                beta = np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2))
+                time_interp.append(time_interp[i+1] + circumference/(beta*c))
+                i += 1
+        return np.array(time_interp[:-1]), np.array(momentum_interp)
+
+    if interpolation == 'cubic':
+        tck = splrep(time, momentum)
+    else:
+        derivative = np.gradient(momentum)/np.gradient(time)
+        integral_point = momentum[0]
+    i = 0
+    while time_interp[i] <= time[-1]:
+        if interpolation == 'cubic' and time_interp[i+1] > time[-1]:
+            momentum_interp.append(momentum[-1])
+        elif interpolation == 'cubic':
+            momentum_interp.append(splev(time_interp[i+1], tck))
+        else:
+            integral_point += (time_interp[i+1] - time_interp[i]) * \
+                np.interp(time_interp[i+1], time, derivative)
+            momentum_interp.append(integral_point)
+        beta = np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2))
+        time_interp.append(time_interp[i+1] + circumference/(beta*c))
+        i += 1
+    momentum_interp = np.array(momentum_interp)
+    if interpolation == 'derivative':
+        momentum_interp = (momentum_interp - momentum_interp[0]) / \
+            (momentum_interp[-1] - momentum_interp[0]) * \
+            (momentum[-1] - momentum[0]) + momentum[0]
+    return np.array(time_interp[:-1]), momentum_interp
+
+
+print("%12s %10s %12s %12s" % ("interp.", "turns", "block size", "time [s]"))
+
+for interpolation in ['linear', 'cubic', 'derivative']:
+    start = timer.perf_counter()
+    reference = turn_by_turn(interpolation)
+    print("%12s %10d %12s %12.2f" % (interpolation, len(reference[0]),
+                                     "turn by turn",
+                                     timer.perf_counter() - start))
+
+    for block_size in block_sizes:
+        options = RingOptions(interpolation=interpolation)
+        options.block_size = block_size
+        start = timer.perf_counter()
+        result = options.preprocess(mass, circumference, time, momentum)
+        elapsed = timer.perf_counter() - start
+        assert np.array_equal(result[0], reference[0])
+        assert np.array_equal(result[1], reference[1])
+        print("%12s %10d %12d %12.2f" % (interpolation, len(result[0]),
+                                         block_size, elapsed))
@@ -16,7 +16,7 @@ except ImportError:
 # BLonD imports
 #from blond.beams.distributions import matched_from_line_density
 from blond.utils.input_parser import parse
-from blond.utils.mpi_config import worker, mpiprint
+from blond.utils.mpi_config import worker, mpiprint, TaskGraph
 from blond.beam.beam import Proton, Beam
 from blond.input_parameters.ring import Ring, RingOptions
 from blond.input_parameters.rf_parameters import RFStation
@@ -27,6 +27,8 @@ from blond.impedances.impedance import InducedVoltageTime, InducedVoltageFreq, T
 from blond.impedances.impedance_sources import Resonators
 from blond.monitors.monitors import SlicesMonitor
 from blond.utils import bmath as bm
+from blond.utils.fft_plans import plan_simulation
+from blond.utils.approximation import ApproximationScheduler
 # Other imports
 from colormap import colormap
 # LoCa imports
@@ -129,7 +131,8 @@ precision = args['precision']
 bm.use_precision(precision)
 
 bm.use_mpi()
-# bm.use_fftw()
+if args['fftw']:
+    bm.use_fftw()
 
 worker.assignGPUs(num_gpus=args['gpu'])
 
@@ -440,7 +443,30 @@ if worker.hasGPU:
 print(f'Glob rank: [{worker.rank}], Node rank: [{worker.noderank}], Intra rank: [{worker.intrarank}], GPU rank: [{worker.gpucommrank}], hasGPU: {worker.hasGPU}')
 
 
-worker.initDLB(args['loadbalance'], n_iterations)
+if approx == 3:
+    approx_scheduler = ApproximationScheduler(profile,
+                                              tolerance=args['approxtol'],
+                                              induced_voltage=PS_longitudinal_intensity)
+
+# Task parallelism: the induced voltage and the RF voltage are computed
+# by different processes of the node
+if withtp and worker.gpu_id < 0:
+    def induced_voltage_stage():
+        if (approx in [0, 2, 3]) or (turn % n_turns_reduce == 0):
+            PS_longitudinal_intensity.induced_voltage_sum()
+
+    taskgraph = TaskGraph(worker, {'impedance': 1, 'rf': 1})
+    taskgraph.add_stage('induced_voltage', induced_voltage_stage,
+                        group='impedance',
+                        outputs=[(PS_longitudinal_intensity, 'induced_voltage')])
+    taskgraph.add_stage('rf_voltage', tracker.pre_track, group='rf',
+                        outputs=[(tracker, 'rf_voltage')])
+
+worker.initDLB(args['loadbalance'], n_iterations,
+               balancer=args['balancer'])
+
+# Plan the FFTs with the wisdom of the previous runs
+plan_simulation(profile, PS_longitudinal_intensity, args['wisdom'])
 
 worker.sync()
 timing.reset()
@@ -467,6 +493,8 @@ with cp.region_timer('main_loop'):
         elif (approx == 2):
             profile.track()
             profile.scale_histo()
+        elif (approx == 3):
+            approx_scheduler.track()
 
         # Change impedance of 10 MHz only if it changes
         # if (i > 0) and (R_S_program_10MHz[i] != R_S_program_10MHz[i-1]):
@@ -477,7 +505,7 @@ with cp.region_timer('main_loop'):
         # If we are in a gpu group, with tp
         if withtp and worker.gpu_id >= 0:
             if worker.hasGPU:
-                if (approx == 0) or (approx == 2):
+                if approx in [0, 2, 3]:
                     PS_longitudinal_intensity.induced_voltage_sum()
                 elif (approx == 1) and (turn % n_turns_reduce == 0):
                     PS_longitudinal_intensity.induced_voltage_sum()
@@ -492,18 +520,9 @@ with cp.region_timer('main_loop'):
             tracker.rf_voltage = worker.broadcast(tracker.rf_voltage)
         # else just do the normal task-parallelism
         elif withtp:
-            if worker.isFirst:
-                if (approx == 0) or (approx == 2):
-                    PS_longitudinal_intensity.induced_voltage_sum()
-                elif (approx == 1) and (turn % n_turns_reduce == 0):
-                    PS_longitudinal_intensity.induced_voltage_sum()
-            if worker.isLast:
-                tracker.pre_track()
-
-            worker.intraSync()
-            worker.sendrecv(PS_longitudinal_intensity.induced_voltage, tracker.rf_voltage)
+            taskgraph.run()
         else:
-            if (approx == 0) or (approx == 2):
+            if approx in [0, 2, 3]:
                 PS_longitudinal_intensity.induced_voltage_sum()
             elif (approx == 1) and (turn % n_turns_reduce == 0):
                 PS_longitudinal_intensity.induced_voltage_sum()
@@ -32,8 +32,10 @@ from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
 from blond.llrf.beam_feedback import BeamFeedback
 from blond.utils.input_parser import parse
 from blond.monitors.monitors import SlicesMonitor
-from blond.utils.mpi_config import worker, mpiprint
+from blond.utils.mpi_config import worker, mpiprint, TaskGraph
 from blond.utils import bmath as bm
+from blond.utils.fft_plans import plan_simulation
+from blond.utils.approximation import ApproximationScheduler
 
 
 this_directory = os.path.dirname(os.path.realpath(__file__)) + '/'
@@ -98,7 +100,8 @@ precision = args['precision']
 bm.use_precision(precision)
 
 bm.use_mpi()
-# bm.use_fftw()
+if args['fftw']:
+    bm.use_fftw()
 
 worker.assignGPUs(num_gpus=args['gpu'])
 
@@ -492,7 +495,33 @@ if args['gpu'] > 0:
 print(f'Glob rank: [{worker.rank}], Node rank: [{worker.noderank}], Intra rank: [{worker.intrarank}], GPU rank: [{worker.gpucommrank}], hasGPU: {worker.hasGPU}')
 
 
-worker.initDLB(args['loadbalance'], n_iterations)
+if approx == 3:
+    approx_scheduler = ApproximationScheduler(profile,
+                                              tolerance=args['approxtol'],
+                                              induced_voltage=inducedVoltage)
+
+# Task parallelism: the induced voltage and the RF voltage are computed
+# by different processes of the node
+if withtp and worker.gpu_id < 0:
+    def induced_voltage_stage():
+        if (turn < 8*int(FBtime)):
+            longCavityImpedanceReduction.track()
+            shortCavityImpedanceReduction.track()
+        if (approx in [0, 2, 3]) or (turn % n_turns_reduce == 0):
+            inducedVoltage.induced_voltage_sum()
+
+    taskgraph = TaskGraph(worker, {'impedance': 1, 'rf': 1})
+    taskgraph.add_stage('induced_voltage', induced_voltage_stage,
+                        group='impedance',
+                        outputs=[(inducedVoltage, 'induced_voltage')])
+    taskgraph.add_stage('rf_voltage', tracker.pre_track, group='rf',
+                        outputs=[(tracker, 'rf_voltage')])
+
+worker.initDLB(args['loadbalance'], n_iterations,
+               balancer=args['balancer'])
+
+# Plan the FFTs with the wisdom of the previous runs
+plan_simulation(profile, inducedVoltage, args['wisdom'])
 
 delta = 0
 worker.sync()
@@ -522,6 +551,8 @@ with cp.region_timer('main_loop'):
         elif (approx == 2):
             profile.track()
             profile.scale_histo()
+        elif (approx == 3):
+            approx_scheduler.track()
 
         # If we are in a gpu group, with tp
         if withtp and worker.gpu_id >= 0:
@@ -529,7 +560,7 @@ with cp.region_timer('main_loop'):
                 if (turn < 8*int(FBtime)):
                     longCavityImpedanceReduction.track()
                     shortCavityImpedanceReduction.track()
-                if (approx == 0) or (approx == 2):
+                if approx in [0, 2, 3]:
                     inducedVoltage.induced_voltage_sum()
                 elif (approx == 1) and (turn % n_turns_reduce == 0):
                     inducedVoltage.induced_voltage_sum()
@@ -542,24 +573,12 @@ with cp.region_timer('main_loop'):
             tracker.rf_voltage = worker.broadcast(tracker.rf_voltage)
         # else just do the normal task-parallelism
         elif withtp:
-            if worker.isFirst:
-                if (turn < 8*int(FBtime)):
-                    longCavityImpedanceReduction.track()
-                    shortCavityImpedanceReduction.track()
-                if (approx == 0) or (approx == 2):
-                    inducedVoltage.induced_voltage_sum()
-                elif (approx == 1) and (turn % n_turns_reduce == 0):
-                    inducedVoltage.induced_voltage_sum()
-            if worker.isLast:
-                tracker.pre_track()
-
-            worker.intraSync()
-            worker.sendrecv(inducedVoltage.induced_voltage, tracker.rf_voltage)
+            taskgraph.run()
         else:
             if (turn < 8*int(FBtime)):
                 longCavityImpedanceReduction.track()
                 shortCavityImpedanceReduction.track()
-            if (approx == 0) or (approx == 2):
+            if approx in [0, 2, 3]:
                 inducedVoltage.induced_voltage_sum()
             elif (approx == 1) and (turn % n_turns_reduce == 0):
                 inducedVoltage.induced_voltage_sum()
@@ -24,7 +24,8 @@ from blond.input_parameters.rf_parameters import RFStation
 from blond.trackers.tracker import RingAndRFTracker
 from blond.beam.beam import Beam, Proton
 from blond.beam.distributions import bigaussian
-from blond.beam.profile import CutOptions, FitOptions, Profile
+from blond.beam.profile import CutOptions, FitOptions, Profile, \
+    OtherSlicesOptions
 from blond.monitors.monitors import BunchMonitor
 from blond.plots.plot import Plot
 import os
@@ -83,9 +84,11 @@ long_tracker = RingAndRFTracker(rf, beam)
 bigaussian(ring, rf, beam, tau_0/4, reinsertion=True, seed=1)
 
 
-# Need slices for the Gaussian fit
+# Need slices for the Gaussian fit; the histogram is reduced over the
+# workers without blocking
 profile = Profile(beam, CutOptions(n_slices=100),
-                  FitOptions(fit_option='gaussian'))
+                  FitOptions(fit_option='gaussian'),
+                  OtherSlicesOptions=OtherSlicesOptions(async_reduce=True))
 
 
 # Accelerator map
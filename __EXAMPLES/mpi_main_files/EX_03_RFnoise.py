@@ -67,19 +67,25 @@ dt_plt = 20        # Time steps between plots
 mpiprint("Setting up the simulation...")
 mpiprint("")
 
-# Define general parameters
-general_params = Ring(C, alpha, p_s, Proton(), N_t)
+# Define general parameters, computed by the first worker of the node and
+# shared by the others
+general_params = worker.node_shared(Ring, C, alpha, p_s, Proton(), N_t)
 
 # Define RF station parameters and corresponding tracker
-rf_params = RFStation(general_params, [h], [V], [0])
+rf_params = worker.node_shared(RFStation, general_params, [h], [V], [0],
+                               private=['phi_rf', 'omega_rf', 'dphi_rf'])
 
 # Pre-processing: RF phase noise -----------------------------------------------
-RFnoise = FlatSpectrum(general_params, rf_params, delta_f = 1.12455000e-02, fmin_s0 = 0, 
-                       fmax_s0 = 1.1, seed1=1234, seed2=7564, 
-                       initial_amplitude = 1.11100000e-07, folder_plots =
-                       this_directory + '../mpi_output_files/EX_03_fig')
-RFnoise.generate()
-rf_params.phi_noise = np.array(RFnoise.dphi, ndmin =2) 
+def rf_noise(general_params, rf_params):
+    RFnoise = FlatSpectrum(general_params, rf_params, delta_f = 1.12455000e-02, fmin_s0 = 0, 
+                           fmax_s0 = 1.1, seed1=1234, seed2=7564, 
+                           initial_amplitude = 1.11100000e-07, folder_plots =
+                           this_directory + '../mpi_output_files/EX_03_fig')
+    RFnoise.generate()
+    return RFnoise
+
+RFnoise = worker.node_shared(rf_noise, general_params, rf_params)
+rf_params.phi_noise = np.array(RFnoise.dphi, ndmin =2, copy=False) 
 
 
 mpiprint("   Sigma of RF noise is %.4e" %np.std(RFnoise.dphi))
@@ -77,22 +77,27 @@ phi_offset = 0.0
 
 # DEFINE RING------------------------------------------------------------------
 
-general_params = Ring(C, momentum_compaction,
+# The machine programs and the impedance tables are computed by the first
+# worker of the node and shared by the others
+general_params = worker.node_shared(Ring, C, momentum_compaction,
                                    sync_momentum, Proton(), n_turns)
-general_params_freq = Ring(C, momentum_compaction,
+general_params_freq = worker.node_shared(Ring, C, momentum_compaction,
                                         sync_momentum, Proton(), n_turns)
-general_params_res = Ring(C, momentum_compaction,
+general_params_res = worker.node_shared(Ring, C, momentum_compaction,
                                        sync_momentum, Proton(), n_turns)
 
-
-RF_sct_par = RFStation(general_params, [harmonic_number], 
-                          [voltage_program], [phi_offset], n_rf_systems)
-RF_sct_par_freq = RFStation(general_params_freq,
+rf_private = ['phi_rf', 'omega_rf', 'dphi_rf']
+RF_sct_par = worker.node_shared(RFStation, general_params, [harmonic_number], 
+                          [voltage_program], [phi_offset], n_rf_systems,
+                          private=rf_private)
+RF_sct_par_freq = worker.node_shared(RFStation, general_params_freq,
                                       [harmonic_number], [voltage_program],
-                                      [phi_offset], n_rf_systems)
-RF_sct_par_res = RFStation(general_params_res,
+                                      [phi_offset], n_rf_systems,
+                                      private=rf_private)
+RF_sct_par_res = worker.node_shared(RFStation, general_params_res,
                                       [harmonic_number], [voltage_program],
-                                      [phi_offset], n_rf_systems)
+                                      [phi_offset], n_rf_systems,
+                                      private=rf_private)
 
 my_beam = Beam(general_params, n_macroparticles, n_particles)
 my_beam_freq = Beam(general_params_freq, n_macroparticles, n_particles)
@@ -139,7 +144,8 @@ Q_factor = table[:, 1]
 resonator = Resonators(R_shunt, f_res, Q_factor)
 
 ind_volt_time = InducedVoltageTime(my_beam, slice_beam, [resonator])
-ind_volt_freq = InducedVoltageFreq(my_beam_freq, slice_beam_freq, [resonator], 1e5)
+ind_volt_freq = worker.node_shared(InducedVoltageFreq, my_beam_freq,
+                                   slice_beam_freq, [resonator], 1e5)
 ind_volt_res = InducedVoltageResonator(my_beam_res,slice_beam_res,resonator)
 
 tot_vol = TotalInducedVoltage(my_beam, slice_beam, [ind_volt_time])
@@ -22,6 +22,7 @@ from scipy.constants import m_p, m_e, e, c, epsilon_0, hbar
 from ..trackers.utilities import is_in_separatrix
 from ..utils import exceptions as blExcept
 from ..utils import bmath as bm
+from .particle_store import ParticleStore
 
 
 class Particle(object):
@@ -209,8 +210,7 @@ class Beam(object):
         self.n_total_macroparticles_lost = 0
         self.n_total_macroparticles = n_macroparticles
         self.is_splitted = False
-        self._sumsq_dt = 0.
-        self._sumsq_dE = 0.
+        self._moments = None
 
     @property
     def n_macroparticles_lost(self):
@@ -266,21 +266,27 @@ class Beam(object):
         - sigma_dE
         '''
 
-        # Statistics only for particles that are not flagged as lost
-        itemindex = np.where(self.id != 0)[0]
-        # itemindex = bm.where(self.id, 0)
-        self.mean_dt = bm.mean(self.dt[itemindex])
-        self.sigma_dt = bm.std(self.dt[itemindex])
-        self._sumsq_dt = np.dot(self.dt[itemindex], self.dt[itemindex])
-        # self.min_dt = np.min(self.dt[itemindex])
-        # self.max_dt = np.max(self.dt[itemindex])
-
-        self.mean_dE = bm.mean(self.dE[itemindex])
-        self.sigma_dE = bm.std(self.dE[itemindex])
-        self._sumsq_dE = np.dot(self.dE[itemindex], self.dE[itemindex])
-
-        # self.min_dE = np.min(self.dE[itemindex])
-        # self.max_dE = np.max(self.dE[itemindex])
+        # Statistics only for particles that are not flagged as lost,
+        # computed in a single pass over the coordinates
+        self._moments = bm.beam_statistics(self.dt, self.dE, self.id)
+        self._set_statistics(self._moments)
+
+    def _set_statistics(self, moments):
+        # moments: [count, mean_dt, mean_dE, m2_dt, m2_dE,
+        #           min_dt, min_dE, max_dt, max_dE]
+        # with m2 the sum of the squared deviations from the mean
+        count = moments[0]
+        if count > 0:
+            self.mean_dt = moments[1]
+            self.mean_dE = moments[2]
+            self.sigma_dt = np.sqrt(moments[3] / count)
+            self.sigma_dE = np.sqrt(moments[4] / count)
+            self.min_dt, self.min_dE = moments[5], moments[6]
+            self.max_dt, self.max_dE = moments[7], moments[8]
+        else:
+            self.mean_dt = self.mean_dE = np.nan
+            self.sigma_dt = self.sigma_dE = np.nan
+            self.min_dt = self.min_dE = self.max_dt = self.max_dE = np.nan
 
         # R.m.s. emittance in Gaussian approximation
         self.epsn_rms_l = np.pi*self.sigma_dE*self.sigma_dt  # in eVs
@@ -368,15 +374,7 @@ class Beam(object):
             (2, n) array of (dt, dE) for new particles
         '''
 
-        try:
-            newdt = new_particles[0]
-            newdE = new_particles[1]
-            if len(newdt) != len(newdE):
-                raise blExcept.ParticleAdditionError(
-                    "new_particles must have equal number of time and energy coordinates")
-        except TypeError:
-            raise blExcept.ParticleAdditionError(
-                "new_particles shape must be (2, n)")
+        newdt, newdE = self._new_particle_coordinates(new_particles)
 
         nNew = len(newdt)
 
@@ -388,6 +386,20 @@ class Beam(object):
         self.dt = np.concatenate((self.dt, newdt))
         self.dE = np.concatenate((self.dE, newdE))
 
+    @staticmethod
+    def _new_particle_coordinates(new_particles):
+        try:
+            newdt = new_particles[0]
+            newdE = new_particles[1]
+            if len(newdt) != len(newdE):
+                raise blExcept.ParticleAdditionError(
+                    "new_particles must have equal number of time and energy coordinates")
+        except TypeError:
+            raise blExcept.ParticleAdditionError(
+                "new_particles shape must be (2, n)")
+
+        return newdt, newdE
+
     def add_beam(self, other_beam):
         '''
         Method to add the particles from another beam to this beam
@@ -399,7 +411,7 @@ class Beam(object):
         other_beam : blond beam object
         '''
 
-        if not isinstance(other_beam, type(self)):
+        if not isinstance(other_beam, Beam):
             raise TypeError("add_beam method requires a beam object as input")
 
         self.dt = np.concatenate((self.dt, other_beam.dt))
@@ -427,7 +439,7 @@ class Beam(object):
         other : blond beam object or (2, n) array
         '''
 
-        if isinstance(other, type(self)):
+        if isinstance(other, Beam):
             self.add_beam(other)
             return self
         else:
@@ -520,76 +532,20 @@ class Beam(object):
                 'ERROR: Cannot use this routine unless in MPI Mode')
 
         from ..utils.mpi_config import worker
-        if all:
-
-            self.mean_dt = worker.allreduce(
-                np.array([self.mean_dt]), operator='mean')[0]
 
-            self.mean_dE = worker.allreduce(
-                np.array([self.mean_dE]), operator='mean')[0]
-
-            self.n_total_macroparticles_lost = worker.allreduce(
-                np.array([self.n_macroparticles_lost]), operator='sum')[0]
-
-            # self.n_total_macroparticles_alive = worker.allreduce(
-            # np.array([self.n_macroparticles_alive]), operator='sum')[0]
-
-            self.sigma_dt = worker.allreduce(
-                np.array([self._sumsq_dt]), operator='sum')[0]
-            self.sigma_dt = np.sqrt(
-                self.sigma_dt/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dt**2)
-
-            self.sigma_dE = worker.allreduce(
-                np.array([self._sumsq_dE]), operator='sum')[0]
-            self.sigma_dE = np.sqrt(
-                self.sigma_dE/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dE**2)
-
-            # self.sigma_dt = worker.allreduce(
-            #     np.array([self.mean_dt, self.sigma_dt, self.n_macroparticles_alive]),
-            #     operator='std')[0]
-
-            # self.sigma_dE = worker.allreduce(
-            #     np.array([self.mean_dE, self.sigma_dE,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
+        if self._moments is None:
+            self.statistics()
 
+        # The moments of all workers are merged in a single reduction
+        moments = np.concatenate(([self.n_macroparticles_lost],
+                                  self._moments))
+        if all:
+            moments = worker.allreduce(moments, operator='beam_statistics')
         else:
-            self.mean_dt = worker.reduce(
-                np.array([self.mean_dt]), operator='mean')[0]
-
-            self.mean_dE = worker.reduce(
-                np.array([self.mean_dE]), operator='mean')[0]
-
-            self.n_total_macroparticles_lost = worker.reduce(
-                np.array([self.n_macroparticles_lost]), operator='sum')[0]
-
-            self.sigma_dt = worker.reduce(
-                np.array([self._sumsq_dt]), operator='sum')[0]
-            self.sigma_dt = np.sqrt(
-                self.sigma_dt/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dt**2)
-
-            self.sigma_dE = worker.reduce(
-                np.array([self._sumsq_dE]), operator='sum')[0]
-            self.sigma_dE = np.sqrt(
-                self.sigma_dE/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dE**2)
-
-            # self.sigma_dt = worker.reduce(
-            #     np.array([self.mean_dt, self.sigma_dt,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
-
-            # self.sigma_dE = worker.reduce(
-            #     np.array([self.mean_dE, self.sigma_dE,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
+            moments = worker.reduce(moments, operator='beam_statistics')
+
+        self.n_total_macroparticles_lost = int(moments[0])
+        self._set_statistics(moments[1:])
 
     def gather_losses(self, all=False):
         '''
@@ -613,3 +569,219 @@ class Beam(object):
         else:
             temp = worker.gather(np.array([self.n_macroparticles_lost]))
             self.n_total_macroparticles_lost = np.sum(temp)
+
+
+class StoredBeam(Beam):
+    """Beam whose coordinates are kept in a ParticleStore.
+
+    The dt, dE and id attributes are views of the store, so that they can be
+    used as in the Beam class. Assigning an array copies it into the store,
+    and changing the number of macro-particles uses the spare capacity of
+    the store before reallocating it. If the store uses an alive mask, id is
+    one for the particles not lost and zero for the lost ones.
+
+    Parameters
+    ----------
+    Ring : Ring
+        Used to import different quantities such as the mass and the energy.
+    n_macroparticles : int
+        total number of macroparticles.
+    intensity : float
+        total intensity of the beam (in number of charge).
+    capacity, alive_mask, growth_factor, compaction_threshold :
+        see ParticleStore.
+
+    Attributes
+    ----------
+    particles : ParticleStore
+        storage of the beam coordinates.
+    """
+
+    def __init__(self, Ring, n_macroparticles, intensity, capacity=None,
+                 alive_mask=False, growth_factor=1.5,
+                 compaction_threshold=None):
+
+        self.particles = ParticleStore(
+            n_macroparticles, capacity=capacity, alive_mask=alive_mask,
+            growth_factor=growth_factor,
+            compaction_threshold=compaction_threshold)
+        Beam.__init__(self, Ring, n_macroparticles, intensity)
+
+    @property
+    def dt(self):
+        return self.particles.dt
+
+    @dt.setter
+    def dt(self, value):
+        self.particles.resize(len(value))
+        self.particles.dt[:] = value
+
+    @property
+    def dE(self):
+        return self.particles.dE
+
+    @dE.setter
+    def dE(self, value):
+        self.particles.resize(len(value))
+        self.particles.dE[:] = value
+
+    @property
+    def id(self):
+        return self.particles.id
+
+    @id.setter
+    def id(self, value):
+        self.particles.resize(len(value))
+        self.particles.set_id(value)
+
+    @property
+    def n_macroparticles(self):
+        return self.particles.n_macroparticles
+
+    @n_macroparticles.setter
+    def n_macroparticles(self, value):
+        self.particles.resize(value)
+
+    @property
+    def n_macroparticles_lost(self):
+        '''Number of lost macro-particles, including the ones removed from
+        the store.
+        '''
+
+        return self.particles.n_macroparticles_lost
+
+    @property
+    def n_macroparticles_alive(self):
+        return self.particles.n_macroparticles_alive
+
+    def eliminate_lost_particles(self):
+        """Eliminate lost particles from the beam coordinate arrays
+        """
+
+        self.particles.compact()
+        if self.n_macroparticles == 0:
+            # AllParticlesLost
+            raise RuntimeError("ERROR in Beams: all particles lost and" +
+                               " eliminated!")
+
+    def statistics(self):
+        '''
+        Calculation of the mean and standard deviation of beam coordinates,
+        as well as beam emittance using different definitions. The lost
+        particles are removed first if the compaction threshold is exceeded.
+        '''
+
+        self.particles.compact_if_needed()
+        Beam.statistics(self)
+
+    def add_particles(self, new_particles):
+        '''
+        Method to add array of new particles to beam object, in the spare
+        capacity of the store if possible.
+        New particles are given id numbers sequential from last id of this beam
+
+        Parameters
+        ----------
+        new_particles : array-like
+            (2, n) array of (dt, dE) for new particles
+        '''
+
+        newdt, newdE = self._new_particle_coordinates(new_particles)
+
+        n = self.n_macroparticles
+        self.particles.append(newdt, newdE,
+                              np.arange(n + 1, n + len(newdt) + 1, dtype=int))
+
+    def add_beam(self, other_beam):
+        '''
+        Method to add the particles from another beam to this beam, in the
+        spare capacity of the store if possible.
+        New particles are given id numbers sequential from last id of this beam
+        Particles with id == 0 keep id == 0 and are included in addition
+
+        Parameters
+        ----------
+        other_beam : blond beam object
+        '''
+
+        if not isinstance(other_beam, Beam):
+            raise TypeError("add_beam method requires a beam object as input")
+
+        n = self.n_macroparticles
+        newids = np.where(other_beam.id != 0,
+                          np.arange(n + 1, n + other_beam.n_macroparticles + 1),
+                          0)
+        self.particles.append(other_beam.dt, other_beam.dE, newids)
+
+    def split(self, random=False, fast=False):
+        '''
+        MPI ONLY ROUTINE: Splits the beam equally among the workers for
+        MPI processing, see Beam.split. The random and fast options require
+        the particle ids, so they cannot be used with an alive mask.
+        '''
+
+        if self.particles.alive_mask and (random or fast):
+            raise RuntimeError("ERROR in StoredBeam: the random and fast" +
+                               " options of split require particle ids!")
+        Beam.split(self, random=random, fast=fast)
+
+    def gather(self, all=False):
+        '''
+        MPI ONLY ROUTINE: Gather the beam coordinates to the master or all
+        workers, see Beam.gather. The gathered beam is identified by the
+        particle ids, so it cannot be gathered with an alive mask.
+        '''
+
+        if self.particles.alive_mask:
+            raise RuntimeError("ERROR in StoredBeam: gather requires" +
+                               " particle ids!")
+        Beam.gather(self, all=all)
+
+    @classmethod
+    def from_beam(cls, beam, capacity=None, alive_mask=False,
+                  growth_factor=1.5, compaction_threshold=None):
+        '''
+        Returns a StoredBeam holding a copy of the coordinates and ids of a
+        Beam, the other attributes being shared with it. It should be
+        created before the objects using the beam, e.g. Profile and
+        RingAndRFTracker.
+
+        Parameters
+        ----------
+        beam : Beam
+            the beam to copy.
+        capacity, alive_mask, growth_factor, compaction_threshold :
+            see ParticleStore.
+        '''
+
+        stored = cls.__new__(cls)
+        for attribute, value in beam.__dict__.items():
+            if attribute not in ['dt', 'dE', 'id', 'n_macroparticles',
+                                 'particles']:
+                stored.__dict__[attribute] = value
+        stored.particles = ParticleStore.from_arrays(
+            beam.dt, beam.dE, beam.id, capacity=capacity,
+            alive_mask=alive_mask, growth_factor=growth_factor,
+            compaction_threshold=compaction_threshold)
+        return stored
+
+    def to_beam(self):
+        '''
+        Returns a Beam holding a copy of the coordinates and ids, the other
+        attributes being shared with this beam. Particle ids are needed, so
+        this cannot be done with an alive mask. Particles removed by
+        compaction are no longer counted as lost.
+        '''
+
+        if self.particles.alive_mask:
+            raise RuntimeError("ERROR in StoredBeam: the particle ids are" +
+                               " replaced by an alive mask!")
+        beam = Beam.__new__(Beam)
+        for attribute, value in self.__dict__.items():
+            if attribute != 'particles':
+                beam.__dict__[attribute] = value
+        beam.dt = self.dt.copy()
+        beam.dE = self.dE.copy()
+        beam.id = self.id.copy()
+        beam.n_macroparticles = self.n_macroparticles
+        return beam
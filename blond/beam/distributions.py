@@ -26,6 +26,7 @@ import matplotlib.pyplot as plt
 from scipy.integrate import cumtrapz
 from ..trackers.utilities import is_in_separatrix
 from ..beam.profile import Profile, CutOptions
+from ..beam.beam import StoredBeam
 from ..trackers.utilities import potential_well_cut, minmax_location
 from ..utils import bmath as bm
 
@@ -38,11 +39,14 @@ def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
                               dt_margin_percent=0.40, n_points_abel=1e4,
                               bunch_length=None, line_density_type=None,
                               line_density_exponent=None, seed=None,
-                              process_pot_well = True):
+                              process_pot_well = True, distributed=False,
+                              sampler='choice', threads=1):
     '''
     *Function to generate a beam by inputing the line density. The distribution
     function is then reconstructed with the Abel transform and the particles
-    randomly generated.*
+    randomly generated. With distributed, every MPI worker generates only
+    its share of the particles, see generate_distributed; sampler and
+    threads are passed to populate_bunch.*
     '''    
         
     # Initialize variables depending on the accelerator parameters
@@ -339,7 +343,8 @@ def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
     # Populating the bunch
     populate_bunch(beam, time_grid, deltaE_grid, density_grid,
                    time_for_grid[1]-time_for_grid[0],
-                   deltaE_for_grid[1]-deltaE_for_grid[0], seed)
+                   deltaE_for_grid[1]-deltaE_for_grid[0], seed,
+                   distributed, sampler, threads)
              
     if TotalInducedVoltage is not None:
         # Inputing new line density
@@ -379,7 +384,8 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
                                bunch_length_fit=None,
                                distribution_variable='Hamiltonian',
                                process_pot_well = True,
-                               turn_number=0):
+                               turn_number=0, distributed=False,
+                               sampler='choice', threads=1):
     '''
     *Function to generate a beam by inputing the distribution function (by
     choosing the type of distribution and the emittance).
@@ -401,7 +407,10 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
     The user can also add an input table by setting the parameter
     distribution_type = 'user_input_table',
     distribution_options['user_table_action'] = array of action (in H or in J)
-    and distribution_options['user_table_distribution']*
+    and distribution_options['user_table_distribution'].
+    With distributed, every MPI worker generates only its share of the
+    particles, see generate_distributed; sampler and threads are passed to
+    populate_bunch.*
     '''
         
     # Loading the distribution function if provided by the user
@@ -617,7 +626,8 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
     # Populating the bunch
     populate_bunch(beam, time_grid, deltaE_grid, density_grid, 
                    time_resolution_low, deltaE_coord_array[1] -
-                   deltaE_coord_array[0], seed)
+                   deltaE_coord_array[0], seed, distributed, sampler,
+                   threads)
     
     if TotalInducedVoltage is not None:
         return [time_potential_low_res, line_density_], induced_voltage_object
@@ -710,12 +720,196 @@ def X0_from_bunch_length(bunch_length, bunch_length_fit, X_grid, sorted_X_dE0,
 #    return 0.5 * (X_low + X_hi)
     return X0
 
+#: *Number of particles drawn from each random stream by the distributed
+#: generation*
+generation_block_size = 65536
+
+
+def generate_distributed(beam, seed, sample, threads=1):
+    '''
+    *Generates the particles of the beam in blocks of generation_block_size
+    particles, block b being drawn by sample(generator, n) from the b-th
+    stream spawned from numpy.random.SeedSequence(seed). In MPI mode, every
+    worker draws only the blocks of its share of the particles (the share
+    given by Beam.split) and the beam is left split; otherwise all the blocks
+    are drawn. The beam is thus the same whatever the number of workers.*
+    '''
+    n_total = int(beam.n_total_macroparticles)
+    start, stop = 0, n_total
+    if bm.mpiMode():
+        from ..utils.mpi_config import worker
+        if seed is None:
+            # The workers must draw from the same streams
+            seed = worker.intercomm.bcast(
+                np.random.SeedSequence().entropy, root=0)
+        counts = worker.split_counts(n_total)
+        start = int(np.sum(counts[:worker.rank]))
+        stop = start + counts[worker.rank]
+
+    dt, dE = coordinate_buffers(beam, stop - start)
+    generate_blocks(seed, sample, start, stop, n_total, threads, dt, dE)
+    if bm.mpiMode():
+        beam.id = np.arange(start + 1, stop + 1, dtype=int)
+        beam.n_macroparticles = stop - start
+        beam.is_splitted = True
+
+
+def coordinate_buffers(beam, n_macroparticles):
+    '''
+    *Returns beam.dt and beam.dE resized to n_macroparticles particles, in
+    place when possible (through the store of a StoredBeam, or by resizing
+    arrays owning their data), so that the particles can be generated
+    directly in the beam without a second copy of the coordinates.*
+    '''
+    if isinstance(beam, StoredBeam):
+        beam.n_macroparticles = n_macroparticles
+        return beam.dt, beam.dE
+
+    for name in ['dt', 'dE']:
+        array = getattr(beam, name)
+        usable = (array.dtype == bm.precision.real_t) and \
+            array.flags.c_contiguous and array.flags.writeable
+        if usable and len(array) == n_macroparticles:
+            continue
+        resizable = usable and array.flags.owndata
+        del array
+        if resizable:
+            try:
+                getattr(beam, name).resize(n_macroparticles)
+                continue
+            except ValueError:
+                # The array is referenced elsewhere
+                pass
+        setattr(beam, name,
+                np.empty(n_macroparticles, dtype=bm.precision.real_t))
+    return beam.dt, beam.dE
+
+
+def generate_blocks(seed, sample, start, stop, n_total, threads=1, dt=None,
+                    dE=None):
+    '''
+    *Returns dt and dE of the particles [start, stop) of n_total particles,
+    drawn in blocks as by generate_distributed. Every block is written in
+    the output arrays dt and dE, of stop-start particles (allocated if not
+    given), as soon as it is drawn; with threads > 1, the blocks are drawn
+    by a pool of threads, each block still having its own stream, so that
+    the particles do not depend on the number of threads.*
+    '''
+    entropy = np.random.SeedSequence(seed).entropy
+    if dt is None:
+        dt = np.empty(stop - start, dtype=bm.precision.real_t)
+    if dE is None:
+        dE = np.empty(stop - start, dtype=bm.precision.real_t)
+
+    def draw(block):
+        block_start = block * generation_block_size
+        block_stop = min(block_start + generation_block_size, n_total)
+        generator = np.random.default_rng(
+            np.random.SeedSequence(entropy, spawn_key=(block,)))
+        block_dt, block_dE = sample(generator, block_stop - block_start)
+        first = max(start, block_start)
+        last = min(stop, block_stop)
+        dt[first-start:last-start] = block_dt[first-block_start:last-block_start]
+        dE[first-start:last-start] = block_dE[first-block_start:last-block_start]
+
+    blocks = range(start // generation_block_size,
+                   -(-stop // generation_block_size))
+    if threads > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(int(threads)) as pool:
+            # list() re-raises the exceptions of the threads
+            list(pool.map(draw, blocks))
+    else:
+        for block in blocks:
+            draw(block)
+    return dt, dE
+
+
+def alias_table(probabilities):
+    '''
+    *Alias table of the discrete distribution of the given (not necessarily
+    normalised) probabilities, for Walker's alias method: an index k drawn
+    uniformly is kept with probability threshold[k], and replaced by
+    alias[k] otherwise. The table is built by rounds, every round giving
+    all the current under-full cells an over-full cell as alias.*
+    '''
+    probabilities = np.asarray(probabilities, dtype=float).flatten()
+    n_cells = len(probabilities)
+    scaled = probabilities * n_cells / np.sum(probabilities)
+    threshold = np.ones(n_cells)
+    alias = np.arange(n_cells)
+
+    small = np.where(scaled < 1)[0]
+    large = np.where(scaled >= 1)[0]
+    while len(small) > 0 and len(large) > 0:
+        threshold[small] = scaled[small]
+        # The under-full cell i takes its alias in the over-full cell whose
+        # cumulative excess covers the cumulative deficit up to i
+        deficit = np.cumsum(1 - scaled[small])
+        excess = np.cumsum(scaled[large] - 1)
+        donors = np.minimum(np.searchsorted(excess, deficit), len(large) - 1)
+        alias[small] = large[donors]
+        scaled[large] -= np.bincount(donors, weights=1 - scaled[small],
+                                     minlength=len(large))
+        small = large[scaled[large] < 1]
+        large = large[scaled[large] >= 1]
+    # Left over by the rounding errors
+    threshold[small] = 1
+    return threshold, alias
+
+
 def populate_bunch(beam, time_grid, deltaE_grid, density_grid, time_step,
-                   deltaE_step, seed):
+                   deltaE_step, seed, distributed=False, sampler='choice',
+                   threads=1):
     '''
     *Method to populate the bunch using a random number generator from the
-    particle density in phase space.*
+    particle density in phase space. With sampler = 'alias', the grid cells
+    are drawn with an alias table (see alias_table) by numpy.random.Generator
+    streams, in blocks written directly in beam.dt and beam.dE and
+    optionally drawn by several threads (see generate_blocks). With
+    distributed, the particles are drawn in the same way, every MPI worker
+    drawing its share (see generate_distributed). Otherwise, the cells are
+    drawn by numpy.random.choice from the global random generator.*
     '''
+    if distributed or sampler == 'alias':
+        time_grid = time_grid.flatten()
+        deltaE_grid = deltaE_grid.flatten()
+        threshold, alias = alias_table(density_grid)
+        n_cells = len(threshold)
+
+        def sample(generator, n):
+            # The integer and fractional parts of a single uniform number
+            # give the column of the table and the threshold test
+            column = generator.random(n)
+            column *= n_cells
+            indexes = column.astype(int)
+            np.minimum(indexes, n_cells - 1, out=indexes)
+            column -= indexes
+            indexes = np.where(column < threshold[indexes], indexes,
+                               alias[indexes])
+            dt = generator.random(n)
+            dt -= 0.5
+            dt *= time_step
+            dt += time_grid[indexes]
+            dE = generator.random(n)
+            dE -= 0.5
+            dE *= deltaE_step
+            dE += deltaE_grid[indexes]
+            return dt, dE
+
+        if distributed:
+            generate_distributed(beam, seed, sample, threads)
+        else:
+            n_macroparticles = int(beam.n_macroparticles)
+            dt, dE = coordinate_buffers(beam, n_macroparticles)
+            generate_blocks(seed, sample, 0, n_macroparticles,
+                            n_macroparticles, threads, dt, dE)
+        return
+    elif sampler != 'choice':
+        # InputDataError
+        raise RuntimeError('ERROR in populate_bunch: sampler should be ' +
+                           '\'choice\' or \'alias\'')
+
     # Initialise the random number generator
     np.random.seed(seed=seed)
     # Generating particles randomly inside the grid cells according to the
@@ -797,7 +991,7 @@ def line_density(coord_array, dist_type, bunch_length, bunch_position=0,
 
 
 def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE = None, seed = None,
-               reinsertion = False):
+               reinsertion = False, distributed = False):
     r"""Function generating a Gaussian beam both in time and energy 
     coordinates. Fills Beam.dt and Beam.dE arrays.
     
@@ -819,6 +1013,9 @@ def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE = None, seed = None,
     reinsertion : bool (optional)
         Re-insert particles that are generated outside the separatrix into the
         bucket; default in False
+    distributed : bool (optional)
+        Every MPI worker generates only its share of the particles, see
+        generate_distributed; default is False
     
     """
     
@@ -860,6 +1057,28 @@ def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE = None, seed = None,
     Beam.sigma_dt = sigma_dt
     Beam.sigma_dE = sigma_dE
     
+    if distributed:
+        def sample(generator, n):
+            dt = sigma_dt * generator.standard_normal(n) + \
+                (phi_s - phi_rf)/omega_rf
+            dE = sigma_dE * generator.standard_normal(n)
+            if reinsertion:
+                itemindex = np.where(is_in_separatrix(Ring, RFStation, Beam,
+                                                      dt, dE) == False)[0]
+                while itemindex.size != 0:
+                    dt[itemindex] = sigma_dt * \
+                        generator.standard_normal(itemindex.size) + \
+                        (phi_s - phi_rf)/omega_rf
+                    dE[itemindex] = sigma_dE * \
+                        generator.standard_normal(itemindex.size)
+                    itemindex = itemindex[is_in_separatrix(
+                        Ring, RFStation, Beam, dt[itemindex],
+                        dE[itemindex]) == False]
+            return dt, dE
+
+        generate_distributed(Beam, seed, sample)
+        return
+
     # Generate coordinates
     np.random.seed(seed)
     
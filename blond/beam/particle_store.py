@@ -0,0 +1,220 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""Module containing a structure-of-arrays storage of the macro-particle
+coordinates, with spare capacity and in-place compaction of lost particles
+"""
+
+from __future__ import division
+from builtins import object
+import numpy as np
+from ..utils import bmath as bm
+
+
+def _aligned_empty(shape, dtype, alignment=64):
+    '''Allocates an uninitialised, C-contiguous array whose first element is
+    aligned to the given number of bytes.
+    '''
+
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = (-raw.ctypes.data) % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+class ParticleStore(object):
+    """Class storing the macro-particle coordinates in a single preallocated
+    buffer.
+
+    The dt and dE coordinates are the two rows of one aligned buffer of shape
+    (2, capacity), of which the first n_macroparticles columns are in use.
+    Particles are flagged as lost either through their integer id (zero if
+    lost), or through a uint8 alive mask that takes the place of the id.
+    The spare capacity absorbs particle additions without reallocation, and
+    lost particles can be removed in place by compaction.
+
+    Parameters
+    ----------
+    n_macroparticles : int
+        number of macro-particles in use.
+    capacity : int
+        number of macro-particles that fit in the buffer, defaults to
+        n_macroparticles; rounded up to keep the rows aligned.
+    alive_mask : bool
+        if True, the particle ids are replaced by a uint8 alive mask.
+    growth_factor : float
+        factor by which the capacity is increased when the buffer is full.
+    compaction_threshold : float
+        fraction of lost particles above which compact_if_needed() removes
+        them from the buffer; None disables the automatic compaction.
+
+    Attributes
+    ----------
+    dt : numpy_array, float
+        view of the arrival times in use.
+    dE : numpy_array, float
+        view of the energy offsets in use.
+    id : numpy_array, int or uint8
+        view of the particle ids or of the alive mask in use.
+    n_removed : int
+        number of lost macro-particles removed by compaction.
+    """
+
+    def __init__(self, n_macroparticles, capacity=None, alive_mask=False,
+                 growth_factor=1.5, compaction_threshold=None):
+
+        self.n_macroparticles = int(n_macroparticles)
+        if capacity is None:
+            capacity = self.n_macroparticles
+        if capacity < self.n_macroparticles:
+            # CapacityError
+            raise RuntimeError("ERROR in ParticleStore: capacity smaller" +
+                               " than the number of macro-particles!")
+        if growth_factor <= 1:
+            # CapacityError
+            raise RuntimeError("ERROR in ParticleStore: growth_factor" +
+                               " should be larger than one!")
+        self.alive_mask = bool(alive_mask)
+        self.id_dtype = np.uint8 if self.alive_mask else int
+        self.growth_factor = float(growth_factor)
+        self.compaction_threshold = compaction_threshold
+        self.n_removed = 0
+
+        self._allocate(capacity)
+        self._update_views()
+
+    @classmethod
+    def from_arrays(cls, dt, dE, id, **kwargs):
+        '''Creates a store holding a copy of the given coordinates and ids.
+        '''
+
+        store = cls(len(dt), **kwargs)
+        store.dt[:] = dt
+        store.dE[:] = dE
+        store.set_id(id)
+        return store
+
+    @property
+    def capacity(self):
+        return self._coordinates.shape[1]
+
+    @property
+    def n_macroparticles_lost(self):
+        '''Number of lost macro-particles, including the removed ones.
+        '''
+
+        return self.n_macroparticles - self.n_macroparticles_alive \
+            + self.n_removed
+
+    @property
+    def n_macroparticles_alive(self):
+        return int(np.count_nonzero(self.id))
+
+    def _allocate(self, capacity, alignment=64):
+        # The capacity is rounded up so that both rows are aligned
+        per_line = alignment // np.dtype(bm.precision.real_t).itemsize
+        capacity = -(-int(capacity) // per_line) * per_line
+        self._coordinates = _aligned_empty((2, capacity),
+                                           bm.precision.real_t, alignment)
+        self._id = np.zeros(capacity, dtype=self.id_dtype)
+
+    def _update_views(self):
+        # The views are kept, so that their identity only changes when the
+        # number of particles in use does
+        n = self.n_macroparticles
+        self.dt = self._coordinates[0, :n]
+        self.dE = self._coordinates[1, :n]
+        self.id = self._id[:n]
+
+    def reserve(self, capacity):
+        '''Increases the capacity of the buffer, keeping the particles in use.
+        '''
+
+        if capacity <= self.capacity:
+            return
+        n = self.n_macroparticles
+        coordinates = self._coordinates
+        ids = self._id
+        self._allocate(capacity)
+        self._coordinates[:, :n] = coordinates[:, :n]
+        self._id[:n] = ids[:n]
+        self._update_views()
+
+    def resize(self, n_macroparticles):
+        '''Changes the number of particles in use. New particles have
+        undefined coordinates and are flagged as lost.
+        '''
+
+        n_macroparticles = int(n_macroparticles)
+        if n_macroparticles == self.n_macroparticles:
+            return
+        if n_macroparticles > self.capacity:
+            self.reserve(max(n_macroparticles,
+                             int(self.growth_factor * self.capacity)))
+        if n_macroparticles > self.n_macroparticles:
+            self._id[self.n_macroparticles:n_macroparticles] = 0
+        self.n_macroparticles = n_macroparticles
+        self._update_views()
+
+    def set_id(self, id):
+        '''Copies the particle ids, or the alive flags derived from them.
+        '''
+
+        if self.alive_mask:
+            np.not_equal(id, 0, out=self.id, casting='unsafe')
+        else:
+            self.id[:] = id
+
+    def append(self, dt, dE, id):
+        '''Adds particles at the end of the buffer, using the spare capacity
+        if available.
+        '''
+
+        n = self.n_macroparticles
+        self.resize(n + len(dt))
+        self.dt[n:] = dt
+        self.dE[n:] = dE
+        if self.alive_mask:
+            np.not_equal(id, 0, out=self.id[n:], casting='unsafe')
+        else:
+            self.id[n:] = id
+
+    def compact(self):
+        '''Removes the lost particles, keeping the order of the others.
+
+        Returns
+        -------
+        n_lost : int
+            number of macro-particles removed.
+        '''
+
+        alive = np.flatnonzero(self.id)
+        n_lost = self.n_macroparticles - len(alive)
+        if n_lost == 0:
+            return 0
+        n_alive = len(alive)
+        self._coordinates[:, :n_alive] = self._coordinates[:, alive]
+        self._id[:n_alive] = self._id[alive]
+        self.n_macroparticles = n_alive
+        self.n_removed += n_lost
+        self._update_views()
+        return n_lost
+
+    def compact_if_needed(self):
+        '''Compacts the buffer if the fraction of lost particles exceeds the
+        compaction threshold.
+        '''
+
+        if self.compaction_threshold is None or self.n_macroparticles == 0:
+            return 0
+        n_lost = self.n_macroparticles - self.n_macroparticles_alive
+        if n_lost > self.compaction_threshold * self.n_macroparticles:
+            return self.compact()
+        return 0
@@ -269,22 +269,42 @@ class OtherSlicesOptions(object):
         If set True, the profile is calculated when the Profile class below
         is created. If False the user has to manually track the Profile object
         in the main file after its creation
+    async_reduce : boolean
+        If set True, in MPI mode, the histogram is reduced over the workers
+        without blocking, see Profile.reduce_histo_start and
+        Profile.reduce_histo_wait
+    hierarchical_reduce : boolean
+        If set True, in MPI mode, the workers of a node slice into a
+        node-shared buffer and only one histogram per node is reduced over
+        the network, see Profile.reduce_histo_node
+    compress_reduce : boolean
+        If set True, in MPI mode, the blocking reduction of the histogram
+        sends it in the narrowest type holding the counts, or as a list of
+        the non-empty bins, see Worker.allreduce_histogram
 
     Attributes
     ----------
 
     smooth : boolean
     direct_slicing : boolean
+    async_reduce : boolean
+    hierarchical_reduce : boolean
+    compress_reduce : boolean
 
     """
 
-    def __init__(self, smooth=False, direct_slicing=False):
+    def __init__(self, smooth=False, direct_slicing=False,
+                 async_reduce=False, hierarchical_reduce=False,
+                 compress_reduce=False):
         """
         Constructor
         """
 
         self.smooth = smooth
         self.direct_slicing = direct_slicing
+        self.async_reduce = async_reduce
+        self.hierarchical_reduce = hierarchical_reduce
+        self.compress_reduce = compress_reduce
 
 
 class Profile(object):
@@ -341,6 +361,24 @@ class Profile(object):
     bunchLength : float
         profile length [s]
     filterExtraOptions : unknown (see above)
+    tiled_slicing_threshold : int
+        number of slices above which the histogram is computed tile by tile,
+        as the histogram (and the thread-private ones) no longer fit in cache
+        (class attribute)
+    slicing_tile_size : int
+        number of slices per tile of the tiled histogram (class attribute)
+    slicing_chunk_size : int
+        number of particles bucketed at once by the tiled histogram, which
+        sets the size of its workspace (class attribute)
+    async_reduce : bool
+        in MPI mode, the histogram is reduced over the workers without
+        blocking (see OtherSlicesOptions)
+    hierarchical_reduce : bool
+        in MPI mode, only one histogram per node is reduced over the network
+        (see OtherSlicesOptions)
+    compress_reduce : bool
+        in MPI mode, the histogram is encoded for the blocking reduction (see
+        OtherSlicesOptions)
 
     Examples
     --------
@@ -364,6 +402,10 @@ class Profile(object):
 
     """
 
+    tiled_slicing_threshold = 500000
+    slicing_tile_size = 16384
+    slicing_chunk_size = 1048576
+
     def __init__(self, Beam,
                  CutOptions=CutOptions(),
                  FitOptions=FitOptions(),
@@ -392,6 +434,29 @@ class Profile(object):
         self.beam_spectrum = np.array([], dtype=bm.precision.real_t, order='C')
         self.beam_spectrum_freq = np.array([], dtype=bm.precision.real_t, order='C')
 
+        # Histogram pre-computed by the fused kick-drift-slice kernel of the
+        # tracker, and the state of the slicing at the time it was computed
+        self.fused_histogram = None
+        self._fused_state = None
+
+        # Buffers of the multi-threaded histogram kernels, kept between turns
+        # and reallocated only when the number of slices, of threads or of
+        # particles grows
+        self._slicing_workspace = None
+        self._tile_indices = None
+        self._tile_offsets = None
+
+        # Persistent buffers and request of the non-blocking reduction of the
+        # histogram over the workers
+        self._reduce_sendbuf = None
+        self._reduce_recvbuf = None
+        self._reduce_request = None
+
+        # Reduction of the histogram over the MPI workers
+        self.async_reduce = OtherSlicesOptions.async_reduce
+        self.hierarchical_reduce = OtherSlicesOptions.hierarchical_reduce
+        self.compress_reduce = OtherSlicesOptions.compress_reduce
+
         if OtherSlicesOptions.smooth:
             self.operations = [self._slice_smooth]
         else:
@@ -429,18 +494,127 @@ class Profile(object):
         needed for the MPI version.
         """
 
-        for op in self.operations:
+        for i, op in enumerate(self.operations):
+            # The fit and filter work on the reduced histogram
+            if i > 0:
+                self.reduce_histo_wait()
             op()
 
-    def _slice(self):
+    def _slice(self, reduce=True):
+        """
+        Constant space slicing with a constant frame. In MPI mode, the
+        histogram is reduced over the workers unless reduce is False.
+        """
+        node_reduction = self.get_node_reduction()
+        if node_reduction is not None:
+            self.n_macroparticles = node_reduction.local
+
+        if self.fused_histogram_valid():
+            # The tracker has already sliced the beam while drifting it
+            self.n_macroparticles[:] = self.fused_histogram
+        elif self.tiled_slicing_possible():
+            indices, offsets = self.get_tiled_workspace()
+            bm.slice_tiled(self.Beam.dt, self.n_macroparticles,
+                           self.cut_left, self.cut_right,
+                           self.slicing_tile_size, indices, offsets,
+                           self.slicing_chunk_size)
+        else:
+            bm.slice(self.Beam.dt, self.n_macroparticles, self.cut_left,
+                     self.cut_right, self.get_slicing_workspace())
+        self._fused_state = None
+
+        if bm.mpiMode() and reduce:
+            if node_reduction is not None:
+                self.reduce_histo_node()
+            elif self.async_reduce:
+                self.reduce_histo_start()
+            else:
+                self.reduce_histo()
+
+    def get_slicing_workspace(self):
+        """
+        Returns the buffer holding the thread-private histograms of the
+        slicing kernels, max_threads * n_slices elements.
+        """
+        size = bm.get_max_threads() * self.n_slices
+        if (self._slicing_workspace is None) or \
+                (len(self._slicing_workspace) != size):
+            self._slicing_workspace = np.empty(size,
+                                               dtype=bm.precision.real_t,
+                                               order='C')
+        return self._slicing_workspace
+
+    def tiled_slicing_possible(self):
+        """
+        True if the tiled histogram should be used, i.e. many slices.
+        """
+        return self.n_slices > self.tiled_slicing_threshold
+
+    def get_tiled_workspace(self):
+        """
+        Returns the buffers of the tiled histogram: the bin index of every
+        particle of a chunk, bucketed by tile, and the per thread offsets of
+        the tiles.
+        """
+        size = 2 * min(self.slicing_chunk_size, len(self.Beam.dt))
+        if (self._tile_indices is None) or (len(self._tile_indices) < size):
+            self._tile_indices = np.empty(size, dtype=np.int32)
+        n_tiles = -(-self.n_slices // self.slicing_tile_size)
+        size = (bm.get_max_threads() + 1) * n_tiles + 1
+        if (self._tile_offsets is None) or (len(self._tile_offsets) != size):
+            self._tile_offsets = np.empty(size, dtype=np.int32)
+        return self._tile_indices, self._tile_offsets
+
+    # Number of particles sampled to check that the beam has not moved since
+    # the fused histogram was computed
+    fused_check_samples = 256
+
+    def _slicing_state(self):
+        # Everything that would make a pre-computed histogram invalid: the
+        # cuts, the number of particles and a sample of their coordinates
+        n_macroparticles = len(self.Beam.dt)
+        stride = max(1, n_macroparticles // self.fused_check_samples)
+        return (n_macroparticles, self.cut_left, self.cut_right,
+                self.n_slices, self.Beam.dt[::stride].copy())
+
+    def fused_histogram_valid(self):
+        """
+        True if the fused histogram was computed for the current beam and
+        cuts. Coordinates moved in place after the kick and drift are
+        detected from a sample of the particles.
+        """
+        if self._fused_state is None:
+            return False
+        state = self._slicing_state()
+        return self._fused_state[:-1] == state[:-1] and \
+            np.array_equal(self._fused_state[-1], state[-1])
+
+    def fused_slicing_possible(self):
+        """
+        True if the histogram can be computed by the tracker in the same pass
+        as the kick and drift, i.e. plain constant space slicing.
+        """
+        return self.operations[0] == self._slice
+
+    def get_fused_histogram(self):
         """
-        Constant space slicing with a constant frame.
+        Returns the buffer the tracker fills with the histogram of the drifted
+        particles. The buffer is used by the next call to track() if the beam
+        and the cuts are still the same.
         """
-        bm.slice(self.Beam.dt, self.n_macroparticles, self.cut_left,
-                 self.cut_right)
+        if (self.fused_histogram is None) or \
+                (len(self.fused_histogram) != self.n_slices):
+            self.fused_histogram = np.zeros(self.n_slices,
+                                            dtype=bm.precision.real_t,
+                                            order='C')
+        self._fused_state = None
+        return self.fused_histogram
 
-        if bm.mpiMode():
-            self.reduce_histo()
+    def set_fused_histogram_ready(self):
+        """
+        Called by the tracker once the fused histogram has been filled.
+        """
+        self._fused_state = self._slicing_state()
 
     def reduce_histo(self, dtype=np.uint32):
         if not bm.mpiMode():
@@ -449,7 +623,13 @@ class Profile(object):
 
         from ..utils.mpi_config import worker
 
-        if self.Beam.is_splitted:
+        self.reduce_histo_wait()
+
+        if self.Beam.is_splitted and self.compress_reduce and \
+                np.issubdtype(dtype, np.integer):
+            # Encoded from the counts, the histogram keeps its type
+            worker.allreduce_histogram(self.n_macroparticles)
+        elif self.Beam.is_splitted:
             # Convert to uint32t for better performance
             self.n_macroparticles = self.n_macroparticles.astype(dtype, order='C')
 
@@ -458,7 +638,81 @@ class Profile(object):
             # Convert back to float64
             self.n_macroparticles = self.n_macroparticles.astype(dtype=bm.precision.real_t, order='C', copy=False)
 
-        
+    def reduce_histo_start(self, dtype=np.uint32):
+        """
+        Starts the reduction of the histogram over the workers without
+        waiting for it to complete, so that the work not depending on the
+        histogram overlaps with the communication. The histogram is converted
+        to dtype in a persistent buffer. The reduced histogram is copied to
+        n_macroparticles by reduce_histo_wait, which the tracker and the
+        induced voltage call before using it.
+        """
+        if not bm.mpiMode():
+            raise RuntimeError(
+                'ERROR: Cannot use this routine unless in MPI Mode')
+
+        from ..utils.mpi_config import worker
+
+        self.reduce_histo_wait()
+
+        if self.Beam.is_splitted:
+            if (self._reduce_sendbuf is None) or \
+                    (len(self._reduce_sendbuf) != self.n_slices) or \
+                    (self._reduce_sendbuf.dtype != dtype):
+                self._reduce_sendbuf = np.empty(self.n_slices, dtype=dtype)
+                self._reduce_recvbuf = np.empty(self.n_slices, dtype=dtype)
+
+            self._reduce_sendbuf[:] = self.n_macroparticles
+            self._reduce_request = worker.iallreduce(self._reduce_sendbuf,
+                                                     self._reduce_recvbuf)
+
+    def reduce_histo_wait(self):
+        """
+        Waits for the reduction started by reduce_histo_start, if any, and
+        copies the reduced histogram to n_macroparticles.
+        """
+        if self._reduce_request is None:
+            return
+
+        from ..utils.mpi_config import worker
+
+        worker.wait_allreduce(self._reduce_request)
+        self._reduce_request = None
+        self.n_macroparticles[:] = self._reduce_recvbuf
+
+    def get_node_reduction(self):
+        """
+        Returns the node-shared buffers of the hierarchical reduction of the
+        histogram if it is enabled, otherwise None.
+        """
+        if not (self.hierarchical_reduce and bm.mpiMode() and
+                self.Beam.is_splitted):
+            return None
+
+        from ..utils.mpi_config import worker
+
+        return worker.node_reduction(self.n_slices, bm.precision.real_t)
+
+    def reduce_histo_node(self):
+        """
+        Reduces the histogram over the workers in two levels: the histograms
+        of the workers of a node, sliced in the node-shared buffer, are
+        summed in parallel by these workers, then the node histograms are
+        summed by one worker per node. n_macroparticles then points to the
+        reduced histogram in the shared buffer, without copy.
+        """
+        if not bm.mpiMode():
+            raise RuntimeError(
+                'ERROR: Cannot use this routine unless in MPI Mode')
+
+        self.reduce_histo_wait()
+
+        node_reduction = self.get_node_reduction()
+        if node_reduction is not None:
+            if self.n_macroparticles is not node_reduction.local:
+                node_reduction.local[:] = self.n_macroparticles
+            self.n_macroparticles = node_reduction.reduce()
+
     def scale_histo(self):
         if not bm.mpiMode():
             raise RuntimeError(
@@ -472,11 +726,20 @@ class Profile(object):
         """
         At the moment 4x slower than _slice but smoother (filtered).
         """
+        node_reduction = self.get_node_reduction()
+        if node_reduction is not None:
+            self.n_macroparticles = node_reduction.local
+
         bm.slice_smooth(self.Beam.dt, self.n_macroparticles, self.cut_left,
-                        self.cut_right)
+                        self.cut_right, self.get_slicing_workspace())
 
-        if bm.mpiMode():
-            self.reduce_histo(dtype=np.float64)
+        if bm.mpiMode() and reduce:
+            if node_reduction is not None:
+                self.reduce_histo_node()
+            elif self.async_reduce:
+                self.reduce_histo_start(dtype=np.float64)
+            else:
+                self.reduce_histo(dtype=np.float64)
 
     def apply_fit(self):
         """
@@ -20,6 +20,8 @@ C++ Math library
 #include <cmath>
 #include <algorithm>
 #include <functional>
+#include <limits>
+#include <stdint.h>
 #include "blondmath.h"
 #include "openmp.h"
 
@@ -921,3 +923,92 @@ extern "C" {
 
 }
 
+
+
+// Single pass statistics of the beam coordinates over the particles whose
+// id is non-zero (all particles if id is NULL). The sums are accumulated in
+// double precision, relative to the first particle to avoid cancellations,
+// and stored in stats as:
+// [count, mean_dt, mean_dE, m2_dt, m2_dE, min_dt, min_dE, max_dt, max_dE]
+// where m2 is the sum of the squared deviations from the mean.
+template <typename T, typename U>
+static void beam_statistics_impl(const T * __restrict__ dt,
+                                 const T * __restrict__ dE,
+                                 const U * __restrict__ id,
+                                 const int n,
+                                 double * __restrict__ stats)
+{
+    const double shift_dt = n > 0 ? dt[0] : 0.;
+    const double shift_dE = n > 0 ? dE[0] : 0.;
+    double count = 0., sum_dt = 0., sum_dE = 0., sumsq_dt = 0., sumsq_dE = 0.;
+    // no infinities with -ffast-math
+    double min_dt = numeric_limits<double>::max();
+    double min_dE = numeric_limits<double>::max();
+    double max_dt = -numeric_limits<double>::max();
+    double max_dE = -numeric_limits<double>::max();
+
+    #pragma omp parallel for reduction(+:count, sum_dt, sum_dE, sumsq_dt, sumsq_dE) \
+        reduction(min:min_dt, min_dE) reduction(max:max_dt, max_dE)
+    for (int i = 0; i < n; i++) {
+        if (id != NULL && id[i] == 0) continue;
+        const double t = dt[i];
+        const double e = dE[i];
+        const double st = t - shift_dt;
+        const double se = e - shift_dE;
+        count += 1.;
+        sum_dt += st;
+        sum_dE += se;
+        sumsq_dt += st * st;
+        sumsq_dE += se * se;
+        min_dt = t < min_dt ? t : min_dt;
+        min_dE = e < min_dE ? e : min_dE;
+        max_dt = t > max_dt ? t : max_dt;
+        max_dE = e > max_dE ? e : max_dE;
+    }
+
+    const double inv_count = count > 0. ? 1. / count : 0.;
+    stats[0] = count;
+    stats[1] = shift_dt + sum_dt * inv_count;
+    stats[2] = shift_dE + sum_dE * inv_count;
+    stats[3] = std::max(sumsq_dt - sum_dt * sum_dt * inv_count, 0.);
+    stats[4] = std::max(sumsq_dE - sum_dE * sum_dE * inv_count, 0.);
+    stats[5] = min_dt;
+    stats[6] = min_dE;
+    stats[7] = max_dt;
+    stats[8] = max_dE;
+}
+
+extern "C" {
+
+    void beam_statistics(const double * __restrict__ dt,
+                         const double * __restrict__ dE,
+                         const int64_t * __restrict__ id,
+                         const int n, double * __restrict__ stats)
+    {
+        beam_statistics_impl<double, int64_t>(dt, dE, id, n, stats);
+    }
+
+    void beam_statisticsf(const float * __restrict__ dt,
+                          const float * __restrict__ dE,
+                          const int64_t * __restrict__ id,
+                          const int n, double * __restrict__ stats)
+    {
+        beam_statistics_impl<float, int64_t>(dt, dE, id, n, stats);
+    }
+
+    void beam_statistics_mask(const double * __restrict__ dt,
+                              const double * __restrict__ dE,
+                              const unsigned char * __restrict__ alive,
+                              const int n, double * __restrict__ stats)
+    {
+        beam_statistics_impl<double, unsigned char>(dt, dE, alive, n, stats);
+    }
+
+    void beam_statistics_maskf(const float * __restrict__ dt,
+                               const float * __restrict__ dE,
+                               const unsigned char * __restrict__ alive,
+                               const int n, double * __restrict__ stats)
+    {
+        beam_statistics_impl<float, unsigned char>(dt, dE, alive, n, stats);
+    }
+}
@@ -17,6 +17,8 @@ Project website: http://blond.web.cern.ch/
 
 #include <string.h>
 #include <math.h>
+#include <algorithm>
+#include "drift.h"
 
 extern "C" void drift(double * __restrict__ beam_dt,
                       const double * __restrict__ beam_dE,
@@ -29,63 +31,17 @@ extern "C" void drift(double * __restrict__ beam_dt,
                       const double beta, const double energy,
                       const int n_macroparticles) {
 
-    int i;
-    double T = T0 * length_ratio;
+    const drift_params<double> params(drift_solver_code(solver), T0,
+                                      length_ratio, alpha_order, eta_zero,
+                                      eta_one, eta_two, alpha_zero,
+                                      alpha_one, alpha_two, beta, energy);
 
-    if ( strcmp (solver, "simple") == 0 )
-    {
-        double coeff = eta_zero / (beta * beta * energy);
-        #pragma omp parallel for
-        for (int i = 0; i < n_macroparticles; i++)
-            beam_dt[i] += T * coeff * beam_dE[i];
-    }
-
-    else if ( strcmp (solver, "legacy") == 0 )
-    {
-        const double coeff = 1. / (beta * beta * energy);
-        const double eta0 = eta_zero * coeff;
-        const double eta1 = eta_one * coeff * coeff;
-        const double eta2 = eta_two * coeff * coeff * coeff;
-
-        if (alpha_order == 0)
-            for ( i = 0; i < n_macroparticles; i++ )
-                beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]) - 1.);
-        else if (alpha_order == 1)
-            for ( i = 0; i < n_macroparticles; i++ )
-                beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]
-                                         - eta1 * beam_dE[i] * beam_dE[i]) - 1.);
-        else
-            for ( i = 0; i < n_macroparticles; i++ )
-                beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]
-                                         - eta1 * beam_dE[i] * beam_dE[i]
-                                         - eta2 * beam_dE[i] * beam_dE[i] * beam_dE[i]) - 1.);
-    }
-
-    else
-    {
-
-        const double invbetasq = 1 / (beta * beta);
-        const double invenesq = 1 / (energy * energy);
-        // double beam_delta;
-
-        #pragma omp parallel for
-        for ( i = 0; i < n_macroparticles; i++ )
-
-        {
-
-            double beam_delta = sqrt(1. + invbetasq *
-                              (beam_dE[i] * beam_dE[i] * invenesq + 2.*beam_dE[i] / energy)) - 1.;
-
-            beam_dt[i] += T * (
-                              (1. + alpha_zero * beam_delta +
-                               alpha_one * (beam_delta * beam_delta) +
-                               alpha_two * (beam_delta * beam_delta * beam_delta)) *
-                              (1. + beam_dE[i] / energy) / (1. + beam_delta) - 1.);
-
-        }
-
-    }
+    const int STEP = 4096;
 
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i += STEP)
+        drift_particles(beam_dt + i, beam_dE + i, params,
+                        std::min(STEP, n_macroparticles - i));
 }
 
 
@@ -100,62 +56,15 @@ extern "C" void driftf(float * __restrict__ beam_dt,
                        const float beta, const float energy,
                        const int n_macroparticles) {
 
-  int i;
-  float T = T0 * length_ratio;
-
-  if ( strcmp (solver, "simple") == 0 )
-  {
-    float coeff = eta_zero / (beta * beta * energy);
-    #pragma omp parallel for
-    for (int i = 0; i < n_macroparticles; i++)
-      beam_dt[i] += T * coeff * beam_dE[i];
-  }
-
-  else if ( strcmp (solver, "legacy") == 0 )
-  {
-    const float coeff = 1. / (beta * beta * energy);
-    const float eta0 = eta_zero * coeff;
-    const float eta1 = eta_one * coeff * coeff;
-    const float eta2 = eta_two * coeff * coeff * coeff;
-
-    if (alpha_order == 0)
-      for ( i = 0; i < n_macroparticles; i++ )
-        beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]) - 1.);
-    else if (alpha_order == 1)
-      for ( i = 0; i < n_macroparticles; i++ )
-        beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]
-                                 - eta1 * beam_dE[i] * beam_dE[i]) - 1.);
-    else
-      for ( i = 0; i < n_macroparticles; i++ )
-        beam_dt[i] += T * (1. / (1. - eta0 * beam_dE[i]
-                                 - eta1 * beam_dE[i] * beam_dE[i]
-                                 - eta2 * beam_dE[i] * beam_dE[i] * beam_dE[i]) - 1.);
-  }
-
-  else
-  {
-
-    const float invbetasq = 1 / (beta * beta);
-    const float invenesq = 1 / (energy * energy);
-    // float beam_delta;
-
-    #pragma omp parallel for
-    for ( i = 0; i < n_macroparticles; i++ )
-
-    {
-
-      float beam_delta = sqrt(1. + invbetasq *
-                              (beam_dE[i] * beam_dE[i] * invenesq + 2.*beam_dE[i] / energy)) - 1.;
+  const drift_params<float> params(drift_solver_code(solver), T0,
+                                   length_ratio, alpha_order, eta_zero,
+                                   eta_one, eta_two, alpha_zero,
+                                   alpha_one, alpha_two, beta, energy);
 
-      beam_dt[i] += T * (
-                      (1. + alpha_zero * beam_delta +
-                       alpha_one * (beam_delta * beam_delta) +
-                       alpha_two * (beam_delta * beam_delta * beam_delta)) *
-                      (1. + beam_dE[i] / energy) / (1. + beam_delta) - 1.);
-
-    }
-
-  }
+  const int STEP = 4096;
 
+  #pragma omp parallel for
+  for (int i = 0; i < n_macroparticles; i += STEP)
+    drift_particles(beam_dt + i, beam_dE + i, params,
+                    std::min(STEP, n_macroparticles - i));
 }
-
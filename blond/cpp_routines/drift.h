@@ -0,0 +1,110 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Per-particle drift, shared by drift() and the fused tracking kernels so
+// that they track the particles to the same bits.
+
+#ifndef _DRIFT_H_
+#define _DRIFT_H_
+
+#include <string.h>
+#include <math.h>
+
+enum drift_solver_t {SOLVER_SIMPLE = 0, SOLVER_LEGACY = 1, SOLVER_EXACT = 2};
+
+static inline drift_solver_t drift_solver_code(const char *solver)
+{
+    if (strcmp(solver, "simple") == 0)
+        return SOLVER_SIMPLE;
+    else if (strcmp(solver, "legacy") == 0)
+        return SOLVER_LEGACY;
+    else
+        return SOLVER_EXACT;
+}
+
+// Turn-dependent constants of the drift, computed once per turn
+template <typename T>
+struct drift_params {
+    drift_solver_t solver;
+    int alpha_order;
+    T T_rev;
+    T coeff;
+    T eta0, eta1, eta2;
+    T alpha0, alpha1, alpha2;
+    T simple_coeff;
+    T invbetasq, invenesq, energy;
+
+    drift_params(const drift_solver_t _solver, const T T0,
+                 const T length_ratio, const T _alpha_order,
+                 const T eta_zero, const T eta_one, const T eta_two,
+                 const T alpha_zero, const T alpha_one, const T alpha_two,
+                 const T beta, const T _energy)
+    {
+        solver = _solver;
+        alpha_order = (int) _alpha_order;
+        T_rev = T0 * length_ratio;
+        simple_coeff = eta_zero / (beta * beta * _energy);
+        coeff = 1. / (beta * beta * _energy);
+        eta0 = eta_zero * coeff;
+        eta1 = eta_one * coeff * coeff;
+        eta2 = eta_two * coeff * coeff * coeff;
+        alpha0 = alpha_zero;
+        alpha1 = alpha_one;
+        alpha2 = alpha_two;
+        invbetasq = 1. / (beta * beta);
+        invenesq = 1. / (_energy * _energy);
+        energy = _energy;
+    }
+};
+
+// Drift of n particles, with the solver selected outside of the loops so
+// that they are vectorised
+template <typename T>
+static inline void drift_particles(T * __restrict__ dt,
+                                   const T * __restrict__ dE,
+                                   const drift_params<T> &p, const int n)
+{
+    const T T_rev = p.T_rev;
+
+    if (p.solver == SOLVER_SIMPLE) {
+        const T coeff = p.simple_coeff;
+        for (int i = 0; i < n; i++)
+            dt[i] += T_rev * coeff * dE[i];
+    } else if (p.solver == SOLVER_LEGACY) {
+        const T eta0 = p.eta0, eta1 = p.eta1, eta2 = p.eta2;
+        if (p.alpha_order == 0)
+            for (int i = 0; i < n; i++)
+                dt[i] += T_rev * (1. / (1. - eta0 * dE[i]) - 1.);
+        else if (p.alpha_order == 1)
+            for (int i = 0; i < n; i++)
+                dt[i] += T_rev * (1. / (1. - eta0 * dE[i]
+                                        - eta1 * dE[i] * dE[i]) - 1.);
+        else
+            for (int i = 0; i < n; i++)
+                dt[i] += T_rev * (1. / (1. - eta0 * dE[i]
+                                        - eta1 * dE[i] * dE[i]
+                                        - eta2 * dE[i] * dE[i] * dE[i]) - 1.);
+    } else {
+        const T alpha0 = p.alpha0, alpha1 = p.alpha1, alpha2 = p.alpha2;
+        const T invbetasq = p.invbetasq, invenesq = p.invenesq;
+        const T energy = p.energy;
+        for (int i = 0; i < n; i++) {
+            const T delta = sqrt(1. + invbetasq *
+                                 (dE[i] * dE[i] * invenesq
+                                  + 2. * dE[i] / energy)) - 1.;
+            dt[i] += T_rev * ((1. + alpha0 * delta
+                               + alpha1 * (delta * delta)
+                               + alpha2 * (delta * delta * delta))
+                              * (1. + dE[i] / energy) / (1. + delta) - 1.);
+        }
+    }
+}
+
+#endif // _DRIFT_H_
@@ -15,6 +15,46 @@
 #include <math.h>
 
 
+#include <vector>
+
+
+// All resonators are summed in a single pass over the frequencies, with the
+// frequencies split among the threads: the output is read and written once,
+// however many resonators (HOM tables count hundreds of them).
+template <typename T>
+static void fast_resonator_impl(T *__restrict__ impedanceReal,
+                                T *__restrict__ impedanceImag,
+                                const T *__restrict__ frequencies,
+                                const T *__restrict__ shunt_impedances,
+                                const T *__restrict__ Q_values,
+                                const T *__restrict__ resonant_frequencies,
+                                const int n_resonators,
+                                const int n_frequencies)
+{
+    std::vector<T> inverse_frequency_R(n_resonators);
+    for (int res = 0; res < n_resonators; res++)
+        inverse_frequency_R[res] = 1.0 / resonant_frequencies[res];
+
+    #pragma omp parallel for
+    for (int freq = 1; freq < n_frequencies; freq++) {
+        const T f = frequencies[freq];
+        const T inverse_f = 1.0 / f;
+        T real = 0, imag = 0;
+        for (int res = 0; res < n_resonators; res++) {
+            const T commonTerm = Q_values[res]
+                                 * (f * inverse_frequency_R[res]
+                                    - resonant_frequencies[res] * inverse_f);
+            const T real_res = shunt_impedances[res]
+                               / (1.0 + commonTerm * commonTerm);
+            real += real_res;
+            imag -= real_res * commonTerm;
+        }
+        impedanceReal[freq] += real;
+        impedanceImag[freq] += imag;
+    }
+}
+
+
 extern "C" void fast_resonator_real_imag(double *__restrict__ impedanceReal,
         double *__restrict__ impedanceImag,
         const double *__restrict__ frequencies,
@@ -51,25 +91,10 @@ extern "C" void fast_resonator_real_imag(double *__restrict__ impedanceReal,
         imaginary part of the impedance
       */
 
-
-    for (int res = 0; res < n_resonators; res++) {
-        const double Qsquare = Q_values[res] * Q_values[res];
-        #pragma omp parallel for
-        for (int freq = 1; freq < n_frequencies; freq++) {
-            const double commonTerm = (frequencies[freq]
-                                       / resonant_frequencies[res]
-                                       - resonant_frequencies[res]
-                                       / frequencies[freq]);
-
-            impedanceReal[freq] += shunt_impedances[res]
-                                   / (1.0 + Qsquare * commonTerm * commonTerm);
-
-            impedanceImag[freq] -= shunt_impedances[res]
-                                   * (Q_values[res] * commonTerm)
-                                   / (1.0 + Qsquare * commonTerm * commonTerm);
-        }
-    }
-
+    fast_resonator_impl<double>(impedanceReal, impedanceImag, frequencies,
+                                shunt_impedances, Q_values,
+                                resonant_frequencies, n_resonators,
+                                n_frequencies);
 }
 
 
@@ -83,50 +108,136 @@ extern "C" void fast_resonator_real_imagf(float *__restrict__ impedanceReal,
         const int n_frequencies)
         
 {   /*
-    This function takes as an input a list of resonators parameters and 
-    computes the impedance in an optimised way.
-    
-    Parameters
-    ---------- 
-    frequencies : float array
-        array of frequency in Hz
-    shunt_impedances : float array
-        array of shunt impedances in Ohm
-    Q_values : float array
-        array of quality factors
-    resonant_frequencies : float array
-        array of resonant frequency in Hz
-    n_resonators : int
-        number of resonantors
-    n_frequencies : int
-        length of the array 'frequencies'
-    
-    Returns
-    -------
-    impedanceReal : float array
-        real part of the impedance
-    impedanceImag : float array
-        imaginary part of the impedance
+    Single precision version of fast_resonator_real_imag.
       */
 
+    fast_resonator_impl<float>(impedanceReal, impedanceImag, frequencies,
+                               shunt_impedances, Q_values,
+                               resonant_frequencies, n_resonators,
+                               n_frequencies);
+}
 
-    for (int res = 0; res < n_resonators; res++) {
-        const float Qsquare = Q_values[res] * Q_values[res];
-        #pragma omp parallel for
-        for (int freq = 1; freq < n_frequencies; freq++) {
-            const float commonTerm = (frequencies[freq]
-                                       / resonant_frequencies[res]
-                                       - resonant_frequencies[res]
-                                       / frequencies[freq]);
 
-            impedanceReal[freq] += shunt_impedances[res]
-                                   / (1.0 + Qsquare * commonTerm * commonTerm);
+#include <complex>
+#include <algorithm>
+#include "openmp.h"
 
-            impedanceImag[freq] -= shunt_impedances[res]
-                                   * (Q_values[res] * commonTerm)
-                                   / (1.0 + Qsquare * commonTerm * commonTerm);
+template <typename T>
+static void resonator_induced_voltage_impl(T *__restrict__ induced_voltage,
+        const T *__restrict__ time,
+        const T *__restrict__ bin_centers,
+        const T *__restrict__ coefficients,
+        const T *__restrict__ amplitudes,
+        const T *__restrict__ omega,
+        const T *__restrict__ alpha,
+        const T *__restrict__ Q_tilde,
+        const int n_resonators,
+        const int n_time,
+        const int n_slices)
+{
+    /*
+    Induced voltage of resonators for a piecewise linear line density, as the
+    sum over the slices j of coefficients[j] * (g(t - b_j) - sign(t - b_j)),
+    with g(x) = H(x) * (2 cos(omega x) + sin(omega x) / Q_tilde) exp(-alpha x)
+    and H(0) = 1/2. The damped oscillation is the real part of
+    (2 - i / Q_tilde) * exp((i omega - alpha) x), so that its sum over the
+    slices before t is propagated from one time to the next by a single
+    complex factor. The times must be sorted, each thread starts its block of
+    times with a direct sum over the slices.
+    */
+
+    #pragma omp parallel
+    {
+        const int n_threads = omp_get_num_threads();
+        const int thread = omp_get_thread_num();
+        const int block = (n_time + n_threads - 1) / n_threads;
+        const int first = thread * block;
+        const int last = std::min(n_time, first + block);
+
+        for (int t = first; t < last; t++)
+            induced_voltage[t] = 0;
+
+        if (first < last) {
+            for (int r = 0; r < n_resonators; r++) {
+                const std::complex<double> p(-(double) alpha[r],
+                                             (double) omega[r]);
+                const std::complex<double> K(2.0, -1.0 / Q_tilde[r]);
+                std::complex<double> sum(0, 0);
+                int j = 0;
+                double t_previous = time[first];
+                for (; j < n_slices && bin_centers[j] < time[first]; j++)
+                    sum += (double) coefficients[j]
+                           * std::exp(p * (double)(time[first]
+                                                   - bin_centers[j]));
+
+                for (int t = first; t < last; t++) {
+                    sum *= std::exp(p * (double)(time[t] - t_previous));
+                    t_previous = time[t];
+                    for (; j < n_slices && bin_centers[j] < time[t]; j++)
+                        sum += (double) coefficients[j]
+                               * std::exp(p * (double)(time[t]
+                                                       - bin_centers[j]));
+                    induced_voltage[t] += amplitudes[r] * std::real(K * sum);
+                }
+            }
+
+            // Part common to all resonators, from the sign function and
+            // from the slices at t, with g(0) = 1 and sign(0) = 0
+            double amplitude = 0;
+            for (int r = 0; r < n_resonators; r++)
+                amplitude += amplitudes[r];
+            double total = 0;
+            for (int j = 0; j < n_slices; j++)
+                total += coefficients[j];
+            double before = 0;
+            int j = 0;
+            for (int t = first; t < last; t++) {
+                for (; j < n_slices && bin_centers[j] < time[t]; j++)
+                    before += coefficients[j];
+                double at = 0;
+                for (int k = j; k < n_slices && bin_centers[k] == time[t]; k++)
+                    at += coefficients[k];
+                const double after = total - before - at;
+                induced_voltage[t] += amplitude * (at - before + after);
+            }
         }
     }
+}
 
+
+extern "C" void resonator_induced_voltage(double *__restrict__ induced_voltage,
+        const double *__restrict__ time,
+        const double *__restrict__ bin_centers,
+        const double *__restrict__ coefficients,
+        const double *__restrict__ amplitudes,
+        const double *__restrict__ omega,
+        const double *__restrict__ alpha,
+        const double *__restrict__ Q_tilde,
+        const int n_resonators,
+        const int n_time,
+        const int n_slices)
+{
+    resonator_induced_voltage_impl<double>(induced_voltage, time, bin_centers,
+                                           coefficients, amplitudes, omega,
+                                           alpha, Q_tilde, n_resonators,
+                                           n_time, n_slices);
 }
 
+
+extern "C" void resonator_induced_voltagef(float *__restrict__ induced_voltage,
+        const float *__restrict__ time,
+        const float *__restrict__ bin_centers,
+        const float *__restrict__ coefficients,
+        const float *__restrict__ amplitudes,
+        const float *__restrict__ omega,
+        const float *__restrict__ alpha,
+        const float *__restrict__ Q_tilde,
+        const int n_resonators,
+        const int n_time,
+        const int n_slices)
+{
+    resonator_induced_voltage_impl<float>(induced_voltage, time, bin_centers,
+                                          coefficients, amplitudes, omega,
+                                          alpha, Q_tilde, n_resonators,
+                                          n_time, n_slices);
+}
@@ -10,6 +10,7 @@
 #include "fft.h"
 #include <complex>
 #include <vector>
+#include <map>
 #include <algorithm>
 #include <cmath>
 #include <fftw3.h>
@@ -32,8 +33,12 @@
 // May yield better performance but the input is not usable any more.
 // Can be combined with all the above
 
-static std::vector<fft_plan_t> planV;
-static std::vector<fftf_plan_t> planVf;
+// The plans are cached by (fftSize, inSize, howmany, type). A miss is a
+// plan that had to be created, either by planning or from the wisdom.
+static std::map<fft_key_t, fft_plan_t> planV;
+static std::map<fft_key_t, fftf_plan_t> planVf;
+static long planHits = 0, planMisses = 0;
+static long planHitsf = 0, planMissesf = 0;
 static bool hasBeenInit = false;
 const unsigned FFTW_FLAGS = FFTW_MEASURE | FFTW_DESTROY_INPUT;
 
@@ -144,16 +149,13 @@ extern "C" {
 
 
     fft_plan_t find_plan(int fftSize, int inSize, fft_type_t type, int threads,
-                         vector<fft_plan_t> &v)
+                         map<fft_key_t, fft_plan_t> &v)
     {
-        // const uint flag = FFTW_FLAGS;
-        auto it =
-        find_if(v.begin(), v.end(), [inSize, fftSize, type](const fft_plan_t &s) {
-            return ((s.inSize == inSize) && (s.fftSize == fftSize) && (s.type == type)
-                    && (s.howmany == 1));
-        });
+        const fft_key_t key(fftSize, inSize, 1, type);
+        auto it = v.find(key);
 
         if (it == v.end()) {
+            planMisses++;
             fft_plan_t plan;
             plan.inSize = inSize;
             plan.fftSize = fftSize;
@@ -209,26 +211,24 @@ extern "C" {
                 exit(-1);
             }
 
-            v.push_back(plan);
+            v[key] = plan;
             return plan;
         } else {
-            return *it;
+            planHits++;
+            return it->second;
         }
     }
 
 
 
     fft_plan_t find_plan_packed(int fftSize, int howmany, int inSize, fft_type_t type, int threads,
-                                vector<fft_plan_t> &v)
+                                map<fft_key_t, fft_plan_t> &v)
     {
-        // const uint flag = FFTW_FLAGS;
-        auto it =
-        find_if(v.begin(), v.end(), [inSize, fftSize, howmany, type](const fft_plan_t &s) {
-            return ((s.inSize == inSize) && (s.fftSize == fftSize) && (s.type == type)
-                    && (s.howmany == howmany));
-        });
+        const fft_key_t key(fftSize, inSize, howmany, type);
+        auto it = v.find(key);
 
         if (it == v.end()) {
+            planMisses++;
             fft_plan_t plan;
             plan.inSize = inSize;
             plan.fftSize = fftSize;
@@ -251,10 +251,11 @@ extern "C" {
                 exit(-1);
             }
 
-            v.push_back(plan);
+            v[key] = plan;
             return plan;
         } else {
-            return *it;
+            planHits++;
+            return it->second;
         }
     }
 
@@ -263,21 +264,54 @@ extern "C" {
     void destroy_plans()
     {
         for (auto &i : planV) {
-            fftw_destroy_plan(i.p);
-            fftw_free(i.in);
-            fftw_free(i.out);
+            fftw_destroy_plan(i.second.p);
+            fftw_free(i.second.in);
+            fftw_free(i.second.out);
         }
         planV.clear();
 
         for (auto &i : planVf) {
-            fftwf_destroy_plan(i.p);
-            fftwf_free(i.in);
-            fftwf_free(i.out);
+            fftwf_destroy_plan(i.second.p);
+            fftwf_free(i.second.in);
+            fftwf_free(i.second.out);
         }
         planVf.clear();
 
     }
 
+    // Creates the plans of the rfft of n points, and of the irfft back to
+    // n points, so that they are ready before the first transform.
+    void plan_rfft(const int n, const int threads)
+    {
+        find_plan(n / 2 + 1, n, RFFT, threads, planV);
+    }
+
+    void plan_irfft(const int n, const int threads)
+    {
+        find_plan(n, n / 2 + 1, IRFFT, threads, planV);
+    }
+
+    // @stats: number of cache hits, cache misses and cached plans
+    void fft_plan_statistics(long *stats)
+    {
+        stats[0] = planHits;
+        stats[1] = planMisses;
+        stats[2] = planV.size();
+    }
+
+    // The wisdom accumulates the plans of all the sizes planned so far, so
+    // that the same sizes are planned instantly by the next processes.
+    // Both return 1 on success.
+    int import_wisdom(const char *filename)
+    {
+        return fftw_import_wisdom_from_filename(filename);
+    }
+
+    int export_wisdom(const char *filename)
+    {
+        return fftw_export_wisdom_to_filename(filename);
+    }
+
     // rfft
     // @in: input vector which must be the result of a rfft
     // @out: irfft of input, always real
@@ -555,16 +589,13 @@ extern "C" {
 
 
     fftf_plan_t find_planf(int fftSize, int inSize, fft_type_t type, int threads,
-                           vector<fftf_plan_t> &v)
+                           map<fft_key_t, fftf_plan_t> &v)
     {
-        // const uint flag = FFTW_FLAGS;
-        auto it =
-        find_if(v.begin(), v.end(), [inSize, fftSize, type](const fftf_plan_t &s) {
-            return ((s.inSize == inSize) && (s.fftSize == fftSize) && (s.type == type)
-                    && (s.howmany == 1));
-        });
+        const fft_key_t key(fftSize, inSize, 1, type);
+        auto it = v.find(key);
 
         if (it == v.end()) {
+            planMissesf++;
             fftf_plan_t plan;
             plan.inSize = inSize;
             plan.fftSize = fftSize;
@@ -620,26 +651,24 @@ extern "C" {
                 exit(-1);
             }
 
-            v.push_back(plan);
+            v[key] = plan;
             return plan;
         } else {
-            return *it;
+            planHitsf++;
+            return it->second;
         }
     }
 
 
 
     fftf_plan_t find_plan_packedf(int fftSize, int howmany, int inSize, fft_type_t type, int threads,
-                                  vector<fftf_plan_t> &v)
+                                  map<fft_key_t, fftf_plan_t> &v)
     {
-        // const uint flag = FFTW_FLAGS;
-        auto it =
-        find_if(v.begin(), v.end(), [inSize, fftSize, howmany, type](const fftf_plan_t &s) {
-            return ((s.inSize == inSize) && (s.fftSize == fftSize) && (s.type == type)
-                    && (s.howmany == howmany));
-        });
+        const fft_key_t key(fftSize, inSize, howmany, type);
+        auto it = v.find(key);
 
         if (it == v.end()) {
+            planMissesf++;
             fftf_plan_t plan;
             plan.inSize = inSize;
             plan.fftSize = fftSize;
@@ -662,15 +691,43 @@ extern "C" {
                 exit(-1);
             }
 
-            v.push_back(plan);
+            v[key] = plan;
             return plan;
         } else {
-            return *it;
+            planHitsf++;
+            return it->second;
         }
     }
 
 
 
+    void plan_rfftf(const int n, const int threads)
+    {
+        find_planf(n / 2 + 1, n, RFFT, threads, planVf);
+    }
+
+    void plan_irfftf(const int n, const int threads)
+    {
+        find_planf(n, n / 2 + 1, IRFFT, threads, planVf);
+    }
+
+    void fft_plan_statisticsf(long *stats)
+    {
+        stats[0] = planHitsf;
+        stats[1] = planMissesf;
+        stats[2] = planVf.size();
+    }
+
+    int import_wisdomf(const char *filename)
+    {
+        return fftwf_import_wisdom_from_filename(filename);
+    }
+
+    int export_wisdomf(const char *filename)
+    {
+        return fftwf_export_wisdom_to_filename(filename);
+    }
+
     // rfft
     // @in: input vector which must be the result of a rfft
     // @out: irfft of input, always real
@@ -9,12 +9,16 @@
 #define INCLUDE_FFT_H_
 
 #include <complex>
+#include <tuple>
 #include <fftw3.h>
 #include "openmp.h"
 typedef std::complex<float> complex64_t;
 typedef std::complex<double> complex128_t;
 enum fft_type_t { FFT, IFFT, RFFT, IRFFT };
 
+// Key of the plan cache: fftSize, inSize, howmany, type
+typedef std::tuple<int, int, int, int> fft_key_t;
+
 struct fft_plan_t {
     fftw_plan p;      // fftw_plan
     int inSize;       // input size
@@ -41,6 +45,13 @@ struct fftf_plan_t {
 extern "C" {
     void destroy_plans();
 
+// Plan ahead the transforms of n points; see rfft and irfft
+    void plan_rfft(const int n, const int threads = 1);
+    void plan_irfft(const int n, const int threads = 1);
+    void fft_plan_statistics(long *stats);
+    int import_wisdom(const char *filename);
+    int export_wisdom(const char *filename);
+
     void rfft(double *in, const int inSize,
               complex128_t *out, int fftSize = 0,
               const int threads = 1);
@@ -94,6 +105,11 @@ extern "C" {
 
 
 // The single precision counterparts
+    void plan_rfftf(const int n, const int threads = 1);
+    void plan_irfftf(const int n, const int threads = 1);
+    void fft_plan_statisticsf(long *stats);
+    int import_wisdomf(const char *filename);
+    int export_wisdomf(const char *filename);
 
 
     void rfftf(float *in, const int inSize,
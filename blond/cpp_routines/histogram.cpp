@@ -17,27 +17,57 @@
 #include "openmp.h"
 
 
-extern "C" void histogram(const double *__restrict__ input,
-                          double *__restrict__ output, const double cut_left,
-                          const double cut_right, const int n_slices,
-                          const int n_macroparticles)
+// Thread-private histograms are kept in the workspace, of at least
+// omp_get_max_threads() * n_slices elements, owned by the caller so that
+// it is not reallocated every turn. If workspace is NULL, it is allocated
+// for the call.
+// The bin index is kept in the precision of the input, as a float index
+// merges neighbouring bins above 2^24 slices. Particles outside the cuts
+// (and NaN) give a negative index, rejected by the unsigned comparison.
+template <typename T>
+static void histogram_impl(const T *__restrict__ input,
+                           T *__restrict__ output, const T cut_left,
+                           const T cut_right, const int n_slices,
+                           const int n_macroparticles,
+                           T *__restrict__ workspace)
 {
     // Number of Iterations of the inner loop
     const int STEP = 16;
-    const double inv_bin_width = n_slices / (cut_right - cut_left);
+    const T inv_bin_width = n_slices / (cut_right - cut_left);
+
+    // A single thread fills the output directly
+    if (omp_get_max_threads() == 1) {
+        memset(output, 0., n_slices * sizeof(T));
+        T fbin[STEP];
+        for (int i = 0; i < n_macroparticles; i += STEP) {
+
+            const int loop_count = n_macroparticles - i > STEP ?
+                                   STEP : n_macroparticles - i;
+
+            for (int j = 0; j < loop_count; j++) {
+                fbin[j] = floor((input[i + j] - cut_left) * inv_bin_width);
+            }
+            for (int j = 0; j < loop_count; j++) {
+                const int bin = (int) fbin[j];
+                if ((unsigned) bin >= (unsigned) n_slices) continue;
+                output[bin] += 1.;
+            }
+        }
+        return;
+    }
 
     // allocate memory for the thread_private histogram
-    double **histo = (double **) malloc(omp_get_max_threads() * sizeof(double *));
-    histo[0] = (double *) malloc (omp_get_max_threads() * n_slices * sizeof(double));
-    for (int i = 0; i < omp_get_max_threads(); i++)
-        histo[i] = (*histo + n_slices * i);
+    T *histo = workspace;
+    if (histo == NULL)
+        histo = (T *) malloc (omp_get_max_threads() * n_slices * sizeof(T));
 
     #pragma omp parallel
     {
         const int id = omp_get_thread_num();
         const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(double));
-        float fbin[STEP];
+        T *my_histo = histo + id * n_slices;
+        memset(my_histo, 0., n_slices * sizeof(T));
+        T fbin[STEP];
         #pragma omp for
         for (int i = 0; i < n_macroparticles; i += STEP) {
 
@@ -50,9 +80,9 @@ extern "C" void histogram(const double *__restrict__ input,
             }
             // Then update the corresponding bins
             for (int j = 0; j < loop_count; j++) {
-                const int bin  = (int) fbin[j];
-                if (bin < 0 || bin >= n_slices) continue;
-                histo[id][bin] += 1.;
+                const int bin = (int) fbin[j];
+                if ((unsigned) bin >= (unsigned) n_slices) continue;
+                my_histo[bin] += 1.;
             }
         }
 
@@ -61,56 +91,58 @@ extern "C" void histogram(const double *__restrict__ input,
         for (int i = 0; i < n_slices; i++) {
             output[i] = 0.;
             for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
+                output[i] += histo[t * n_slices + i];
         }
     }
 
     // free memory
-    free(histo[0]);
-    free(histo);
+    if (workspace == NULL)
+        free(histo);
 }
 
-extern "C" void smooth_histogram(const double *__restrict__ input,
-                                 double *__restrict__ output, const double cut_left,
-                                 const double cut_right, const int n_slices,
-                                 const int n_macroparticles)
+
+template <typename T>
+static void smooth_histogram_impl(const T *__restrict__ input,
+                                  T *__restrict__ output, const T cut_left,
+                                  const T cut_right, const int n_slices,
+                                  const int n_macroparticles,
+                                  T *__restrict__ workspace)
 {
     // Constants init
-    const double inv_bin_width = n_slices / (cut_right - cut_left);
-    const double bin_width = (cut_right - cut_left) / n_slices;
-    const double const1 = (cut_left + bin_width * 0.5);
-    const double const2 = (cut_right - bin_width * 0.5);
+    const T inv_bin_width = n_slices / (cut_right - cut_left);
+    const T bin_width = (cut_right - cut_left) / n_slices;
+    const T const1 = (cut_left + bin_width * 0.5);
+    const T const2 = (cut_right - bin_width * 0.5);
 
     // memory alloc for per thread histo
-    double **histo = (double **) malloc(omp_get_max_threads() * sizeof(double *));
-    histo[0] = (double *) malloc (omp_get_max_threads() * n_slices * sizeof(double));
-    for (int i = 0; i < omp_get_max_threads(); i++)
-        histo[i] = (*histo + n_slices * i);
-
+    T *histo = workspace;
+    if (histo == NULL)
+        histo = (T *) malloc (omp_get_max_threads() * n_slices * sizeof(T));
 
     #pragma omp parallel
     {
         const int id = omp_get_thread_num();
         const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(double));
+        T *my_histo = histo + id * n_slices;
+        memset(my_histo, 0., n_slices * sizeof(T));
 
         // main caclulation
         #pragma omp for
         for (int i = 0; i < n_macroparticles; i++) {
             int fffbin = 0;
-            double a = input[i];
+            T a = input[i];
             if ((a < const1) || (a > const2))
                 continue;
-            double fbin = (a - cut_left) * inv_bin_width;
+            T fbin = (a - cut_left) * inv_bin_width;
             int ffbin = (int)(fbin);
-            double distToCenter = fbin - (double)(ffbin);
+            T distToCenter = fbin - (T)(ffbin);
             if (distToCenter > 0.5)
                 fffbin = (int)(fbin + 1.0);
             else
                 fffbin = (int)(fbin - 1.0);
 
-            histo[id][ffbin] = histo[id][ffbin] + 0.5 - distToCenter;
-            histo[id][fffbin] = histo[id][fffbin] + 0.5 + distToCenter;
+            my_histo[ffbin] = my_histo[ffbin] + 0.5 - distToCenter;
+            my_histo[fffbin] = my_histo[fffbin] + 0.5 + distToCenter;
         }
 
         // Reduce to a single histogram
@@ -118,132 +150,189 @@ extern "C" void smooth_histogram(const double *__restrict__ input,
         for (int i = 0; i < n_slices; i++) {
             output[i] = 0.;
             for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
+                output[i] += histo[t * n_slices + i];
         }
-
-
     }
-    // free memory
-    free(histo[0]);
-    free(histo);
 
+    // free memory
+    if (workspace == NULL)
+        free(histo);
 }
 
 
-extern "C" void histogramf(const float *__restrict__ input,
-                           float *__restrict__ output, const float cut_left,
-                           const float cut_right, const int n_slices,
-                           const int n_macroparticles)
+// Histogram for a large number of slices, where the thread-private
+// histograms would no longer fit in cache. The slices are split in tiles of
+// tile_size slices. The particles are processed in chunks of chunk_size
+// particles, bucketed by tile with a counting sort; each tile is then filled
+// by a single thread, directly in the output, while it stays in cache.
+// indices: 2 * min(chunk_size, n_macroparticles) elements, the bin of every
+// particle of the chunk and the bins ordered by tile.
+// offsets: (omp_get_max_threads() + 1) * n_tiles + 1 elements, the position
+// of every thread in every tile, and the first particle of every tile.
+// If a buffer is NULL, it is allocated for the call.
+template <typename T>
+static void histogram_tiled_impl(const T *__restrict__ input,
+                                 T *__restrict__ output, const T cut_left,
+                                 const T cut_right, const int n_slices,
+                                 const int n_macroparticles,
+                                 const int tile_size, int chunk_size,
+                                 int *__restrict__ indices,
+                                 int *__restrict__ offsets)
 {
-    // Number of Iterations of the inner loop
-    const int STEP = 16;
-    const float inv_bin_width = n_slices / (cut_right - cut_left);
-
-    // allocate memory for the thread_private histogram
-    static float **histo = nullptr;
-
-    histo = (float **) malloc(omp_get_max_threads() * sizeof(float *));
-    histo[0] = (float *) malloc (omp_get_max_threads() * n_slices * sizeof(float));
-    for (int i = 0; i < omp_get_max_threads(); i++)
-        histo[i] = (*histo + n_slices * i);
-
+    const T inv_bin_width = n_slices / (cut_right - cut_left);
+    const int n_tiles = (n_slices + tile_size - 1) / tile_size;
+    const int max_threads = omp_get_max_threads();
+    if (chunk_size > n_macroparticles)
+        chunk_size = n_macroparticles;
+    if (chunk_size < 1)
+        chunk_size = 1;
+
+    int *bins = indices;
+    if (bins == NULL)
+        bins = (int *) malloc (2 * (size_t) chunk_size * sizeof(int));
+    int *sorted = bins + chunk_size;
+    int *start = offsets;
+    if (start == NULL)
+        start = (int *) malloc (((max_threads + 1) * (size_t) n_tiles + 1)
+                                * sizeof(int));
+    // The particles of every tile, in the sorted array
+    int *tile_start = start + max_threads * n_tiles;
 
     #pragma omp parallel
     {
         const int id = omp_get_thread_num();
         const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(float));
-        float fbin[STEP];
-        #pragma omp for
-        for (int i = 0; i < n_macroparticles; i += STEP) {
+        int *my_start = start + id * n_tiles;
 
-            const int loop_count = n_macroparticles - i > STEP ?
-                                   STEP : n_macroparticles - i;
+        #pragma omp for schedule(static)
+        for (int i = 0; i < n_slices; i++)
+            output[i] = 0.;
 
-            // First calculate the index to update
-            for (int j = 0; j < loop_count; j++) {
-                fbin[j] = floor((input[i + j] - cut_left) * inv_bin_width);
+        for (int first = 0; first < n_macroparticles; first += chunk_size) {
+            const int n = n_macroparticles - first > chunk_size ?
+                          chunk_size : n_macroparticles - first;
+            const T *chunk = input + first;
+            memset(my_start, 0, n_tiles * sizeof(int));
+
+            // Bin of every particle and number of particles per tile. The
+            // same particles are given to the same threads in both loops.
+            #pragma omp for schedule(static)
+            for (int i = 0; i < n; i++) {
+                const T fbin = floor((chunk[i] - cut_left) * inv_bin_width);
+                int bin = (int) fbin;
+                if ((unsigned) bin >= (unsigned) n_slices)
+                    bin = -1;
+                else
+                    my_start[bin / tile_size]++;
+                bins[i] = bin;
             }
-            // Then update the corresponding bins
-            for (int j = 0; j < loop_count; j++) {
-                const int bin  = (int) fbin[j];
-                if (bin < 0 || bin >= n_slices) continue;
-                histo[id][bin] += 1.;
+
+            // First position of every thread in every tile
+            #pragma omp single
+            {
+                int position = 0;
+                for (int tile = 0; tile < n_tiles; tile++) {
+                    tile_start[tile] = position;
+                    for (int t = 0; t < threads; t++) {
+                        const int count = start[t * n_tiles + tile];
+                        start[t * n_tiles + tile] = position;
+                        position += count;
+                    }
+                }
+                tile_start[n_tiles] = position;
             }
-        }
 
-        // Reduce to a single histogram
-        #pragma omp for
-        for (int i = 0; i < n_slices; i++) {
-            output[i] = 0.;
-            for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
+            #pragma omp for schedule(static)
+            for (int i = 0; i < n; i++) {
+                const int bin = bins[i];
+                if (bin >= 0)
+                    sorted[my_start[bin / tile_size]++] = bin;
+            }
+
+            // Every tile of the output is written by a single thread
+            #pragma omp for schedule(dynamic)
+            for (int tile = 0; tile < n_tiles; tile++)
+                for (int i = tile_start[tile]; i < tile_start[tile + 1]; i++)
+                    output[sorted[i]] += 1.;
         }
     }
 
-    // free memory
-    free(histo[0]);
-    free(histo);
+    if (indices == NULL)
+        free(bins);
+    if (offsets == NULL)
+        free(start);
 }
 
 
-extern "C" void smooth_histogramf(const float *__restrict__ input,
-                                  float *__restrict__ output, const float cut_left,
-                                  const float cut_right, const int n_slices,
-                                  const int n_macroparticles)
+extern "C" void histogram(const double *__restrict__ input,
+                          double *__restrict__ output, const double cut_left,
+                          const double cut_right, const int n_slices,
+                          const int n_macroparticles,
+                          double *__restrict__ workspace)
 {
-    // Constants init
-    const float inv_bin_width = n_slices / (cut_right - cut_left);
-    const float bin_width = (cut_right - cut_left) / n_slices;
-    const float const1 = (cut_left + bin_width * 0.5);
-    const float const2 = (cut_right - bin_width * 0.5);
-
-    // memory alloc for per thread histo
-    float **histo = (float **) malloc(omp_get_max_threads() * sizeof(float *));
-    histo[0] = (float *) malloc (omp_get_max_threads() * n_slices * sizeof(float));
-    for (int i = 0; i < omp_get_max_threads(); i++)
-        histo[i] = (*histo + n_slices * i);
-
-
-    #pragma omp parallel
-    {
-        const int id = omp_get_thread_num();
-        const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(float));
+    histogram_impl<double>(input, output, cut_left, cut_right, n_slices,
+                           n_macroparticles, workspace);
+}
 
-        // main caclulation
-        #pragma omp for
-        for (int i = 0; i < n_macroparticles; i++) {
-            int fffbin = 0;
-            float a = input[i];
-            if ((a < const1) || (a > const2))
-                continue;
-            float fbin = (a - cut_left) * inv_bin_width;
-            int ffbin = (int)(fbin);
-            float distToCenter = fbin - (float)(ffbin);
-            if (distToCenter > 0.5)
-                fffbin = (int)(fbin + 1.0);
-            else
-                fffbin = (int)(fbin - 1.0);
+extern "C" void smooth_histogram(const double *__restrict__ input,
+                                 double *__restrict__ output, const double cut_left,
+                                 const double cut_right, const int n_slices,
+                                 const int n_macroparticles,
+                                 double *__restrict__ workspace)
+{
+    smooth_histogram_impl<double>(input, output, cut_left, cut_right,
+                                  n_slices, n_macroparticles, workspace);
+}
 
-            histo[id][ffbin] = histo[id][ffbin] + 0.5 - distToCenter;
-            histo[id][fffbin] = histo[id][fffbin] + 0.5 + distToCenter;
-        }
+extern "C" void histogram_tiled(const double *__restrict__ input,
+                                double *__restrict__ output, const double cut_left,
+                                const double cut_right, const int n_slices,
+                                const int n_macroparticles, const int tile_size,
+                                const int chunk_size,
+                                int *__restrict__ indices,
+                                int *__restrict__ offsets)
+{
+    histogram_tiled_impl<double>(input, output, cut_left, cut_right,
+                                 n_slices, n_macroparticles, tile_size,
+                                 chunk_size, indices, offsets);
+}
 
-        // Reduce to a single histogram
-        #pragma omp for
-        for (int i = 0; i < n_slices; i++) {
-            output[i] = 0.;
-            for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
-        }
+extern "C" void histogramf(const float *__restrict__ input,
+                           float *__restrict__ output, const float cut_left,
+                           const float cut_right, const int n_slices,
+                           const int n_macroparticles,
+                           float *__restrict__ workspace)
+{
+    histogram_impl<float>(input, output, cut_left, cut_right, n_slices,
+                          n_macroparticles, workspace);
+}
 
+extern "C" void smooth_histogramf(const float *__restrict__ input,
+                                  float *__restrict__ output, const float cut_left,
+                                  const float cut_right, const int n_slices,
+                                  const int n_macroparticles,
+                                  float *__restrict__ workspace)
+{
+    smooth_histogram_impl<float>(input, output, cut_left, cut_right,
+                                 n_slices, n_macroparticles, workspace);
+}
 
-    }
-    // free memory
-    free(histo[0]);
-    free(histo);
+extern "C" void histogram_tiledf(const float *__restrict__ input,
+                                 float *__restrict__ output, const float cut_left,
+                                 const float cut_right, const int n_slices,
+                                 const int n_macroparticles, const int tile_size,
+                                 const int chunk_size,
+                                 int *__restrict__ indices,
+                                 int *__restrict__ offsets)
+{
+    histogram_tiled_impl<float>(input, output, cut_left, cut_right,
+                                n_slices, n_macroparticles, tile_size,
+                                chunk_size, indices, offsets);
+}
 
+extern "C" int get_max_threads()
+{
+    return omp_get_max_threads();
 }
 
 
@@ -11,7 +11,9 @@ Project website: http://blond.web.cern.ch/
 // Optimised C++ routine that calculates the kicks
 // Author: Danilo Quartullo, Helga Timko, Alexandre Lasheen
 
+#include <vector>
 #include "sin.h"
+#include "drift.h"
 
 using namespace vdt;
 
@@ -96,3 +98,148 @@ extern "C" void rf_volt_compf(const float * __restrict__ voltage,
     }
 }
 
+
+
+// Multi-turn tracking without collective effects. Each chunk of particles
+// stays in cache while the kicks and drifts of all the turns are applied.
+
+static inline double kick_sin(const double x) {return fast_sin(x);}
+static inline float kick_sin(const float x) {return fast_sinf(x);}
+
+template <typename T>
+static void kick_drift_n_turns_impl(T * __restrict__ beam_dt,
+                                    T * __restrict__ beam_dE,
+                                    const int n_rf,
+                                    const int n_turns,
+                                    const T * __restrict__ voltage,
+                                    const T * __restrict__ omega_RF,
+                                    const T * __restrict__ phi_RF,
+                                    const T * __restrict__ acc_kick,
+                                    const drift_params<T> * __restrict__ drift,
+                                    const int n_macroparticles)
+{
+    const int STEP = 256;
+
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i += STEP) {
+
+        const int loop_count = n_macroparticles - i > STEP ?
+                               STEP : n_macroparticles - i;
+        T * __restrict__ dt = beam_dt + i;
+        T * __restrict__ dE = beam_dE + i;
+
+        for (int k = 0; k < n_turns; k++) {
+            const T * __restrict__ V = voltage + k * n_rf;
+            const T * __restrict__ omega = omega_RF + k * n_rf;
+            const T * __restrict__ phi = phi_RF + k * n_rf;
+
+            // Kick
+            for (int j = 0; j < n_rf; j++)
+                for (int m = 0; m < loop_count; m++)
+                    dE[m] += V[j] * kick_sin(omega[j] * dt[m] + phi[j]);
+
+            for (int m = 0; m < loop_count; m++)
+                dE[m] += acc_kick[k];
+
+            // Drift
+            drift_particles(dt, dE, drift[k], loop_count);
+        }
+    }
+}
+
+template <typename T>
+static void kick_drift_n_turns_dispatch(T * __restrict__ beam_dt,
+                                        T * __restrict__ beam_dE,
+                                        const int n_rf,
+                                        const int n_turns,
+                                        const T * __restrict__ voltage,
+                                        const T * __restrict__ omega_RF,
+                                        const T * __restrict__ phi_RF,
+                                        const T * __restrict__ acc_kick,
+                                        const char * __restrict__ solver,
+                                        const T * __restrict__ T0,
+                                        const T length_ratio,
+                                        const T alpha_order,
+                                        const T * __restrict__ eta_zero,
+                                        const T * __restrict__ eta_one,
+                                        const T * __restrict__ eta_two,
+                                        const T * __restrict__ alpha_zero,
+                                        const T * __restrict__ alpha_one,
+                                        const T * __restrict__ alpha_two,
+                                        const T * __restrict__ beta,
+                                        const T * __restrict__ energy,
+                                        const int n_macroparticles)
+{
+    const drift_solver_t solver_code = drift_solver_code(solver);
+    std::vector<drift_params<T>> drift;
+    drift.reserve(n_turns);
+    for (int k = 0; k < n_turns; k++)
+        drift.emplace_back(solver_code, T0[k], length_ratio, alpha_order,
+                           eta_zero[k], eta_one[k], eta_two[k],
+                           alpha_zero[k], alpha_one[k], alpha_two[k],
+                           beta[k], energy[k]);
+
+    kick_drift_n_turns_impl<T>(beam_dt, beam_dE, n_rf, n_turns, voltage,
+                               omega_RF, phi_RF, acc_kick, drift.data(),
+                               n_macroparticles);
+}
+
+extern "C" void kick_drift_n_turns(double * __restrict__ beam_dt,
+                                   double * __restrict__ beam_dE,
+                                   const int n_rf,
+                                   const int n_turns,
+                                   const double * __restrict__ voltage,
+                                   const double * __restrict__ omega_RF,
+                                   const double * __restrict__ phi_RF,
+                                   const double * __restrict__ acc_kick,
+                                   const char * __restrict__ solver,
+                                   const double * __restrict__ T0,
+                                   const double length_ratio,
+                                   const double alpha_order,
+                                   const double * __restrict__ eta_zero,
+                                   const double * __restrict__ eta_one,
+                                   const double * __restrict__ eta_two,
+                                   const double * __restrict__ alpha_zero,
+                                   const double * __restrict__ alpha_one,
+                                   const double * __restrict__ alpha_two,
+                                   const double * __restrict__ beta,
+                                   const double * __restrict__ energy,
+                                   const int n_macroparticles)
+{
+    kick_drift_n_turns_dispatch<double>(beam_dt, beam_dE, n_rf, n_turns,
+                                        voltage, omega_RF, phi_RF, acc_kick,
+                                        solver, T0, length_ratio, alpha_order,
+                                        eta_zero, eta_one, eta_two,
+                                        alpha_zero, alpha_one, alpha_two,
+                                        beta, energy, n_macroparticles);
+}
+
+extern "C" void kick_drift_n_turnsf(float * __restrict__ beam_dt,
+                                    float * __restrict__ beam_dE,
+                                    const int n_rf,
+                                    const int n_turns,
+                                    const float * __restrict__ voltage,
+                                    const float * __restrict__ omega_RF,
+                                    const float * __restrict__ phi_RF,
+                                    const float * __restrict__ acc_kick,
+                                    const char * __restrict__ solver,
+                                    const float * __restrict__ T0,
+                                    const float length_ratio,
+                                    const float alpha_order,
+                                    const float * __restrict__ eta_zero,
+                                    const float * __restrict__ eta_one,
+                                    const float * __restrict__ eta_two,
+                                    const float * __restrict__ alpha_zero,
+                                    const float * __restrict__ alpha_one,
+                                    const float * __restrict__ alpha_two,
+                                    const float * __restrict__ beta,
+                                    const float * __restrict__ energy,
+                                    const int n_macroparticles)
+{
+    kick_drift_n_turns_dispatch<float>(beam_dt, beam_dE, n_rf, n_turns,
+                                       voltage, omega_RF, phi_RF, acc_kick,
+                                       solver, T0, length_ratio, alpha_order,
+                                       eta_zero, eta_one, eta_two,
+                                       alpha_zero, alpha_one, alpha_two,
+                                       beta, energy, n_macroparticles);
+}
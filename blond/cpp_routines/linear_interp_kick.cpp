@@ -13,8 +13,11 @@ Project website: http://blond.web.cern.ch/
 // Optimised C++ routine that calculates the kick of a voltage array on particles
 
 #include <stdlib.h>
+#include <string.h>
 #include <math.h>
 #include <cmath>
+#include "drift.h"
+#include "openmp.h"
 
 
 extern "C" void linear_interp_kick(double * __restrict__ beam_dt,
@@ -307,3 +310,174 @@ extern "C" void linear_interp_kick_n_driftf(float * __restrict__ beam_dt,
 }
 
 
+
+
+// Optimised C++ routine that applies the interpolated kick, the drift and
+// accumulates the histogram of the drifted particles in a single pass over
+// the beam coordinates. The histogram uses the same cuts as the voltage
+// bin_centers, i.e. it is the profile of the next turn.
+template <typename T>
+static void linear_interp_kick_drift_n_slice_impl(
+    T * __restrict__ beam_dt,
+    T * __restrict__ beam_dE,
+    const T * __restrict__ voltage_array,
+    const T * __restrict__ bin_centers,
+    const T charge,
+    const int n_slices,
+    const int n_macroparticles,
+    const T acc_kick,
+    const drift_params<T> &drift,
+    T * __restrict__ profile,
+    const T cut_left,
+    const T cut_right,
+    T * __restrict__ workspace)
+{
+    const int STEP = 64;
+    const T inv_bin_width = (n_slices - 1)
+                            / (bin_centers[n_slices - 1] - bin_centers[0]);
+    const T inv_slice_width = n_slices / (cut_right - cut_left);
+
+    T *voltageKick = (T *) malloc ((n_slices - 1) * sizeof(T));
+    T *factor = (T *) malloc ((n_slices - 1) * sizeof(T));
+
+    // thread-private histograms, see histogram() in histogram.cpp
+    T *histo = workspace;
+    if (histo == NULL)
+        histo = (T *) malloc (omp_get_max_threads() * n_slices * sizeof(T));
+
+    #pragma omp parallel
+    {
+        const int id = omp_get_thread_num();
+        const int threads = omp_get_num_threads();
+        T *my_histo = histo + id * n_slices;
+        memset(my_histo, 0., n_slices * sizeof(T));
+        unsigned fbin[STEP];
+        int sbin[STEP];
+
+        #pragma omp for
+        for (int i = 0; i < n_slices - 1; i++) {
+            voltageKick[i] = charge * (voltage_array[i + 1] - voltage_array[i]) * inv_bin_width;
+            factor[i] = (charge * voltage_array[i] - bin_centers[i] * voltageKick[i]) + acc_kick;
+        }
+
+        #pragma omp for
+        for (int i = 0; i < n_macroparticles; i += STEP) {
+
+            const int loop_count = n_macroparticles - i > STEP ?
+                                   STEP : n_macroparticles - i;
+
+            // Kick
+            for (int j = 0; j < loop_count; j++) {
+                fbin[j] = (unsigned) std::floor((beam_dt[i + j] - bin_centers[0])
+                                                * inv_bin_width);
+            }
+
+            for (int j = 0; j < loop_count; j++) {
+                if (fbin[j] < n_slices - 1) {
+                    beam_dE[i + j] += beam_dt[i + j] * voltageKick[fbin[j]] + factor[fbin[j]];
+                }
+            }
+
+            // Drift
+            drift_particles(beam_dt + i, beam_dE + i, drift, loop_count);
+
+            // Slice
+            for (int j = 0; j < loop_count; j++) {
+                sbin[j] = (int) std::floor((beam_dt[i + j] - cut_left)
+                                           * inv_slice_width);
+            }
+
+            for (int j = 0; j < loop_count; j++) {
+                if (sbin[j] < 0 || sbin[j] >= n_slices) continue;
+                my_histo[sbin[j]] += 1.;
+            }
+        }
+
+        // Reduce to a single histogram
+        #pragma omp for
+        for (int i = 0; i < n_slices; i++) {
+            profile[i] = 0.;
+            for (int t = 0; t < threads; t++)
+                profile[i] += histo[t * n_slices + i];
+        }
+    }
+
+    free(voltageKick);
+    free(factor);
+    if (workspace == NULL)
+        free(histo);
+}
+
+
+extern "C" void linear_interp_kick_drift_n_slice(double * __restrict__ beam_dt,
+        double * __restrict__ beam_dE,
+        const double * __restrict__ voltage_array,
+        const double * __restrict__ bin_centers,
+        const double charge,
+        const int n_slices,
+        const int n_macroparticles,
+        const double acc_kick,
+        const char * __restrict__ solver,
+        const double T0,
+        const double length_ratio,
+        const double alpha_order,
+        const double eta_zero,
+        const double eta_one,
+        const double eta_two,
+        const double alpha_zero,
+        const double alpha_one,
+        const double alpha_two,
+        const double beta,
+        const double energy,
+        double * __restrict__ profile,
+        const double cut_left,
+        const double cut_right,
+        double * __restrict__ workspace)
+{
+    const drift_params<double> drift(drift_solver_code(solver), T0,
+                                     length_ratio, alpha_order,
+                                     eta_zero, eta_one, eta_two,
+                                     alpha_zero, alpha_one, alpha_two,
+                                     beta, energy);
+
+    linear_interp_kick_drift_n_slice_impl<double>(beam_dt, beam_dE,
+            voltage_array, bin_centers, charge, n_slices, n_macroparticles,
+            acc_kick, drift, profile, cut_left, cut_right, workspace);
+}
+
+
+extern "C" void linear_interp_kick_drift_n_slicef(float * __restrict__ beam_dt,
+        float * __restrict__ beam_dE,
+        const float * __restrict__ voltage_array,
+        const float * __restrict__ bin_centers,
+        const float charge,
+        const int n_slices,
+        const int n_macroparticles,
+        const float acc_kick,
+        const char * __restrict__ solver,
+        const float T0,
+        const float length_ratio,
+        const float alpha_order,
+        const float eta_zero,
+        const float eta_one,
+        const float eta_two,
+        const float alpha_zero,
+        const float alpha_one,
+        const float alpha_two,
+        const float beta,
+        const float energy,
+        float * __restrict__ profile,
+        const float cut_left,
+        const float cut_right,
+        float * __restrict__ workspace)
+{
+    const drift_params<float> drift(drift_solver_code(solver), T0,
+                                    length_ratio, alpha_order,
+                                    eta_zero, eta_one, eta_two,
+                                    alpha_zero, alpha_one, alpha_two,
+                                    beta, energy);
+
+    linear_interp_kick_drift_n_slice_impl<float>(beam_dt, beam_dE,
+            voltage_array, bin_centers, charge, n_slices, n_macroparticles,
+            acc_kick, drift, profile, cut_left, cut_right, workspace);
+}
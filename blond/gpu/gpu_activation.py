@@ -18,6 +18,12 @@ def use_gpu_beam(self):
     if self.__class__ == gb.GpuBeam:
         return
 
+    # The GPU beam keeps its own copy of the coordinates
+    if isinstance(self, beam.StoredBeam):
+        raise RuntimeError('ERROR in Beam.use_gpu: the coordinates of a ' +
+                           'StoredBeam cannot be moved to the GPU, use ' +
+                           'StoredBeam.to_beam first')
+
     self.dE_obj = CGA(self.dE)
 
     self.dt_obj = CGA(self.dt)
@@ -107,5 +107,10 @@ class GpuBeam(Beam):
 
         self.sigma_dt = np.sqrt(stdKernel(self.dev_dt, self.dev_id, self.mean_dt).get() / ones_sum)
         self.sigma_dE = np.sqrt(stdKernel(self.dev_dE, self.dev_id, self.mean_dE).get() / ones_sum)
+        # min and max are not computed on the GPU
+        self._moments = np.array([ones_sum, self.mean_dt, self.mean_dE,
+                                  ones_sum * self.sigma_dt**2,
+                                  ones_sum * self.sigma_dE**2,
+                                  np.nan, np.nan, np.nan, np.nan])
 
         self.epsn_rms_l = np.pi * self.sigma_dE * self.sigma_dt  # in eVs
@@ -15,12 +15,14 @@
 '''
 
 from __future__ import division, print_function
-from builtins import range, object
+from builtins import object
 import numpy as np
 from ctypes import c_uint, c_double, c_void_p
 from scipy.constants import e
 from ..toolbox.next_regular import next_regular
 from ..utils import bmath as bm
+from ..utils.fft_plans import fftw_enabled
+from .impedance_cache import ImpedanceCache
 
 
 class TotalInducedVoltage(object):
@@ -39,6 +41,13 @@ class TotalInducedVoltage(object):
         Profile object
     induced_voltage_list : object list
         List of objects for which induced voltages have to be calculated
+    combine_impedances : boolean, optional
+        If True, the impedances of the single-turn InducedVoltageTime and
+        InducedVoltageFreq objects are summed on a common FFT size, so that
+        their induced voltage takes one rfft and one irfft per turn whatever
+        their number (default is False). The induced_voltage of a combined
+        object is computed from the beam spectrum of the last turn when it
+        is read.
 
     Attributes
     ----------
@@ -52,9 +61,19 @@ class TotalInducedVoltage(object):
         Array to store the computed induced voltage [V]
     time_array : float array
         Time array corresponding to induced_voltage [s]
+    combined_list : object list
+        Objects whose impedances are summed in combined_impedance
+    separate_list : object list
+        Objects whose induced voltages are computed one by one
+    combined_n_fft : int
+        Number of points of the FFTs of the combined impedance
+    combined_impedance : complex array
+        Sum of the impedances of combined_list, sampled on combined_n_fft
+        points [:math:`\Omega`]
     """
 
-    def __init__(self, Beam, Profile, induced_voltage_list):
+    def __init__(self, Beam, Profile, induced_voltage_list,
+                 combine_impedances=False):
         """
         Constructor.
         """
@@ -74,6 +93,10 @@ class TotalInducedVoltage(object):
         # Time array of the wake in s
         self.time_array = self.profile.bin_centers
 
+        # Sum of the impedances on a common FFT size
+        self.combine_impedances = combine_impedances
+        self.combine()
+
     def reprocess(self):
         """
         Reprocess the impedance contributions. To be run when profile changes
@@ -82,6 +105,61 @@ class TotalInducedVoltage(object):
         for induced_voltage_object in self.induced_voltage_list:
             induced_voltage_object.process()
 
+        self.combine()
+
+    def combine(self):
+        """
+        Plans the combination of the impedances. The common FFT size is the
+        next regular number of the longest one needed: the FFT size of the
+        InducedVoltageFreq objects, and the length of the linear convolution
+        of the wake with the profile for the InducedVoltageTime objects. The
+        impedances of the InducedVoltageFreq objects are recomputed on the
+        frequencies of the common FFT, which are at least as fine as their
+        own, and the wakes of the InducedVoltageTime objects are transformed
+        on it. The multi-turn wake objects are not combined.
+        """
+
+        for obj in self.induced_voltage_list:
+            obj.combined_spectrum = None
+
+        self.combined_list = []
+        self.separate_list = list(self.induced_voltage_list)
+        self.combined_n_fft = None
+        self.combined_impedance = None
+
+        if not self.combine_impedances:
+            return
+
+        n_slices = int(self.profile.n_slices)
+        self.combined_list = [obj for obj in self.induced_voltage_list
+                              if isinstance(obj, (InducedVoltageTime,
+                                                  InducedVoltageFreq))
+                              and not obj.multi_turn_wake]
+        if not self.combined_list:
+            return
+        self.separate_list = [obj for obj in self.induced_voltage_list
+                              if obj not in self.combined_list]
+
+        n_fft = next_regular(max(
+            int(obj.n_fft) if isinstance(obj, InducedVoltageFreq)
+            else int(obj.n_induced_voltage) + n_slices - 1
+            for obj in self.combined_list))
+        self.combined_n_fft = n_fft
+
+        self.combined_impedance = np.zeros(n_fft // 2 + 1,
+                                           dtype=bm.precision.complex_t)
+        for obj in self.combined_list:
+            if obj.n_fft != n_fft:
+                obj.n_fft = n_fft
+                obj.frequency_resolution = 1 / (n_fft * self.profile.bin_size)
+                if isinstance(obj, InducedVoltageFreq):
+                    self.profile.beam_spectrum_freq_generation(n_fft)
+                    obj.freq = self.profile.beam_spectrum_freq
+                    obj.sum_impedances(obj.freq)
+                else:
+                    obj.total_impedance = bm.rfft(obj.total_wake, n_fft)
+            self.combined_impedance += obj.total_impedance
+
     def induced_voltage_sum(self):
         """
         Method to sum all the induced voltages in one single array.
@@ -90,7 +168,25 @@ class TotalInducedVoltage(object):
         beam_spectrum_dict = {}
         temp_induced_voltage = 0
 
-        for induced_voltage_object in self.induced_voltage_list:
+        # The histogram may still be reduced over the workers
+        self.profile.reduce_histo_wait()
+
+        if self.combined_list:
+            n_fft = self.combined_n_fft
+            if n_fft not in beam_spectrum_dict:
+                self.profile.beam_spectrum_generation(n_fft)
+                beam_spectrum_dict[n_fft] = self.profile.beam_spectrum
+            temp_induced_voltage = - (
+                self.beam.Particle.charge * e * self.beam.ratio
+                * bm.irfft(self.combined_impedance
+                           * beam_spectrum_dict[n_fft], n_fft)
+                [:self.profile.n_slices])
+            # The induced voltages of the combined objects are computed
+            # from this spectrum if they are read
+            for obj in self.combined_list:
+                obj.combined_spectrum = beam_spectrum_dict[n_fft]
+
+        for induced_voltage_object in self.separate_list:
             induced_voltage_object.induced_voltage_generation(
                 beam_spectrum_dict)
             temp_induced_voltage += \
@@ -169,6 +265,13 @@ class _InducedVoltage(object):
         use the next_regular function to ensure regular number for FFT
         calculations (default is True for efficient calculations, for
         better control of the sampling frequency False is preferred)
+    mtw_engine : str, optional
+        Multi-turn wake computation in 'freq' mode: 'classic' (default)
+        shifts the memory and adds the induced voltage of the turn
+        separately, 'spectral' adds the induced voltage of the turn to the
+        shifted memory in the frequency domain, on the grid of the memory,
+        which saves one of the four FFTs per turn but does not round the
+        same way as 'classic', 'auto' picks the cheaper one
 
     Attributes
     ----------
@@ -178,6 +281,10 @@ class _InducedVoltage(object):
         Copy of the Profile object in order to access the profile info
     induced_voltage : float array
         Induced voltage from the sum of the wake sources in V
+    combined_spectrum : complex array
+        Beam spectrum of the last turn when the impedance is combined in a
+        TotalInducedVoltage, from which induced_voltage is computed when it
+        is read, None otherwise
     wake_length_input : float
         Wake length [s]
     frequency_resolution_input : float
@@ -190,11 +297,20 @@ class _InducedVoltage(object):
         Multi-turn wake mode can be 'freq' or 'time' (default)
     use_regular_fft : boolean
         User set value to use (default) or not regular numbers for FFTs
+    mtw_transforms_saved : int
+        Number of FFTs per turn saved by the 'spectral' engine, set at the
+        first turn of the multi-turn wake in 'freq' mode
     """
 
+    # Length [s] of the front wake, extending the multi-turn wake buffer
+    front_wake_length = 0
+    # Incremental updates of the multi-turn wake phasor between two exact
+    # recomputations
+    mtw_phasor_rebuild = 1000
+
     def __init__(self, Beam, Profile, frequency_resolution=None,
                  wake_length=None, multi_turn_wake=False, mtw_mode='time',
-                 RFParams=None, use_regular_fft=True):
+                 RFParams=None, use_regular_fft=True, mtw_engine='classic'):
 
         # Beam object in order to access the beam info
         self.beam = Beam
@@ -202,6 +318,9 @@ class _InducedVoltage(object):
         # Profile object in order to access the profile info
         self.profile = Profile
 
+        # Beam spectrum of the last turn if combined in a TotalInducedVoltage
+        self.combined_spectrum = None
+
         # Induced voltage from the sum of the wake sources in V
         self.induced_voltage = 0
 
@@ -225,6 +344,12 @@ class _InducedVoltage(object):
         # in the frequency domain. For 'time', a linear interpolation is used.
         self.mtw_mode = mtw_mode
 
+        if mtw_engine not in ['auto', 'classic', 'spectral']:
+            # MTWEngineError
+            raise RuntimeError("ERROR in _InducedVoltage: mtw_engine should" +
+                               " be 'auto', 'classic' or 'spectral'!")
+        self.mtw_engine = mtw_engine
+
         self.process()
 
     def process(self):
@@ -279,7 +404,8 @@ class _InducedVoltage(object):
                             self.profile.bin_size)
                 # Extending the buffer to reduce the effect of the front wake
                 self.buffer_size += \
-                    np.ceil(np.max(self.buffer_extra) / self.profile.bin_size)
+                    np.ceil(np.max(self.front_wake_length) /
+                            self.profile.bin_size)
                 self.n_mtw_memory += int(self.buffer_size)
                 # Using next regular for FFTs speedup
                 if self.use_regular_fft:
@@ -290,6 +416,25 @@ class _InducedVoltage(object):
                 self.freq_mtw = \
                     bm.rfftfreq(self.n_mtw_fft, d=self.profile.bin_size)
                 self.omegaj_mtw = 2.0j * np.pi * self.freq_mtw
+                # Phase-shift table of the last revolution period, and
+                # buffers of the transforms
+                self._mtw_phasor = np.empty(len(self.freq_mtw),
+                                            dtype=bm.precision.complex_t)
+                self._mtw_phasor_t_rev = None
+                self._mtw_phasor_updates = 0
+                self._mtw_phasor_delta = np.empty(len(self.freq_mtw),
+                                                  dtype=bm.precision.complex_t)
+                self._mtw_spectrum = np.empty(len(self.freq_mtw),
+                                              dtype=bm.precision.complex_t)
+                self._mtw_product = np.empty(len(self.freq_mtw),
+                                             dtype=bm.precision.complex_t)
+                self._mtw_voltage = np.empty(self.n_mtw_fft,
+                                             dtype=bm.precision.real_t)
+                # The engine is selected at the first turn, once the
+                # impedance is known
+                self._mtw_kernel = None
+                self.mtw_engine_used = None
+                self.mtw_transforms_saved = 0
                 # Selecting time-shift method
                 self.shift_trev = self.shift_trev_freq
             else:
@@ -309,6 +454,23 @@ class _InducedVoltage(object):
         else:
             self.induced_voltage_generation = self.induced_voltage_1turn
 
+    @property
+    def induced_voltage(self):
+        """
+        Induced voltage from the sum of the wake sources in V. If the
+        impedance is combined in a TotalInducedVoltage, it is computed from
+        the beam spectrum of the last turn at the first read.
+        """
+
+        if self.combined_spectrum is not None:
+            self.induced_voltage_1turn({self.n_fft: self.combined_spectrum})
+        return self._induced_voltage
+
+    @induced_voltage.setter
+    def induced_voltage(self, induced_voltage):
+        self.combined_spectrum = None
+        self._induced_voltage = induced_voltage
+
     def induced_voltage_1turn(self, beam_spectrum_dict={}):
         """
         Method to calculate the induced voltage at the current turn. DFTs are
@@ -334,6 +496,13 @@ class _InducedVoltage(object):
         from previous passages (multi-turn wake)
         """
 
+        if self.mtw_mode == 'freq':
+            if self.mtw_engine_used is None:
+                self.mtw_engine_setup()
+            if self.mtw_engine_used == 'spectral':
+                self.induced_voltage_mtw_spectral(beam_spectrum_dict)
+                return
+
         # Shift of the memory wake field by the current revolution period
         self.shift_trev()
 
@@ -351,6 +520,131 @@ class _InducedVoltage(object):
 
         self.induced_voltage = self.mtw_memory[:self.n_induced_voltage]
 
+    def induced_voltage_mtw_spectral(self, beam_spectrum_dict={}):
+        """
+        Multi-turn wake in 'freq' mode with the induced voltage of the turn
+        summed to the shifted memory in the frequency domain, on the grid of
+        the memory. The memory is still transformed back and forth every
+        turn, only the inverse FFT of the induced voltage at n_fft is saved.
+        """
+
+        t_rev = self.RFParams.t_rev[self.RFParams.counter[0]]
+
+        if self.n_mtw_fft not in beam_spectrum_dict:
+            self.profile.beam_spectrum_generation(self.n_mtw_fft)
+            beam_spectrum_dict[self.n_mtw_fft] = self.profile.beam_spectrum
+        beam_spectrum = beam_spectrum_dict[self.n_mtw_fft]
+
+        spectrum = self._rfft(self.mtw_memory, self.n_mtw_fft,
+                              self._mtw_spectrum)
+        spectrum *= self.mtw_phasor(t_rev)
+        np.multiply(self._mtw_kernel, beam_spectrum, out=self._mtw_product)
+        self._mtw_product *= - (self.beam.Particle.charge * e
+                                * self.beam.ratio)
+        spectrum += self._mtw_product
+
+        voltage = self._irfft(spectrum, self.n_mtw_fft, self._mtw_voltage)
+        self.mtw_memory[:] = voltage[:self.n_mtw_memory]
+        # Removing the contribution from the circular convolution, and the
+        # induced voltage of the turn beyond the wake length
+        self.mtw_memory[self.n_induced_voltage:] = 0
+
+        self.induced_voltage = self.mtw_memory[:self.n_induced_voltage]
+
+    def mtw_engine_setup(self):
+        """
+        Selects the multi-turn wake engine in 'freq' mode. The 'spectral'
+        engine needs the induced voltage of one turn as a linear convolution
+        on the memory grid, which holds for an even n_fft, no front wake and
+        a memory longer than the induced voltage plus the profile. Per turn,
+        'classic' transforms the memory back and forth and the profile back
+        and forth at n_fft, 'spectral' transforms the memory back and forth
+        and the profile at the memory size. In 'auto', it is used if the
+        latter three transforms are cheaper than the four of 'classic'.
+        """
+
+        n_slices = int(self.profile.n_slices)
+        n_induced_voltage = int(self.n_induced_voltage)
+        possible = (self.n_fft % 2 == 0) and (self.front_wake_buffer == 0) \
+            and (self.n_mtw_fft >= n_induced_voltage + n_slices - 1)
+
+        def cost(n):
+            return n * np.log2(n)
+
+        if self.mtw_engine == 'classic' or not possible:
+            spectral = False
+        elif self.mtw_engine == 'spectral':
+            spectral = True
+        else:
+            spectral = cost(self.n_mtw_fft) <= 2 * cost(self.n_fft)
+
+        if not spectral:
+            self.mtw_engine_used = 'classic'
+            self.mtw_transforms_saved = 0
+            return
+
+        # Wake kernel of the convolution at n_fft, folded onto the memory
+        # grid: positive lags at the front, negative lags at the back
+        wake = bm.irfft(self.total_impedance.astype(
+            dtype=bm.precision.complex_t, order='C', copy=False), self.n_fft)
+        kernel = np.zeros(self.n_mtw_fft, dtype=bm.precision.real_t)
+        kernel[:n_induced_voltage] = wake[:n_induced_voltage]
+        if n_slices > 1:
+            kernel[-(n_slices-1):] = wake[-(n_slices-1):]
+        self._mtw_kernel = np.ascontiguousarray(
+            bm.rfft(kernel, self.n_mtw_fft), dtype=bm.precision.complex_t)
+
+        self.mtw_engine_used = 'spectral'
+        self.mtw_transforms_saved = 1
+
+    def mtw_phasor(self, t_rev):
+        """
+        Phase-shift table exp(omegaj_mtw * t_rev). When the revolution
+        period changes, the table is updated in place by the phasor of the
+        change of t_rev, and recomputed from scratch every
+        mtw_phasor_rebuild updates to bound the rounding drift.
+        """
+
+        if t_rev == self._mtw_phasor_t_rev:
+            return self._mtw_phasor
+
+        if (self._mtw_phasor_t_rev is None or
+                self._mtw_phasor_updates >= self.mtw_phasor_rebuild):
+            self._mtw_phasor_table(t_rev, self._mtw_phasor)
+            self._mtw_phasor_updates = 0
+        else:
+            self._mtw_phasor *= self._mtw_phasor_table(
+                t_rev - self._mtw_phasor_t_rev, self._mtw_phasor_delta)
+            self._mtw_phasor_updates += 1
+        self._mtw_phasor_t_rev = t_rev
+        return self._mtw_phasor
+
+    def _mtw_phasor_table(self, delta_t, table):
+        # Outer product of the phasors of the high and low parts of the
+        # frequency index: only about 2*sqrt(n) exponentials are evaluated
+        n = len(table)
+        block = int(np.ceil(np.sqrt(n)))
+        rows = -(-n // block)
+        phase = 2 * np.pi * delta_t / (self.n_mtw_fft * self.profile.bin_size)
+        low = np.exp(1j * phase * np.arange(block))
+        high = np.exp(1j * phase * block * np.arange(rows - 1))
+        full = (rows - 1) * block
+        np.multiply.outer(high, low,
+                          out=table[:full].reshape(rows - 1, block))
+        table[full:] = np.exp(1j * phase * full) * low[:n - full]
+        return table
+
+    def _rfft(self, signal, n, result):
+        # The FFTW transforms write into the given buffer
+        if fftw_enabled():
+            return bm.rfft(signal, n, result=result)
+        return bm.rfft(signal, n)
+
+    def _irfft(self, spectrum, n, result):
+        if fftw_enabled():
+            return bm.irfft(spectrum, n, result=result)
+        return bm.irfft(spectrum, n)
+
     def shift_trev_freq(self):
         """
         Method to shift the induced voltage by a revolution period in the
@@ -359,9 +653,11 @@ class _InducedVoltage(object):
 
         t_rev = self.RFParams.t_rev[self.RFParams.counter[0]]
         # Shift in frequency domain
-        induced_voltage_f = bm.rfft(self.mtw_memory, self.n_mtw_fft)
-        induced_voltage_f *= np.exp(self.omegaj_mtw * t_rev)
-        self.mtw_memory = bm.irfft(induced_voltage_f)[:self.n_mtw_memory]
+        induced_voltage_f = self._rfft(self.mtw_memory, self.n_mtw_fft,
+                                       self._mtw_spectrum)
+        induced_voltage_f *= self.mtw_phasor(t_rev)
+        self.mtw_memory[:] = self._irfft(induced_voltage_f, self.n_mtw_fft,
+                                         self._mtw_voltage)[:self.n_mtw_memory]
         # Setting to zero to the last part to remove the contribution from the
         # circular convolution
         self.mtw_memory[-int(self.buffer_size):] = 0
@@ -415,6 +711,9 @@ class InducedVoltageTime(_InducedVoltage):
         use the next_regular function to ensure regular number for FFT
         calculations (default is True for efficient calculations, for
         better control of the sampling frequency False is preferred)
+    mtw_engine : str, optional
+        Multi-turn wake computation in 'freq' mode: 'classic' (default),
+        'spectral' or 'auto', see _InducedVoltage
 
     Attributes
     ----------
@@ -428,7 +727,7 @@ class InducedVoltageTime(_InducedVoltage):
 
     def __init__(self, Beam, Profile, wake_source_list, wake_length=None,
                  multi_turn_wake=False, RFParams=None, mtw_mode=None,
-                 use_regular_fft=True):
+                 use_regular_fft=True, mtw_engine='classic'):
 
         # Wake sources list (e.g. list of Resonator objects)
         self.wake_source_list = wake_source_list
@@ -440,7 +739,8 @@ class InducedVoltageTime(_InducedVoltage):
         _InducedVoltage.__init__(self, Beam, Profile, frequency_resolution=None,
                                  wake_length=wake_length, multi_turn_wake=multi_turn_wake,
                                  RFParams=RFParams, mtw_mode=mtw_mode,
-                                 use_regular_fft=use_regular_fft)
+                                 use_regular_fft=use_regular_fft,
+                                 mtw_engine=mtw_engine)
 
     def process(self):
         """
@@ -513,6 +813,13 @@ class InducedVoltageFreq(_InducedVoltage):
         use the next_regular function to ensure regular number for FFT
         calculations (default is True for efficient calculations, for
         better control of the sampling frequency False is preferred)
+    mtw_engine : str, optional
+        Multi-turn wake computation in 'freq' mode: 'classic' (default),
+        'spectral' or 'auto', see _InducedVoltage
+    impedance_cache : boolean or ImpedanceCache, optional
+        Cache of the impedances of the sources: False (default) for no cache,
+        True for a cache owned by this object, or a given cache, which can be
+        shared by several objects
 
     Attributes
     ----------
@@ -524,16 +831,31 @@ class InducedVoltageFreq(_InducedVoltage):
         Lenght [s] of the front wake (if any) for multi-turn wake mode
     use_regular_fft : boolean
         User set value to use (default) or not regular numbers for FFTs
+    impedance_cache : ImpedanceCache
+        Cache of the impedances of the sources, None if not cached
     """
 
     def __init__(self, Beam, Profile, impedance_source_list,
                  frequency_resolution=None, multi_turn_wake=False,
                  front_wake_length=0, RFParams=None, mtw_mode=None,
-                 use_regular_fft=True):
+                 use_regular_fft=True, mtw_engine='classic',
+                 impedance_cache=False):
 
         # Impedance sources list (e.g. list of Resonator objects)
         self.impedance_source_list = impedance_source_list
 
+        # Cache of the impedances, reused when the profile changes
+        if impedance_cache is True:
+            self.impedance_cache = ImpedanceCache()
+        elif isinstance(impedance_cache, ImpedanceCache):
+            self.impedance_cache = impedance_cache
+        elif not impedance_cache:
+            self.impedance_cache = None
+        else:
+            # ImpedanceCacheError
+            raise RuntimeError("ERROR in InducedVoltageFreq: impedance_cache" +
+                               " should be a boolean or an ImpedanceCache!")
+
         # Total impedance array of all sources in* :math:`\Omega`
         self.total_impedance = 0
 
@@ -547,7 +869,8 @@ class InducedVoltageFreq(_InducedVoltage):
         _InducedVoltage.__init__(self, Beam, Profile, wake_length=None,
                                  frequency_resolution=frequency_resolution,
                                  multi_turn_wake=multi_turn_wake, RFParams=RFParams,
-                                 mtw_mode=mtw_mode, use_regular_fft=use_regular_fft)
+                                 mtw_mode=mtw_mode, use_regular_fft=use_regular_fft,
+                                 mtw_engine=mtw_engine)
 
     def process(self):
         """
@@ -586,9 +909,16 @@ class InducedVoltageFreq(_InducedVoltage):
         self.total_impedance = np.zeros(
             freq.shape, dtype=bm.precision.complex_t, order='C')
 
-        for impedance_source in self.impedance_source_list:
-            impedance_source.imped_calc(freq)
-            self.total_impedance += impedance_source.impedance
+        if self.impedance_cache is None:
+            for impedance_source in self.impedance_source_list:
+                impedance_source.imped_calc(freq)
+                self.total_impedance += impedance_source.impedance
+        else:
+            grid_key = self.impedance_cache.grid_key(freq)
+            for impedance_source in self.impedance_source_list:
+                self.impedance_cache.imped_calc(impedance_source, freq,
+                                                grid_key)
+                self.total_impedance += impedance_source.impedance
 
         # Factor relating Fourier transform and DFT
         self.total_impedance /= self.profile.bin_size
@@ -631,6 +961,23 @@ class InductiveImpedance(_InducedVoltage):
         # Call the __init__ method of the parent class
         _InducedVoltage.__init__(self, Beam, Profile, RFParams=RFParams)
 
+    @property
+    def induced_voltage(self):
+        """
+        Induced voltage from the sum of the wake sources in V. If the
+        impedance is combined in a TotalInducedVoltage, it is computed from
+        the beam spectrum of the last turn at the first read.
+        """
+
+        if self.combined_spectrum is not None:
+            self.induced_voltage_1turn({self.n_fft: self.combined_spectrum})
+        return self._induced_voltage
+
+    @induced_voltage.setter
+    def induced_voltage(self, induced_voltage):
+        self.combined_spectrum = None
+        self._induced_voltage = induced_voltage
+
     def induced_voltage_1turn(self, beam_spectrum_dict={}):
         """
         Method to calculate the induced voltage through the derivative of the
@@ -735,19 +1082,21 @@ class InducedVoltageResonator(_InducedVoltage):
         self._Qtilde = self.Q * np.sqrt(1. - 1./(4.*self.Q**2.))
         self._reOmegaP = self.omega_r * self._Qtilde / self.Q
         self._imOmegaP = self.omega_r / (2.*self.Q)
+        self._amplitudes = self.R / (2*self.omega_r*self.Q)
 
-        # Each the 'n_resonator' rows of the matrix holds the induced voltage
-        # at the 'n_time' time-values of one cavity. For internal use.
-        self._tmp_matrix = np.ones(
-            (self.n_resonators, self.n_time), dtype=bm.precision.real_t, order='C')
+        # The times are swept in increasing order. For internal use.
+        if np.all(np.diff(self.tArray) >= 0):
+            self._time_order = None
+        else:
+            self._time_order = np.argsort(self.tArray, kind='stable')
 
         # Slopes of the line segments. For internal use.
         self._kappa1 = np.zeros(
             int(self.profile.n_slices-1), dtype=bm.precision.real_t, order='C')
 
-        # Matrix to hold n_times many tArray[t]-bin_centers arrays.
-        self._deltaT = np.zeros(
-            (self.n_time, self.profile.n_slices), dtype=bm.precision.real_t, order='C')
+        # Changes of slope at the bin centers. For internal use.
+        self._coefficients = np.zeros(
+            int(self.profile.n_slices), dtype=bm.precision.real_t, order='C')
 
         # Call the __init__ method of the parent class [calls process()]
         _InducedVoltage.__init__(self, Beam, Profile, wake_length=None,
@@ -762,17 +1111,40 @@ class InducedVoltageResonator(_InducedVoltage):
         _InducedVoltage.process(self)
 
         # Since profile object changed, need to assign the proper dimensions to
-        # _kappa1 and _deltaT
+        # _kappa1 and _coefficients
         self._kappa1 = np.zeros(
             int(self.profile.n_slices-1), dtype=bm.precision.real_t, order='C')
-        self._deltaT = np.zeros(
-            (self.n_time, self.profile.n_slices), dtype=bm.precision.real_t, order='C')
+        self._coefficients = np.zeros(
+            int(self.profile.n_slices), dtype=bm.precision.real_t, order='C')
+
+    @property
+    def induced_voltage(self):
+        """
+        Induced voltage from the sum of the wake sources in V. If the
+        impedance is combined in a TotalInducedVoltage, it is computed from
+        the beam spectrum of the last turn at the first read.
+        """
+
+        if self.combined_spectrum is not None:
+            self.induced_voltage_1turn({self.n_fft: self.combined_spectrum})
+        return self._induced_voltage
+
+    @induced_voltage.setter
+    def induced_voltage(self, induced_voltage):
+        self.combined_spectrum = None
+        self._induced_voltage = induced_voltage
 
     def induced_voltage_1turn(self, beam_spectrum_dict={}):
         r"""
         Method to calculate the induced voltage through linearily 
         interpolating the line density and applying the analytic equation
         to the result.
+
+        Summed by parts, the contribution of the line segments is that of
+        the changes of slope :math:`c_j` at the bin centers :math:`t_j`, and
+        the damped oscillation of all the slices before a time point is
+        carried over to the next one by a single exponential factor. The
+        cost is linear in the number of time points and of slices.
         """
 
         # Compute the slopes of the line sections of the linearily interpolated
@@ -782,27 +1154,27 @@ class InducedVoltageResonator(_InducedVoltage):
             / (self.beam.n_macroparticles*self.profile.bin_size)
         # [:] makes kappa pass by reference
 
-        for t in range(self.n_time):
-            self._deltaT[t] = self.tArray[t]-self.profile.bin_centers
-
-        # For each cavity compute the induced voltage and store in the r-th row
-        for r in range(self.n_resonators):
-            tmp_sum = ((((2 *
-                          np.cos(self._reOmegaP[r] * self._deltaT)
-                          + np.sin(self._reOmegaP[r] * self._deltaT)/self._Qtilde[r]) *
-                         np.exp(-self._imOmegaP[r] * self._deltaT)) *
-                        self.Heaviside(self._deltaT)) -
-                       np.sign(self._deltaT))
-            # np.sum performs the sum over the points of the line density
-            self._tmp_matrix[r] = self.R[r]/(2*self.omega_r[r]*self.Q[r]) \
-                * np.sum(self._kappa1 * np.diff(tmp_sum), axis=1)
-
-        # To obtain the voltage, sum the contribution of each cavity...
-        self.induced_voltage = self._tmp_matrix.sum(axis=0)
-        # ... and multiply with bunch charge
-        self.induced_voltage *= -self.beam.Particle.charge*e \
+        # c_j = kappa_{j-1} - kappa_j, with no slope outside the profile
+        self._coefficients[0] = 0
+        self._coefficients[1:] = self._kappa1
+        self._coefficients[:-1] -= self._kappa1
+
+        if self._time_order is None:
+            time = self.tArray
+        else:
+            time = self.tArray[self._time_order]
+
+        induced_voltage = bm.resonator_induced_voltage(
+            time, self.profile.bin_centers, self._coefficients,
+            self._amplitudes, self._reOmegaP, self._imOmegaP, self._Qtilde)
+
+        if self._time_order is not None:
+            induced_voltage[self._time_order] = induced_voltage.copy()
+
+        # Multiply with bunch charge
+        induced_voltage *= -self.beam.Particle.charge*e \
             * self.beam.n_macroparticles*self.beam.ratio
-        self.induced_voltage = self.induced_voltage.astype(
+        self.induced_voltage = induced_voltage.astype(
             dtype=bm.precision.real_t, order='C', copy=False)
 
     # Implementation of Heaviside function
@@ -0,0 +1,111 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to cache the impedances of the impedance sources, evaluated on the
+frequency grids of the induced voltage calculations, so that reprocessing
+after a change of the profile cuts reuses them.**
+'''
+
+from __future__ import division
+from builtins import object
+from collections import OrderedDict
+import hashlib
+import numpy as np
+from ..utils import bmath as bm
+
+
+class ImpedanceCache(object):
+    r"""
+    Least recently used cache of impedance arrays, keyed by the parameters
+    of the impedance source (see _ImpedanceObject.impedance_key) and by the
+    frequency grid.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of impedance arrays kept
+    max_bytes : int
+        Maximum total size of the impedance arrays kept, in bytes
+
+    Attributes
+    ----------
+    hits : int
+        Number of impedances taken from the cache
+    misses : int
+        Number of impedances computed and stored
+    nbytes : int
+        Total size of the impedance arrays kept, in bytes
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256*1024**2):
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def grid_key(frequency_array):
+        '''Key of a frequency grid, from its values.
+        '''
+
+        frequency_array = np.ascontiguousarray(frequency_array)
+        return (len(frequency_array), frequency_array.dtype.str,
+                bm.precision.str,
+                hashlib.sha1(frequency_array.view(np.uint8)).hexdigest())
+
+    def imped_calc(self, impedance_source, frequency_array, grid_key=None):
+        '''Sets the impedance of the source on the frequency grid, from the
+        cache if possible, otherwise by calling its imped_calc method.
+        Sources without impedance_key are always computed.
+        '''
+
+        source_key = impedance_source.impedance_key()
+        if source_key is None:
+            impedance_source.imped_calc(frequency_array)
+            return
+
+        if grid_key is None:
+            grid_key = self.grid_key(frequency_array)
+        key = (source_key, grid_key)
+
+        impedance = self._entries.get(key)
+        if impedance is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            impedance_source.frequency_array = frequency_array
+            impedance_source.impedance = impedance.copy()
+            return
+
+        self.misses += 1
+        impedance_source.imped_calc(frequency_array)
+        impedance = np.array(impedance_source.impedance, copy=True)
+        impedance.flags.writeable = False
+        self._entries[key] = impedance
+        self.nbytes += impedance.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 self.nbytes > self.max_bytes):
+            _, impedance = self._entries.popitem(last=False)
+            self.nbytes -= impedance.nbytes
+
+    def clear(self):
+        '''Removes all the impedances from the cache.
+        '''
+
+        self._entries.clear()
+        self.nbytes = 0
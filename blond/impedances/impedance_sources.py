@@ -69,6 +69,13 @@ class _ImpedanceObject(object):
                                   'This object is probably meant to be used in the ' +
                                   'time domain')
 
+    def impedance_key(self):
+        """
+        Key of the impedance parameters, under which the impedance can be
+        cached (see ImpedanceCache). None if the impedance is not cached.
+        """
+        return None
+
 
 class InputTable(_ImpedanceObject):
     r"""
@@ -345,6 +352,15 @@ class Resonators(_ImpedanceObject):
                           * (bm.cos(omega_bar * self.time_array) - alpha /
                              omega_bar * bm.sin(omega_bar * self.time_array)))
 
+    def impedance_key(self):
+        """
+        Key of the resonator parameters for the impedance cache.
+        """
+        return ('Resonators', self.imped_calc.__name__,
+                np.asarray(self.R_S, dtype=float).tobytes(),
+                np.asarray(self.frequency_R, dtype=float).tobytes(),
+                np.asarray(self.Q, dtype=float).tobytes())
+
     def _imped_calc_python(self, frequency_array):
         r"""
         Impedance calculation method as a function of frequency using Python.
@@ -492,6 +508,15 @@ class TravelingWaveCavity(_ImpedanceObject):
                                    * bm.cos(2 * np.pi * self.frequency_R[i] *
                                           self.time_array[indexes]))
 
+    def impedance_key(self):
+        """
+        Key of the cavity parameters for the impedance cache.
+        """
+        return ('TravelingWaveCavity',
+                np.asarray(self.R_S, dtype=float).tobytes(),
+                np.asarray(self.frequency_R, dtype=float).tobytes(),
+                np.asarray(self.a_factor, dtype=float).tobytes())
+
     def imped_calc(self, frequency_array):
         r"""
         Impedance calculation method as a function of frequency.
@@ -0,0 +1,308 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Turn-by-turn programs generated on demand for a sliding window of turns,
+used by Ring and RFStation instead of arrays of n_turns+1 turns, see
+RingOptions.program_window.**
+'''
+
+from __future__ import division
+from builtins import object
+import numpy as np
+
+
+class WindowedProgram(object):
+    r"""Turn-by-turn program, of shape (n_rows, length) or (length,), of
+    which only a window of turns is kept in memory. The program is indexed
+    as an array, with the turn as last index; the turns accessed are
+    generated when they are outside of the window, which then moves to
+    start a few turns (lookback) before them. The turns of the window can
+    be changed in place, e.g. the RF phase of the next turn by the tracker;
+    the changes are lost once the turns leave the window, and turns are
+    changed only if they fit in the window. Accessing more turns than the
+    window generates them each time, and np.asarray generates the whole
+    program.
+
+    Parameters
+    ----------
+    generate : function
+        generate(start, stop) returns the program for the turns [start,
+        stop), of shape (n_rows, stop-start) or (stop-start,)
+    length : int
+        number of turns of the program, e.g. n_turns+1
+    n_rows : int
+        number of rows of the program, None for a one-dimensional program
+    window : int
+        number of turns kept in memory
+    dtype : numpy dtype
+        type of the program
+
+    Attributes
+    ----------
+    start : int
+        first turn of the window
+    buffer : array
+        program of the turns of the window
+    """
+
+    # Turns kept in the window before the first turn accessed
+    lookback = 2
+
+    def __init__(self, generate, length, n_rows=None, window=10000,
+                 dtype=float):
+
+        self.generate = generate
+        self.length = int(length)
+        self.n_rows = n_rows
+        self.window = max(int(window), self.lookback + 1)
+        self.dtype = np.dtype(dtype)
+        self.start = 0
+        self.buffer = None
+
+    @property
+    def shape(self):
+        if self.n_rows is None:
+            return (self.length,)
+        return (self.n_rows, self.length)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _generate(self, start, stop):
+        shape = self.shape[:-1] + (stop - start,)
+        return np.asarray(self.generate(start, stop),
+                          dtype=self.dtype).reshape(shape)
+
+    def _load(self, first, last):
+        # Moves the window to contain the turns [first, last), returns False
+        # if they do not fit in the window
+        if last - first > self.window:
+            return False
+        if (self.buffer is not None) and (first >= self.start) and \
+                (last <= self.start + self.buffer.shape[-1]):
+            return True
+
+        start = max(0, min(first - self.lookback, self.length - self.window),
+                    last - self.window)
+        stop = min(start + self.window, self.length)
+        buffer = np.empty(self.shape[:-1] + (stop - start,), dtype=self.dtype)
+
+        # The turns already in the window, possibly changed, are kept
+        kept_start, kept_stop = start, start
+        if self.buffer is not None:
+            kept_start = max(start, self.start)
+            kept_stop = min(stop, self.start + self.buffer.shape[-1])
+        if kept_start < kept_stop:
+            buffer[..., kept_start-start:kept_stop-start] = \
+                self.buffer[..., kept_start-self.start:kept_stop-self.start]
+            if start < kept_start:
+                buffer[..., :kept_start-start] = self._generate(start,
+                                                                kept_start)
+            if kept_stop < stop:
+                buffer[..., kept_stop-start:] = self._generate(kept_stop, stop)
+        else:
+            buffer[...] = self._generate(start, stop)
+
+        self.start = start
+        self.buffer = buffer
+        return True
+
+    def _split(self, key):
+        # Row and turn indices
+        if self.n_rows is None:
+            return None, key
+        if isinstance(key, tuple):
+            if len(key) != 2:
+                raise IndexError('ERROR in WindowedProgram: too many indices')
+            return key
+        return key, None
+
+    def _turns(self, turn_key):
+        # First and last+1 turns of the index, and the index relative to a
+        # first turn
+        if isinstance(turn_key, slice):
+            start, stop, step = turn_key.indices(self.length)
+            if step > 0:
+                stop = max(stop, start)
+                return start, stop, \
+                    lambda offset: slice(start - offset, stop - offset, step)
+            turn_key = np.arange(start, stop, step)
+        if np.ndim(turn_key) == 0:
+            turn = int(turn_key)
+            if turn < 0:
+                turn += self.length
+            if not (0 <= turn < self.length):
+                raise IndexError('ERROR in WindowedProgram: turn {} out of '
+                                 'range'.format(turn_key))
+            return turn, turn + 1, lambda offset: turn - offset
+        turns = np.asarray(turn_key, dtype=int)
+        turns = np.where(turns < 0, turns + self.length, turns)
+        if turns.size == 0:
+            return 0, 0, lambda offset: turns
+        if (turns.min() < 0) or (turns.max() >= self.length):
+            raise IndexError('ERROR in WindowedProgram: turns out of range')
+        return turns.min(), turns.max() + 1, lambda offset: turns - offset
+
+    def __getitem__(self, key):
+        row_key, turn_key = self._split(key)
+        if turn_key is None:
+            if np.ndim(row_key) == 0 and not isinstance(row_key, slice):
+                return ProgramRow(self, int(row_key))
+            return np.asarray(self)[row_key]
+
+        first, last, local = self._turns(turn_key)
+        if self._load(first, last):
+            data, offset = self.buffer, self.start
+        else:
+            data, offset = self._generate(first, last), first
+        if row_key is None:
+            return data[local(offset)]
+        return data[row_key, local(offset)]
+
+    def __setitem__(self, key, value):
+        row_key, turn_key = self._split(key)
+        if turn_key is None:
+            turn_key = slice(None)
+        first, last, local = self._turns(turn_key)
+        if not self._load(first, last):
+            raise RuntimeError('ERROR in WindowedProgram: cannot change more '
+                               'turns than the window ({})'.format(self.window))
+        if row_key is None:
+            self.buffer[local(self.start)] = value
+        else:
+            self.buffer[row_key, local(self.start)] = value
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._generate(0, self.length)
+        if self.buffer is not None:
+            data[..., self.start:self.start+self.buffer.shape[-1]] = \
+                self.buffer
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __neg__(self):
+        if self.n_rows is None:
+            return WindowedProgram(lambda start, stop: -self[start:stop],
+                                   self.length, None, self.window, self.dtype)
+        return WindowedProgram(lambda start, stop: -self[:, start:stop],
+                               self.length, self.n_rows, self.window,
+                               self.dtype)
+
+
+class ProgramRow(object):
+    r"""Row of a WindowedProgram, indexed by the turn, sharing the window
+    of the program.
+
+    Parameters
+    ----------
+    program : WindowedProgram
+        the program
+    row : int
+        index of the row
+    """
+
+    def __init__(self, program, row):
+
+        self.program = program
+        self.row = row
+        self.dtype = program.dtype
+        self.shape = (program.length,)
+        self.ndim = 1
+        self.size = program.length
+
+    def __len__(self):
+        return self.program.length
+
+    def __getitem__(self, key):
+        return self.program[self.row, key]
+
+    def __setitem__(self, key, value):
+        self.program[self.row, key] = value
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.program, dtype=dtype)[self.row]
+
+    def __neg__(self):
+        return WindowedProgram(lambda start, stop: -self[start:stop],
+                               self.program.length, None,
+                               self.program.window, self.dtype)
+
+
+def input_program(input_data, n_rows, length, interpolate, name):
+    r"""Function returning generate(start, stop) of a program given as the
+    programs of Ring and RFStation: a single value, a value per row, a value
+    per row and turn, or (time, values) per row, interpolated by
+    interpolate(start, stop). The values per turn are sliced, without copy
+    if they are a float array, e.g. a numpy.memmap.
+
+    Parameters
+    ----------
+    input_data : float, array, list or tuple
+        the program
+    n_rows : int
+        number of rows of the program
+    length : int
+        number of turns of the program
+    interpolate : function
+        interpolate(start, stop) returns the program of a tuple input for
+        the turns [start, stop)
+    name : str
+        name of the class, for the error messages
+
+    Returns
+    -------
+    function
+        generate(start, stop)
+    """
+
+    if isinstance(input_data, tuple):
+        return interpolate
+
+    values = np.asarray(input_data, dtype=float)
+    if values.ndim < 2:
+        values = values.reshape((1, -1))
+    if values.size == 1:
+        values = values * np.ones((n_rows, 1))
+    elif values.size == n_rows:
+        values = values.reshape((n_rows, 1))
+
+    if len(values) != n_rows:
+        # InputDataError
+        raise RuntimeError("ERROR in " + name + ": the input data does not " +
+                           "match the number of rows")
+    if values.shape[1] == 1:
+        return lambda start, stop: values * np.ones((n_rows, stop - start))
+    if values.shape[1] != length:
+        # InputDataError
+        raise RuntimeError("ERROR in " + name + ": The input data does not " +
+                           "match the proper length (n_turns+1)")
+    return lambda start, stop: values[:, start:stop]
+
+
+def input_values(input_data, n_rows):
+    r"""Function returning all the values of a program given as in
+    input_program, as a flat array.
+    """
+
+    if isinstance(input_data, tuple):
+        if (n_rows == 1) and (len(input_data) > 1):
+            input_data = (input_data, )
+        return np.concatenate([np.ravel(np.asarray(data[1], dtype=float))
+                               for data in input_data])
+    return np.ravel(np.asarray(input_data, dtype=float))
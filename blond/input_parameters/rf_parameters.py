@@ -20,6 +20,8 @@ from scipy.constants import c
 from scipy.integrate import cumtrapz
 from ..beam.beam import Proton
 from ..input_parameters.rf_parameters_options import RFStationOptions
+from ..input_parameters.program_provider import WindowedProgram, \
+    input_program, input_values
 from ..utils import bmath as bm
 
 
@@ -202,6 +204,9 @@ class RFStation(object):
     RFStationOptions : RFStationOptions()
         The RFStationOptions is kept as an attribute of the RFStationg object
         for further usage.
+    program_window : int
+        Ring.program_window; if not None, the programs above except
+        phi_modulation are WindowedProgram objects, generated on demand.
 
 
     Examples
@@ -258,6 +263,16 @@ class RFStation(object):
             setattr(self, "eta_%s" % i, dummy[self.section_index])
             dummy = getattr(Ring, 'alpha_' + str(i))
             setattr(self, "alpha_%s" % i, dummy[self.section_index])
+
+        # Programs generated on demand for windows of turns, see
+        # RingOptions.program_window
+        self.program_window = getattr(Ring, 'program_window', None)
+        if self.program_window is not None:
+            self._windowed_programs(Ring, harmonic, voltage, phi_rf_d,
+                                    omega_rf, phi_noise, phi_modulation,
+                                    RFStationOptions)
+            return
+
         self.sign_eta_0 = np.sign(self.eta_0)
 
         # Reshape input rf programs
@@ -319,43 +334,9 @@ class RFStation(object):
             self.phi_noise = None
             
         if phi_modulation is not None:
-            
-            try:
-                iter(phi_modulation)
-            except TypeError:
-                phi_modulation = [phi_modulation]
-            
-            dPhi = np.zeros([self.n_rf, self.n_turns+1], dtype=bm.precision.real_t)
-            dOmega = np.zeros([self.n_rf, self.n_turns+1], dtype=bm.precision.real_t)
-            for pMod in phi_modulation:
-                system = np.where(self.harmonic[:,0] == pMod.harmonic)[0]
-                if len(system) == 0:
-                    raise ValueError("No matching harmonic in phi_modulation")
-                elif len(system) > 1:
-                    raise RuntimeError("""Phase modulation not yet 
-                                       implemented with multiple systems 
-                                       at the same harmonic.""")
-                else:
-                    system = system[0]
-                    
-                pMod.calc_modulation()
-                pMod.calc_delta_omega((Ring.cycle_time, self.omega_rf_d[system]))
-                dPhiInput, dOmegaInput =  pMod.extend_to_n_rf(self.harmonic[:,0])
-                dPhi += RFStationOptions.reshape_data(dPhiInput,
-                                                     self.n_turns,
-                                                     self.n_rf,
-                                                     Ring.cycle_time,
-                                                     Ring.RingOptions.t_start)
-                dOmega += RFStationOptions.reshape_data(dOmegaInput,
-                                                       self.n_turns,
-                                                       self.n_rf,
-                                                       Ring.cycle_time,
-                                                       Ring.RingOptions.t_start)
-                
-                
-            
-            self.phi_modulation = (dPhi, dOmega)
-            
+            self.phi_modulation = self._phi_modulation(
+                phi_modulation, Ring.cycle_time, Ring.RingOptions.t_start,
+                RFStationOptions)
         else:
             
             self.phi_modulation = None
@@ -375,6 +356,126 @@ class RFStation(object):
         self.omega_s0 = self.Q_s*Ring.omega_rev
 
 
+    def _phi_modulation(self, phi_modulation, cycle_time, t_start,
+                        RFStationOptions):
+        # Phase and frequency programs of the phase modulations, on all the
+        # turns
+        try:
+            iter(phi_modulation)
+        except TypeError:
+            phi_modulation = [phi_modulation]
+
+        cycle_time = np.asarray(cycle_time)
+        dPhi = np.zeros([self.n_rf, self.n_turns+1], dtype=bm.precision.real_t)
+        dOmega = np.zeros([self.n_rf, self.n_turns+1], dtype=bm.precision.real_t)
+        for pMod in phi_modulation:
+            system = np.where(self.harmonic[:,0] == pMod.harmonic)[0]
+            if len(system) == 0:
+                raise ValueError("No matching harmonic in phi_modulation")
+            elif len(system) > 1:
+                raise RuntimeError("""Phase modulation not yet 
+                                   implemented with multiple systems 
+                                   at the same harmonic.""")
+            else:
+                system = system[0]
+
+            pMod.calc_modulation()
+            pMod.calc_delta_omega((cycle_time,
+                                   np.asarray(self.omega_rf_d[system])))
+            dPhiInput, dOmegaInput =  pMod.extend_to_n_rf(self.harmonic[:,0])
+            dPhi += RFStationOptions.reshape_data(dPhiInput,
+                                                 self.n_turns,
+                                                 self.n_rf,
+                                                 cycle_time,
+                                                 t_start)
+            dOmega += RFStationOptions.reshape_data(dOmegaInput,
+                                                   self.n_turns,
+                                                   self.n_rf,
+                                                   cycle_time,
+                                                   t_start)
+
+        return (dPhi, dOmega)
+
+    def _windowed_programs(self, Ring, harmonic, voltage, phi_rf_d, omega_rf,
+                           phi_noise, phi_modulation, RFStationOptions):
+        # RF programs as WindowedProgram, generated on demand for windows of
+        # turns from the input programs; the phase modulations are on all the
+        # turns
+        window = self.program_window
+        length = self.n_turns + 1
+        real_t = bm.precision.real_t
+
+        def program(input_data, n_rows=self.n_rf, dtype=real_t):
+            return WindowedProgram(input_program(
+                input_data, n_rows, length,
+                lambda start, stop: RFStationOptions.reshape_data(
+                    input_data, stop-start-1, n_rows,
+                    Ring.cycle_time[start:stop], Ring.RingOptions.t_start),
+                'RFStation'), length, n_rows, window, dtype)
+
+        def derived(generate, n_rows=self.n_rf, dtype=real_t):
+            return WindowedProgram(generate, length, n_rows, window, dtype)
+
+        self.sign_eta_0 = derived(
+            lambda start, stop: np.sign(self.eta_0[start:stop]), None, float)
+
+        self.harmonic = program(harmonic)
+        self.voltage = program(voltage)
+        # Checking if the RFStation is empty
+        self.empty = not np.any(input_values(voltage, self.n_rf))
+        self.phi_rf_d = program(phi_rf_d, dtype=float)
+
+        # Design rf angular frequency
+        if omega_rf is None:
+            self.omega_rf_d = derived(
+                lambda start, stop: 2.*np.pi*self.beta[start:stop]*c *
+                self.harmonic[:, start:stop] / (self.ring_circumference))
+        else:
+            self.omega_rf_d = program(omega_rf)
+
+        if phi_noise is not None:
+            self.phi_noise = program(phi_noise)
+        else:
+            self.phi_noise = None
+
+        if phi_modulation is not None:
+            self.phi_modulation = self._phi_modulation(
+                phi_modulation, Ring.cycle_time, Ring.RingOptions.t_start,
+                RFStationOptions)
+        else:
+            self.phi_modulation = None
+            self.dev_phi_modulation = None
+
+        # Programs used for tracking, changed by feedbacks in the window
+        self.phi_rf = derived(lambda start, stop: self.phi_rf_d[:, start:stop])
+        self.dphi_rf = np.zeros(self.n_rf).astype(real_t)
+        self.omega_rf = derived(
+            lambda start, stop: self.omega_rf_d[:, start:stop])
+        self.t_rf = derived(
+            lambda start, stop: 2*np.pi / self.omega_rf_d[:, start:stop])
+
+        # From helper functions, on the turns of the window
+        self.phi_s = derived(self._phi_s, None, float)
+        self.Q_s = derived(self._Q_s, None, float)
+        self.omega_s0 = derived(
+            lambda start, stop: self.Q_s[start:stop] *
+            Ring.omega_rev[start:stop], None, float)
+
+    def _phi_s(self, start, stop):
+        # Synchronous phase of the turns [start, stop), from the turn before
+        # the last turn to the turn after, as calculate_phi_s uses the
+        # energy increment and the slippage factor of the next turn
+        first = max(min(start, self.n_turns - 1), 0)
+        last = min(stop + 1, self.n_turns + 1)
+        phi_s = calculate_phi_s(_TurnRange(self, first, last), self.Particle)
+        return phi_s[start-first:stop-first]
+
+    def _Q_s(self, start, stop):
+        # Synchrotron tune of the turns [start, stop)
+        turns = _TurnRange(self, start, stop)
+        turns.phi_s = self.phi_s[start:stop]
+        return calculate_Q_s(turns, self.Particle)
+
     def eta_tracking(self, beam, counter, dE):
         r"""Function to calculate the slippage factor as a function of the
         energy offset :math:`\Delta E` of the particle. The slippage factor
@@ -395,6 +496,20 @@ class RFStation(object):
             return eta
 
 
+class _TurnRange(object):
+    # Programs of an RFStation on the turns [start, stop), for
+    # calculate_phi_s and calculate_Q_s
+
+    def __init__(self, RFStation, start, stop):
+
+        self.harmonic = RFStation.harmonic[:, start:stop]
+        self.voltage = RFStation.voltage[:, start:stop]
+        self.eta_0 = RFStation.eta_0[start:stop]
+        self.beta = RFStation.beta[start:stop]
+        self.energy = RFStation.energy[start:stop]
+        self.delta_E = RFStation.delta_E[start:stop-1]
+
+
 def calculate_Q_s(RFStation, Particle=Proton()):
     r""" Function calculating the turn-by-turn synchrotron tune for
     single-harmonic RF, without intensity effects.
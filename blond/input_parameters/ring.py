@@ -18,6 +18,8 @@ import numpy as np
 import warnings
 from scipy.constants import c
 from ..input_parameters.ring_options import RingOptions
+from ..input_parameters.program_provider import WindowedProgram, \
+    input_program
 
 
 class Ring(object):
@@ -151,6 +153,10 @@ class Ring(object):
     RingOptions : RingOptions()
         The RingOptions is kept as an attribute of the Ring object for further
         usage.
+    program_window : int
+        Number of turns of the programs generated on demand, the programs
+        derived from the momentum being WindowedProgram objects; None if the
+        programs are arrays (see RingOptions).
 
     Examples
     --------
@@ -233,6 +239,12 @@ class Ring(object):
                           "simulation was changed by passing a momentum " +
                           "program.")
 
+        # Programs generated on demand for windows of turns
+        self.program_window = RingOptions.program_window
+        if self.program_window is not None:
+            self._windowed_programs(alpha_0, alpha_1, alpha_2)
+            return
+
         # Derived from momentum
         self.beta = np.sqrt(1/(1 + (self.Particle.mass/self.momentum)**2))
         self.gamma = np.sqrt(1 + (self.momentum/self.Particle.mass)**2)
@@ -308,28 +320,124 @@ class Ring(object):
     def _eta0(self):
         """ Function to calculate the zeroth order slippage factor eta_0 """
 
-        self.eta_0 = np.empty([self.n_sections, self.n_turns+1])
-        for i in range(0, self.n_sections):
-            self.eta_0[i] = self.alpha_0[i] - self.gamma[i]**(-2.)
+        self.eta_0 = self._eta_values(0, self.alpha_0, self.alpha_1,
+                                      self.alpha_2, self.beta, self.gamma)
 
     def _eta1(self):
         """ Function to calculate the first order slippage factor eta_1 """
 
-        self.eta_1 = np.empty([self.n_sections, self.n_turns+1])
-        for i in range(0, self.n_sections):
-            self.eta_1[i] = 3*self.beta[i]**2/(2*self.gamma[i]**2) + \
-                self.alpha_1[i] - self.alpha_0[i]*self.eta_0[i]
+        self.eta_1 = self._eta_values(1, self.alpha_0, self.alpha_1,
+                                      self.alpha_2, self.beta, self.gamma)
 
     def _eta2(self):
         """ Function to calculate the second order slippage factor eta_2 """
 
-        self.eta_2 = np.empty([self.n_sections, self.n_turns+1])
-        for i in range(0, self.n_sections):
-            self.eta_2[i] = - self.beta[i]**2*(5*self.beta[i]**2 - 1) / \
-                (2*self.gamma[i]**2) + self.alpha_2[i] - 2*self.alpha_0[i] *\
-                self.alpha_1[i] + self.alpha_1[i] / self.gamma[i]**2 + \
-                self.alpha_0[i]**2*self.eta_0[i] - 3*self.beta[i]**2 * \
-                self.alpha_0[i]/(2*self.gamma[i]**2)
+        self.eta_2 = self._eta_values(2, self.alpha_0, self.alpha_1,
+                                      self.alpha_2, self.beta, self.gamma)
+
+    @staticmethod
+    def _eta_values(order, alpha_0, alpha_1, alpha_2, beta, gamma):
+        """ Function to calculate the slippage factor of the given order from
+        the momentum compaction and the relativistic beta and gamma arrays
+        """
+
+        eta_0 = alpha_0 - gamma**(-2.)
+        if order == 0:
+            return eta_0
+        elif order == 1:
+            return 3*beta**2/(2*gamma**2) + alpha_1 - alpha_0*eta_0
+        return - beta**2*(5*beta**2 - 1) / (2*gamma**2) + alpha_2 - \
+            2*alpha_0*alpha_1 + alpha_1 / gamma**2 + alpha_0**2*eta_0 - \
+            3*beta**2*alpha_0/(2*gamma**2)
+
+    def _windowed_programs(self, alpha_0, alpha_1, alpha_2):
+        """ Function to create the programs derived from the momentum as
+        WindowedProgram, generated on demand for windows of turns (see
+        RingOptions.program_window)
+        """
+
+        mass = self.Particle.mass
+        momentum = self.momentum
+        window = self.program_window
+
+        def program(generate, n_rows=self.n_sections, length=self.n_turns+1):
+            return WindowedProgram(generate, length, n_rows, window)
+
+        self.beta = program(
+            lambda start, stop: np.sqrt(1/(1 + (mass/momentum[:, start:stop])**2)))
+        self.gamma = program(
+            lambda start, stop: np.sqrt(1 + (momentum[:, start:stop]/mass)**2))
+        self.energy = program(
+            lambda start, stop: np.sqrt(momentum[:, start:stop]**2 + mass**2))
+        self.kin_energy = program(
+            lambda start, stop: np.sqrt(momentum[:, start:stop]**2 + mass**2)
+            - mass)
+        self.delta_E = program(
+            lambda start, stop: np.diff(
+                np.sqrt(momentum[:, start:stop+1]**2 + mass**2), axis=1),
+            length=self.n_turns)
+        self.t_rev = program(self._t_rev, None)
+        self.cycle_time = program(self._cycle_time, None)
+        self.f_rev = program(lambda start, stop: 1/self._t_rev(start, stop),
+                             None)
+        self.omega_rev = program(
+            lambda start, stop: 2*np.pi*(1/self._t_rev(start, stop)), None)
+        # Cycle time at the start of every window of turns
+        self._cycle_time_starts = [self._t_rev(0, 1)[0]]
+
+        # Momentum compaction, interpolated on the cycle time
+        t_start = 0 if self.RingOptions.t_start is None else \
+            self.RingOptions.t_start
+
+        def alpha_program(alpha):
+            return program(input_program(
+                alpha, self.n_sections, self.n_turns+1,
+                lambda start, stop: self.RingOptions.reshape_data(
+                    alpha, stop-start-1, self.n_sections,
+                    interp_time=self.cycle_time[start:stop]+t_start),
+                'Ring'))
+
+        self.alpha_0 = alpha_program(alpha_0)
+        self.alpha_1 = alpha_program(0 if alpha_1 is None else alpha_1)
+        self.alpha_2 = alpha_program(0 if alpha_2 is None else alpha_2)
+        self.alpha_order = 0 if alpha_1 is None else 1
+        if alpha_2 is not None:
+            self.alpha_order = 2
+
+        # Slippage factors, filled with zeros above alpha_order
+        for order in range(3):
+            if order <= self.alpha_order:
+                generate = (lambda order: lambda start, stop: self._eta_values(
+                    order, self.alpha_0[:, start:stop],
+                    self.alpha_1[:, start:stop], self.alpha_2[:, start:stop],
+                    self.beta[:, start:stop], self.gamma[:, start:stop]))(order)
+            else:
+                generate = lambda start, stop: \
+                    np.zeros((self.n_sections, stop-start))
+            setattr(self, 'eta_%s' % order, program(generate))
+
+    def _t_rev(self, start, stop):
+        # Revolution period of the turns [start, stop)
+        beta = np.sqrt(1/(1 + (self.Particle.mass /
+                               self.momentum[:, start:stop])**2))
+        return np.dot(self.ring_length, 1/(beta*c))
+
+    def _cycle_time(self, start, stop):
+        # Cycle time of the turns [start, stop), summed from the cycle time
+        # at the start of the window of turns of start, the windows being
+        # summed once
+        window = self.program_window
+        index = start // window
+        starts = self._cycle_time_starts
+        while len(starts) <= index:
+            first = (len(starts) - 1)*window
+            starts.append(np.cumsum(np.concatenate((
+                [starts[-1]],
+                self._t_rev(first+1, first+window+1))))[-1])
+        first = index*window
+        cycle_time = np.cumsum(np.concatenate((
+            [starts[index]], self._t_rev(first+1, stop))))
+        return cycle_time[start-first:]
 
     def parameters_at_time(self, cycle_moments):
         """ Function to return various cycle parameters at a specific moment in
@@ -54,11 +54,23 @@ class RingOptions(object):
         Figure name to save optional plot; default is 'preprocess_ramp'
     sampling : int
         Decimation value for plotting; default is 1
+    program_window : int
+        If not None, Ring and RFStation generate their turn-by-turn programs
+        on demand for windows of program_window turns instead of storing
+        them for all the turns (see WindowedProgram); the momentum program
+        is still stored, and the changes of the RF programs, e.g. by the
+        feedbacks, are kept only while their turns are in the window.
+        Default is None
 
     """
+
+    # Number of turns integrated at once by preprocess
+    block_size = 4096
+
     def __init__(self, interpolation='linear', smoothing=0, flat_bottom=0,
                  flat_top=0, t_start=None, t_end=None, plot=False,
-                 figdir='fig', figname='preprocess_ramp', sampling=1):
+                 figdir='fig', figname='preprocess_ramp', sampling=1,
+                 program_window=None):
 
         if interpolation in ['linear', 'cubic', 'derivative']:
             self.interpolation = str(interpolation)
@@ -102,6 +114,15 @@ class RingOptions(object):
             raise RuntimeError("ERROR: sampling value in PreprocessRamp" +
                                " not recognised. Aborting...")
 
+        if program_window is None:
+            self.program_window = None
+        elif program_window > 0:
+            self.program_window = int(program_window)
+        else:
+            #TypeError
+            raise RuntimeError("ERROR: program_window value in " +
+                               "PreprocessRamp not recognised. Aborting...")
+
     def reshape_data(self, input_data, n_turns, n_sections,
                      interp_time='t_rev', input_to_momentum=False,
                      synchronous_data_type='momentum', mass=None, charge=None,
@@ -277,6 +298,78 @@ class RingOptions(object):
 
         return output_data
 
+    def _integrate_ramp(self, mass, circumference, time_start, beta_start,
+                        momentum_function, momentum_start, time_end):
+        r"""Function integrating the revolution period over the turns from
+        time_start, up to the first turn after time_end. The time of the
+        turn i+1 is
+
+        .. math::
+            t_{i+1} = t_i + \frac{C}{\beta(p(t_i)) c}
+
+        The recursion is solved by blocks of block_size turns: the times of
+        a block are extrapolated from the last period, then recomputed from
+        their own momenta until they are unchanged, which gives the same
+        results as turn by turn.
+
+        Parameters
+        ----------
+        mass : float
+            Particle mass [eV]
+        circumference : float
+            Ring circumference [m]
+        time_start : float
+            Time [s] of the turn before the first one
+        beta_start : float
+            Relativistic beta of the turn before the first one
+        momentum_function : function
+            Momentum of an array of turn times, given the (time, momentum)
+            of the turn before the first one
+        momentum_start : float
+            Momentum [eV/c] of the turn before the first one
+        time_end : float
+            Time [s] of the end of the data
+
+        Returns
+        -------
+        float array
+            Cumulative time [s] of the turns
+        float array
+            Momentum [eV/c] of the turns
+
+        """
+
+        time_blocks = []
+        momentum_blocks = []
+        previous = (time_start, momentum_start)
+        period = circumference/(beta_start*c)
+
+        while previous[0] <= time_end:
+
+            # First guess: constant revolution period
+            times = previous[0] + period*np.arange(1, self.block_size+1)
+            first_time = previous[0] + period
+            while True:
+                block_momentum = momentum_function(times, previous)
+                periods = circumference / \
+                    (np.sqrt(1/(1 + (mass/block_momentum)**2))*c)
+                new_times = np.cumsum(np.concatenate(([first_time],
+                                                      periods[:-1])))
+                if np.array_equal(new_times, times):
+                    break
+                times = new_times
+
+            time_blocks.append(times)
+            momentum_blocks.append(block_momentum)
+            previous = (times[-1], block_momentum[-1])
+            period = periods[-1]
+
+        # Turns up to the first one after time_end
+        n_turns = np.searchsorted(np.concatenate(time_blocks), time_end,
+                                  side='right') + 1
+        return np.concatenate(time_blocks)[:n_turns], \
+            np.concatenate(momentum_blocks)[:n_turns]
+
     def preprocess(self, mass, circumference, time, momentum):
         r"""Function to pre-process acceleration ramp data, interpolating it to
         every turn. Currently it works only if the number of RF sections is
@@ -302,6 +395,9 @@ class RingOptions(object):
 
         """
 
+        time = np.asarray(time, dtype=float)
+        momentum = np.asarray(momentum, dtype=float)
+
         # Some checks on the options
         if ((self.t_start is not None) and (self.t_start < time[0])) or \
                 ((self.t_end is not None) and (self.t_end > time[-1])):
@@ -317,36 +413,23 @@ class RingOptions(object):
         beta_interp = beta_0*np.ones(self.flat_bottom+1)
         momentum_interp = momentum[0]*np.ones(self.flat_bottom+1)
 
-        time_interp = time_interp.tolist()
-        beta_interp = beta_interp.tolist()
-        momentum_interp = momentum_interp.tolist()
-
         time_start_ramp = np.max(time[momentum == momentum[0]])
         time_end_ramp = np.min(time[momentum == momentum[-1]])
 
         # Interpolate data recursively
         if self.interpolation == 'linear':
 
-            time_interp.append(time_interp[-1]
-                               + circumference/(beta_interp[0]*c))
+            def momentum_function(times, previous):
+                k = np.clip(np.searchsorted(time, times), 1, len(time)-1)
+                return momentum[k-1] + (momentum[k] - momentum[k-1]) * \
+                    (times - time[k-1]) / (time[k] - time[k-1])
 
-            i = self.flat_bottom
-            for k in range(1, len(time)):
-
-                while time_interp[i+1] <= time[k]:
-
-                    momentum_interp.append(
-                        momentum[k-1] + (momentum[k] - momentum[k-1]) *
-                        (time_interp[i+1] - time[k-1]) /
-                        (time[k] - time[k-1]))
-
-                    beta_interp.append(
-                        np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2)))
-
-                    time_interp.append(
-                        time_interp[i+1] + circumference/(beta_interp[i+1]*c))
-
-                    i += 1
+            # Turns up to the end of the input data
+            ramp_time, ramp_momentum = self._integrate_ramp(
+                mass, circumference, time_interp[-1], beta_0,
+                momentum_function, momentum[0], time[-1])
+            ramp_momentum = ramp_momentum[ramp_time <= time[-1]]
+            ramp_time = ramp_time[:len(ramp_momentum)]
 
         elif self.interpolation == 'cubic':
 
@@ -355,92 +438,47 @@ class RingOptions(object):
                 momentum[(time >= time_start_ramp) * (time <= time_end_ramp)],
                 s=self.smoothing)
 
-            i = self.flat_bottom
-
-            time_interp.append(
-                time_interp[-1] + circumference / (beta_interp[0]*c))
-
-            while time_interp[i] <= time[-1]:
-
-                if (time_interp[i+1] < time_start_ramp):
-
-                    momentum_interp.append(momentum[0])
-
-                    beta_interp.append(
-                        np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2)))
-
-                    time_interp.append(
-                        time_interp[i+1] + circumference/(beta_interp[i+1]*c))
-
-                elif (time_interp[i+1] > time_end_ramp):
-
-                    momentum_interp.append(momentum[-1])
+            def momentum_function(times, previous):
+                return np.where(
+                    times < time_start_ramp, momentum[0],
+                    np.where(times > time_end_ramp, momentum[-1],
+                             splev(times, interp_funtion_momentum)))
 
-                    beta_interp.append(
-                        np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2)))
-
-                    time_interp.append(
-                        time_interp[i+1] + circumference/(beta_interp[i+1]*c))
-
-                else:
-
-                    momentum_interp.append(
-                        splev(time_interp[i+1], interp_funtion_momentum))
-
-                    beta_interp.append(
-                        np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2)))
-
-                    time_interp.append(
-                        time_interp[i+1] + circumference/(beta_interp[i+1]*c))
-
-                i += 1
+            # Turns up to the first one after the end of the input data
+            ramp_time, ramp_momentum = self._integrate_ramp(
+                mass, circumference, time_interp[-1], beta_0,
+                momentum_function, momentum[0], time[-1])
 
         # Interpolate momentum in 1st derivative to maintain smooth B-dot
         elif self.interpolation == 'derivative':
 
-            momentum_initial = momentum_interp[0]
             momentum_derivative = np.gradient(momentum)/np.gradient(time)
 
-            momentum_derivative_interp = [0]*self.flat_bottom + \
-                [momentum_derivative[0]]
-            integral_point = momentum_initial
+            def momentum_function(times, previous):
+                derivative_point = np.interp(times, time, momentum_derivative)
+                steps = np.diff(np.concatenate(([previous[0]], times))) * \
+                    derivative_point
+                return np.cumsum(np.concatenate(([previous[1]], steps)))[1:]
 
-            i = self.flat_bottom
+            # Turns up to the first one after the end of the input data
+            ramp_time, ramp_momentum = self._integrate_ramp(
+                mass, circumference, time_interp[-1], beta_0,
+                momentum_function, momentum_interp[0], time[-1])
 
-            time_interp.append(
-                time_interp[-1] + circumference/(beta_interp[0]*c))
-
-            while time_interp[i] <= time[-1]:
-
-                derivative_point = np.interp(time_interp[i+1], time,
-                                             momentum_derivative)
-                momentum_derivative_interp.append(derivative_point)
-                integral_point += (time_interp[i+1] - time_interp[i]) \
-                    * derivative_point
-
-                momentum_interp.append(integral_point)
-                beta_interp.append(
-                    np.sqrt(1/(1 + (mass/momentum_interp[i+1])**2)))
-
-                time_interp.append(
-                    time_interp[i+1] + circumference/(beta_interp[i+1]*c))
-
-                i += 1
+        time_interp = np.concatenate((time_interp, ramp_time))
+        momentum_interp = np.concatenate((momentum_interp, ramp_momentum))
+        beta_interp = np.concatenate((
+            beta_interp, np.sqrt(1/(1 + (mass/ramp_momentum)**2))))
 
+        if self.interpolation == 'derivative':
             # Adjust result to get flat top energy correct as derivation and
             # integration leads to ~10^-8 error in flat top momentum
-            momentum_interp = np.asarray(momentum_interp)
             momentum_interp -= momentum_interp[0]
             momentum_interp /= momentum_interp[-1]
             momentum_interp *= momentum[-1] - momentum[0]
 
             momentum_interp += momentum[0]
 
-        time_interp.pop()
-        time_interp = np.asarray(time_interp)
-        beta_interp = np.asarray(beta_interp)
-        momentum_interp = np.asarray(momentum_interp)
-
         # Obtain flat top data, extrapolate to constant
         if self.flat_top > 0:
             time_interp = np.append(
@@ -18,10 +18,14 @@ from __future__ import division, print_function
 from builtins import range, object
 import numpy as np
 import numpy.random as rnd
+import scipy.fft
 from scipy.constants import c
 from ..plots.plot import *
 from ..plots.plot_llrf import *
 from ..toolbox.next_regular import next_regular
+from ..utils import bmath as bm
+from ..utils.fft_plans import fftw_enabled
+from ..input_parameters.program_provider import WindowedProgram
 #from input_parameters.rf_parameters import calculate_phi_s
 cfwhm = np.sqrt(2./np.log(2.))
 import matplotlib.pyplot as plt
@@ -58,6 +62,8 @@ class FlatSpectrum(object):
         self.A_i = initial_amplitude    # initial spectrum amplitude [rad^2/Hz]
         self.seed1 = seed1
         self.seed2 = seed2
+        # Seeds of the first call of generate, for noise()
+        self._seeds = (seed1, seed2)
         self.predistortion = predistortion
         if self.predistortion == 'weightfunction':
             # Overwrite frequencies
@@ -68,7 +74,7 @@ class FlatSpectrum(object):
         self.dphi = np.zeros(self.n_turns+1)
         self.continuous_phase = continuous_phase
         if self.continuous_phase:
-            self.dphi2 = np.zeros(self.n_turns+1+self.corr/4)
+            self.dphi2 = np.zeros(self.n_turns+1+self.corr//4)
         self.folder_plots = folder_plots    
         self.print_option = print_option
     
@@ -124,76 +130,111 @@ class FlatSpectrum(object):
         self.dphi_output = dPt.real
  
     
-    def generate(self):
-       
-        for i in range(0, np.int(np.ceil(self.n_turns/self.corr))):
+    def _segment_spectrum(self, i):
+        # Turns [k, kmax) filled by the segment i of corr turns, and the
+        # noise spectrum of the segment
+
+        # Scale amplitude to keep area (phase noise amplitude) constant
+        k = i*self.corr       # current time step
+        ampl = self.A_i*self.fs[0]/self.fs[k]
         
-            # Scale amplitude to keep area (phase noise amplitude) constant
-            k = i*self.corr       # current time step
-            ampl = self.A_i*self.fs[0]/self.fs[k]
-            
-            # Calculate the frequency step
-            f_max = self.f0[k]/2
-            n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
-            nt = 2*(n_points_pos_f_incl_zero - 1)
-            nt_regular = next_regular(int(nt))
-            if nt_regular%2!=0 or nt_regular < self.corr:
-                #NoiseError
-                raise RuntimeError('Error in noise generation!')
-            n_points_pos_f_incl_zero = int(nt_regular/2 + 1)  
-            freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero)
-            delta_f = f_max/(n_points_pos_f_incl_zero-1) 
-
-            # Construct spectrum   
-            nmin = np.int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
-            nmax = np.int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
-            
-            # To compensate the notch due to PL at central frequency
-            if self.predistortion == 'exponential':
-                
-                spectrum = np.concatenate((np.zeros(nmin), ampl*np.exp(
-                    np.log(100.)*np.arange(0,nmax-nmin+1)/(nmax-nmin) ), 
-                                           np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
-             
-            elif self.predistortion == 'linear':
-                
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    np.linspace(0, float(ampl), nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))   
-                
-            elif self.predistortion == 'hyperbolic':
-
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    ampl*np.ones(nmax-nmin+1)* \
-                    1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1))
-                       /(nmax-nmin)), np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
-
-            elif self.predistortion == 'weightfunction':
-
-                frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
-                frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
-                sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
-                gamma = 0.577216
-                weight = (4.*np.pi*frel/sigma**2)**2 * \
-                    np.exp(-16.*(1. - frel)/sigma**2) + \
-                    0.25*( 1 + 8.*frel/sigma**2 * 
-                           np.exp(-8.*(1. - frel)/sigma**2) * 
-                           ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
-                             8.*(1. - frel)/sigma**2 ) )**2
-                weight /= weight[0] # normalise to have 1 at fmin
-                spectrum = np.concatenate((np.zeros(nmin), ampl*weight, 
-                                            np.zeros(n_points_pos_f_incl_zero-nmax-1)))
+        # Calculate the frequency step
+        f_max = self.f0[k]/2
+        n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
+        nt = 2*(n_points_pos_f_incl_zero - 1)
+        nt_regular = next_regular(int(nt))
+        if nt_regular%2!=0 or nt_regular < self.corr:
+            #NoiseError
+            raise RuntimeError('Error in noise generation!')
+        n_points_pos_f_incl_zero = int(nt_regular/2 + 1)  
+        freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero)
+        delta_f = f_max/(n_points_pos_f_incl_zero-1) 
 
-            else:
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    ampl*np.ones(nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))               
+        # Construct spectrum   
+        nmin = int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
+        nmax = int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
+        
+        # To compensate the notch due to PL at central frequency
+        if self.predistortion == 'exponential':
             
+            spectrum = np.concatenate((np.zeros(nmin), ampl*np.exp(
+                np.log(100.)*np.arange(0,nmax-nmin+1)/(nmax-nmin) ), 
+                                       np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
+         
+        elif self.predistortion == 'linear':
             
-            # Fill phase noise array
-            if i < int(self.n_turns/self.corr) - 1:
-                kmax = (i + 1)*self.corr
-            else:
-                kmax = self.n_turns + 1
+            spectrum = np.concatenate((np.zeros(nmin), 
+                np.linspace(0, float(ampl), nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))   
             
+        elif self.predistortion == 'hyperbolic':
+
+            spectrum = np.concatenate((np.zeros(nmin), 
+                ampl*np.ones(nmax-nmin+1)* \
+                1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1))
+                   /(nmax-nmin)), np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
+
+        elif self.predistortion == 'weightfunction':
+
+            frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
+            frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
+            sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
+            gamma = 0.577216
+            weight = (4.*np.pi*frel/sigma**2)**2 * \
+                np.exp(-16.*(1. - frel)/sigma**2) + \
+                0.25*( 1 + 8.*frel/sigma**2 * 
+                       np.exp(-8.*(1. - frel)/sigma**2) * 
+                       ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
+                         8.*(1. - frel)/sigma**2 ) )**2
+            weight /= weight[0] # normalise to have 1 at fmin
+            spectrum = np.concatenate((np.zeros(nmin), ampl*weight, 
+                                        np.zeros(n_points_pos_f_incl_zero-nmax-1)))
+
+        else:
+            spectrum = np.concatenate((np.zeros(nmin), 
+                ampl*np.ones(nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))               
+        
+        # Fill phase noise array
+        if i < int(self.n_turns/self.corr) - 1:
+            kmax = (i + 1)*self.corr
+        else:
+            kmax = self.n_turns + 1
+
+        return k, kmax, freq, spectrum
+
+    def _report(self, i, freq, spectrum, n_points):
+        # Plots and r.m.s. of the phase noise of the segment i
+
+        if self.folder_plots != None:
+            fig_folder(self.folder_plots)
+            plot_noise_spectrum(freq, spectrum, sampling=1, figno=i, 
+                                dirname = self.folder_plots)
+            plot_phase_noise(self.t[0:n_points], self.dphi_output[0:n_points], 
+                             sampling=1, figno=i, dirname = self.folder_plots)
+            
+        rms_noise = np.std(self.dphi_output)
+        if self.print_option:
+            print("RF noise for time step %.4e s (iter %d) has r.m.s. phase %.4e rad (%.3e deg)" \
+                %(self.t[1], i, rms_noise, rms_noise*180/np.pi))
+
+    def generate(self, batched=False, batch_size=32, workers=1):
+        '''
+        Generates the phase noise of all the turns in dphi, segment by
+        segment of corr turns. If batched, the segments are generated by
+        batches of batch_size segments, the segments of a batch with the
+        same number of points being transformed together as a 2-D array,
+        without re-seeding the global numpy random generator. The noise is
+        the same, or the same to rounding with threaded transforms: on
+        workers threads (scipy.fft) if workers > 1, and with the FFTW
+        irfft_packed if bm.use_fftw() is on (see fftw_enabled).
+        '''
+
+        if batched:
+            self._generate_batched(batch_size, workers)
+            return
+       
+        for i in range(0, int(np.ceil(self.n_turns/self.corr))):
+
+            k, kmax, freq, spectrum = self._segment_spectrum(i)
             
             self.spectrum_to_phase_noise(freq, spectrum)
             self.seed1 +=239
@@ -205,25 +246,20 @@ class FlatSpectrum(object):
                     self.spectrum_to_phase_noise(freq, spectrum)
                     self.seed1 +=239
                     self.seed2 +=158
-                    self.dphi2[:self.corr/4] = self.dphi_output[:self.corr/4]
+                    self.dphi2[:self.corr//4] = self.dphi_output[:self.corr//4]
                     
                 self.spectrum_to_phase_noise(freq, spectrum)
                 self.seed1 +=239
                 self.seed2 +=158
-                self.dphi2[(k+self.corr/4):(kmax+self.corr/4)] = self.dphi_output[0:(kmax-k)]
-            
-            if self.folder_plots != None:
-                fig_folder(self.folder_plots)
-                plot_noise_spectrum(freq, spectrum, sampling=1, figno=i, 
-                                    dirname = self.folder_plots)
-                plot_phase_noise(self.t[0:(kmax-k)], self.dphi_output[0:(kmax-k)], 
-                                 sampling=1, figno=i, dirname = self.folder_plots)
-                
-            rms_noise = np.std(self.dphi_output)
-            if self.print_option:
-                print("RF noise for time step %.4e s (iter %d) has r.m.s. phase %.4e rad (%.3e deg)" \
-                    %(self.t[1], i, rms_noise, rms_noise*180/np.pi))
+                self.dphi2[(k+self.corr//4):(kmax+self.corr//4)] = self.dphi_output[0:(kmax-k)]
+
+            self._report(i, freq, spectrum, kmax-k)
                 
+        self._finish()
+
+    def _finish(self):
+        # Continuous phase and turns outside of initial_final_turns
+
         if self.continuous_phase:
             psi = np.arange(0, self.n_turns+1)*2*np.pi/self.corr
             self.dphi = self.dphi*np.sin(psi[:self.n_turns+1]) + self.dphi2[:(self.n_turns+1)]*np.cos(psi[:self.n_turns+1])
@@ -231,6 +267,177 @@ class FlatSpectrum(object):
         if self.initial_final_turns[0]>0 or self.initial_final_turns[1]<self.total_n_turns+1:
             self.dphi = np.concatenate((np.zeros(self.initial_final_turns[0]), self.dphi, np.zeros(1+self.total_n_turns-self.initial_final_turns[1])))
 
+    def _draws(self, i):
+        # Indices of the spectrum_to_phase_noise calls of generate for the
+        # segment i, the seeds being incremented at every call: the noise of
+        # the turns, the noise of the first corr/4 turns of dphi2 and the
+        # noise of dphi2 (the last two if continuous_phase)
+        if not self.continuous_phase:
+            return i, None, None
+        if i == 0:
+            return 0, 1, 2
+        return 2*i + 1, None, 2*i + 2
+
+    def _batch_phase_noise(self, draws, segments, seeds, workers=1):
+        # Phase noise of the draws (index, segment i), as a dictionary by
+        # index, for the seeds of the first draw; the draws with the same
+        # number of points are transformed together
+        groups = {}
+        for draw, i in draws:
+            freq, spectrum = segments[i][2:]
+            groups.setdefault(len(spectrum), []).append((draw, freq,
+                                                         spectrum))
+
+        noise = {}
+        for group in groups.values():
+            nt = 2*(len(group[0][2]) - 1)
+            Gt = np.empty((len(group), nt))
+            for row, (draw, freq, spectrum) in enumerate(group):
+                r1 = rnd.RandomState(seeds[0] + 239*draw).random_sample(nt)
+                r2 = rnd.RandomState(seeds[1] + 158*draw).random_sample(nt)
+                Gt[row] = np.cos(2*np.pi*r1) * np.sqrt(-2*np.log(r2))
+            if workers == 1:
+                Gf = np.fft.rfft(Gt, axis=1)
+            else:
+                Gf = scipy.fft.rfft(Gt, axis=1, workers=workers)
+            for row, (draw, freq, spectrum) in enumerate(group):
+                s = np.sqrt(2*freq[-1]*spectrum)
+                Gf[row] = s*Gf[row].real + 1j*s*Gf[row].imag
+            if fftw_enabled():
+                dPt = bm.irfft_packed(Gf)
+            elif workers == 1:
+                dPt = np.fft.irfft(Gf, axis=1)
+            else:
+                dPt = scipy.fft.irfft(Gf, axis=1, workers=workers)
+            for row, (draw, freq, spectrum) in enumerate(group):
+                noise[draw] = dPt[row].real
+        return noise
+
+    def _generate_batched(self, batch_size, workers):
+        # generate(), by batches of segments
+
+        seeds = (self.seed1, self.seed2)
+        n_segments = int(np.ceil(self.n_turns/self.corr))
+        for first in range(0, n_segments, batch_size):
+            batch = range(first, min(first + batch_size, n_segments))
+            segments = dict((i, self._segment_spectrum(i)) for i in batch)
+            draws = [(draw, i) for i in batch for draw in self._draws(i)
+                     if draw is not None]
+            noise = self._batch_phase_noise(draws, segments, seeds, workers)
+
+            for i in batch:
+                k, kmax, freq, spectrum = segments[i]
+                main, initial, second = self._draws(i)
+                self.dphi[k:kmax] = noise[main][0:(kmax-k)]
+                self.dphi_output = noise[main]
+                if initial is not None:
+                    self.dphi2[:self.corr//4] = noise[initial][:self.corr//4]
+                if second is not None:
+                    self.dphi2[(k+self.corr//4):(kmax+self.corr//4)] = \
+                        noise[second][0:(kmax-k)]
+                    self.dphi_output = noise[second]
+                nt = len(self.dphi_output)
+                dt = 1/(2*freq[-1])
+                self.t = np.linspace(0, float(nt*dt), nt)
+                self._report(i, freq, spectrum, kmax-k)
+
+        if n_segments > 0:
+            n_draws = max(draw for draw in self._draws(n_segments - 1)
+                          if draw is not None) + 1
+            self.seed1 = seeds[0] + 239*n_draws
+            self.seed2 = seeds[1] + 158*n_draws
+        self._finish()
+
+    def noise(self, start, stop, batch_size=32, workers=1):
+        '''
+        Returns the phase noise of the turns [start, stop), the same as
+        dphi[start:stop] after the first call of generate(batched=True),
+        generating only the segments of these turns (see generate for
+        batch_size and workers). The noise of the segments of the previous
+        call is kept, e.g. for consecutive blocks of turns.
+        '''
+
+        dphi = np.zeros(stop - start)
+        first, last = self.initial_final_turns
+        turns = np.arange(max(start, first), min(stop, last)) - first
+        if len(turns) == 0:
+            return dphi
+
+        # Segment, draw (see _draws) and index in the draw plus the first
+        # turn of the segment, of every turn
+        n_segments = int(np.ceil(self.n_turns/self.corr))
+        segment = np.minimum(turns//self.corr, n_segments - 1)
+        owners = [(segment, [self._draws(i)[0] for i in segment], turns)]
+        if self.continuous_phase:
+            quarter = self.corr//4
+            segment = np.where(turns < quarter, 0, np.minimum(
+                (turns - quarter)//self.corr, n_segments - 1))
+            owners.append((segment, [self._draws(i)[1] if turn < quarter
+                                     else self._draws(i)[2]
+                                     for i, turn in zip(segment, turns)],
+                           np.where(turns < quarter, turns, turns - quarter)))
+
+        needed = set()
+        for segment, draws, offset in owners:
+            needed.update(zip(draws, segment.tolist()))
+        cache = getattr(self, '_noise_cache', {})
+        noise = dict((draw, cache[draw]) for draw, i in needed
+                     if draw in cache)
+        missing = sorted(draw for draw in needed if draw[0] not in cache)
+        for index in range(0, len(missing), batch_size):
+            batch = missing[index:index + batch_size]
+            segments = dict((i, self._segment_spectrum(i))
+                            for draw, i in batch)
+            noise.update(self._batch_phase_noise(batch, segments, self._seeds,
+                                                 workers))
+        self._noise_cache = noise
+
+        values = []
+        for segment, draws, offset in owners:
+            draws = np.array(draws)
+            value = np.empty(len(turns))
+            for draw in np.unique(draws):
+                turn = draws == draw
+                i = segment[turn][0]
+                value[turn] = noise[draw][offset[turn] - i*self.corr]
+            values.append(value)
+
+        if self.continuous_phase:
+            psi = turns*2*np.pi/self.corr
+            values[0] = values[0]*np.sin(psi) + values[1]*np.cos(psi)
+        dphi[turns + first - start] = values[0]
+        return dphi
+
+    def stream(self, block=None, batch_size=32, workers=1):
+        '''
+        Generator of the phase noise by blocks of block turns (by default
+        the turns of batch_size segments), yielding the first turn and the
+        noise of every block, without keeping the noise of all the turns
+        (see noise).
+        '''
+
+        if block is None:
+            block = batch_size*self.corr
+        for start in range(0, self.total_n_turns + 1, block):
+            yield start, self.noise(start, min(start + block,
+                                               self.total_n_turns + 1),
+                                    batch_size, workers)
+
+    def program(self, window=None, batch_size=32, workers=1):
+        '''
+        Returns the phase noise as a WindowedProgram of shape
+        (1, n_turns+1), e.g. for RFStation.phi_noise, generating the noise
+        of the upcoming turns by windows of window turns (by default the
+        turns of batch_size segments) during the tracking.
+        '''
+
+        if window is None:
+            window = batch_size*self.corr
+        return WindowedProgram(
+            lambda start, stop: self.noise(start, stop, batch_size,
+                                           workers)[np.newaxis],
+            self.total_n_turns + 1, 1, window)
+
 class LHCNoiseFB(object): 
     '''
     *Feedback on phase noise amplitude for LHC controlled longitudinal emittance
@@ -14,8 +14,10 @@
 '''
 
 from builtins import object
+import os
 import h5py as hp
 import numpy as np
+from ..utils import bmath as bm
 
 
 class BunchMonitor(object):
@@ -537,3 +539,160 @@ class MultiBunchMonitor(object):
         if self.i_turn > self.last_save:
             self.write_data()
         self.h5file.close()
+
+
+class ParallelBeamMonitor(object):
+
+    ''' Class able to save snapshots of the particle coordinates (dt, dE and
+        id) of a beam split over the MPI workers, every worker writing its own
+        particles, without gathering them on the master. The datasets have
+        one row per snapshot and one column per particle, the particles of
+        worker i following those of worker i-1.
+
+        With parallel HDF5 (h5py built with MPI, see parallel), all the
+        workers write collectively into the same file at the offsets of
+        their particles. Otherwise every worker writes its own file
+        (filename_rank<i>.h5) and the master writes at close() the file
+        filename.h5 of virtual datasets mapping the rows and columns to the
+        files of the workers, to be read as the single file.
+
+        Outside of MPI mode, the beam is written as one worker.
+    '''
+
+    def __init__(self, filename, n_snapshots, Beam, parallel=None):
+
+        self.filename = filename
+        self.n_snapshots = n_snapshots
+        self.beam = Beam
+        self.i_snapshot = 0
+
+        if bm.mpiMode():
+            from ..utils.mpi_config import worker
+            self.comm = worker.intercomm
+        else:
+            self.comm = None
+        self.rank = 0 if self.comm is None else self.comm.rank
+        self.workers = 1 if self.comm is None else self.comm.size
+
+        if parallel is None:
+            parallel = (self.comm is not None) and hp.get_config().mpi
+        elif parallel and not hp.get_config().mpi:
+            raise RuntimeError('ERROR in ParallelBeamMonitor: h5py was ' +
+                               'built without MPI support')
+        self.parallel = parallel
+
+        # Particles of every worker at every snapshot
+        self.counts = np.zeros((self.n_snapshots, self.workers), dtype=int)
+        self.n_total = None
+        self.turns = np.zeros(self.n_snapshots, dtype='int32')
+
+        if self.parallel:
+            self.h5file = hp.File(filename + '.h5', 'w', driver='mpio',
+                                  comm=self.comm)
+        else:
+            self.h5file = hp.File(self.rank_filename(self.rank), 'w')
+        self.h5group = self.h5file.create_group('Beam')
+
+    def rank_filename(self, rank):
+
+        return '{}_rank{}.h5'.format(self.filename, rank)
+
+    def track(self, turn):
+
+        if self.i_snapshot >= self.n_snapshots:
+            raise RuntimeError('ERROR in ParallelBeamMonitor: more ' +
+                               'snapshots than n_snapshots')
+
+        n_local = len(self.beam.dt)
+        if self.comm is None:
+            counts = np.array([n_local])
+        else:
+            counts = np.array(self.comm.allgather(n_local))
+        if self.n_total is None:
+            self.n_total = int(np.sum(counts))
+            self.create_data(counts[self.rank])
+        elif np.sum(counts) != self.n_total:
+            raise RuntimeError('ERROR in ParallelBeamMonitor: the number ' +
+                               'of particles of the beam changed')
+
+        self.counts[self.i_snapshot] = counts
+        self.turns[self.i_snapshot] = turn
+        self.write_data(counts)
+        self.i_snapshot += 1
+
+    def create_data(self, n_local):
+
+        if self.parallel:
+            # Collective, no compression with parallel writes
+            shape = (self.n_snapshots, self.n_total)
+            self.h5group.create_dataset('dt', shape, dtype=self.beam.dt.dtype)
+            self.h5group.create_dataset('dE', shape, dtype=self.beam.dE.dtype)
+            self.h5group.create_dataset('id', shape, dtype=self.beam.id.dtype)
+            self.h5group.create_dataset('turns', (self.n_snapshots,),
+                                        dtype='int32')
+        else:
+            # The particles of the snapshots one after the other, the
+            # number of particles of the worker may change
+            for name in ['dt', 'dE', 'id']:
+                self.h5group.create_dataset(
+                    name, (0,), maxshape=(None,),
+                    chunks=(max(min(n_local, 1 << 20), 1),),
+                    dtype=getattr(self.beam, name).dtype)
+
+    def write_data(self, counts):
+
+        n_local = counts[self.rank]
+        if self.parallel:
+            start = int(np.sum(counts[:self.rank]))
+            for name in ['dt', 'dE', 'id']:
+                dataset = self.h5group[name]
+                with dataset.collective:
+                    dataset[self.i_snapshot, start:start+n_local] = \
+                        getattr(self.beam, name)
+            if self.rank == 0:
+                self.h5group['turns'][self.i_snapshot] = \
+                    self.turns[self.i_snapshot]
+        else:
+            for name in ['dt', 'dE', 'id']:
+                dataset = self.h5group[name]
+                start = dataset.shape[0]
+                dataset.resize((start + n_local,))
+                dataset[start:] = getattr(self.beam, name)
+
+    def write_index(self):
+
+        n_snapshots = self.i_snapshot
+        # Start of every snapshot in the file of every worker
+        starts = np.cumsum(self.counts[:n_snapshots], axis=0) - \
+            self.counts[:n_snapshots]
+        lengths = np.sum(self.counts[:n_snapshots], axis=0)
+
+        with hp.File(self.filename + '.h5', 'w') as h5file:
+            h5group = h5file.create_group('Beam')
+            for name in ['dt', 'dE', 'id']:
+                layout = hp.VirtualLayout(shape=(n_snapshots, self.n_total),
+                                          dtype=getattr(self.beam, name).dtype)
+                for rank in range(self.workers):
+                    source = hp.VirtualSource(
+                        os.path.basename(self.rank_filename(rank)),
+                        'Beam/' + name, shape=(lengths[rank],))
+                    for i in range(n_snapshots):
+                        n = self.counts[i, rank]
+                        if n == 0:
+                            continue
+                        offset = np.sum(self.counts[i, :rank])
+                        layout[i, offset:offset+n] = \
+                            source[starts[i, rank]:starts[i, rank]+n]
+                h5group.create_virtual_dataset(name, layout)
+            h5group.create_dataset('turns', data=self.turns[:n_snapshots])
+
+    def close(self):
+
+        self.h5file.close()
+        if not self.parallel:
+            if self.comm is not None:
+                # All the worker files are complete
+                self.comm.Barrier()
+            if (self.rank == 0) and (self.n_total is not None):
+                self.write_index()
+
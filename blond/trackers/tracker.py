@@ -237,12 +237,19 @@ class RingAndRFTracker(object):
     interpolation : bool (optional)
         Option to use sliced and interpolated voltage for the kicker; default
         is False
+    fused_slicing : bool (optional)
+        Option to compute the histogram of the next turn during the kick and
+        drift, with interpolation; default is None, to use it whenever a
+        Profile of the beam is given. The Profile uses the histogram only if
+        the cuts and a sample of the particle coordinates have not changed
+        since, otherwise it slices the beam again
 
     """
 
     def __init__(self, RFStation, Beam, solver='simple', BeamFeedback=None,
                  NoiseFeedback=None, CavityFeedback=None, periodicity=False,
-                 interpolation=False, Profile=None, TotalInducedVoltage=None):
+                 interpolation=False, Profile=None, TotalInducedVoltage=None,
+                 fused_slicing=None):
 
         # Set up logging
         # self.logger = logging.getLogger(__class__.__name__)
@@ -320,6 +327,15 @@ class RingAndRFTracker(object):
             warnings.warn('Setting interpolation to TRUE')
             # self.logger.warning("Setting interpolation to TRUE")
 
+        # With interpolation, the kick, the drift and the slicing of the next
+        # turn can be done in a single pass over the particles
+        self.fused_slicing = (fused_slicing is not False) \
+            and (bm.gpuMode() is False) \
+            and (self.interpolation is True) \
+            and (self.periodicity is False) \
+            and (self.profile is not None) \
+            and (self.profile.Beam is self.beam) \
+            and self.profile.fused_slicing_possible()
 
 
     def kick(self, beam_dt, beam_dE, index):
@@ -376,6 +392,31 @@ class RingAndRFTracker(object):
                  self.alpha_1[index], self.alpha_2[index],
                  self.rf_params.beta[index], self.rf_params.energy[index])
 
+    def kick_drift_slice(self, index):
+        """Function applying the interpolated kick of the total voltage, the
+        drift to the next RF station, and computing the histogram of the
+        drifted particles in a single pass over the beam coordinates. The
+        histogram is handed to the Profile, which uses it on its next call to
+        track() instead of slicing the beam again.
+        """
+        bm.LIKick_n_drift_n_slice(self.beam.dt, self.beam.dE,
+                                  self.total_voltage,
+                                  self.profile.bin_centers,
+                                  self.beam.Particle.charge,
+                                  self.acceleration_kick[index],
+                                  self.solver, self.t_rev[index+1],
+                                  self.length_ratio, self.alpha_order,
+                                  self.eta_0[index+1], self.eta_1[index+1],
+                                  self.eta_2[index+1], self.alpha_0[index+1],
+                                  self.alpha_1[index+1], self.alpha_2[index+1],
+                                  self.rf_params.beta[index+1],
+                                  self.rf_params.energy[index+1],
+                                  self.profile.get_fused_histogram(),
+                                  self.profile.cut_left,
+                                  self.profile.cut_right,
+                                  self.profile.get_slicing_workspace())
+        self.profile.set_fused_histogram_ready()
+
     def rf_voltage_calculation(self):
         """Function calculating the total, discretised RF voltage seen by the
         beam at a given turn. Requires a Profile object.
@@ -402,8 +443,26 @@ class RingAndRFTracker(object):
         of the Beam class.
         """
 
-        # Add phase noise directly to the cavity RF phase
-        turn = self.counter[0]
+        # The phase loop needs the reduced histogram, the RF voltage can be
+        # computed while the reduction is in progress
+        if (self.beamFB is not None) and (self.profile is not None):
+            self.profile.reduce_histo_wait()
+
+        self.rf_program_update(self.counter[0])
+
+        if self.periodicity:
+            pass
+        else:
+            if self.rf_params.empty is False:
+                if self.interpolation:
+                    self.rf_voltage_calculation()
+
+    def rf_program_update(self, turn):
+        """Function applying the phase noise, the phase modulation and the
+        beam feedback corrections to the RF program of the given turn, and
+        accumulating the resulting phase offset on the RF phase of the next
+        turn.
+        """
 
         # Add phase noise directly to the cavity RF phase
         if self.phi_noise is not None:
@@ -437,14 +496,6 @@ class RingAndRFTracker(object):
         # Total phase offset
         self.rf_params.phi_rf[:,turn+1] += self.rf_params.dphi_rf
 
-        if self.periodicity:
-            pass
-        else:
-            if self.rf_params.empty is False:
-                if self.interpolation:
-                    self.rf_voltage_calculation()
-
-
     def track_only(self):
         """Tracking method for the section. Applies first the kick, then the 
         drift. Calls also RF/beam feedbacks if applicable. Updates the counter
@@ -513,17 +564,23 @@ class RingAndRFTracker(object):
                     else:
                         self.total_voltage = self.rf_voltage
 
-                    with timing.timed_region('comp:LIKick'):
-                        # with mpiprof.traced_region('comp:LIKick'):
-                        bm.linear_interp_kick(dt=self.beam.dt, dE=self.beam.dE,
-                                              voltage=self.total_voltage,
-                                              bin_centers=self.profile.bin_centers,
-                                              charge=self.beam.Particle.charge,
-                                              acceleration_kick=self.acceleration_kick[turn])
+                    if self.fused_slicing:
+                        with timing.timed_region('comp:LIKick_drift_slice'):
+                            self.kick_drift_slice(turn)
+                    else:
+                        with timing.timed_region('comp:LIKick'):
+                            # with mpiprof.traced_region('comp:LIKick'):
+                            bm.linear_interp_kick(dt=self.beam.dt, dE=self.beam.dE,
+                                                  voltage=self.total_voltage,
+                                                  bin_centers=self.profile.bin_centers,
+                                                  charge=self.beam.Particle.charge,
+                                                  acceleration_kick=self.acceleration_kick[turn])
+                        self.drift(self.beam.dt, self.beam.dE, turn + 1)
                 else:
                     self.kick(self.beam.dt, self.beam.dE, turn)
-
-            self.drift(self.beam.dt, self.beam.dE, turn + 1)
+                    self.drift(self.beam.dt, self.beam.dE, turn + 1)
+            else:
+                self.drift(self.beam.dt, self.beam.dE, turn + 1)
 
         # Updating the beam synchronous momentum etc.
         self.beam.beta = self.rf_params.beta[turn+1]
@@ -531,9 +588,82 @@ class RingAndRFTracker(object):
         self.beam.energy = self.rf_params.energy[turn+1]
         self.beam.momentum = self.rf_params.momentum[turn+1]
 
+        # The reduction of the histogram, if still in progress, has
+        # overlapped with the kick and drift
+        if self.profile is not None:
+            self.profile.reduce_histo_wait()
+
         # Increment by one the turn counter
         self.counter[0] += 1
 
     def track(self):
         self.pre_track()
         self.track_only()
+
+    def batch_tracking_possible(self):
+        """Function checking whether several turns can be tracked in a single
+        call, i.e. whether the particles only see the RF program of the
+        station, independently of the beam itself.
+        """
+
+        return (bm.device == 'CPU') \
+            and (self.periodicity is False) \
+            and (self.interpolation is False) \
+            and (self.rf_params.empty is False) \
+            and (self.beamFB is None) \
+            and (self.noiseFB is None) \
+            and (self.cavityFB is None) \
+            and (self.totalInducedVoltage is None)
+
+    def track_turns(self, n_turns):
+        """Tracking method for several consecutive turns. Without collective
+        effects or feedbacks, the RF programs of the next n_turns are
+        prepared in advance and passed to a single compiled loop, which
+        applies all the kicks and drifts to a chunk of particles before
+        moving to the next chunk. Otherwise, falls back to calling track()
+        n_turns times.
+        """
+
+        turn = self.counter[0]
+        n_turns = int(n_turns)
+        if turn + n_turns >= len(self.t_rev):
+            # TurnError
+            raise RuntimeError("ERROR in RingAndRFTracker: Cannot track " +
+                               "beyond the last turn of the RF program!")
+
+        if not self.batch_tracking_possible():
+            for i in range(n_turns):
+                self.track()
+            return
+
+        with timing.timed_region('serial:pretrack_n_turns'):
+            for i in range(turn, turn + n_turns):
+                self.rf_program_update(i)
+
+        turns = slice(turn, turn + n_turns)
+        next_turns = slice(turn + 1, turn + n_turns + 1)
+        with timing.timed_region('comp:kick_drift_n_turns'):
+            bm.kick_drift_n_turns(self.beam.dt, self.beam.dE,
+                                  self.voltage[:, turns],
+                                  self.omega_rf[:, turns],
+                                  self.phi_rf[:, turns], self.charge,
+                                  self.n_rf, self.acceleration_kick[turns],
+                                  self.solver, self.t_rev[next_turns],
+                                  self.length_ratio, self.alpha_order,
+                                  self.eta_0[next_turns],
+                                  self.eta_1[next_turns],
+                                  self.eta_2[next_turns],
+                                  self.alpha_0[next_turns],
+                                  self.alpha_1[next_turns],
+                                  self.alpha_2[next_turns],
+                                  self.rf_params.beta[next_turns],
+                                  self.rf_params.energy[next_turns])
+
+        # Updating the beam synchronous momentum etc.
+        turn += n_turns
+        self.beam.beta = self.rf_params.beta[turn]
+        self.beam.gamma = self.rf_params.gamma[turn]
+        self.beam.energy = self.rf_params.energy[turn]
+        self.beam.momentum = self.rf_params.momentum[turn]
+
+        self.counter[0] = turn
@@ -0,0 +1,148 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Error-controlled approximation of the beam profile in MPI mode: the
+histogram is reduced over the workers only every few turns.**
+'''
+
+from __future__ import division
+from builtins import object
+import numpy as np
+
+from ..utils import bmath as bm
+
+
+class ApproximationScheduler(object):
+    r"""
+    Updates the beam profile every turn, reducing the histogram over the
+    workers only every interval turns. On the other turns, the histogram is
+    the local histogram scaled by the number of workers, corrected by the
+    difference between the global and the scaled local histograms of the
+    last reduction: the particles of a worker being the same from turn to
+    turn, this difference drifts slowly. At every reduction, the predicted
+    histogram is compared with the global one; the interval is halved if
+    the relative error exceeds the tolerance, and doubled if it is below
+    half of it.
+
+    The error is measured on the induced voltage if induced_voltage is
+    given: the difference of the histograms is weighted by the total
+    impedance of the InducedVoltageTime and InducedVoltageFreq objects.
+    Otherwise, or without such objects, it is measured on the histogram.
+
+    Parameters
+    ----------
+    profile : Profile
+        the profile of the split beam
+    tolerance : float
+        maximum relative error (2-norm) of the induced voltage, or of the
+        histogram
+    induced_voltage : TotalInducedVoltage (optional)
+        the induced voltage computed from the profile
+    start_interval : int
+        number of turns between the first reductions
+    min_interval : int
+        minimum number of turns between two reductions
+    max_interval : int
+        maximum number of turns between two reductions
+
+    Attributes
+    ----------
+    interval : int
+        current number of turns between two reductions
+    errors : list
+        (turn, interval, relative error) at every reduction but the first
+    """
+
+    def __init__(self, profile, tolerance=1e-2, induced_voltage=None,
+                 start_interval=1, min_interval=1, max_interval=128):
+
+        if not bm.mpiMode():
+            raise RuntimeError(
+                'ERROR in ApproximationScheduler: Cannot be used unless in '
+                'MPI Mode')
+
+        self.profile = profile
+        self.tolerance = tolerance
+        self.induced_voltage = induced_voltage
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(start_interval, min_interval), max_interval)
+        self.errors = []
+        self.turn = 0
+        self.correction = None
+        self._turns_since_reduce = 0
+
+    def _impedances(self):
+        if self.induced_voltage is None:
+            return []
+        return [(obj.n_fft, obj.total_impedance)
+                for obj in self.induced_voltage.induced_voltage_list
+                if hasattr(obj, 'total_impedance') and hasattr(obj, 'n_fft')]
+
+    def relative_error(self, predicted, exact):
+        """
+        Relative error of the induced voltage computed from the predicted
+        histogram, or of the histogram itself (see the class).
+        """
+        impedances = self._impedances()
+        if len(impedances) == 0:
+            return np.linalg.norm(predicted - exact) / \
+                max(np.linalg.norm(exact), np.finfo(float).tiny)
+
+        error = 0.
+        norm = 0.
+        for n_fft, impedance in impedances:
+            error += np.sum(np.abs(impedance *
+                                   np.fft.rfft(predicted - exact, n_fft))**2)
+            norm += np.sum(np.abs(impedance * np.fft.rfft(exact, n_fft))**2)
+        return np.sqrt(error / max(norm, np.finfo(float).tiny))
+
+    def track(self):
+        """
+        Updates the profile for the current turn, in place of
+        Profile.track. Returns True if the histogram was reduced over the
+        workers.
+        """
+        from ..utils.mpi_config import worker
+
+        profile = self.profile
+        reduce = (self.correction is None) or \
+            (self._turns_since_reduce >= self.interval)
+
+        profile.operations[0](reduce=False)
+        scaled = np.array(profile.n_macroparticles, dtype=float) * \
+            worker.workers
+
+        if reduce:
+            if profile.operations[0] == getattr(profile, '_slice_smooth', None):
+                profile.reduce_histo(dtype=np.float64)
+            else:
+                profile.reduce_histo()
+            exact = np.array(profile.n_macroparticles, dtype=float)
+            if self.correction is not None:
+                error = self.relative_error(scaled + self.correction, exact)
+                # All the workers must agree on the next reduction
+                error = worker.allreduce(np.array([error]), operator='max')[0]
+                self.errors.append((self.turn, self.interval, error))
+                if error > self.tolerance:
+                    self.interval = max(self.interval // 2, self.min_interval)
+                elif error < 0.5 * self.tolerance:
+                    self.interval = min(2 * self.interval, self.max_interval)
+            self.correction = exact - scaled
+            self._turns_since_reduce = 1
+        else:
+            profile.n_macroparticles[:] = scaled + self.correction
+            self._turns_since_reduce += 1
+
+        for op in profile.operations[1:]:
+            op()
+
+        self.turn += 1
+        return reduce
@@ -26,6 +26,7 @@ _CPU_func_dict = {
     'exp': butils_wrap.exp,
     'mean': butils_wrap.mean,
     'std': butils_wrap.std,
+    'beam_statistics': butils_wrap.beam_statistics,
     'where': butils_wrap.where,
     'interp': butils_wrap.interp,
     'interp_const_space': butils_wrap.interp_const_space,
@@ -42,11 +43,14 @@ _CPU_func_dict = {
     'mul': butils_wrap.mul,
     'beam_phase': butils_wrap.beam_phase,
     'fast_resonator': butils_wrap.fast_resonator,
+    'resonator_induced_voltage': butils_wrap.resonator_induced_voltage,
     'kick': butils_wrap.kick,
     'rf_volt_comp': butils_wrap.rf_volt_comp,
     'drift': butils_wrap.drift,
+    'kick_drift_n_turns': butils_wrap.kick_drift_n_turns,
     'linear_interp_kick': butils_wrap.linear_interp_kick,
     'LIKick_n_drift': butils_wrap.linear_interp_kick_n_drift,
+    'LIKick_n_drift_n_slice': butils_wrap.linear_interp_kick_drift_n_slice,
     'synchrotron_radiation': butils_wrap.synchrotron_radiation,
     'synchrotron_radiation_full': butils_wrap.synchrotron_radiation_full,
     'set_random_seed': butils_wrap.set_random_seed,
@@ -54,6 +58,8 @@ _CPU_func_dict = {
     # 'linear_interp_time_translation': butils_wrap.linear_interp_time_translation,
     'slice': butils_wrap.slice,
     'slice_smooth': butils_wrap.slice_smooth,
+    'slice_tiled': butils_wrap.slice_tiled,
+    'get_max_threads': butils_wrap.get_max_threads,
     'music_track': butils_wrap.music_track,
     'music_track_multiturn': butils_wrap.music_track_multiturn,
     'diff': np.diff,
@@ -67,7 +73,12 @@ _CPU_func_dict = {
 _FFTW_func_dict = {
     'rfft': butils_wrap.rfft,
     'irfft': butils_wrap.irfft,
-    'rfftfreq': butils_wrap.rfftfreq
+    'rfftfreq': butils_wrap.rfftfreq,
+    'plan_rfft': butils_wrap.plan_rfft,
+    'plan_irfft': butils_wrap.plan_irfft,
+    'fft_plan_statistics': butils_wrap.fft_plan_statistics,
+    'import_fft_wisdom': butils_wrap.import_fft_wisdom,
+    'export_fft_wisdom': butils_wrap.export_fft_wisdom
 }
 
 _MPI_func_dict = {
@@ -249,6 +260,7 @@ def use_gpu(gpu_id=0):
         # 'linear_interp_time_translation': butils_wrap.linear_interp_time_translation,
         'slice': gpu_physics_wrap.gpu_slice,
         'slice_smooth': butils_wrap.slice_smooth,
+        'get_max_threads': butils_wrap.get_max_threads,
         # 'rfftfreq': gpu_butils_wrap.gpu_rfftfreq,
         'rfftfreq': np.fft.rfftfreq,
         'irfft_packed': butils_wrap.irfft_packed,
@@ -271,6 +283,7 @@ def use_gpu(gpu_id=0):
         'add': butils_wrap.add,
         'mul': butils_wrap.mul,
         'fast_resonator': butils_wrap.fast_resonator,
+        'resonator_induced_voltage': butils_wrap.resonator_induced_voltage,
         'music_track': butils_wrap.music_track,
         'music_track_multiturn': butils_wrap.music_track_multiturn,
         'diff': np.diff,
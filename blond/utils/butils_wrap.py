@@ -306,6 +306,35 @@ def std(x):
         return __lib.stdev(__getPointer(x), __getLen(x))
 
 
+def beam_statistics(dt, dE, id=None, stats=None):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert len(dt) == len(dE)
+
+    # [count, mean_dt, mean_dE, m2_dt, m2_dE, min_dt, min_dE, max_dt, max_dE]
+    if stats is None:
+        stats = np.empty(9, dtype=np.float64)
+
+    if id is None:
+        func = __lib.beam_statisticsf if precision.num == 1 \
+            else __lib.beam_statistics
+        id_pointer = None
+    elif id.dtype == np.int64:
+        func = __lib.beam_statisticsf if precision.num == 1 \
+            else __lib.beam_statistics
+        id_pointer = __getPointer(id)
+    else:
+        if id.dtype not in [np.uint8, np.bool_]:
+            id = (id != 0)
+        func = __lib.beam_statistics_maskf if precision.num == 1 \
+            else __lib.beam_statistics_mask
+        id_pointer = __getPointer(id)
+
+    func(__getPointer(dt), __getPointer(dE), id_pointer, __getLen(dt),
+         __getPointer(stats))
+    return stats
+
+
 def sin(x, result=None):
     if isinstance(x, np.ndarray) and isinstance(x[0], np.float64):
         if result is None:
@@ -425,9 +454,9 @@ def interp_const_space(x, xp, yp, left=None, right=None, result=None):
 
 def rfft(a, n=0, result=None):
     a = a.astype(dtype=precision.real_t, order='C', copy=False)
-    if (n == 0) and (result == None):
+    if (n == 0) and (result is None):
         result = np.empty(len(a)//2 + 1, dtype=precision.complex_t, order='C')
-    elif (n != 0) and (result == None):
+    elif (n != 0) and (result is None):
         result = np.empty(n//2 + 1, dtype=precision.complex_t, order='C')
 
     if precision.num == 1:
@@ -449,9 +478,9 @@ def rfft(a, n=0, result=None):
 def irfft(a, n=0, result=None):
     a = a.astype(dtype=precision.complex_t, order='C', copy=False)
 
-    if (n == 0) and (result == None):
+    if (n == 0) and (result is None):
         result = np.empty(2*(len(a)-1), dtype=precision.real_t, order='C')
-    elif (n != 0) and (result == None):
+    elif (n != 0) and (result is None):
         result = np.empty(n, dtype=precision.real_t, order='C')
 
     if precision.num == 1:
@@ -496,9 +525,9 @@ def irfft_packed(signal, fftsize=0, result=None):
     signal = np.ascontiguousarray(np.reshape(
         signal, -1), dtype=precision.complex_t)
 
-    if (fftsize == 0) and (result == None):
+    if (fftsize == 0) and (result is None):
         result = np.empty(howmany * 2*(n0-1), dtype=precision.real_t)
-    elif (fftsize != 0) and (result == None):
+    elif (fftsize != 0) and (result is None):
         result = np.empty(howmany * fftsize, dtype=precision.real_t)
 
     if precision.num == 1:
@@ -521,6 +550,59 @@ def irfft_packed(signal, fftsize=0, result=None):
     return result
 
 
+def fftw_available():
+    # The FFTW routines are only built with the --with-fftw options
+    try:
+        __lib.plan_rfft
+    except AttributeError:
+        return False
+    return True
+
+
+def plan_rfft(n):
+    if precision.num == 1:
+        __lib.plan_rfftf(ct.c_int(int(n)),
+                         ct.c_int(int(os.environ.get('OMP_NUM_THREADS', 1))))
+    else:
+        __lib.plan_rfft(ct.c_int(int(n)),
+                        ct.c_int(int(os.environ.get('OMP_NUM_THREADS', 1))))
+
+
+def plan_irfft(n):
+    if precision.num == 1:
+        __lib.plan_irfftf(ct.c_int(int(n)),
+                          ct.c_int(int(os.environ.get('OMP_NUM_THREADS', 1))))
+    else:
+        __lib.plan_irfft(ct.c_int(int(n)),
+                         ct.c_int(int(os.environ.get('OMP_NUM_THREADS', 1))))
+
+
+def fft_plan_statistics():
+    stats = np.zeros(3, dtype=ct.c_long)
+    if precision.num == 1:
+        __lib.fft_plan_statisticsf(__getPointer(stats))
+    else:
+        __lib.fft_plan_statistics(__getPointer(stats))
+    return {'hits': int(stats[0]), 'misses': int(stats[1]),
+            'plans': int(stats[2])}
+
+
+def import_fft_wisdom(filename):
+    filename = ct.c_char_p(filename.encode())
+    if precision.num == 1:
+        return bool(__lib.import_wisdomf(filename))
+    else:
+        return bool(__lib.import_wisdom(filename))
+
+
+def export_fft_wisdom(filename):
+    filename = ct.c_char_p(filename.encode())
+    if precision.num == 1:
+        return bool(__lib.export_wisdomf(filename))
+    else:
+        return bool(__lib.export_wisdom(filename))
+
+
 def cumtrapz(y, x=None, dx=1.0, initial=None, result=None):
     if x is not None:
         # IntegrationError
@@ -686,6 +768,55 @@ def drift(dt, dE, solver, t_rev, length_ratio, alpha_order, eta_0,
                     __getLen(dt))
 
 
+def kick_drift_n_turns(dt, dE, voltage, omega_rf, phi_rf, charge, n_rf,
+                       acceleration_kick, solver, t_rev, length_ratio,
+                       alpha_order, eta_0, eta_1, eta_2, alpha_0, alpha_1,
+                       alpha_2, beta, energy):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+
+    # The RF programs are given as [n_rf, n_turns] and passed turn by turn
+    n_turns = len(acceleration_kick)
+    voltage_kick = np.ascontiguousarray(charge * voltage.T,
+                                        dtype=precision.real_t)
+    omegarf_kick = np.ascontiguousarray(omega_rf.T, dtype=precision.real_t)
+    phirf_kick = np.ascontiguousarray(phi_rf.T, dtype=precision.real_t)
+    turn_arrays = [np.ascontiguousarray(array, dtype=precision.real_t)
+                   for array in [acceleration_kick, t_rev, eta_0, eta_1,
+                                 eta_2, alpha_0, alpha_1, alpha_2, beta,
+                                 energy]]
+    for array in turn_arrays:
+        assert len(array) == n_turns
+    acc_kick, t_rev, eta_0, eta_1, eta_2, alpha_0, alpha_1, alpha_2, \
+        beta, energy = turn_arrays
+
+    if precision.num == 1:
+        func = __lib.kick_drift_n_turnsf
+    else:
+        func = __lib.kick_drift_n_turns
+    func(__getPointer(dt),
+         __getPointer(dE),
+         ct.c_int(n_rf),
+         ct.c_int(n_turns),
+         __getPointer(voltage_kick),
+         __getPointer(omegarf_kick),
+         __getPointer(phirf_kick),
+         __getPointer(acc_kick),
+         ct.c_char_p(solver),
+         __getPointer(t_rev),
+         __c_real(length_ratio),
+         __c_real(alpha_order),
+         __getPointer(eta_0),
+         __getPointer(eta_1),
+         __getPointer(eta_2),
+         __getPointer(alpha_0),
+         __getPointer(alpha_1),
+         __getPointer(alpha_2),
+         __getPointer(beta),
+         __getPointer(energy),
+         __getLen(dt))
+
+
 def linear_interp_kick(dt, dE, voltage,
                        bin_centers, charge,
                        acceleration_kick):
@@ -773,50 +904,182 @@ def linear_interp_kick_n_drift(dt, dE, total_voltage, bin_centers, charge, acc_k
                                          __c_real(charge))
 
 
-def slice(dt, profile, cut_left, cut_right):
+def linear_interp_kick_drift_n_slice(dt, dE, total_voltage, bin_centers, charge,
+                                     acc_kick, solver, t_rev, length_ratio,
+                                     alpha_order, eta_0, eta_1, eta_2,
+                                     alpha_0, alpha_1, alpha_2, beta, energy,
+                                     profile, cut_left, cut_right,
+                                     workspace=None):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert isinstance(total_voltage[0], precision.real_t)
+    assert isinstance(bin_centers[0], precision.real_t)
+    assert isinstance(profile[0], precision.real_t)
+    assert len(profile) == len(bin_centers)
+    if workspace is not None:
+        assert len(workspace) >= get_max_threads() * len(profile)
+
+    if precision.num == 1:
+        __lib.linear_interp_kick_drift_n_slicef(__getPointer(dt),
+                                                __getPointer(dE),
+                                                __getPointer(total_voltage),
+                                                __getPointer(bin_centers),
+                                                __c_real(charge),
+                                                __getLen(bin_centers),
+                                                __getLen(dt),
+                                                __c_real(acc_kick),
+                                                ct.c_char_p(solver),
+                                                __c_real(t_rev),
+                                                __c_real(length_ratio),
+                                                __c_real(alpha_order),
+                                                __c_real(eta_0),
+                                                __c_real(eta_1),
+                                                __c_real(eta_2),
+                                                __c_real(alpha_0),
+                                                __c_real(alpha_1),
+                                                __c_real(alpha_2),
+                                                __c_real(beta),
+                                                __c_real(energy),
+                                                __getPointer(profile),
+                                                __c_real(cut_left),
+                                                __c_real(cut_right),
+                                                __getWorkspace(workspace))
+    else:
+        __lib.linear_interp_kick_drift_n_slice(__getPointer(dt),
+                                               __getPointer(dE),
+                                               __getPointer(total_voltage),
+                                               __getPointer(bin_centers),
+                                               __c_real(charge),
+                                               __getLen(bin_centers),
+                                               __getLen(dt),
+                                               __c_real(acc_kick),
+                                               ct.c_char_p(solver),
+                                               __c_real(t_rev),
+                                               __c_real(length_ratio),
+                                               __c_real(alpha_order),
+                                               __c_real(eta_0),
+                                               __c_real(eta_1),
+                                               __c_real(eta_2),
+                                               __c_real(alpha_0),
+                                               __c_real(alpha_1),
+                                               __c_real(alpha_2),
+                                               __c_real(beta),
+                                               __c_real(energy),
+                                               __getPointer(profile),
+                                               __c_real(cut_left),
+                                               __c_real(cut_right),
+                                               __getWorkspace(workspace))
+
+
+def get_max_threads():
+    return __lib.get_max_threads()
+
+
+def __getWorkspace(workspace):
+    if workspace is None:
+        return None
+    assert isinstance(workspace[0], precision.real_t)
+    return __getPointer(workspace)
+
+
+def slice(dt, profile, cut_left, cut_right, workspace=None):
     assert isinstance(dt[0], precision.real_t)
     assert isinstance(profile[0], precision.real_t)
 
     # dt = dt.astype(dtype=precision.real_t, order='C', copy=False)
     # profile = profile.astype(dtype=precision.real_t, order='C', copy=False)
 
+    # The workspace holds the thread-private histograms,
+    # get_max_threads() * len(profile) elements. Allocated per call if None.
+    if workspace is not None:
+        assert len(workspace) >= get_max_threads() * len(profile)
+
     if precision.num == 1:
         __lib.histogramf(__getPointer(dt),
                          __getPointer(profile),
                          __c_real(cut_left),
                          __c_real(cut_right),
                          __getLen(profile),
-                         __getLen(dt))
+                         __getLen(dt),
+                         __getWorkspace(workspace))
     else:
         __lib.histogram(__getPointer(dt),
                         __getPointer(profile),
                         __c_real(cut_left),
                         __c_real(cut_right),
                         __getLen(profile),
-                        __getLen(dt))
+                        __getLen(dt),
+                        __getWorkspace(workspace))
 
 
-def slice_smooth(dt, profile, cut_left, cut_right):
+def slice_tiled(dt, profile, cut_left, cut_right, tile_size=16384,
+                indices=None, offsets=None, chunk_size=1048576):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(profile[0], precision.real_t)
+
+    # indices: int32 array of 2 * min(chunk_size, len(dt)) elements
+    # offsets: int32 array of (get_max_threads() + 1) * n_tiles + 1 elements
+    # Allocated per call if None.
+    if indices is not None:
+        assert indices.dtype == np.int32
+        assert len(indices) >= 2 * min(chunk_size, len(dt))
+        indices = __getPointer(indices)
+    if offsets is not None:
+        n_tiles = -(-len(profile) // tile_size)
+        assert offsets.dtype == np.int32
+        assert len(offsets) >= (get_max_threads() + 1) * n_tiles + 1
+        offsets = __getPointer(offsets)
+
+    if precision.num == 1:
+        __lib.histogram_tiledf(__getPointer(dt),
+                               __getPointer(profile),
+                               __c_real(cut_left),
+                               __c_real(cut_right),
+                               __getLen(profile),
+                               __getLen(dt),
+                               ct.c_int(tile_size),
+                               ct.c_int(chunk_size),
+                               indices,
+                               offsets)
+    else:
+        __lib.histogram_tiled(__getPointer(dt),
+                              __getPointer(profile),
+                              __c_real(cut_left),
+                              __c_real(cut_right),
+                              __getLen(profile),
+                              __getLen(dt),
+                              ct.c_int(tile_size),
+                              ct.c_int(chunk_size),
+                              indices,
+                              offsets)
+
+
+def slice_smooth(dt, profile, cut_left, cut_right, workspace=None):
     assert isinstance(dt[0], precision.real_t)
     assert isinstance(profile[0], precision.real_t)
 
     # dt = dt.astype(dtype=precision.real_t, order='C', copy=False)
     # profile = profile.astype(dtype=precision.real_t, order='C', copy=False)
 
+    if workspace is not None:
+        assert len(workspace) >= get_max_threads() * len(profile)
+
     if precision.num == 1:
         __lib.smooth_histogramf(__getPointer(dt),
                                 __getPointer(profile),
                                 __c_real(cut_left),
                                 __c_real(cut_right),
                                 __getLen(profile),
-                                __getLen(dt))
+                                __getLen(dt),
+                                __getWorkspace(workspace))
     else:
         __lib.smooth_histogram(__getPointer(dt),
                                __getPointer(profile),
                                __c_real(cut_left),
                                __c_real(cut_right),
                                __getLen(profile),
-                               __getLen(dt))
+                               __getLen(dt),
+                               __getWorkspace(workspace))
 
 
 def sparse_histogram(dt, profile, cut_left, cut_right, bunch_indexes):
@@ -1018,6 +1281,55 @@ def fast_resonator(R_S, Q, frequency_array, frequency_R, impedance=None):
     return impedance
 
 
+def resonator_induced_voltage(time, bin_centers, coefficients, amplitudes,
+                              omega, alpha, Q_tilde, result=None):
+    '''Induced voltage of resonators at the sorted times, for a piecewise
+    linear line density whose slope changes by coefficients at bin_centers.
+    Linear in the number of times and slices, see InducedVoltageResonator.
+    '''
+    time = time.astype(dtype=precision.real_t, order='C', copy=False)
+    bin_centers = bin_centers.astype(
+        dtype=precision.real_t, order='C', copy=False)
+    coefficients = coefficients.astype(
+        dtype=precision.real_t, order='C', copy=False)
+    amplitudes = amplitudes.astype(
+        dtype=precision.real_t, order='C', copy=False)
+    omega = omega.astype(dtype=precision.real_t, order='C', copy=False)
+    alpha = alpha.astype(dtype=precision.real_t, order='C', copy=False)
+    Q_tilde = Q_tilde.astype(dtype=precision.real_t, order='C', copy=False)
+
+    if result is None:
+        result = np.empty(len(time), dtype=precision.real_t)
+
+    if precision.num == 1:
+        __lib.resonator_induced_voltagef(
+            __getPointer(result),
+            __getPointer(time),
+            __getPointer(bin_centers),
+            __getPointer(coefficients),
+            __getPointer(amplitudes),
+            __getPointer(omega),
+            __getPointer(alpha),
+            __getPointer(Q_tilde),
+            __getLen(amplitudes),
+            __getLen(time),
+            __getLen(bin_centers))
+    else:
+        __lib.resonator_induced_voltage(
+            __getPointer(result),
+            __getPointer(time),
+            __getPointer(bin_centers),
+            __getPointer(coefficients),
+            __getPointer(amplitudes),
+            __getPointer(omega),
+            __getPointer(alpha),
+            __getPointer(Q_tilde),
+            __getLen(amplitudes),
+            __getLen(time),
+            __getLen(bin_centers))
+    return result
+
+
 # def mean(x):
 #     __lib.mean.restype = ct.c_double
 #     return __lib.mean(__getPointer(x), __getLen(x))
@@ -0,0 +1,324 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Module to checkpoint the state of a simulation to HDF5 files and to
+restore it, to resume tracking after an interruption with the same results
+as without.**
+'''
+
+from __future__ import division
+from builtins import object
+import json
+import os
+import time
+import numbers
+import h5py as hp
+import numpy as np
+
+from ..utils import bmath as bm
+from ..beam.beam import Beam
+from ..beam.profile import Profile
+from ..input_parameters.ring import Ring
+from ..input_parameters.rf_parameters import RFStation
+
+
+class Checkpoint(object):
+    r"""
+    Writes and restores the state of the objects of a simulation. The
+    objects are given by name, the same objects, created in the same way,
+    must be given to restore the state.
+
+    The state of a Beam is its coordinates, ids and energy; the state of an
+    RFStation its counter, its accumulated phase offsets and the RF phase
+    and frequency of the current and neighbouring turns. For any other
+    object, e.g. BeamFeedback, TotalInducedVoltage (with the mtw_memory of
+    its multi-turn wakes), SPSCavityFeedback (with the buffers of its
+    SPSOneTurnFeedback) or a noise feedback, the state is all its numeric
+    attributes and random generators, and the states of the BLonD objects it
+    holds, except the ones of the classes above and the trackers, whose
+    state is saved only when given by name. The state of the global numpy
+    random generator is saved as well.
+
+    Every MPI worker writes its own file, filename_rank<i>.h5 (filename.h5
+    outside of MPI mode), the file of the previous checkpoint being replaced
+    only once the new one is complete.
+
+    Parameters
+    ----------
+    filename : str
+        path of the files, without extension
+    objects : dict
+        the objects to checkpoint, by name
+    every : int (optional)
+        number of turns between checkpoints written by track
+    walltime : float (optional)
+        time [s] after which track writes a checkpoint and requests to stop
+        tracking, from the creation of the object
+    """
+
+    version = 1
+    # Turns of the RF programs saved around the counter of an RFStation
+    rf_program_turns = (-1, 2)
+
+    def __init__(self, filename, objects, every=None, walltime=None):
+
+        self.filename = filename
+        self.objects = objects
+        self.every = every
+        self.walltime = walltime
+        self.start_time = time.time()
+
+        if bm.mpiMode():
+            from ..utils.mpi_config import worker
+            self.worker = worker
+            self.rank = worker.rank
+            self.workers = worker.workers
+            self.path = '{}_rank{}.h5'.format(filename, self.rank)
+        else:
+            self.worker = None
+            self.rank = 0
+            self.workers = 1
+            self.path = filename + '.h5'
+
+    def track(self, turn):
+        """
+        Writes a checkpoint every 'every' turns, and once the wall time is
+        reached. Returns True if the wall time is reached, i.e. tracking
+        should stop.
+        """
+        stop = False
+        if self.walltime is not None:
+            elapsed = time.time() - self.start_time
+            if self.worker is not None:
+                # All the workers must stop at the same turn
+                elapsed = self.worker.allreduce(np.array([elapsed]),
+                                                operator='max')[0]
+            stop = elapsed >= self.walltime
+
+        if stop or ((self.every is not None) and (turn % self.every == 0)):
+            self.save(turn)
+        return stop
+
+    def save(self, turn):
+        """
+        Writes the state of the objects after the given turn.
+        """
+        temporary = self.path + '.tmp'
+        with hp.File(temporary, 'w') as h5file:
+            h5file.attrs['version'] = self.version
+            h5file.attrs['turn'] = turn
+            h5file.attrs['workers'] = self.workers
+            h5file.create_dataset('numpy_random_state',
+                                  data=_rng_state(np.random.get_state()))
+
+            visited = set()
+            for name, obj in self.objects.items():
+                group = h5file.create_group(name)
+                if isinstance(obj, Beam):
+                    _save_beam(obj, group)
+                elif isinstance(obj, RFStation):
+                    _save_rf_station(obj, group, self.rf_program_turns)
+                else:
+                    _save_object(obj, group, visited)
+        os.replace(temporary, self.path)
+
+    def restore(self):
+        """
+        Restores the state of the objects, returns the turn of the
+        checkpoint.
+        """
+        with hp.File(self.path, 'r') as h5file:
+            if h5file.attrs['version'] != self.version:
+                raise RuntimeError(
+                    'ERROR in Checkpoint: version {} of {} not supported'.format(
+                        h5file.attrs['version'], self.path))
+            if h5file.attrs['workers'] != self.workers:
+                raise RuntimeError(
+                    'ERROR in Checkpoint: written by {} workers, restored by '
+                    '{}'.format(h5file.attrs['workers'], self.workers))
+
+            np.random.set_state(_rng_from_state(
+                h5file['numpy_random_state'][()]))
+            for name, obj in self.objects.items():
+                group = h5file[name]
+                if isinstance(obj, Beam):
+                    _restore_beam(obj, group)
+                elif isinstance(obj, RFStation):
+                    _restore_rf_station(obj, group)
+                else:
+                    _restore_object(obj, group)
+            return int(h5file.attrs['turn'])
+
+
+# Classes whose state is saved only when given to the Checkpoint by name
+def _skipped_types():
+    from ..trackers.tracker import RingAndRFTracker, FullRingAndRF
+    return (Beam, RFStation, Ring, Profile, RingAndRFTracker, FullRingAndRF)
+
+
+def _is_blond_object(value):
+    return type(value).__module__.startswith('blond.') and \
+        hasattr(value, '__dict__')
+
+
+def _rng_state(state):
+    # Random generators as JSON strings
+    if isinstance(state, tuple):
+        # numpy.random.get_state()
+        state = {'legacy': [state[0], state[1].tolist()] + list(state[2:])}
+    return json.dumps(state, default=lambda x: x.tolist())
+
+
+def _rng_from_state(state):
+    state = json.loads(state)
+    if 'legacy' in state:
+        state = state['legacy']
+        return (state[0], np.array(state[1], dtype=np.uint32)) + \
+            tuple(state[2:])
+    return state
+
+
+def _save_beam(beam, group):
+    for name in ['dt', 'dE', 'id']:
+        group.create_dataset(name, data=getattr(beam, name))
+    for name in ['n_macroparticles', 'beta', 'gamma', 'energy', 'momentum',
+                 'is_splitted']:
+        group.attrs[name] = getattr(beam, name)
+
+
+def _restore_beam(beam, group):
+    for name in ['dt', 'dE', 'id']:
+        setattr(beam, name, group[name][()])
+    beam.n_macroparticles = int(group.attrs['n_macroparticles'])
+    beam.is_splitted = bool(group.attrs['is_splitted'])
+    for name in ['beta', 'gamma', 'energy', 'momentum']:
+        setattr(beam, name, float(group.attrs[name]))
+
+
+def _save_rf_station(rf_station, group, program_turns):
+    counter = rf_station.counter[0]
+    group.attrs['counter'] = counter
+    for name in ['dphi_rf', 'dphi_rf_steering']:
+        if hasattr(rf_station, name):
+            group.create_dataset(name, data=getattr(rf_station, name))
+    # The tracking changes the RF programs only around the current turn
+    start = max(counter + program_turns[0], 0)
+    stop = min(counter + program_turns[1], rf_station.phi_rf.shape[1])
+    group.attrs['program_start'] = start
+    group.create_dataset('phi_rf', data=rf_station.phi_rf[:, start:stop])
+    group.create_dataset('omega_rf', data=rf_station.omega_rf[:, start:stop])
+
+
+def _restore_rf_station(rf_station, group):
+    # The counter is shared with the trackers
+    rf_station.counter[0] = int(group.attrs['counter'])
+    for name in ['dphi_rf', 'dphi_rf_steering']:
+        if name in group:
+            _restore_value(rf_station, name, group[name])
+    start = int(group.attrs['program_start'])
+    for name in ['phi_rf', 'omega_rf']:
+        data = group[name][()]
+        getattr(rf_station, name)[:, start:start+data.shape[1]] = data
+
+
+def _save_value(group, name, value):
+    # Returns False if the value is not part of the state
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind not in 'biufc':
+            return False
+        dataset = group.create_dataset(name, data=value)
+        dataset.attrs['kind'] = 'array'
+    elif isinstance(value, (bool, np.bool_)):
+        dataset = group.create_dataset(name, data=value)
+        dataset.attrs['kind'] = 'bool'
+    elif isinstance(value, numbers.Number):
+        dataset = group.create_dataset(name, data=value)
+        dataset.attrs['kind'] = 'numpy' if isinstance(value, np.generic) \
+            else type(value).__name__
+    elif isinstance(value, list) and len(value) > 0 and \
+            all(isinstance(v, numbers.Number) for v in value):
+        dataset = group.create_dataset(name, data=np.array(value))
+        dataset.attrs['kind'] = 'list'
+    elif isinstance(value, np.random.Generator):
+        dataset = group.create_dataset(
+            name, data=_rng_state(value.bit_generator.state))
+        dataset.attrs['kind'] = 'generator'
+    elif isinstance(value, np.random.RandomState):
+        dataset = group.create_dataset(name,
+                                       data=_rng_state(value.get_state()))
+        dataset.attrs['kind'] = 'random_state'
+    else:
+        return False
+    return True
+
+
+def _restore_value(obj, name, dataset):
+    kind = dataset.attrs.get('kind', 'array')
+    current = getattr(obj, name, None)
+    data = dataset[()]
+    if kind == 'array':
+        if isinstance(current, np.ndarray) and \
+                (current.shape == data.shape) and \
+                (current.dtype == data.dtype) and current.flags.writeable:
+            # In place, the array may be shared with other objects
+            current[...] = data
+        else:
+            setattr(obj, name, data)
+    elif kind == 'list':
+        if isinstance(current, list) and len(current) == len(data):
+            current[:] = data.tolist()
+        else:
+            setattr(obj, name, data.tolist())
+    elif kind == 'generator':
+        current.bit_generator.state = _rng_from_state(data)
+    elif kind == 'random_state':
+        current.set_state(_rng_from_state(data))
+    elif kind == 'numpy':
+        setattr(obj, name, data)
+    else:
+        setattr(obj, name, {'bool': bool, 'int': int, 'float': float,
+                            'complex': complex}[kind](data))
+
+
+def _save_object(obj, group, visited):
+    visited.add(id(obj))
+    skipped = _skipped_types()
+    for name, value in vars(obj).items():
+        if _save_value(group, name, value):
+            continue
+        if isinstance(value, (list, tuple)):
+            items = [(str(i), v) for i, v in enumerate(value)]
+        elif isinstance(value, dict):
+            items = None
+        else:
+            items = [(None, value)]
+        if items is None:
+            continue
+        for key, item in items:
+            if (not _is_blond_object(item)) or isinstance(item, skipped) or \
+                    (id(item) in visited):
+                continue
+            subgroup = group.require_group(name)
+            if key is not None:
+                subgroup = subgroup.create_group(key)
+            _save_object(item, subgroup, visited)
+
+
+def _restore_object(obj, group):
+    for name, item in group.items():
+        if isinstance(item, hp.Dataset):
+            _restore_value(obj, name, item)
+            continue
+        value = getattr(obj, name)
+        if isinstance(value, (list, tuple)):
+            for key, subgroup in item.items():
+                _restore_object(value[int(key)], subgroup)
+        else:
+            _restore_object(value, item)
@@ -0,0 +1,148 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""Module to plan ahead the FFTW transforms of a simulation, and to share the
+FFTW wisdom between processes through a file.
+
+The plans of the FFTW transforms (bm.use_fftw()) are otherwise created at the
+first transform of every size, by every process. With the wisdom of a
+previous run, creating the same plans is almost instantaneous.
+"""
+
+from __future__ import division
+import os
+from . import bmath as bm
+from . import butils_wrap
+
+
+def fftw_enabled():
+    '''True if the FFTs are computed by FFTW, see bm.use_fftw(): the
+    FFTW transforms are selected and the library is compiled with them.
+    '''
+
+    return (getattr(bm, 'rfft', None) is butils_wrap.rfft) and \
+        butils_wrap.fftw_available()
+
+
+def wisdom_file(filename=None):
+    '''Returns the wisdom file of the current precision, the wisdom of
+    the single and double precision transforms being kept apart.
+
+    Parameters
+    ----------
+    filename : str
+        base name of the wisdom file, defaults to the BLOND_FFTW_WISDOM
+        environment variable. No file is used if neither is given.
+    '''
+
+    if filename is None:
+        filename = os.environ.get('BLOND_FFTW_WISDOM', None)
+    if not filename:
+        return None
+    return '{}.{}'.format(filename, bm.precision.str)
+
+
+def load_wisdom(filename=None):
+    '''Imports the wisdom of the file, if it exists. Returns True if the
+    wisdom was imported.
+    '''
+
+    filename = wisdom_file(filename)
+    if (filename is None) or (not os.path.exists(filename)):
+        return False
+    return bm.import_fft_wisdom(filename)
+
+
+def save_wisdom(filename=None):
+    '''Exports the wisdom to the file. The wisdom already in the file is
+    merged first, and the file is replaced atomically, so that processes
+    saving to the same file do not corrupt it. Returns True on success.
+    '''
+
+    filename = wisdom_file(filename)
+    if filename is None:
+        return False
+    if os.path.exists(filename):
+        bm.import_fft_wisdom(filename)
+    temporary = '{}.{}.tmp'.format(filename, os.getpid())
+    if not bm.export_fft_wisdom(temporary):
+        return False
+    os.replace(temporary, filename)
+    return True
+
+
+def simulation_fft_sizes(profile=None, total_induced_voltage=None):
+    '''Returns the sorted sizes of the real FFTs computed turn after turn:
+    the beam spectrum and multi-turn wake of every induced voltage, and the
+    plain spectrum of the profile.
+    '''
+
+    sizes = set()
+    if profile is not None:
+        sizes.add(int(profile.n_slices))
+    if total_induced_voltage is not None:
+        for induced_voltage in total_induced_voltage.induced_voltage_list:
+            if hasattr(induced_voltage, 'n_fft'):
+                sizes.add(int(induced_voltage.n_fft))
+            if getattr(induced_voltage, 'multi_turn_wake', False) and \
+                    induced_voltage.mtw_mode == 'freq':
+                sizes.add(int(induced_voltage.n_mtw_fft))
+    return sorted(sizes)
+
+
+def plan_ffts(sizes):
+    '''Creates the plans of the rfft of every size and of the irfft back
+    to it.
+    '''
+
+    for n in sizes:
+        bm.plan_rfft(n)
+        # irfft with the default output size of 2 * (n // 2 + 1 - 1) points
+        bm.plan_irfft(2 * (n // 2))
+        # and with the odd size given explicitly, as for the multi-turn wake
+        if n % 2:
+            bm.plan_irfft(n)
+
+
+def plan_simulation(profile=None, total_induced_voltage=None, filename=None):
+    '''Plans the FFTs of a simulation before tracking, using and updating
+    the wisdom file. In MPI mode, a single process per node saves the wisdom.
+    Does nothing if the FFTs are not computed by FFTW.
+
+    Parameters
+    ----------
+    profile : Profile
+        profile whose spectrum is computed.
+    total_induced_voltage : TotalInducedVoltage
+        induced voltages whose FFTs are computed.
+    filename : str
+        base name of the wisdom file, see wisdom_file().
+
+    Returns
+    -------
+    sizes : list
+        sizes of the planned FFTs.
+    '''
+
+    if not fftw_enabled():
+        return []
+
+    load_wisdom(filename)
+    misses = bm.fft_plan_statistics()['misses']
+    sizes = simulation_fft_sizes(profile, total_induced_voltage)
+    plan_ffts(sizes)
+
+    if bm.fft_plan_statistics()['misses'] > misses:
+        save = True
+        if bm.mpiMode():
+            from .mpi_config import worker
+            save = (worker.noderank == 0)
+        if save:
+            save_wisdom(filename)
+    return sizes
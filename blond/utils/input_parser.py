@@ -27,8 +27,13 @@ parser.add_argument('-precision', '--precision', type=str, choices=['single', 'd
                     default='double',
                     help='Floating point precision.')
 
-parser.add_argument('-approx', '--approx', type=int, choices=[0, 1, 2], default=0,
-                    help='Which approximation to use: 0 (No approx), 1 (global reduce), 2 (scale histo).')
+parser.add_argument('-approx', '--approx', type=int, choices=[0, 1, 2, 3], default=0,
+                    help='Which approximation to use: 0 (No approx), 1 (global reduce), 2 (scale histo), '
+                    '3 (adaptive reduce interval, see -approxtol).')
+
+parser.add_argument('-approxtol', '--approxtol', type=float, default=1e-2,
+                    help='Tolerance on the relative error of the induced voltage of approx 3.'
+                    '\nDefault: 0.01')
 
 parser.add_argument('-withtp', '--withtp', type=int, default=0, choices=[0, 1],
                     help='Use task-parallelism. Default: 0')
@@ -66,6 +71,15 @@ parser.add_argument('-seed', '--seed', type=int, default=0,
                     help='Seed value for the particle distribution generation.'
                     '\nDefault: None')
 
+parser.add_argument('-fftw', '--fftw', type=int, default=0, choices=[0, 1],
+                    help='Compute the FFTs with FFTW (1) or numpy (0).'
+                    '\nDefault: 0')
+
+parser.add_argument('-wisdom', '--wisdom', type=str, default=None,
+                    help='Base name of the FFTW wisdom file shared by the runs, '
+                    'used to plan the FFTs before tracking.'
+                    '\nDefault: the BLOND_FFTW_WISDOM environment variable.')
+
 parser.add_argument('-gpu', '--gpu', type=int, default=0,
                     help='Use the GPU to run the computational core: 0 (OFF), num (ON, number of gpus to use)'
                     'Default: 0 (OFF)')
@@ -95,6 +109,15 @@ parser.add_argument('-lb', '--loadbalance', type=str,
                     'keep: Only consider the last keep number of measurements. Default: 20'
                     'Default: off ')
 
+parser.add_argument('-balancer', '--balancer', type=str,
+                    default='linear', choices=['linear', 'predictive'],
+                    help='Load balancer model.\n'
+                    'linear: linear fit of the compute time of every node.\n'
+                    'predictive: per worker compute and communication models, '
+                    'particles moved only if the predicted saving exceeds the '
+                    'migration cost.\n'
+                    'Default: linear')
+
 
 parser.add_argument('-artificialdelay', '--artificialdelay', type=str,
                     default='off',
@@ -0,0 +1,247 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Load balancers of the dynamic load balancing of the MPI workers, see
+Worker.initDLB and Worker.DLB.**
+'''
+
+from __future__ import division
+from abc import ABC, abstractmethod
+import numpy as np
+from mpi4py import MPI
+
+from .mpi_config import calc_transactions
+
+
+class LoadBalancer(ABC):
+    r"""
+    Interface of the load balancers. Worker.DLB calls balance on the turns
+    of the inter-node balancing and intra_balance on the turns of the
+    intra-node balancing, with the times [s] spent by this worker since the
+    previous call. Both return the number of turns after which to balance
+    again, used by the 'dynamic' load balancing. balance must be
+    implemented; by default, intra_balance does nothing.
+
+    Parameters
+    ----------
+    worker : Worker
+        the worker of this process
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    @abstractmethod
+    def balance(self, turn, beam, tcomp, tcomm, tsync, tconst):
+        pass
+
+    def intra_balance(self, turn, beam, tcomp, tcomm, tsync, tconst):
+        return 0
+
+
+class LinearBalancer(LoadBalancer):
+    r"""
+    Balancer fitting the compute time of every node, and of every worker of
+    a node, as linear in the number of particles, see Worker.redistribute
+    and Worker.intra_redistribute. The communication and synchronisation
+    times are not modelled.
+    """
+
+    def balance(self, turn, beam, tcomp, tcomm, tsync, tconst):
+        return self.worker.redistribute(turn, beam, tcomp=tcomp, tconst=tconst)
+
+    def intra_balance(self, turn, beam, tcomp, tcomm, tsync, tconst):
+        return self.worker.intra_redistribute(turn, beam, tcomp=tcomp,
+                                              tconst=tconst)
+
+
+class PredictiveBalancer(LoadBalancer):
+    r"""
+    Balancer predicting the time per turn of every worker from separate
+    models of its compute time, linear in the number of particles, and of
+    its communication time, independent of it. The synchronisation time is
+    the consequence of the imbalance and is not predicted. The particles are
+    moved only if the time saved over the next interval, predicted from the
+    models, exceeds the estimated cost of the migration by the factor
+    hysteresis, which stops workers of different speed (e.g. CPU and GPU
+    workers, see Worker.assignGPUs) from exchanging particles back and forth
+    because of noise in the measurements. All the workers are balanced
+    together, intra_balance does nothing.
+
+    Parameters
+    ----------
+    worker : Worker
+        the worker of this process
+    decay : float
+        the measurements are weighted by exp(-x/decay), x the number of
+        measurements since (default: worker.dlb['decay'])
+    keep : int
+        number of measurements kept (default: worker.dlb['coeffs_keep'])
+    cutoff : float
+        minimum number of particles of a transaction, relative to the mean
+        number of particles per worker (default: worker.dlb['cutoff'])
+    hysteresis : float
+        minimum ratio of the predicted saving over the migration cost to
+        move particles
+    min_share : float
+        minimum number of particles per worker, relative to the mean
+
+    Attributes
+    ----------
+    decisions : list
+        a dict per call of balance: turn, predicted time per turn before and
+        after, predicted saving and migration cost [s], particles moved and
+        whether the particles were moved
+    migration_bandwidth : float
+        bytes per second of the migrations, measured at every migration
+        (initial value as class attribute)
+    migration_latency : float
+        time [s] per message of the migrations (class attribute)
+    max_interval : int
+        maximum number of turns between two balancings (class attribute)
+    """
+
+    migration_bandwidth = 1e9
+    migration_latency = 1e-5
+    max_interval = 4000
+
+    def __init__(self, worker, decay=None, keep=None, cutoff=None,
+                 hysteresis=2., min_share=0.1):
+
+        LoadBalancer.__init__(self, worker)
+        self.decay = worker.dlb['decay'] if decay is None else decay
+        self.keep = worker.dlb['coeffs_keep'] if keep is None else keep
+        self.cutoff = worker.dlb['cutoff'] if cutoff is None else cutoff
+        self.hysteresis = hysteresis
+        self.min_share = min_share
+        self.history = {'particles': [], 'tcomp': [], 'tcomm': []}
+        self.decisions = []
+        self.last_turn = 0
+        self.interval = worker.start_interval
+
+    def _record(self, n_macroparticles, tcomp, tcomm, turns):
+        for key, value in (('particles', n_macroparticles),
+                           ('tcomp', tcomp / turns), ('tcomm', tcomm / turns)):
+            self.history[key] = (self.history[key] + [value])[-self.keep:]
+
+    def cost_model(self):
+        """
+        Returns the compute time per turn and particle, the compute time per
+        turn independent of the particles and the communication time per
+        turn of this worker, from the weighted measurements.
+        """
+        particles = np.array(self.history['particles'], dtype=float)
+        tcomp = np.array(self.history['tcomp'])
+        tcomm = np.array(self.history['tcomm'])
+        weights = np.exp(-(len(tcomp) - 1 - np.arange(len(tcomp))) /
+                         self.decay)
+
+        if len(np.unique(particles)) > 1:
+            slope, intercept = np.polyfit(particles, tcomp, deg=1, w=weights)
+        else:
+            slope, intercept = 0., 0.
+        if slope <= 0:
+            # Not enough different loads measured, all the compute time is
+            # taken as proportional to the particles
+            slope = np.average(tcomp / np.maximum(particles, 1),
+                               weights=weights)
+            intercept = 0.
+        return max(slope, 1e-30), intercept, np.average(tcomm, weights=weights)
+
+    def target(self, slopes, constants, particles):
+        """
+        Returns the number of particles per worker equalising the predicted
+        time per turn, at least min_share of the mean, summing to the current
+        total.
+        """
+        total = np.sum(particles)
+        t_turn = (total + np.sum(constants / slopes)) / np.sum(1. / slopes)
+        target = np.maximum((t_turn - constants) / slopes,
+                            self.min_share * total / len(particles))
+        target = np.floor(target * total / np.sum(target))
+        # The rounding remainder goes to the fastest workers
+        remainder = int(total - np.sum(target))
+        target[np.argsort(slopes)[:remainder]] += 1
+        return target
+
+    def migration_cost(self, dPi, bytes_per_particle):
+        """
+        Estimated time [s] of the migration of dPi particles (positive sent,
+        negative received), limited by the worker moving the most.
+        """
+        messages = np.count_nonzero(dPi) * 3
+        return np.max(np.abs(dPi)) * bytes_per_particle / \
+            self.migration_bandwidth + messages * self.migration_latency
+
+    def balance(self, turn, beam, tcomp, tcomm, tsync, tconst):
+        worker = self.worker
+        turns = max(turn - self.last_turn, 1)
+        self.last_turn = turn
+        self._record(beam.n_macroparticles, tcomp, tcomm, turns)
+        slope, intercept, comm = self.cost_model()
+
+        sendbuf = np.array([slope, intercept + comm, beam.n_macroparticles],
+                           dtype=float)
+        recvbuf = np.empty(len(sendbuf) * worker.workers, dtype=float)
+        worker.intercomm.Allgather(sendbuf, recvbuf)
+        slopes = recvbuf[::3]
+        constants = recvbuf[1::3]
+        particles = recvbuf[2::3]
+
+        target = self.target(slopes, constants, particles)
+        dPi = particles - target
+        cutoff = self.cutoff * np.sum(particles) / worker.workers
+        transactions = calc_transactions(dPi, cutoff=cutoff)
+        moved = np.array([np.sum([t[1] for t in transactions[i]])
+                          for i in range(worker.workers)]) * np.sign(dPi)
+
+        # The prediction uses the particles actually moved, the transactions
+        # below the cutoff being dropped
+        t_before = np.max(slopes * particles + constants)
+        t_after = np.max(slopes * (particles - moved) + constants)
+        saving = (t_before - t_after) * self.interval
+        bytes_per_particle = beam.dE.itemsize + beam.dt.itemsize + \
+            beam.id.itemsize
+        cost = self.migration_cost(moved, bytes_per_particle)
+        migrate = np.any(moved != 0) and (saving > self.hysteresis * cost)
+
+        if migrate:
+            start = MPI.Wtime()
+            if len(transactions[worker.rank]) > 0:
+                worker.migrate(beam, transactions[worker.rank],
+                               moved[worker.rank] > 0, worker.intercomm)
+            elapsed = worker.allreduce(np.array([MPI.Wtime() - start]),
+                                       operator='max')[0]
+            if elapsed > self.migration_latency:
+                self.migration_bandwidth = np.max(np.abs(moved)) * \
+                    bytes_per_particle / elapsed
+            self.interval = worker.start_interval
+        else:
+            self.interval = min(2 * self.interval, self.max_interval)
+
+        decision = {'turn': turn, 't_before': t_before, 't_after': t_after,
+                    'saving': saving, 'cost': cost,
+                    'particles_moved': int(np.sum(np.abs(moved)) // 2),
+                    'migrated': bool(migrate)}
+        self.decisions.append(decision)
+        if worker.log:
+            worker.logger.info(
+                'DLB [{}]: Turn {}, Tturn {:g} -> {:g}, Saving {:g}, '
+                'Cost {:g}, Particles {}, Migrated {}'.format(
+                    worker.rank, turn, t_before, t_after, saving, cost,
+                    decision['particles_moved'], migrate))
+
+        if migrate:
+            return worker.start_turn
+        return self.interval
+
+
+load_balancers = {'linear': LinearBalancer,
+                  'predictive': PredictiveBalancer}
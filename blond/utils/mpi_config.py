@@ -1,10 +1,12 @@
 import sys
 import os
+import io
+import pickle
 from mpi4py import MPI
 import numpy as np
 import logging
 from functools import wraps
-import socket
+import time
 
 try:
     from pyprof import timing
@@ -18,6 +20,13 @@ from ..utils import bmath as bm
 worker = None
 
 
+def _count(key, value):
+    # Quantities other than times reported through the timing layer, if it
+    # has counters
+    if hasattr(timing, 'count'):
+        timing.count(key, value)
+
+
 def mpiprint(*args, all=False):
     if worker.isMaster or all:
         print('[{}]'.format(worker.rank), *args)
@@ -58,6 +67,13 @@ class Worker:
                              'intra_particles': [0], 'intra_times': [0],
                              'intra_load': None}
         self.taskparallelism = False
+        # Start times of the pending non-blocking reductions, and the total
+        # time [s] they overlapped with other work
+        self._pending_allreduces = {}
+        self.allreduce_overlap_time = 0.
+        # Encodings of allreduce_histogram, chosen from the previous
+        # reduction of a histogram of the same size
+        self._histogram_plans = {}
 
         # Global inter-communicator
         self.intercomm = MPI.COMM_WORLD
@@ -66,15 +82,24 @@ class Worker:
 
         # Setup TP intracomm
         self.hostname = MPI.Get_processor_name()
-        self.hostip = socket.gethostbyname(self.hostname)
 
-        # Create communicator with processes on the same host
-        color = np.dot(np.array(self.hostip.split('.'), int)
-                       [1:], [1, 256, 256**2])
-        self.nodecomm = self.intercomm.Split(color, self.rank)
+        # Create communicator with processes sharing memory, i.e. on the
+        # same node
+        self.nodecomm = self.intercomm.Split_type(MPI.COMM_TYPE_SHARED,
+                                                  key=self.rank)
         self.noderank = self.nodecomm.rank
         self.nodeworkers = self.nodecomm.size
 
+        # Communicator of the first process of every node, COMM_NULL for
+        # the others
+        self.leadercomm = self.intercomm.Split(
+            0 if self.noderank == 0 else MPI.UNDEFINED, self.rank)
+        # Node-shared arrays of the hierarchical reductions
+        self._node_reductions = {}
+        # Node-shared windows of the objects of node_shared, and their
+        # arrays of bytes
+        self._shared_windows = []
+
         # Break the hostcomm in neighboring pairs
         self.intracomm = self.nodecomm.Split(self.noderank//2, self.noderank)
         self.intraworkers = self.intracomm.size
@@ -198,6 +223,14 @@ class Worker:
                                   [recvbuf, counts, displs, recvbuf.dtype.char])
         return recvbuf
 
+    def split_counts(self, total_size):
+        '''
+        Number of elements of every worker when total_size elements are split
+        among the workers, in rank order, as done by scatter.
+        '''
+        return [total_size // self.workers + 1 if i < total_size % self.workers
+                else total_size // self.workers for i in range(self.workers)]
+
     @timing.timeit(key='comm:scatter')
     # @mpiprof.traceit(key='comm:scatter')
     def scatter(self, var):
@@ -207,8 +240,7 @@ class Worker:
         total_size = int(self.intercomm.bcast(len(var), root=0))
 
         # Then calculate the counts (size for each worker)
-        counts = [total_size // self.workers + 1 if i < total_size % self.workers
-                  else total_size // self.workers for i in range(self.workers)]
+        counts = self.split_counts(total_size)
 
         if self.isMaster:
             displs = np.append([0], np.cumsum(counts[:-1]))
@@ -289,7 +321,7 @@ class Worker:
         if comm is None:
             comm = self.intercomm
         # supported ops:
-        # sum, mean, std, max, min, prod, custom_sum
+        # sum, mean, std, max, min, prod, custom_sum, beam_statistics
         if self.log:
             self.logger.debug('reduce')
         operator = operator.lower()
@@ -324,6 +356,8 @@ class Worker:
             op = MPI.PROD
         elif operator in ['mean', 'avg']:
             op = MPI.SUM
+        elif operator == 'beam_statistics':
+            op = beam_statistics_op
         elif operator == 'std':
             recvbuf = self.gather(sendbuf)
             if worker.isMaster:
@@ -336,10 +370,13 @@ class Worker:
 
         if worker.isMaster:
             if (recvbuf is None) or (sendbuf is recvbuf):
-                comm.Reduce(MPI.IN_PLACE, sendbuf, op=op, root=0)
+                comm.Reduce(MPI.IN_PLACE, self._reduce_buffer(sendbuf, operator),
+                            op=op, root=0)
                 recvbuf = sendbuf
             else:
-                comm.Reduce(sendbuf, recvbuf, op=op, root=0)
+                comm.Reduce(self._reduce_buffer(sendbuf, operator),
+                            self._reduce_buffer(recvbuf, operator),
+                            op=op, root=0)
 
             if operator in ['mean', 'avg']:
                 return recvbuf / self.workers
@@ -347,7 +384,8 @@ class Worker:
                 return recvbuf
         else:
             recvbuf = None
-            comm.Reduce(sendbuf, recvbuf, op=op, root=0)
+            comm.Reduce(self._reduce_buffer(sendbuf, operator), recvbuf,
+                        op=op, root=0)
             return sendbuf
 
     @timing.timeit(key='comm:allreduce')
@@ -358,7 +396,7 @@ class Worker:
             comm = self.intercomm
 
         # supported ops:
-        # sum, mean, std, max, min, prod, custom_sum
+        # sum, mean, std, max, min, prod, custom_sum, beam_statistics
         if self.log:
             self.logger.debug('allreduce')
         operator = operator.lower()
@@ -393,6 +431,8 @@ class Worker:
             op = MPI.PROD
         elif operator in ['mean', 'avg']:
             op = MPI.SUM
+        elif operator == 'beam_statistics':
+            op = beam_statistics_op
         elif operator == 'std':
             recvbuf = self.allgather(sendbuf)
             assert len(recvbuf) == 3 * self.workers
@@ -401,10 +441,12 @@ class Worker:
             return np.array([np.sqrt(totals / (np.sum(recvbuf[2::3]) - 1))])
 
         if (recvbuf is None) or (sendbuf is recvbuf):
-            comm.Allreduce(MPI.IN_PLACE, sendbuf, op=op)
+            comm.Allreduce(MPI.IN_PLACE, self._reduce_buffer(sendbuf, operator),
+                           op=op)
             recvbuf = sendbuf
         else:
-            comm.Allreduce(sendbuf, recvbuf, op=op)
+            comm.Allreduce(self._reduce_buffer(sendbuf, operator),
+                           self._reduce_buffer(recvbuf, operator), op=op)
 
         if operator in ['mean', 'avg']:
 
@@ -412,6 +454,334 @@ class Worker:
         else:
             return recvbuf
 
+    # Encodings of allreduce_histogram, the narrowest unsigned type holding
+    # the sum of the counts is used
+    histogram_dtypes = (np.uint8, np.uint16, np.uint32, np.uint64)
+    # Margin of the encodings chosen from the previous reduction, on the
+    # maximum count and on the number of non-empty bins
+    histogram_margin = 2.
+
+    @timing.timeit(key='comm:allreduce')
+    def allreduce_histogram(self, histogram, comm=None):
+        '''
+        Sums in place a histogram of counts (integer values, of any type)
+        over the workers, encoded to send fewer bytes: either reduced
+        densely in the narrowest unsigned type that cannot overflow, or, if
+        the non-empty bins take fewer bytes, gathered as (index, count)
+        lists and summed by every worker. The encoding is chosen from the
+        previous reduction of a histogram of the same size, with the margin
+        histogram_margin, and the statistics of the next choice travel with
+        the histogram: a flag per worker whose maximum count exceeds its
+        share of the type in the dense reduction, the maximum and number of
+        non-empty bins of every worker in the gathered lists. Only the first
+        reduction, and the rare ones that do not fit the chosen encoding,
+        gather these statistics first, see _allreduce_histogram_exact. The
+        bytes sent, and saved compared to the uint32 histogram of
+        Profile.reduce_histo, are counted per encoding in the timing layer
+        (comm:histogram_bytes:<encoding>, comm:histogram_bytes_saved:<encoding>).
+        '''
+        if comm is None:
+            comm = self.intercomm
+
+        nonzero = np.flatnonzero(histogram)
+        local_max = int(histogram[nonzero].max()) if len(nonzero) else 0
+        key = (comm.py2f(), len(histogram))
+        plan = self._histogram_plans.get(key)
+
+        if plan is None:
+            encoding, sent = self._allreduce_histogram_exact(
+                histogram, nonzero, local_max, comm, key)
+        elif plan[0] == 'dense':
+            dtype = plan[1]
+            buffer = np.empty(len(histogram) + 1, dtype=dtype)
+            buffer[:-1] = histogram
+            # Set if the sum might not fit in the type
+            buffer[-1] = local_max > np.iinfo(dtype).max // comm.size
+            comm.Allreduce(MPI.IN_PLACE, buffer,
+                           op=_histogram_ops.get(dtype.name, MPI.SUM))
+            if buffer[-1] > 0:
+                encoding, sent = self._allreduce_histogram_exact(
+                    histogram, nonzero, local_max, comm, key)
+            else:
+                encoding, sent = dtype.name, buffer.nbytes
+                histogram[:] = buffer[:-1]
+                # The counts of the workers are only known through their
+                # sum, the same on all the workers
+                total_max = int(histogram.max())
+                self._plan_histogram(key, comm.size, len(histogram),
+                                     total_max, total_max / comm.size,
+                                     np.count_nonzero(histogram))
+        else:
+            dtype, capacity = plan[1], plan[2]
+            header = np.array([len(nonzero), local_max], dtype=np.uint64)
+            size = header.nbytes + capacity * (4 + dtype.itemsize)
+            sendbuf = np.zeros(size, dtype=np.uint8)
+            sendbuf[:header.nbytes] = header.view(np.uint8)
+            kept = nonzero[:capacity]
+            indices = sendbuf[header.nbytes:header.nbytes + 4 * capacity]
+            indices.view(np.uint32)[:len(kept)] = kept
+            values = sendbuf[header.nbytes + 4 * capacity:]
+            values.view(dtype)[:len(kept)] = histogram[kept]
+            recvbuf = np.empty(size * comm.size, dtype=np.uint8)
+            comm.Allgather(sendbuf, recvbuf)
+
+            recvbuf = recvbuf.reshape(comm.size, size)
+            headers = recvbuf[:, :header.nbytes].copy().view(np.uint64)
+            counts, maxima = headers[:, 0].astype(int), headers[:, 1]
+            if (counts.max() > capacity) or \
+                    (maxima.max() > np.iinfo(dtype).max):
+                encoding, sent = self._allreduce_histogram_exact(
+                    histogram, nonzero, local_max, comm, key)
+            else:
+                encoding, sent = 'sparse_' + dtype.name, size
+                all_indices = recvbuf[:, header.nbytes:
+                                      header.nbytes + 4 * capacity]
+                all_values = recvbuf[:, header.nbytes + 4 * capacity:]
+                used = np.arange(capacity) < counts[:, None]
+                histogram[:] = np.bincount(
+                    all_indices.copy().view(np.uint32)[used],
+                    weights=all_values.copy().view(dtype)[used],
+                    minlength=len(histogram))
+                self._plan_histogram(key, comm.size, len(histogram),
+                                     int(histogram.max()), int(maxima.max()),
+                                     int(counts.max()))
+
+        saved = len(histogram) * np.dtype(np.uint32).itemsize - sent
+        _count('comm:histogram_bytes:' + encoding, sent)
+        _count('comm:histogram_bytes_saved:' + encoding, saved)
+        if self.log:
+            self.logger.debug('allreduce_histogram {}: {} bytes, {} saved'.format(
+                encoding, sent, saved))
+        return histogram
+
+    def _allreduce_histogram_exact(self, histogram, nonzero, local_max, comm,
+                                   key):
+        '''
+        Reduction of allreduce_histogram gathering first the maximum and the
+        number of non-empty bins of every worker, from which the encoding is
+        chosen exactly: the sum of the maxima gives the type of the dense
+        reduction. Returns the encoding and the bytes sent.
+        '''
+        stats = np.array([local_max, len(nonzero)], dtype=np.uint64)
+        all_stats = np.empty(2 * comm.size, dtype=np.uint64)
+        comm.Allgather(stats, all_stats)
+        bound = int(np.sum(all_stats[::2]))
+        counts = all_stats[1::2].astype(int)
+
+        dtype = self._histogram_dtype(bound)
+        dense_bytes = len(histogram) * dtype.itemsize
+        sparse_bytes = int(np.sum(counts)) * (4 + dtype.itemsize)
+
+        if sparse_bytes < dense_bytes:
+            encoding = 'sparse_' + dtype.name
+            sent = sparse_bytes
+            displs = np.append([0], np.cumsum(counts[:-1]))
+            indices = np.empty(np.sum(counts), dtype=np.uint32)
+            values = np.empty(np.sum(counts), dtype=dtype)
+            comm.Allgatherv(nonzero.astype(np.uint32),
+                            [indices, (counts, displs)])
+            comm.Allgatherv(histogram[nonzero].astype(dtype),
+                            [values, (counts, displs)])
+            histogram[:] = np.bincount(indices, weights=values,
+                                       minlength=len(histogram))
+        else:
+            encoding = dtype.name
+            sent = dense_bytes
+            buffer = histogram.astype(dtype)
+            comm.Allreduce(MPI.IN_PLACE, buffer,
+                           op=_histogram_ops.get(dtype.name, MPI.SUM))
+            histogram[:] = buffer
+
+        self._plan_histogram(key, comm.size, len(histogram),
+                             int(histogram.max()) if len(histogram) else 0,
+                             int(all_stats[::2].max()), int(counts.max()))
+        return encoding, sent
+
+    def _histogram_dtype(self, bound):
+        for dtype in self.histogram_dtypes:
+            if bound <= np.iinfo(dtype).max:
+                break
+        return np.dtype(dtype)
+
+    def _plan_histogram(self, key, workers, n_bins, total_max, worker_max,
+                        worker_nonzero):
+        # Encoding of the next reduction of the histograms of n_bins bins,
+        # from the maximum of the sum and, per worker, the maximum count
+        # and number of non-empty bins of this reduction
+        margin = self.histogram_margin
+        dense = self._histogram_dtype(
+            max(margin * total_max, margin * worker_max * workers, workers))
+        sparse = self._histogram_dtype(margin * worker_max)
+        capacity = int(np.ceil(margin * max(worker_nonzero, 1)))
+        dense_bytes = (n_bins + 1) * dense.itemsize
+        sparse_bytes = 16 + capacity * (4 + sparse.itemsize)
+        if sparse_bytes < dense_bytes:
+            self._histogram_plans[key] = ('sparse', sparse, capacity)
+        else:
+            self._histogram_plans[key] = ('dense', dense)
+
+    @timing.timeit(key='comm:iallreduce')
+    def iallreduce(self, sendbuf, recvbuf, comm=None):
+        '''
+        Starts the sum of sendbuf over the workers into recvbuf, and returns
+        the request to pass to wait_allreduce. Both buffers must stay
+        untouched until then. The time spent waiting is reported as
+        comm:allreduce, the time between the two calls is accumulated
+        separately in allreduce_overlap_time.
+        '''
+        if comm is None:
+            comm = self.intercomm
+
+        if self.log:
+            self.logger.debug('iallreduce')
+
+        request = comm.Iallreduce(sendbuf, recvbuf, op=MPI.SUM)
+        self._pending_allreduces[id(request)] = time.perf_counter()
+        return request
+
+    @timing.timeit(key='comm:allreduce')
+    def wait_allreduce(self, request):
+        start = self._pending_allreduces.pop(id(request), None)
+        if start is not None:
+            self.allreduce_overlap_time += time.perf_counter() - start
+
+        if self.log:
+            self.logger.debug('wait_allreduce')
+        request.Wait()
+
+    def allocate_shared(self, shape, dtype):
+        '''
+        Allocates an array shared by the processes of the node, returns the
+        MPI window and the array. The memory is allocated by the first
+        process of the node, the others attach to it without copy.
+        '''
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        win = MPI.Win.Allocate_shared(nbytes if self.noderank == 0 else 0,
+                                      dtype.itemsize, comm=self.nodecomm)
+        buf, itemsize = win.Shared_query(0)
+        array = np.ndarray(buffer=buf, dtype=dtype, shape=shape)
+        # Passive target epoch, to synchronise the memory with win.Sync()
+        win.Lock_all(MPI.MODE_NOCHECK)
+        return win, array
+
+    def node_reduction(self, n, dtype):
+        '''
+        Returns the NodeReduction of arrays of n elements of dtype, created
+        at the first call.
+        '''
+        key = (int(n), np.dtype(dtype).str)
+        if key not in self._node_reductions:
+            self._node_reductions[key] = NodeReduction(self, n, dtype)
+        return self._node_reductions[key]
+
+    def node_shared(self, build, *args, private=(), min_bytes=1024,
+                    **kwargs):
+        '''
+        Returns the object build(*args, **kwargs), e.g. a Ring, an RFStation,
+        an impedance table or a FlatSpectrum noise, built by the first
+        process of the node only. Its numpy arrays of at least min_bytes
+        bytes are copied to memory shared by the node, and every process
+        gets a copy of the object whose arrays are read-only views of that
+        memory, with the same attribute names. The arrays already in memory
+        shared by an earlier call (e.g. the programs of the Ring given to an
+        RFStation) are not copied again, and the arguments of build (e.g.
+        the beam or the profile) referenced by the object are the ones of
+        each process. The arrays of the attributes named in private, e.g.
+        the phi_rf and omega_rf of an RFStation changed by the feedbacks,
+        are copied to each process and stay writable. The object must be
+        identical on all the processes of the node, and picklable.
+        '''
+        arguments = list(args) + list(kwargs.values())
+        if self.noderank == 0:
+            obj = build(*args, **kwargs)
+            private_ids = set(id(getattr(obj, name)) for name in private)
+            arrays = []
+            pickled = io.BytesIO()
+            pickler = pickle.Pickler(pickled, pickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = lambda value: self._shared_id(
+                value, arguments, private_ids, arrays, min_bytes)
+            pickler.dump(obj)
+            nbytes = 0
+            if len(arrays) > 0:
+                nbytes = arrays[-1][1] + arrays[-1][0].nbytes
+            message = (pickled.getvalue(), nbytes)
+        else:
+            message = None
+        pickled, nbytes = self.nodecomm.bcast(message, root=0)
+
+        if nbytes > 0:
+            win, buffer = self.allocate_shared((nbytes,), np.uint8)
+            if self.noderank == 0:
+                for array, offset in arrays:
+                    buffer[offset:offset+array.nbytes] = \
+                        np.ascontiguousarray(array).view(np.uint8).ravel()
+            win.Sync()
+            self.nodecomm.Barrier()
+            win.Sync()
+            self._shared_windows.append((win, buffer))
+
+        unpickler = pickle.Unpickler(io.BytesIO(pickled))
+        unpickler.persistent_load = lambda pid: self._shared_load(
+            pid, arguments)
+        return unpickler.load()
+
+    def _shared_id(self, value, arguments, private_ids, arrays, min_bytes):
+        # Persistent id of the arguments of build and of the node-shared
+        # arrays in node_shared, None for the values pickled as usual
+        for index, argument in enumerate(arguments):
+            if value is argument and not isinstance(
+                    argument, (str, bytes, int, float, complex, bool, tuple,
+                               type(None))):
+                return ('argument', index)
+        if (type(value) is not np.ndarray) or \
+                (value.dtype.kind not in 'biufc') or (id(value) in private_ids):
+            return None
+
+        # In a window of an earlier call
+        address = value.__array_interface__['data'][0]
+        for index, (win, buffer) in enumerate(self._shared_windows):
+            start = buffer.__array_interface__['data'][0]
+            if start <= address < start + buffer.nbytes:
+                return ('window', index, address - start, value.shape,
+                        value.strides, value.dtype.str)
+
+        if value.nbytes < min_bytes:
+            return None
+        for array, offset in arrays:
+            if array is value:
+                break
+        else:
+            # Copied C-contiguous to the new window, aligned to 64 bytes
+            offset = 0
+            if len(arrays) > 0:
+                offset = -(-(arrays[-1][1] + arrays[-1][0].nbytes) // 64) * 64
+            arrays.append((value, offset))
+        return ('array', offset, value.shape, value.dtype.str)
+
+    def _shared_load(self, pid, arguments):
+        # Object of a persistent id of _shared_id
+        if pid[0] == 'argument':
+            return arguments[pid[1]]
+        if pid[0] == 'window':
+            buffer = self._shared_windows[pid[1]][1]
+            offset, shape, strides, dtype = pid[2:]
+        else:
+            # In the window of this call
+            buffer = self._shared_windows[-1][1]
+            offset, shape, dtype = pid[1:]
+            strides = None
+        array = np.ndarray(shape, dtype, buffer=buffer, offset=offset,
+                           strides=strides)
+        array.flags.writeable = False
+        return array
+
+    def _reduce_buffer(self, buffer, operator):
+        # The beam statistics are reduced as elements of 10 doubles
+        if operator == 'beam_statistics':
+            return [buffer, len(buffer) // 10, beam_statistics_type]
+        return buffer
+
     @timing.timeit(key='serial:sync')
     # @mpiprof.traceit(key='serial:sync')
     def sync(self):
@@ -454,6 +824,84 @@ class Worker:
             self.intracomm.Sendrecv(recvbuf, dest=0, sendtag=1,
                                     recvbuf=sendbuf, source=0, recvtag=0)
 
+    def migrate(self, beam, transactions, sending, comm):
+        '''
+        Moves particles of the beam between workers. A sender sends the
+        particles at the end of its arrays, a receiver receives them after
+        its particles. The coordinates are sent as they are, one message per
+        coordinate, without packing, and the arrays keep spare capacity, see
+        resize_particles.
+
+        Parameters
+        ----------
+        beam : Beam
+            the local beam
+        transactions : list
+            (rank, number of particles) pairs, in comm
+        sending : bool
+            True if the particles are sent, False if received
+        comm : MPI communicator
+            the communicator of the ranks of the transactions
+        '''
+        total = int(np.sum([t[1] for t in transactions]))
+        coordinates = ('dE', 'dt', 'id')
+        n_macroparticles = int(beam.n_macroparticles)
+        if sending:
+            i = n_macroparticles - total
+        else:
+            i = n_macroparticles
+            self.resize_particles(beam, n_macroparticles + total)
+
+        reqs = []
+        for t in transactions:
+            n = int(t[1])
+            for tag, name in enumerate(coordinates):
+                part = getattr(beam, name)[i:i+n]
+                if sending:
+                    reqs.append(comm.Isend(part, dest=t[0], tag=tag))
+                else:
+                    reqs.append(comm.Irecv(part, source=t[0], tag=tag))
+            i += n
+        MPI.Request.Waitall(reqs)
+
+        if sending:
+            # The particles sent stay in the spare capacity
+            self.resize_particles(beam, n_macroparticles - total)
+
+    # Spare capacity allocated when the particle arrays grow, relative to
+    # the new number of particles
+    migration_headroom = 0.1
+
+    def resize_particles(self, beam, n_macroparticles):
+        '''
+        Changes the number of particles of the beam to n_macroparticles, the
+        new ones uninitialised. The particles of a StoredBeam are resized
+        in its ParticleStore. Otherwise, the dE, dt and id arrays are views
+        of larger buffers: they are shortened or extended in place when the
+        buffer is large enough, otherwise copied once to a buffer with
+        migration_headroom spare capacity.
+        '''
+        from ..beam.beam import StoredBeam
+        if isinstance(beam, StoredBeam):
+            beam.particles.resize(n_macroparticles)
+            return
+
+        for name in ('dE', 'dt', 'id'):
+            array = getattr(beam, name)
+            base = array.base if isinstance(array.base, np.ndarray) else array
+            if (base.ndim == 1) and (base.dtype == array.dtype) and \
+                    base.flags['C_CONTIGUOUS'] and (len(base) >= n_macroparticles) and \
+                    (base.__array_interface__['data'][0] ==
+                     array.__array_interface__['data'][0]):
+                setattr(beam, name, base[:n_macroparticles])
+            else:
+                capacity = int(n_macroparticles * (1 + self.migration_headroom))
+                buffer = np.empty(capacity, dtype=array.dtype)
+                kept = min(len(array), n_macroparticles)
+                buffer[:kept] = array[:kept]
+                setattr(beam, name, buffer[:n_macroparticles])
+        beam.n_macroparticles = n_macroparticles
+
     @timing.timeit(key='comm:redistribute')
     # @mpiprof.traceit(key='comm:redistribute')
     def redistribute(self, turn, beam, tcomp, tconst):
@@ -534,60 +982,9 @@ class Worker:
         # 1% of total/n_workers
         transactions = calc_transactions(
             dPi, cutoff=self.dlb['cutoff'] * P / self.workers)[self.rank]
-        if dPi[self.rank] > 0 and len(transactions) > 0:
-            reqs = []
-            tot_to_send = np.sum([t[1] for t in transactions])
-            i = beam.n_macroparticles - tot_to_send
-            for t in transactions:
-                # I need to send t[1] particles to t[0]
-                # buf[:t[1]] de, then dt, then id
-                buf = np.empty(3*t[1], dtype=float)
-                buf[0:t[1]] = beam.dE[i:i+t[1]]
-                buf[t[1]:2*t[1]] = beam.dt[i:i+t[1]]
-                buf[2*t[1]:3*t[1]] = beam.id[i:i+t[1]]
-                i += t[1]
-                # self.logger.critical(
-                #     '[{}]: Sending {} parts to {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.intercomm.Isend(buf, t[0]))
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            beam.dE = beam.dE[:beam.n_macroparticles-tot_to_send]
-            beam.dt = beam.dt[:beam.n_macroparticles-tot_to_send]
-            beam.id = beam.id[:beam.n_macroparticles-tot_to_send]
-            beam.n_macroparticles -= tot_to_send
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-        elif dPi[self.rank] < 0 and len(transactions) > 0:
-            reqs = []
-            recvbuf = []
-            for t in transactions:
-                # I need to receive t[1] particles from t[0]
-                # The buffer contains: de, dt, id
-                buf = np.empty(3*t[1], float)
-                recvbuf.append(buf)
-                # self.logger.critical(
-                #     '[{}]: Receiving {} parts from {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.intercomm.Irecv(buf, t[0]))
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            tot_to_recv = np.sum([t[1] for t in transactions])
-            beam.dE = np.resize(
-                beam.dE, beam.n_macroparticles + tot_to_recv)
-            beam.dt = np.resize(
-                beam.dt, beam.n_macroparticles + tot_to_recv)
-            beam.id = np.resize(
-                beam.id, beam.n_macroparticles + tot_to_recv)
-            i = beam.n_macroparticles
-            for buf, t in zip(recvbuf, transactions):
-                beam.dE[i:i+t[1]] = buf[0:t[1]]
-                beam.dt[i:i+t[1]] = buf[t[1]:2*t[1]]
-                beam.id[i:i+t[1]] = buf[2*t[1]:3*t[1]]
-                i += t[1]
-            beam.n_macroparticles += tot_to_recv
+        if len(transactions) > 0:
+            self.migrate(beam, transactions, dPi[self.rank] > 0,
+                         self.intercomm)
 
         if np.sum(np.abs(dPi))/2 < 1e-4 * P:
             self.interval = min(2*self.interval, 4000)
@@ -778,60 +1175,9 @@ class Worker:
         # 1% of total/n_workers
         transactions = calc_transactions(
             dPi, cutoff=self.dlb['cutoff'] * P / self.nodeworkers)[self.noderank]
-        if dPi[self.noderank] > 0 and len(transactions) > 0:
-            reqs = []
-            tot_to_send = np.sum([t[1] for t in transactions])
-            i = beam.n_macroparticles - tot_to_send
-            for t in transactions:
-                # I need to send t[1] particles to t[0]
-                # buf[:t[1]] de, then dt, then id
-                buf = np.empty(3*t[1], dtype=float)
-                buf[0:t[1]] = beam.dE[i:i+t[1]]
-                buf[t[1]:2*t[1]] = beam.dt[i:i+t[1]]
-                buf[2*t[1]:3*t[1]] = beam.id[i:i+t[1]]
-                i += t[1]
-                # self.logger.critical(
-                #     '[{}]: Sending {} parts to {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.nodecomm.Isend(buf, t[0]))
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            beam.dE = beam.dE[:beam.n_macroparticles-tot_to_send]
-            beam.dt = beam.dt[:beam.n_macroparticles-tot_to_send]
-            beam.id = beam.id[:beam.n_macroparticles-tot_to_send]
-            beam.n_macroparticles -= tot_to_send
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-        elif dPi[self.noderank] < 0 and len(transactions) > 0:
-            reqs = []
-            recvbuf = []
-            for t in transactions:
-                # I need to receive t[1] particles from t[0]
-                # The buffer contains: de, dt, id
-                buf = np.empty(3*t[1], float)
-                recvbuf.append(buf)
-                # self.logger.critical(
-                #     '[{}]: Receiving {} parts from {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.nodecomm.Irecv(buf, t[0]))
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            tot_to_recv = np.sum([t[1] for t in transactions])
-            beam.dE = np.resize(
-                beam.dE, beam.n_macroparticles + tot_to_recv)
-            beam.dt = np.resize(
-                beam.dt, beam.n_macroparticles + tot_to_recv)
-            beam.id = np.resize(
-                beam.id, beam.n_macroparticles + tot_to_recv)
-            i = beam.n_macroparticles
-            for buf, t in zip(recvbuf, transactions):
-                beam.dE[i:i+t[1]] = buf[0:t[1]]
-                beam.dt[i:i+t[1]] = buf[t[1]:2*t[1]]
-                beam.id[i:i+t[1]] = buf[2*t[1]:3*t[1]]
-                i += t[1]
-            beam.n_macroparticles += tot_to_recv
+        if len(transactions) > 0:
+            self.migrate(beam, transactions, dPi[self.noderank] > 0,
+                         self.nodecomm)
 
         if np.sum(np.abs(dPi))/2 < 1e-4 * P:
             self.interval = min(2*self.interval, 4000)
@@ -870,8 +1216,9 @@ class Worker:
     def timer_reset(self, phase):
         self.times[phase] = {'start': MPI.Wtime(), 'total': 0.}
 
-    def initDLB(self, lbstr, n_iter):
+    def initDLB(self, lbstr, n_iter, balancer='linear'):
         # lbstr = lbtype,lbarg,cutoff,decay
+        # balancer: name in load_balancing.load_balancers, or LoadBalancer
         self.inter_lb_turns = []
 
         self.lb_type = lbstr.split(',')[0]
@@ -913,6 +1260,16 @@ class Worker:
                         'intra_tconst': 0,
                         'intra_tsync': 0,
                         'intra_tcomm': 0}
+
+            from .load_balancing import LoadBalancer, load_balancers
+            if isinstance(balancer, LoadBalancer):
+                self.balancer = balancer
+            elif balancer in load_balancers:
+                self.balancer = load_balancers[balancer](self)
+            else:
+                raise RuntimeError(
+                    'ERROR in Worker.initDLB: Load balancer not recognised, '
+                    'choose from {}'.format(list(load_balancers)))
         # to begin with, we make them equal
         self.intra_lb_turns = np.copy(self.inter_lb_turns)
         return self.inter_lb_turns
@@ -927,9 +1284,10 @@ class Worker:
                 tsync_new = timing.get(
                     ['serial:sync', 'serial:intraSync', 'serial:gpuSync'])
                 if self.lb_type != 'reportonly':
-                    intv = self.intra_redistribute(turn, beam,
+                    intv = self.balancer.intra_balance(turn, beam,
                                                 tcomp=tcomp_new -
                                                 self.dlb['intra_tcomp'],
+                                                tcomm=0, tsync=0,
                                                 # tsync=tsync_new - self.dlb['tsync'])
                                                 tconst=0)
 
@@ -957,9 +1315,13 @@ class Worker:
                 tsync_new = timing.get(
                     ['serial:sync', 'serial:intraSync', 'serial:gpuSync'])
                 if self.lb_type != 'reportonly':
-                    intv = self.intra_redistribute(turn, beam,
+                    intv = self.balancer.intra_balance(turn, beam,
                                                 tcomp=tcomp_new -
                                                 self.dlb['intra_tcomp'],
+                                                tcomm=tcomm_new -
+                                                self.dlb['intra_tcomm'],
+                                                tsync=tsync_new -
+                                                self.dlb['intra_tsync'],
                                                 tconst=((tconst_new-self.dlb['intra_tconst'])
                                                     + (tcomm_new - self.dlb['intra_tcomm'])))
 
@@ -981,8 +1343,10 @@ class Worker:
             tsync_new = timing.get(
                 ['serial:sync', 'serial:intraSync', 'serial:gpuSync'])
             if self.lb_type != 'reportonly':
-                intv = self.redistribute(turn, beam,
+                intv = self.balancer.balance(turn, beam,
                                          tcomp=tcomp_new-self.dlb['tcomp'],
+                                         tcomm=tcomm_new-self.dlb['tcomm'],
+                                         tsync=tsync_new-self.dlb['tsync'],
                                          # tsync=tsync_new - self.dlb['tsync'])
                                          tconst=0)
                                          # tconst=((tconst_new-self.dlb['tconst'])
@@ -1000,6 +1364,258 @@ class Worker:
         
         # return intv
 
+class NodeReduction(object):
+    '''
+    Hierarchical sum of an array over the workers. Every process writes its
+    array in its own row of a node-shared buffer, the processes of the node
+    sum the rows in parallel, each over a range of the columns, the first
+    process of every node sums the node results over the nodes, and all the
+    processes read the result from the shared buffer. Only one array per
+    node goes over the network.
+
+    Parameters
+    ----------
+    worker : Worker
+        the worker of this process
+    n : int
+        number of elements of the array
+    dtype : numpy dtype
+        type of the elements
+
+    Attributes
+    ----------
+    local : array
+        row of this process, to fill before reduce()
+    result : array
+        sum over all the workers, valid after reduce() and until the next
+        call to reduce()
+    '''
+
+    def __init__(self, worker, n, dtype):
+        self.worker = worker
+        rows = worker.nodeworkers + 1
+        self.win, self.buffer = worker.allocate_shared((rows, n), dtype)
+        self.local = self.buffer[worker.noderank]
+        self.result = self.buffer[-1]
+        columns = np.array_split(np.arange(n), worker.nodeworkers)
+        mine = columns[worker.noderank]
+        self.columns = slice(mine[0], mine[-1] + 1) if len(mine) else \
+            slice(0, 0)
+
+    def _node_barrier(self):
+        self.win.Sync()
+        self.worker.nodecomm.Barrier()
+        self.win.Sync()
+
+    @timing.timeit(key='comm:allreduce')
+    def reduce(self):
+        '''
+        Sums the local arrays of all the workers, returns the result.
+        '''
+        # Rows written
+        self._node_barrier()
+        np.sum(self.buffer[:-1, self.columns], axis=0,
+               out=self.result[self.columns])
+        # Node result written
+        self._node_barrier()
+        leadercomm = self.worker.leadercomm
+        if (leadercomm != MPI.COMM_NULL) and (leadercomm.size > 1):
+            leadercomm.Allreduce(MPI.IN_PLACE, self.result, op=MPI.SUM)
+        # Global result written
+        self._node_barrier()
+        return self.result
+
+
+class TaskGraph(object):
+    '''
+    Task parallelism of the stages of a turn over the processes of a node.
+    Every stage is given to a group of processes, the groups having any
+    number of processes; the stages of different groups run at the same
+    time, a stage starting only once the stages it depends on are done. The
+    arrays computed by a stage (its outputs) are written by the first
+    process of its group to a node-shared memory window, and the
+    attributes of the other processes are set to views of that window,
+    without copy. The windows are double-buffered, a process reading the
+    outputs of a turn while the outputs of the next turn are computed.
+
+    Stages without group run on every process, one after the other; they
+    may use communications over all the workers (e.g. Profile.reduce_histo)
+    and their results are not shared. The stages of a group must not
+    communicate outside of the group. The processes are assigned to the
+    groups in order of their rank on the node, a process taking part in
+    several groups if the node has fewer processes than the groups, and in
+    none if it has more.
+
+    Parameters
+    ----------
+    worker : Worker
+        the worker of this process
+    groups : dict
+        number of processes of every group, by name
+
+    Attributes
+    ----------
+    levels : list
+        list of the stages run between two synchronisations of the node,
+        built at the first call of run()
+    '''
+
+    def __init__(self, worker, groups):
+        self.worker = worker
+        self.groups = {}
+        self.comms = {}
+        first = 0
+        for name, size in groups.items():
+            size = max(1, min(int(size), worker.nodeworkers))
+            ranks = [(first + i) % worker.nodeworkers for i in range(size)]
+            first += size
+            self.groups[name] = ranks
+            # Collective over the node, in the same order on every process
+            self.comms[name] = worker.nodecomm.Split(
+                0 if worker.noderank in ranks else MPI.UNDEFINED,
+                ranks.index(worker.noderank) if worker.noderank in ranks
+                else 0)
+        self.stages = {}
+        self.levels = None
+        self.turn = 0
+
+    def add_stage(self, name, function, group=None, outputs=(), after=(),
+                  collective=False):
+        '''
+        Adds a stage to the graph.
+
+        Parameters
+        ----------
+        name : str
+            name of the stage
+        function : callable
+            function of the stage, called without argument, or with the
+            communicator of the group if collective
+        group : str
+            group running the stage, None for every process
+        outputs : list
+            (object, attribute name) of the arrays computed by the stage,
+            shared with the other processes; the function must set the
+            attributes to new arrays, not modify them in place
+        after : list
+            names of the stages to run before, added before this one
+        collective : bool
+            if True, the function is called by all the processes of the
+            group, otherwise only by the first one
+        '''
+        if name in self.stages:
+            raise RuntimeError(
+                'ERROR in TaskGraph: stage {} already added'.format(name))
+        if (group is not None) and (group not in self.groups):
+            raise RuntimeError(
+                'ERROR in TaskGraph: unknown group {}'.format(group))
+        if (group is None) and (len(outputs) > 0):
+            raise RuntimeError(
+                'ERROR in TaskGraph: the outputs of stage {} are not shared, '
+                'it has no group'.format(name))
+        for dependency in after:
+            if dependency not in self.stages:
+                raise RuntimeError(
+                    'ERROR in TaskGraph: stage {} must be added before stage '
+                    '{}'.format(dependency, name))
+        self.stages[name] = {'name': name, 'function': function,
+                             'group': group, 'outputs': list(outputs),
+                             'after': list(after), 'collective': collective,
+                             'windows': None}
+        self.levels = None
+
+    def _build_levels(self):
+        # A stage runs after the synchronisation following the stages of
+        # other groups it depends on, and in the same level as the stages
+        # of its group and the stages without group it depends on, which
+        # run before it on the same process
+        levels = {}
+        for name, stage in self.stages.items():
+            level = 0
+            for dependency in stage['after']:
+                other = self.stages[dependency]
+                local = (other['group'] is None) or \
+                    (other['group'] == stage['group'])
+                level = max(level, levels[dependency] + (0 if local else 1))
+            levels[name] = level
+        self.levels = [[] for i in range(max(levels.values(), default=-1)+1)]
+        for name, level in levels.items():
+            self.levels[level].append(self.stages[name])
+
+    def is_member(self, group):
+        '''
+        True if this process is in the group, always for None.
+        '''
+        return (group is None) or (self.worker.noderank in self.groups[group])
+
+    def _allocate(self, stage):
+        # The shape and type of the outputs are known by the first process
+        # of the group after the first call
+        root = self.groups[stage['group']][0]
+        windows = []
+        for obj, attribute in stage['outputs']:
+            if self.worker.noderank == root:
+                value = np.asarray(getattr(obj, attribute))
+                shape, dtype = value.shape, value.dtype.str
+            else:
+                shape, dtype = None, None
+            shape, dtype = self.worker.nodecomm.bcast((shape, dtype),
+                                                      root=root)
+            windows.append(self.worker.allocate_shared((2,) + shape, dtype))
+        stage['windows'] = windows
+
+    @timing.timeit(key='serial:intraSync')
+    def _node_barrier(self, windows):
+        for win, array in windows:
+            win.Sync()
+        self.worker.nodecomm.Barrier()
+        for win, array in windows:
+            win.Sync()
+
+    def run(self):
+        '''
+        Runs the stages of a turn.
+        '''
+        if self.levels is None:
+            self._build_levels()
+        worker = self.worker
+        buffer = self.turn % 2
+
+        for level in self.levels:
+            shared = [stage for stage in level
+                      if (stage['group'] is not None) and
+                      (len(stage['outputs']) > 0)]
+            for stage in level:
+                if not self.is_member(stage['group']):
+                    continue
+                if stage['group'] is None:
+                    stage['function']()
+                elif stage['collective']:
+                    stage['function'](self.comms[stage['group']])
+                elif worker.noderank == self.groups[stage['group']][0]:
+                    stage['function']()
+
+            for stage in shared:
+                if stage['windows'] is None:
+                    self._allocate(stage)
+                if worker.noderank == self.groups[stage['group']][0]:
+                    for (obj, attribute), (win, array) in \
+                            zip(stage['outputs'], stage['windows']):
+                        array[buffer] = getattr(obj, attribute)
+
+            if len(shared) > 0:
+                self._node_barrier([window for stage in shared
+                                    for window in stage['windows']])
+                for stage in shared:
+                    if worker.noderank == self.groups[stage['group']][0]:
+                        continue
+                    for (obj, attribute), (win, array) in \
+                            zip(stage['outputs'], stage['windows']):
+                        setattr(obj, attribute, array[buffer])
+
+        self.turn += 1
+
+
 def calc_transactions(dpi, cutoff):
     trans = {}
     arr = []
@@ -1177,4 +1793,50 @@ add_op_int32 = MPI.Op.Create(c_add_int32, commute=True)
 def c_add_int64(xmem, ymem, dt):
     x = np.frombuffer(xmem, dtype=np.int64)
     y = np.frombuffer(ymem, dtype=np.int64)
-    bm.add(y, x, inplace=True)
\ No newline at end of file
+    bm.add(y, x, inplace=True)
+
+
+add_op_int64 = MPI.Op.Create(c_add_int64, commute=True)
+
+
+def merge_beam_statistics(y, x):
+    '''
+    Merges in place the beam statistics x into y. Both are arrays of
+    [n_lost, count, mean_dt, mean_dE, m2_dt, m2_dE, min_dt, min_dE,
+     max_dt, max_dE], with m2 the sum of the squared deviations from the
+    mean, as computed by bm.beam_statistics.
+    '''
+    y[0] += x[0]
+    n_a = y[1]
+    n_b = x[1]
+    if n_b == 0:
+        return
+    if n_a == 0:
+        y[1:] = x[1:]
+        return
+    n = n_a + n_b
+    delta = x[2:4] - y[2:4]
+    y[4:6] += x[4:6] + delta**2 * n_a * n_b / n
+    y[2:4] += delta * n_b / n
+    y[1] = n
+    y[6:8] = np.minimum(y[6:8], x[6:8])
+    y[8:10] = np.maximum(y[8:10], x[8:10])
+
+
+# The statistics of a worker are a single element of this datatype, since MPI
+# user operations are applied element-wise and the merge mixes the values
+beam_statistics_type = MPI.DOUBLE.Create_contiguous(10).Commit()
+
+
+def c_beam_statistics(xmem, ymem, dt):
+    x = np.frombuffer(xmem, dtype=np.float64).reshape(-1, 10)
+    y = np.frombuffer(ymem, dtype=np.float64).reshape(-1, 10)
+    for i in range(len(x)):
+        merge_beam_statistics(y[i], x[i])
+
+
+beam_statistics_op = MPI.Op.Create(c_beam_statistics, commute=True)
+
+# Reduction operators of the dense encodings of Worker.allreduce_histogram,
+# MPI.SUM for the types bm.add does not support
+_histogram_ops = {'uint16': add_op_uint16, 'uint32': add_op_uint32}
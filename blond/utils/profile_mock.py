@@ -5,6 +5,8 @@ from functools import wraps
 # 'tracing'
 mode = 'disabled'
 times = {}
+# Quantities other than times, e.g. bytes sent, accumulated by count
+counters = {}
 
 
 def init(*args, **kw):
@@ -61,6 +63,10 @@ class timed_region:
         pass
 
 
+def count(key, value=1):
+    counters[key] = counters.get(key, 0) + value
+
+
 def start_timing(*args, **kw):
     pass
 
@@ -54,6 +54,7 @@ class TrackIteration(object):
             raise TypeError("finalTurn must be an integer")
 
         self.functionList = []
+        self.checkpoint = None
 
 
     def _track_turns(self, n_turns):
@@ -76,6 +77,16 @@ class TrackIteration(object):
                                   , repetionRate))
         
 
+    def add_checkpoint(self, checkpoint):
+        '''
+        Takes a Checkpoint, called every turn with checkpoint.track(turnNumber)
+        to write the checkpoints. Tracking stops once its wall time is
+        reached.
+        '''
+
+        self.checkpoint = checkpoint
+
+
     def __next__(self):
         '''
         First raises StopIteration if turnNumber == finalTurn
@@ -103,6 +114,10 @@ class TrackIteration(object):
             if self.turnNumber % rate == 0:
                 func(self._map, self.turnNumber)
 
+        if self.checkpoint is not None and \
+                self.checkpoint.track(self.turnNumber):
+            self._finalTurn = self.turnNumber
+
         return self.turnNumber
 
 
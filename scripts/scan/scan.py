@@ -27,6 +27,11 @@ parser.add_argument('-o', '--output', type=str, default='./results/local',
 parser.add_argument('-l', '--limit', type=int, default=0,
                     help='Limit the number of concurrent jobs queueing. Default: 0 (No Limit)')
 
+parser.add_argument('--wisdom', type=str, default=None,
+                    help='Base name of an FFTW wisdom file shared by the jobs, which then '
+                    'compute the FFTs with FFTW and plan them with the wisdom of the '
+                    'previous jobs. Default: None (numpy FFTs)')
+
 
 if __name__ == '__main__':
     args = parser.parse_args()
@@ -149,6 +154,9 @@ if __name__ == '__main__':
                         '--log='+str(log), '--logdir='+log_dir,
                         '--artificialdelay='+str(artdel),
                         '--gpu='+str(gpu)]
+                    if args.wisdom:
+                        exe_args += ['--fftw=1',
+                                     '--wisdom='+os.path.abspath(args.wisdom)]
 
                     if args.environment == 'local':
                         batch_args = [common.mpirun, '-n', str(w),
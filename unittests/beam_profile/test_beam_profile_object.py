@@ -29,6 +29,7 @@ from blond.input_parameters.ring import Ring
 import blond.beam.profile as profileModule
 from blond.beam.beam import Proton
 from blond.input_parameters.rf_parameters import RFStation
+from blond.utils import bmath as bm
 
 
 class testProfileClass(unittest.TestCase):
@@ -278,6 +279,64 @@ class testProfileClass(unittest.TestCase):
             rtol=rtol, atol=atol,
             err_msg='Bunch length values not correct')
 
+    def test_slicing_workspace(self):
+        workspace = self.profile1.get_slicing_workspace()
+        self.profile1.track()
+        self.assertIs(self.profile1.get_slicing_workspace(), workspace)
+        ref, _ = np.histogram(self.profile1.Beam.dt,
+                              bins=self.profile1.n_slices,
+                              range=(self.profile1.cut_left,
+                                     self.profile1.cut_right))
+        np.testing.assert_array_equal(self.profile1.n_macroparticles, ref)
+
+    def test_tiled_histogram(self):
+        dt = self.profile2.Beam.dt.copy()
+        # Particles far outside the cuts must not overflow the bin index
+        dt[:3] = [-1e30, 1e30, np.nan]
+        cut_left, cut_right = 0., 6e-7
+        for n_slices, tile_size in [(1000, 64), (100000, 16384),
+                                    (1001, 1000)]:
+            ref = np.zeros(n_slices, dtype=bm.precision.real_t)
+            bm.slice(dt, ref, cut_left, cut_right)
+            tiled = np.zeros(n_slices, dtype=bm.precision.real_t)
+            bm.slice_tiled(dt, tiled, cut_left, cut_right, tile_size)
+            np.testing.assert_array_equal(tiled, ref)
+
+            # Workspace of the chunks of particles, not of the whole beam
+            chunk_size = 1000
+            indices = np.empty(2 * chunk_size, dtype=np.int32)
+            offsets = np.empty((bm.get_max_threads() + 1) *
+                               (-(-n_slices // tile_size)) + 1, dtype=np.int32)
+            tiled[:] = -1
+            bm.slice_tiled(dt, tiled, cut_left, cut_right, tile_size,
+                           indices, offsets, chunk_size)
+            np.testing.assert_array_equal(tiled, ref)
+            self.assertEqual(np.sum(ref), np.count_nonzero(
+                (dt >= cut_left) & (dt < cut_right)))
+
+    def test_tiled_profile(self):
+        profile = profileModule.Profile(
+            self.profile1.Beam,
+            CutOptions=profileModule.CutOptions(cut_left=0, cut_right=6e-7,
+                                                n_slices=5000))
+        profile.track()
+        ref = profile.n_macroparticles.copy()
+        self.assertFalse(profile.tiled_slicing_possible())
+        profile.tiled_slicing_threshold = 1000
+        self.assertTrue(profile.tiled_slicing_possible())
+        profile.slicing_tile_size = 64
+        profile.slicing_chunk_size = 777
+        indices, offsets = profile.get_tiled_workspace()
+        self.assertEqual(len(indices), 2 * 777)
+        bm.slice_tiled(profile.Beam.dt, profile.n_macroparticles,
+                       profile.cut_left, profile.cut_right,
+                       profile.slicing_tile_size, indices, offsets,
+                       profile.slicing_chunk_size)
+        np.testing.assert_array_equal(profile.n_macroparticles, ref)
+        profile.track()
+        np.testing.assert_array_equal(profile.n_macroparticles, ref)
+        self.assertIs(profile.get_tiled_workspace()[0], indices)
+
 
 if __name__ == '__main__':
 
@@ -24,6 +24,7 @@ from scipy.constants import physical_constants
 # BLonD imports
 # --------------
 from blond.beam.beam import Particle, Proton, Electron
+from blond.utils import bmath as bm
 from blond.input_parameters.ring import Ring
 from blond.input_parameters.rf_parameters import RFStation
 from blond.beam.beam import Beam
@@ -189,6 +190,61 @@ class testBeamClass(unittest.TestCase):
         self.assertAlmostEqual(self.beam.mean_dE, 0., delta=1e-2,
                                msg='Beam: Failed statistic mean_dE')
 
+    def test_beam_statistic_lost_particles(self):
+
+        # Large offset w.r.t. the spread, with a fraction of lost particles
+        self.beam.dt = 1e-6 + 1e-10 * \
+            numpy.random.randn(self.beam.n_macroparticles)
+        self.beam.dE = 1e6*numpy.random.randn(self.beam.n_macroparticles)
+        self.beam.id[::7] = 0
+        alive = self.beam.id != 0
+
+        self.beam.statistics()
+
+        for coord in ['dt', 'dE']:
+            values = getattr(self.beam, coord)[alive]
+            self.assertAlmostEqual(getattr(self.beam, 'mean_' + coord),
+                                   numpy.mean(values),
+                                   delta=1e-9*numpy.std(values))
+            self.assertAlmostEqual(getattr(self.beam, 'sigma_' + coord),
+                                   numpy.std(values),
+                                   delta=1e-9*numpy.std(values))
+            self.assertEqual(getattr(self.beam, 'min_' + coord),
+                             numpy.min(values))
+            self.assertEqual(getattr(self.beam, 'max_' + coord),
+                             numpy.max(values))
+
+    def test_beam_statistic_merge(self):
+
+        try:
+            from blond.utils.mpi_config import merge_beam_statistics
+        except ImportError:
+            self.skipTest('mpi4py not available')
+
+        self.beam.dt = 1e-6 + 1e-10 * \
+            numpy.random.randn(self.beam.n_macroparticles)
+        self.beam.dE = 1e6*numpy.random.randn(self.beam.n_macroparticles)
+        self.beam.statistics()
+
+        # Statistics of two parts of the beam, as computed by two workers
+        n = self.beam.n_macroparticles // 3
+        moments = numpy.concatenate(([1], bm.beam_statistics(
+            self.beam.dt[:n], self.beam.dE[:n])))
+        other = numpy.concatenate(([2], bm.beam_statistics(
+            self.beam.dt[n:], self.beam.dE[n:])))
+        merge_beam_statistics(moments, other)
+
+        self.assertEqual(moments[0], 3)
+        # The mean energy is close to zero, compared to its spread
+        self.assertAlmostEqual(moments[2], self.beam._moments[1],
+                               delta=1e-9*1e-10)
+        self.assertAlmostEqual(moments[3], self.beam._moments[2],
+                               delta=1e-9*1e6)
+        numpy.testing.assert_allclose(moments[[1, 4, 5, 6, 7, 8, 9]],
+                                      self.beam._moments[[0, 3, 4, 5, 6, 7,
+                                                          8]],
+                                      rtol=1e-9)
+
     def test_losses_separatrix(self):
 
         longitudinal_tracker = RingAndRFTracker(self.rf_params, self.beam)
@@ -0,0 +1,139 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the distributed beam generation.
+
+Run as python test_distributions.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.beam.beam import Beam, Proton
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam import distributions
+from blond.beam.distributions import bigaussian, populate_bunch, alias_table
+
+
+class TestDistributedGeneration(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.ring = Ring(6911.5038, 1./17.95142852**2, 450e9, Proton(), 200)
+        self.rf_params = RFStation(self.ring, [4620], [7e6], [0.])
+        self.n_macroparticles = 200003
+        self.sigma_dt = 0.4e-9
+
+    def bigaussian(self, seed, reinsertion=False):
+        beam = Beam(self.ring, self.n_macroparticles, 1e9)
+        bigaussian(self.ring, self.rf_params, beam, self.sigma_dt, seed=seed,
+                   reinsertion=reinsertion, distributed=True)
+        return beam
+
+    def test_bigaussian_reproducible(self):
+        beam1 = self.bigaussian(seed=1)
+        beam2 = self.bigaussian(seed=1)
+        beam3 = self.bigaussian(seed=2)
+
+        self.assertEqual(len(beam1.dt), self.n_macroparticles)
+        np.testing.assert_array_equal(beam1.dt, beam2.dt)
+        np.testing.assert_array_equal(beam1.dE, beam2.dE)
+        self.assertFalse(np.array_equal(beam1.dt, beam3.dt))
+
+    def test_bigaussian_statistics(self):
+        beam = self.bigaussian(seed=1)
+
+        self.assertAlmostEqual(np.std(beam.dt) / self.sigma_dt, 1., delta=1e-2)
+        self.assertAlmostEqual(np.std(beam.dE) / beam.sigma_dE, 1., delta=1e-2)
+        self.assertAlmostEqual(np.mean(beam.dE) / beam.sigma_dE, 0.,
+                               delta=1e-2)
+
+    def test_bigaussian_blocks(self):
+        # Every block of particles has its own stream: the first blocks do
+        # not depend on the number of particles
+        beam1 = self.bigaussian(seed=1)
+        self.n_macroparticles = 3 * distributions.generation_block_size + 5
+        beam2 = self.bigaussian(seed=1)
+
+        n_common = 3 * distributions.generation_block_size
+        np.testing.assert_array_equal(beam1.dt[:n_common], beam2.dt[:n_common])
+
+    def test_populate_bunch(self):
+        time_grid, deltaE_grid = np.meshgrid(np.arange(4.), np.arange(3.))
+        density_grid = np.zeros((3, 4))
+        density_grid[1, 2] = 3
+        density_grid[2, 0] = 1
+
+        beam = Beam(self.ring, self.n_macroparticles, 1e9)
+        populate_bunch(beam, time_grid, deltaE_grid, density_grid, 1., 1.,
+                       seed=1, distributed=True)
+
+        cell = np.rint(beam.dt) + 4 * np.rint(beam.dE)
+        self.assertTrue(np.all((cell == 6) | (cell == 8)))
+        self.assertAlmostEqual(np.mean(cell == 6), 0.75, delta=1e-2)
+
+    def populate_alias(self, seed, threads=1):
+        time_grid, deltaE_grid = np.meshgrid(np.arange(4.), np.arange(3.))
+        density_grid = np.zeros((3, 4))
+        density_grid[1, 2] = 3
+        density_grid[2, 0] = 1
+        density_grid[0, 3] = 4
+
+        beam = Beam(self.ring, self.n_macroparticles, 1e9)
+        buffers = beam.dt.ctypes.data, beam.dE.ctypes.data
+        populate_bunch(beam, time_grid, deltaE_grid, density_grid, 1., 1.,
+                       seed=seed, sampler='alias', threads=threads)
+        # The particles are generated in the arrays of the beam
+        self.assertEqual((beam.dt.ctypes.data, beam.dE.ctypes.data), buffers)
+        return beam
+
+    def test_populate_bunch_alias(self):
+        state = np.random.get_state()
+        beam1 = self.populate_alias(seed=1)
+        beam2 = self.populate_alias(seed=1, threads=3)
+        beam3 = self.populate_alias(seed=2)
+        # The global random generator is not used
+        np.testing.assert_array_equal(np.random.get_state()[1], state[1])
+
+        self.assertEqual(len(beam1.dt), self.n_macroparticles)
+        np.testing.assert_array_equal(beam1.dt, beam2.dt)
+        np.testing.assert_array_equal(beam1.dE, beam2.dE)
+        self.assertFalse(np.array_equal(beam1.dt, beam3.dt))
+
+        cell = np.rint(beam1.dt) + 4 * np.rint(beam1.dE)
+        self.assertTrue(np.all((cell == 3) | (cell == 6) | (cell == 8)))
+        self.assertAlmostEqual(np.mean(cell == 3), 0.5, delta=1e-2)
+        self.assertAlmostEqual(np.mean(cell == 6), 0.375, delta=1e-2)
+        self.assertLessEqual(np.max(np.abs(beam1.dt - np.rint(beam1.dt))),
+                             0.5)
+
+    def test_alias_table(self):
+        probabilities = np.random.default_rng(1).random(1000)**8
+        probabilities[::3] = 0
+        threshold, alias = alias_table(probabilities)
+
+        # Probability of each cell given by the table
+        table = threshold.copy()
+        np.add.at(table, alias, 1 - threshold)
+        np.testing.assert_allclose(table / len(table),
+                                   probabilities / np.sum(probabilities),
+                                   rtol=0, atol=1e-15)
+        self.assertTrue(np.all(threshold[::3] == 0))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
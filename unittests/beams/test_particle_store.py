@@ -0,0 +1,203 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the ParticleStore and StoredBeam classes.
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.beam.beam import Beam, Proton, StoredBeam
+from blond.beam.particle_store import ParticleStore
+from blond.beam.distributions import bigaussian
+from blond.beam.profile import Profile, CutOptions
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.trackers.tracker import RingAndRFTracker
+from blond.utils import bmath as bm
+
+
+class testParticleStore(unittest.TestCase):
+
+    def test_aligned_views(self):
+        store = ParticleStore(1000, capacity=1500)
+        for array in [store.dt, store.dE]:
+            self.assertEqual(array.ctypes.data % 64, 0)
+            self.assertTrue(array.flags['C_CONTIGUOUS'])
+            self.assertEqual(len(array), 1000)
+        self.assertGreaterEqual(store.capacity, 1500)
+
+    def test_append_in_spare_capacity(self):
+        store = ParticleStore(10, capacity=20)
+        buffer = store._coordinates
+        store.append(np.ones(5), 2 * np.ones(5), np.arange(11, 16))
+        self.assertIs(store._coordinates, buffer)
+        self.assertEqual(store.n_macroparticles, 15)
+        np.testing.assert_array_equal(store.dE[10:], 2)
+
+        store.append(np.ones(10), np.ones(10), np.arange(16, 26))
+        self.assertIsNot(store._coordinates, buffer)
+        self.assertGreaterEqual(store.capacity, 25)
+        np.testing.assert_array_equal(store.dE[10:15], 2)
+
+    def test_alive_mask(self):
+        store = ParticleStore.from_arrays(np.arange(4.), np.arange(4.),
+                                          [1, 0, 256, 4], alive_mask=True)
+        self.assertEqual(store.id.dtype, np.uint8)
+        np.testing.assert_array_equal(store.id, [1, 0, 1, 1])
+        self.assertEqual(store.n_macroparticles_lost, 1)
+
+    def test_compact(self):
+        store = ParticleStore.from_arrays(np.arange(6.), -np.arange(6.),
+                                          [1, 0, 3, 0, 5, 6])
+        self.assertEqual(store.compact(), 2)
+        np.testing.assert_array_equal(store.dt, [0, 2, 4, 5])
+        np.testing.assert_array_equal(store.dE, [0, -2, -4, -5])
+        np.testing.assert_array_equal(store.id, [1, 3, 5, 6])
+        self.assertEqual(store.n_macroparticles_lost, 2)
+        self.assertEqual(store.n_macroparticles_alive, 4)
+
+    def test_compaction_threshold(self):
+        store = ParticleStore.from_arrays(np.arange(10.), np.arange(10.),
+                                          np.arange(1, 11),
+                                          compaction_threshold=0.2)
+        store.id[:2] = 0
+        self.assertEqual(store.compact_if_needed(), 0)
+        store.id[2] = 0
+        self.assertEqual(store.compact_if_needed(), 3)
+        self.assertEqual(store.n_macroparticles, 7)
+
+
+class testStoredBeam(unittest.TestCase):
+
+    def setUp(self):
+        n_turns = 2000
+        self.ring = Ring(26658.883, 1./55.759505**2,
+                         np.linspace(450e9, 460.005e9, n_turns + 1),
+                         Proton(), n_turns)
+        self.rf = RFStation(self.ring, [35640], [6e6], [0])
+        self.beam = Beam(self.ring, 10000, 1e9)
+        bigaussian(self.ring, self.rf, self.beam, 1e-10, reinsertion=True,
+                   seed=1)
+
+    def stored_copy(self, **kwargs):
+        beam = StoredBeam(self.ring, self.beam.n_macroparticles, 1e9,
+                          **kwargs)
+        beam.dt = self.beam.dt
+        beam.dE = self.beam.dE
+        return beam
+
+    def assert_same_statistics(self, beam, other):
+        for attribute in ['mean_dt', 'sigma_dt', 'mean_dE', 'sigma_dE']:
+            self.assertAlmostEqual(getattr(beam, attribute),
+                                   getattr(other, attribute),
+                                   delta=1e-9 * abs(getattr(other, attribute)))
+
+    def test_from_beam(self):
+        beam = StoredBeam.from_beam(self.beam, capacity=20000)
+        self.assertIs(type(beam), StoredBeam)
+        self.assertIs(type(self.beam), Beam)
+        self.assertNotIn('dt', beam.__dict__)
+        np.testing.assert_array_equal(beam.dt, self.beam.dt)
+        self.assertIsNot(beam.dt, self.beam.dt)
+        self.assertEqual(beam.n_macroparticles, self.beam.n_macroparticles)
+        self.assertEqual(beam.energy, self.beam.energy)
+        self.assertGreaterEqual(beam.particles.capacity, 20000)
+
+    def test_statistics(self):
+        for alive_mask in [False, True]:
+            beam = self.stored_copy(alive_mask=alive_mask)
+            beam.losses_longitudinal_cut(0, 1e-9)
+            self.beam.id[:] = np.arange(1, self.beam.n_macroparticles + 1)
+            self.beam.losses_longitudinal_cut(0, 1e-9)
+            self.assertGreater(beam.n_macroparticles_lost, 0)
+            self.assertEqual(beam.n_macroparticles_lost,
+                             self.beam.n_macroparticles_lost)
+            beam.statistics()
+            self.beam.statistics()
+            self.assert_same_statistics(beam, self.beam)
+
+    def test_statistics_with_compaction(self):
+        beam = self.stored_copy(alive_mask=True, compaction_threshold=0.)
+        beam.losses_longitudinal_cut(0, 1e-9)
+        self.beam.losses_longitudinal_cut(0, 1e-9)
+        beam.statistics()
+        self.beam.statistics()
+        self.assert_same_statistics(beam, self.beam)
+        self.assertEqual(beam.n_macroparticles,
+                         self.beam.n_macroparticles_alive)
+        self.assertEqual(beam.n_macroparticles_lost,
+                         self.beam.n_macroparticles_lost)
+
+    def test_add_particles(self):
+        beam = self.stored_copy(capacity=25000)
+        buffer = beam.particles._coordinates
+        beam.add_particles([np.zeros(100), np.ones(100)])
+        beam += self.beam
+        self.assertIs(beam.particles._coordinates, buffer)
+        self.assertEqual(beam.n_macroparticles, 20100)
+        self.assertEqual(beam.id[-1], 20100)
+        np.testing.assert_array_equal(beam.dE[10000:10100], 1)
+
+    def test_tracking(self):
+        beam = self.stored_copy(alive_mask=True)
+        tracker = RingAndRFTracker(self.rf, beam)
+        for i in range(10):
+            tracker.track()
+        dt = self.beam.dt.copy()
+        self.rf.counter[0] = 0
+        tracker = RingAndRFTracker(self.rf, self.beam)
+        for i in range(10):
+            tracker.track()
+        np.testing.assert_array_equal(beam.dt, self.beam.dt)
+        np.testing.assert_array_equal(beam.dE, self.beam.dE)
+        self.assertFalse(np.array_equal(dt, self.beam.dt))
+
+    def test_to_beam(self):
+        stored = self.stored_copy()
+        stored.id[:] = np.arange(1, stored.n_macroparticles + 1)
+        beam = stored.to_beam()
+        self.assertIs(type(beam), Beam)
+        self.assertIs(type(stored), StoredBeam)
+        self.assertNotIn('particles', beam.__dict__)
+        np.testing.assert_array_equal(beam.dt, self.beam.dt)
+        np.testing.assert_array_equal(beam.id[:3], [1, 2, 3])
+        self.assertEqual(beam.n_macroparticles, self.beam.n_macroparticles)
+
+        stored = self.stored_copy(alive_mask=True)
+        with self.assertRaises(RuntimeError):
+            stored.to_beam()
+
+    def test_fused_slicing_after_assignment(self):
+        beam = self.stored_copy()
+        profile = Profile(beam, CutOptions(n_slices=100, cut_left=0,
+                                           cut_right=self.rf.t_rf[0, 0]))
+        tracker = RingAndRFTracker(self.rf, beam, Profile=profile,
+                                   interpolation=True, fused_slicing=True)
+        profile.track()
+        tracker.track()
+        # The assignment copies into the store, dt keeps its identity
+        dt = beam.dt
+        beam.dt = beam.dt + 2e-10
+        self.assertIs(beam.dt, dt)
+        reference = np.zeros(profile.n_slices, dtype=bm.precision.real_t)
+        bm.slice(beam.dt, reference, profile.cut_left, profile.cut_right)
+        profile.track()
+        np.testing.assert_array_equal(profile.n_macroparticles, reference)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -16,9 +16,16 @@ Unittest for impedances.impedance
 import unittest
 import numpy as np
 
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+from blond.beam.distributions import bigaussian
 from blond.beam.profile import Profile, CutOptions
-from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime
+from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime, \
+    TotalInducedVoltage, InducedVoltageResonator
 from blond.impedances.impedance_sources import Resonators
+from blond.impedances.impedance_cache import ImpedanceCache
+from scipy.constants import e
 
 class TestInducedVoltageFreq(unittest.TestCase):
 
@@ -120,6 +127,310 @@ class TestInducedVoltageTime(unittest.TestCase):
         np.testing.assert_allclose(test_object.wake_length_input, 11e-9)
 
 
+class TestMultiTurnWakeFreq(unittest.TestCase):
+
+    def setUp(self):
+
+        # Revolution period 100 ns, 20 RF buckets of 5 ns
+        n_turns = 10
+        self.ring = Ring(30., 1/27.7**2, 26e9, Proton(), n_turns)
+        self.rf = RFStation(self.ring, [20], [0.9e6], [0])
+        self.beam = Beam(self.ring, 10000, 1e11)
+        bigaussian(self.ring, self.rf, self.beam, 1e-9, seed=1)
+        self.profile = Profile(self.beam, CutOptions(
+            cut_left=0, cut_right=self.rf.t_rf[0, 0], n_slices=64))
+        self.profile.track()
+        self.impedance_source = Resonators([5e6, 2e6], [200.2e6, 400e6],
+                                           [100, 20])
+
+    def induced_voltages(self, induced_voltage_class, n_turns=6, **kwargs):
+        self.rf.counter[0] = 0
+        induced_voltage = induced_voltage_class(
+            self.beam, self.profile, [self.impedance_source],
+            multi_turn_wake=True, mtw_mode='freq', RFParams=self.rf,
+            **kwargs)
+        total_induced_voltage = TotalInducedVoltage(
+            self.beam, self.profile, [induced_voltage])
+        voltages = []
+        for i in range(n_turns):
+            total_induced_voltage.induced_voltage_sum()
+            voltages.append(total_induced_voltage.induced_voltage.copy())
+            self.rf.counter[0] += 1
+        return induced_voltage, np.array(voltages)
+
+    def test_phasor(self):
+        induced_voltage, _ = self.induced_voltages(
+            InducedVoltageTime, n_turns=1, wake_length=2*self.rf.t_rev[0])
+        # Ramp of the revolution period, updated incrementally and rebuilt
+        induced_voltage.mtw_phasor_rebuild = 50
+        for t_rev in np.linspace(1, 0.999, 120) * self.rf.t_rev[0]:
+            np.testing.assert_allclose(
+                induced_voltage.mtw_phasor(t_rev),
+                np.exp(induced_voltage.omegaj_mtw * t_rev),
+                rtol=0, atol=1e-9)
+
+    def test_invalid_engine(self):
+        with self.assertRaises(RuntimeError):
+            InducedVoltageTime(self.beam, self.profile,
+                               [self.impedance_source], mtw_engine='fast')
+
+    def test_spectral_engine(self):
+        for induced_voltage_class, kwargs in [
+                (InducedVoltageTime, {'wake_length': 2*self.rf.t_rev[0]}),
+                (InducedVoltageFreq,
+                 {'frequency_resolution': 1/(2*self.rf.t_rev[0])})]:
+            classic, reference = self.induced_voltages(
+                induced_voltage_class, **kwargs)
+            spectral, voltages = self.induced_voltages(
+                induced_voltage_class, mtw_engine='spectral', **kwargs)
+            self.assertEqual(classic.mtw_engine_used, 'classic')
+            self.assertEqual(classic.mtw_transforms_saved, 0)
+            self.assertEqual(spectral.mtw_engine_used, 'spectral')
+            self.assertEqual(spectral.mtw_transforms_saved, 1)
+            self.assertGreater(np.max(np.abs(reference)), 0)
+            np.testing.assert_allclose(
+                voltages, reference, rtol=0,
+                atol=1e-9*np.max(np.abs(reference)))
+
+
+class TestInducedVoltageResonator(unittest.TestCase):
+
+    def setUp(self):
+
+        ring = Ring(30., 1/27.7**2, 26e9, Proton(), 1)
+        rf = RFStation(ring, [20], [0.9e6], [0])
+        self.beam = Beam(ring, 10000, 1e11)
+        bigaussian(ring, rf, self.beam, 1e-9, seed=1)
+        self.profile = Profile(self.beam, CutOptions(
+            cut_left=0, cut_right=rf.t_rf[0, 0], n_slices=200))
+        self.profile.track()
+        self.resonators = Resonators([5e6, 2e6], [200.2e6, 400e6], [100, 20])
+
+    def reference(self, induced_voltage, time):
+        # Direct evaluation of the convolution integral on the matrix of the
+        # time differences
+        profile = induced_voltage.profile
+        kappa = np.diff(profile.n_macroparticles) \
+            / np.diff(profile.bin_centers) \
+            / (self.beam.n_macroparticles*profile.bin_size)
+        delta_t = time[:, np.newaxis] - profile.bin_centers
+        voltage = np.zeros(len(time))
+        for r in range(induced_voltage.n_resonators):
+            tmp_sum = (2*np.cos(induced_voltage._reOmegaP[r]*delta_t)
+                       + np.sin(induced_voltage._reOmegaP[r]*delta_t)
+                       / induced_voltage._Qtilde[r]) \
+                * np.exp(-induced_voltage._imOmegaP[r]*delta_t) \
+                * induced_voltage.Heaviside(delta_t) - np.sign(delta_t)
+            voltage += induced_voltage.R[r] \
+                / (2*induced_voltage.omega_r[r]*induced_voltage.Q[r]) \
+                * np.sum(kappa*np.diff(tmp_sum), axis=1)
+        return -voltage * self.beam.Particle.charge * e \
+            * self.beam.n_macroparticles * self.beam.ratio
+
+    def test_line_density_times(self):
+        induced_voltage = InducedVoltageResonator(
+            self.beam, self.profile, self.resonators)
+        induced_voltage.induced_voltage_1turn()
+        reference = self.reference(induced_voltage, self.profile.bin_centers)
+        np.testing.assert_allclose(induced_voltage.induced_voltage, reference,
+                                   rtol=0, atol=1e-9*np.max(np.abs(reference)))
+
+    def test_time_array(self):
+        rng = np.random.default_rng(1)
+        for time in [np.linspace(-1e-9, 8e-9, 300),
+                     rng.uniform(-1e-9, 8e-9, 300)]:
+            induced_voltage = InducedVoltageResonator(
+                self.beam, self.profile, self.resonators, timeArray=time)
+            induced_voltage.induced_voltage_1turn()
+            reference = self.reference(induced_voltage, time)
+            np.testing.assert_allclose(
+                induced_voltage.induced_voltage, reference,
+                rtol=0, atol=1e-9*np.max(np.abs(reference)))
+
+
+class TestImpedanceCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.profile = Profile(None, CutOptions(cut_left=0, cut_right=5e-9,
+                                                n_slices=16))
+        rng = np.random.default_rng(1)
+        # Table of higher order modes
+        self.resonators = Resonators(rng.uniform(1e3, 1e5, 200),
+                                     rng.uniform(0.1e9, 2e9, 200),
+                                     rng.uniform(1, 1000, 200))
+
+    def change_cuts(self, cut_right):
+        self.profile.cut_options.cut_right = cut_right
+        self.profile.cut_options.set_cuts()
+        self.profile.set_slices_parameters()
+
+    def test_batched_resonators(self):
+        frequency = np.linspace(0, 3e9, 1001)
+        python = Resonators(self.resonators.R_S, self.resonators.frequency_R,
+                            self.resonators.Q, method='python')
+        python.imped_calc(frequency)
+        self.resonators.imped_calc(frequency)
+        np.testing.assert_allclose(self.resonators.impedance,
+                                   python.impedance, rtol=1e-10, atol=0)
+
+    def test_reprocess(self):
+        cache = ImpedanceCache()
+        induced_voltage = InducedVoltageFreq(
+            None, self.profile, [self.resonators],
+            frequency_resolution=3e6, impedance_cache=cache)
+        total_impedance = induced_voltage.total_impedance.copy()
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        self.change_cuts(6e-9)
+        induced_voltage.process()
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.change_cuts(5e-9)
+        induced_voltage.process()
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        np.testing.assert_array_equal(induced_voltage.total_impedance,
+                                      total_impedance)
+        self.assertTrue(self.resonators.impedance.flags.writeable)
+
+        self.resonators.R_S = 2 * self.resonators.R_S
+        induced_voltage.process()
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        np.testing.assert_allclose(induced_voltage.total_impedance,
+                                   2 * total_impedance, rtol=1e-12)
+
+    def test_eviction(self):
+        cache = ImpedanceCache(max_entries=2)
+        induced_voltage = InducedVoltageFreq(
+            None, self.profile, [self.resonators], impedance_cache=cache)
+        for cut_right in [6e-9, 7e-9, 5e-9]:
+            self.change_cuts(cut_right)
+            induced_voltage.process()
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 0)
+        self.change_cuts(7e-9)
+        induced_voltage.process()
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.nbytes, sum(
+            impedance.nbytes for impedance in cache._entries.values()))
+
+    def test_no_cache(self):
+        induced_voltage = InducedVoltageFreq(
+            None, self.profile, [self.resonators])
+        self.assertIsNone(induced_voltage.impedance_cache)
+        first = InducedVoltageFreq(None, self.profile, [self.resonators],
+                                   impedance_cache=True)
+        second = InducedVoltageFreq(None, self.profile, [self.resonators],
+                                    impedance_cache=True)
+        self.assertIsNot(first.impedance_cache, second.impedance_cache)
+        with self.assertRaises(RuntimeError):
+            InducedVoltageFreq(None, self.profile, [self.resonators],
+                               impedance_cache='yes')
+
+
+class TestCombinedImpedances(unittest.TestCase):
+
+    def setUp(self):
+
+        n_turns = 10
+        self.ring = Ring(30., 1/27.7**2, 26e9, Proton(), n_turns)
+        self.rf = RFStation(self.ring, [20], [0.9e6], [0])
+        self.beam = Beam(self.ring, 10000, 1e11)
+        bigaussian(self.ring, self.rf, self.beam, 1e-9, seed=1)
+        self.profile = Profile(self.beam, CutOptions(
+            cut_left=0, cut_right=self.rf.t_rf[0, 0], n_slices=64))
+        self.profile.track()
+
+    def induced_voltages(self):
+        # Two impedances on the same grid, two wakes and a multi-turn wake
+        resolution = 1 / (4 * self.rf.t_rf[0, 0])
+        return [
+            InducedVoltageFreq(self.beam, self.profile,
+                               [Resonators(5e6, 200.2e6, 100)],
+                               frequency_resolution=resolution),
+            InducedVoltageFreq(self.beam, self.profile,
+                               [Resonators(2e6, 400e6, 20)],
+                               frequency_resolution=resolution),
+            InducedVoltageTime(self.beam, self.profile,
+                               [Resonators(1e6, 300e6, 5)],
+                               wake_length=self.rf.t_rf[0, 0]),
+            InducedVoltageTime(self.beam, self.profile,
+                               [Resonators(1e6, 600e6, 50)],
+                               wake_length=2*self.rf.t_rf[0, 0]),
+            InducedVoltageFreq(self.beam, self.profile,
+                               [Resonators(1e6, 100e6, 10)],
+                               frequency_resolution=resolution,
+                               multi_turn_wake=True, mtw_mode='freq',
+                               RFParams=self.rf)]
+
+    def test_combined_sum(self):
+        reference = TotalInducedVoltage(self.beam, self.profile,
+                                        self.induced_voltages())
+        self.assertEqual(reference.combined_list, [])
+        reference.induced_voltage_sum()
+
+        combined = TotalInducedVoltage(self.beam, self.profile,
+                                       self.induced_voltages(),
+                                       combine_impedances=True)
+        self.assertEqual(len(combined.combined_list), 4)
+        self.assertEqual(combined.separate_list,
+                         combined.induced_voltage_list[4:])
+        self.assertEqual(combined.combined_n_fft,
+                         combined.induced_voltage_list[0].n_fft)
+        combined.induced_voltage_sum()
+
+        self.assertGreater(np.max(np.abs(reference.induced_voltage)), 0)
+        np.testing.assert_allclose(
+            combined.induced_voltage, reference.induced_voltage, rtol=0,
+            atol=1e-10*np.max(np.abs(reference.induced_voltage)))
+
+    def test_different_grids(self):
+        # Two impedances of different frequency resolutions and a wake
+        def induced_voltages(coarse_resolution):
+            return [InducedVoltageFreq(self.beam, self.profile,
+                                       [Resonators(5e6, 200.2e6, 100)],
+                                       frequency_resolution=coarse_resolution),
+                    InducedVoltageFreq(self.beam, self.profile,
+                                       [Resonators(2e6, 400e6, 20)],
+                                       frequency_resolution=1 / (
+                                           8 * self.rf.t_rf[0, 0])),
+                    InducedVoltageTime(self.beam, self.profile,
+                                       [Resonators(1e6, 300e6, 5)],
+                                       wake_length=self.rf.t_rf[0, 0])]
+
+        combined = TotalInducedVoltage(
+            self.beam, self.profile,
+            induced_voltages(1 / (4 * self.rf.t_rf[0, 0])),
+            combine_impedances=True)
+        # All are combined on the grid of the finest impedance
+        self.assertEqual(combined.combined_list,
+                         combined.induced_voltage_list)
+        self.assertEqual(combined.separate_list, [])
+        self.assertEqual(combined.combined_n_fft,
+                         combined.induced_voltage_list[1].n_fft)
+        for obj in combined.combined_list:
+            self.assertEqual(obj.n_fft, combined.combined_n_fft)
+
+        # The coarse impedance is evaluated on the fine grid
+        reference = TotalInducedVoltage(
+            self.beam, self.profile,
+            induced_voltages(1 / (8 * self.rf.t_rf[0, 0])))
+        reference.induced_voltage_sum()
+        combined.induced_voltage_sum()
+        scale = np.max(np.abs(reference.induced_voltage))
+        self.assertGreater(scale, 0)
+        np.testing.assert_allclose(
+            combined.induced_voltage, reference.induced_voltage, rtol=0,
+            atol=1e-10*scale)
+
+        # The induced voltages of the combined objects are up to date
+        for obj, reference_obj in zip(combined.induced_voltage_list,
+                                      reference.induced_voltage_list):
+            np.testing.assert_allclose(
+                obj.induced_voltage[:self.profile.n_slices],
+                reference_obj.induced_voltage[:self.profile.n_slices],
+                rtol=0, atol=1e-10*scale)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -15,6 +15,7 @@ Test preprocess.py
 import sys
 import unittest
 import numpy as np
+from scipy.constants import c
 
 from blond.input_parameters.ring_options import RingOptions
 
@@ -82,6 +83,34 @@ class test_preprocess(unittest.TestCase):
             RingOptions(sampling=0)
 
 
+    def preprocess(self, interpolation, block_size, **kwargs):
+        mass = 938.272e6
+        time = np.linspace(0, 0.01, 11)
+        momentum = 14e9 + 12e9 * np.clip((time - 0.001) / 0.008, 0, 1)**2
+        options = RingOptions(interpolation=interpolation, **kwargs)
+        options.block_size = block_size
+        return options.preprocess(mass, 628.3, time, momentum)
+
+    def test_revolution_period(self):
+        # Every turn lasts the revolution period of its momentum
+        mass = 938.272e6
+        for interpolation in ['linear', 'cubic']:
+            time, momentum = self.preprocess(interpolation, 4096)
+            beta = np.sqrt(1/(1 + (mass/momentum)**2))
+            np.testing.assert_array_equal(
+                time[1:], time[:-1] + 628.3/(beta[:-1]*c),
+                err_msg='Wrong revolution period for %s' % interpolation)
+
+    def test_block_size(self):
+        # The integration by blocks does not depend on the block size
+        for interpolation in ['linear', 'cubic', 'derivative']:
+            reference = self.preprocess(interpolation, 1)
+            for block_size in [7, 4096]:
+                result = self.preprocess(interpolation, block_size)
+                np.testing.assert_array_equal(result[0], reference[0])
+                np.testing.assert_array_equal(result[1], reference[1])
+
+
 if __name__ == '__main__':
 
     unittest.main()
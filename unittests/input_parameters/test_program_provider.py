@@ -0,0 +1,156 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unit-test for input_parameters.program_provider.py, and for the Ring and
+RFStation programs generated for windows of turns
+"""
+
+import unittest
+import numpy as np
+
+from blond.input_parameters.program_provider import WindowedProgram
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.ring_options import RingOptions
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+from blond.beam.distributions import bigaussian
+from blond.trackers.tracker import RingAndRFTracker
+
+
+class TestWindowedProgram(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.arange(60.).reshape((2, 30))
+        self.calls = []
+        self.program = WindowedProgram(self.generate, 30, 2, window=8)
+
+    def generate(self, start, stop):
+        self.calls.append((start, stop))
+        return self.data[:, start:stop]
+
+    def test_indexing(self):
+        for turn in range(30):
+            np.testing.assert_array_equal(self.program[:, turn],
+                                          self.data[:, turn])
+            self.assertEqual(self.program[1, turn], self.data[1, turn])
+            self.assertEqual(self.program[1][turn], self.data[1, turn])
+        np.testing.assert_array_equal(self.program[:, -3:],
+                                      self.data[:, -3:])
+        np.testing.assert_array_equal(self.program[0, [4, 2, 7]],
+                                      self.data[0, [4, 2, 7]])
+        np.testing.assert_array_equal(np.asarray(self.program), self.data)
+        np.testing.assert_array_equal(np.asarray(-self.program[0]),
+                                      -self.data[0])
+        self.assertEqual(self.program.shape, (2, 30))
+        self.assertEqual(len(self.program[0]), 30)
+
+    def test_window(self):
+        for turn in range(30):
+            self.program[:, turn]
+        # Every turn is generated once when accessed in order
+        self.assertEqual(sum(stop - start for start, stop in self.calls), 30)
+        self.assertLessEqual(self.program.buffer.shape[1], 8)
+        # More turns than the window are generated without moving it
+        start = self.program.start
+        np.testing.assert_array_equal(self.program[:, :20],
+                                      self.data[:, :20])
+        self.assertEqual(self.program.start, start)
+
+    def test_set(self):
+        self.program[:, 10] += 1
+        self.program[0, 11] = -1
+        # Kept while in the window
+        self.program[:, 14]
+        self.assertEqual(self.program[0, 10], self.data[0, 10] + 1)
+        self.assertEqual(self.program[0, 11], -1)
+        self.assertEqual(np.asarray(self.program)[0, 11], -1)
+        with self.assertRaises(RuntimeError):
+            self.program[:, :20] = 0
+
+
+class TestWindowedRing(unittest.TestCase):
+
+    n_turns = 3000
+    window = 500
+
+    def setUp(self):
+        self.momentum = np.linspace(26e9, 27e9, self.n_turns+1)
+
+    def build(self, program_window, momentum=None, n_turns=None,
+              voltage=None, alpha_0=1e-3, phi_noise=None):
+        if momentum is None:
+            momentum = self.momentum
+            n_turns = self.n_turns
+        ring = Ring(6911.56, alpha_0, momentum, Proton(), n_turns,
+                    alpha_1=2e-5,
+                    RingOptions=RingOptions(program_window=program_window))
+        if voltage is None:
+            voltage = [np.linspace(4e6, 5e6, ring.n_turns+1),
+                       np.linspace(0, 1e5, ring.n_turns+1)]
+        rf_station = RFStation(ring, [4620, 9240], voltage, [0, np.pi],
+                               n_rf=2, phi_noise=phi_noise)
+        return ring, rf_station
+
+    def compare(self, full, windowed, names):
+        for name in names:
+            values = np.asarray(getattr(full, name))
+            program = getattr(windowed, name)
+            if values.ndim == 2:
+                turns = np.array([program[:, turn]
+                                  for turn in range(values.shape[1])]).T
+            else:
+                turns = np.array([program[turn]
+                                  for turn in range(values.shape[0])])
+            np.testing.assert_array_equal(turns, values, err_msg=name)
+            np.testing.assert_array_equal(np.asarray(program), values,
+                                          err_msg=name)
+
+    def test_programs(self):
+        full = self.build(None)
+        windowed = self.build(self.window)
+        self.compare(full[0], windowed[0], [
+            'beta', 'gamma', 'energy', 'kin_energy', 'delta_E', 't_rev',
+            'cycle_time', 'f_rev', 'omega_rev', 'alpha_0', 'alpha_1',
+            'alpha_2', 'eta_0', 'eta_1', 'eta_2'])
+        self.compare(full[1], windowed[1], [
+            'harmonic', 'voltage', 'phi_rf_d', 'omega_rf_d', 'phi_rf',
+            'omega_rf', 't_rf', 'phi_s', 'Q_s', 'omega_s0', 'sign_eta_0'])
+        self.assertFalse(windowed[1].empty)
+
+    def test_interpolated_programs(self):
+        time = np.linspace(0, 0.02, 50)
+        momentum = (time, np.linspace(26e9, 27e9, 50))
+        voltage = ((time, np.linspace(4e6, 6e6, 50)),
+                   (time, np.linspace(0, 1e5, 50)))
+        alpha_0 = (time, np.linspace(1e-3, 2e-3, 50))
+        full = self.build(None, momentum, 1, voltage, alpha_0)
+        windowed = self.build(self.window, momentum, 1, voltage, alpha_0)
+        self.compare(full[0], windowed[0], ['cycle_time', 'alpha_0', 'eta_0'])
+        self.compare(full[1], windowed[1], ['voltage', 'phi_s'])
+
+    def test_tracking(self):
+        phi_noise = np.random.default_rng(0).normal(
+            0, 1e-3, (2, self.n_turns+1))
+        beams = []
+        for program_window in [None, 50]:
+            ring, rf_station = self.build(program_window, phi_noise=phi_noise)
+            beam = Beam(ring, 1000, 1e11)
+            bigaussian(ring, rf_station, beam, 0.5e-9, seed=1)
+            tracker = RingAndRFTracker(rf_station, beam)
+            for turn in range(200):
+                tracker.track()
+            beams.append(beam)
+        np.testing.assert_array_equal(beams[0].dt, beams[1].dt)
+        np.testing.assert_array_equal(beams[0].dE, beams[1].dE)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
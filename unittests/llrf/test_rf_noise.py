@@ -0,0 +1,84 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for llrf.rf_noise.FlatSpectrum, batched and streamed generation
+"""
+
+import unittest
+import numpy as np
+
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Proton
+from blond.llrf.rf_noise import FlatSpectrum
+
+
+class TestFlatSpectrum(unittest.TestCase):
+
+    n_turns = 20000
+
+    def setUp(self):
+        self.ring = Ring(26658.883, 1/55.759505**2,
+                         np.linspace(450e9, 460e9, self.n_turns+1), Proton(),
+                         self.n_turns)
+        self.rf_station = RFStation(self.ring, [35640], [6e6], [0])
+
+    def noise(self, **kwargs):
+        return FlatSpectrum(self.ring, self.rf_station, delta_f=0.5,
+                            corr_time=1000, fmin_s0=0.8, fmax_s0=1.1,
+                            folder_plots=None, print_option=False, **kwargs)
+
+    def assert_same_noise(self, **kwargs):
+        reference = self.noise(**kwargs)
+        reference.generate()
+
+        batched = self.noise(**kwargs)
+        state = np.random.get_state()
+        batched.generate(batched=True, batch_size=3)
+        np.testing.assert_array_equal(batched.dphi, reference.dphi)
+        self.assertEqual((batched.seed1, batched.seed2),
+                         (reference.seed1, reference.seed2))
+        # The global random generator is not re-seeded
+        np.testing.assert_array_equal(np.random.get_state()[1], state[1])
+
+        streamed = self.noise(**kwargs)
+        blocks = list(streamed.stream(block=1500, batch_size=3))
+        self.assertEqual([start for start, noise in blocks],
+                         list(range(0, self.n_turns+1, 1500)))
+        np.testing.assert_array_equal(
+            np.concatenate([noise for start, noise in blocks]),
+            reference.dphi)
+
+        program = self.noise(**kwargs).program(window=700)
+        np.testing.assert_array_equal(
+            [program[0, turn] for turn in range(self.n_turns+1)],
+            reference.dphi)
+
+    def test_noise(self):
+        self.assert_same_noise()
+
+    def test_continuous_phase(self):
+        self.assert_same_noise(continuous_phase=True)
+
+    def test_initial_final_turns(self):
+        self.assert_same_noise(initial_final_turns=[2500, 15000])
+
+    def test_threads(self):
+        reference = self.noise()
+        reference.generate()
+        threaded = self.noise()
+        threaded.generate(batched=True, workers=2)
+        np.testing.assert_allclose(threaded.dphi, reference.dphi, rtol=0,
+                                   atol=1e-12*np.max(np.abs(reference.dphi)))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,78 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the ParallelBeamMonitor class.
+
+Run as python test_parallel_beam_monitor.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import os
+import shutil
+import tempfile
+import h5py as hp
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.beam.beam import Beam, Proton
+from blond.input_parameters.ring import Ring
+from blond.monitors.monitors import ParallelBeamMonitor
+
+
+class TestParallelBeamMonitor(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.ring = Ring(6911.5038, 1./17.95142852**2, 450e9, Proton(), 200)
+        self.beam = Beam(self.ring, 1001, 1e9)
+        rng = np.random.default_rng(1)
+        self.beam.dt[:] = rng.random(1001)
+        self.beam.dE[:] = rng.random(1001)
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'beam')
+
+    # Run after every test
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_virtual_datasets(self):
+        monitor = ParallelBeamMonitor(self.filename, 3, self.beam,
+                                      parallel=False)
+        dt0 = self.beam.dt.copy()
+        monitor.track(0)
+        self.beam.dt += 1
+        monitor.track(5)
+        monitor.close()
+
+        self.assertTrue(os.path.isfile(self.filename + '_rank0.h5'))
+        with hp.File(self.filename + '.h5', 'r') as h5file:
+            self.assertEqual(h5file['Beam/dt'].shape, (2, 1001))
+            np.testing.assert_array_equal(h5file['Beam/turns'][:], [0, 5])
+            np.testing.assert_array_equal(h5file['Beam/dt'][0], dt0)
+            np.testing.assert_array_equal(h5file['Beam/dt'][1], dt0 + 1)
+            np.testing.assert_array_equal(h5file['Beam/id'][1],
+                                          self.beam.id)
+
+    def test_too_many_snapshots(self):
+        monitor = ParallelBeamMonitor(self.filename, 1, self.beam,
+                                      parallel=False)
+        monitor.track(0)
+        with self.assertRaises(RuntimeError):
+            monitor.track(1)
+        monitor.close()
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -250,6 +250,177 @@ class TestRfVoltageCalcWCavityFB(unittest.TestCase):
                 """Phi modulation not added correctly in tracker""")
 
 
+class TestKickDriftSlice(unittest.TestCase):
+    # Simulation parameters -------------------------------------------------------
+    # Bunch parameters
+    N_b = 1e9           # Intensity
+    N_p = 50000         # Macro-particles
+    tau_0 = 0.4e-9          # Initial bunch length, 4 sigma [s]
+    # Machine and RF parameters
+    C = 26658.883        # Machine circumference [m]
+    p_i = 450e9         # Synchronous momentum [eV/c]
+    p_f = 460.005e9      # Synchronous momentum, final
+    h = 35640            # Harmonic number
+    V = 6e6                # RF voltage [V]
+    dphi = 0             # Phase modulation/offset
+    gamma_t = 55.759505  # Transition gamma
+    alpha = 1./gamma_t/gamma_t        # First order mom. comp. factor
+    # Tracking details
+    N_t = 2000          # Number of turns to track
+
+    # Run before every test
+    def setUp(self):
+        self.ring = Ring(self.C, self.alpha, np.linspace(
+            self.p_i, self.p_f, self.N_t + 1), Proton(), self.N_t)
+        self.rf = RFStation(
+            self.ring, [self.h], self.V * np.linspace(1, 1.1, self.N_t+1), [self.dphi])
+
+    # Run after every test
+    def tearDown(self):
+        pass
+
+    def make_tracker(self, solver):
+        beam = Beam(self.ring, self.N_p, self.N_b)
+        bigaussian(self.ring, self.rf, beam,
+                   self.tau_0/4, reinsertion=True, seed=1)
+        profile = Profile(beam, CutOptions(n_slices=100, cut_left=0,
+                                           cut_right=self.rf.t_rf[0, 0]))
+        tracker = RingAndRFTracker(self.rf, beam, Profile=profile,
+                                   interpolation=True, solver=solver,
+                                   fused_slicing=True)
+        return beam, profile, tracker
+
+    def compare_fused(self, solver):
+        beam, profile, tracker = self.make_tracker(solver)
+        self.assertTrue(tracker.fused_slicing)
+
+        beam_ref, profile_ref, tracker_ref = self.make_tracker(solver)
+        tracker_ref.fused_slicing = False
+
+        for i in range(10):
+            profile.track()
+            profile_ref.track()
+            np.testing.assert_array_equal(profile.n_macroparticles,
+                                          profile_ref.n_macroparticles)
+            # Both trackers share the RFStation counter
+            tracker.pre_track()
+            tracker.track_only()
+            self.rf.counter[0] -= 1
+            tracker_ref.pre_track()
+            tracker_ref.track_only()
+
+            np.testing.assert_allclose(beam.dE, beam_ref.dE,
+                                       rtol=1e-9, atol=1e-6)
+            np.testing.assert_allclose(beam.dt, beam_ref.dt,
+                                       rtol=1e-9, atol=1e-18)
+
+    def test_fused_simple(self):
+        self.compare_fused('simple')
+
+    def test_fused_exact(self):
+        self.compare_fused('exact')
+
+    def test_fused_legacy(self):
+        self.compare_fused('legacy')
+
+    def test_fused_histogram_invalidated(self):
+        beam, profile, tracker = self.make_tracker('simple')
+        profile.track()
+        tracker.track()
+        # Moving the particles makes the fused histogram stale
+        beam.dt = beam.dt + 1e-10
+        ref = np.zeros(profile.n_slices, dtype=bm.precision.real_t)
+        bm.slice(beam.dt, ref, profile.cut_left, profile.cut_right)
+        profile.track()
+        np.testing.assert_array_equal(profile.n_macroparticles, ref)
+
+    def test_fused_histogram_moved_in_place(self):
+        beam, profile, tracker = self.make_tracker('simple')
+        profile.track()
+        tracker.track()
+        beam.dt += 2e-10
+        ref = np.zeros(profile.n_slices, dtype=bm.precision.real_t)
+        bm.slice(beam.dt, ref, profile.cut_left, profile.cut_right)
+        profile.track()
+        np.testing.assert_array_equal(profile.n_macroparticles, ref)
+
+    def test_fused_slicing_default(self):
+        beam = Beam(self.ring, self.N_p, self.N_b)
+        profile = Profile(beam, CutOptions(n_slices=100, cut_left=0,
+                                           cut_right=self.rf.t_rf[0, 0]))
+        tracker = RingAndRFTracker(self.rf, beam, Profile=profile,
+                                   interpolation=True)
+        self.assertTrue(tracker.fused_slicing)
+        tracker = RingAndRFTracker(self.rf, beam, Profile=profile,
+                                   interpolation=True, fused_slicing=False)
+        self.assertFalse(tracker.fused_slicing)
+        tracker = RingAndRFTracker(self.rf, beam, interpolation=False)
+        self.assertFalse(tracker.fused_slicing)
+
+
+class TestTrackTurns(unittest.TestCase):
+    # Machine and RF parameters
+    N_p = 20000          # Macro-particles
+    C = 26658.883        # Machine circumference [m]
+    p_i = 450e9         # Synchronous momentum [eV/c]
+    p_f = 460.005e9      # Synchronous momentum, final
+    h = [35640, 71280]   # Harmonic numbers
+    V = [6e6, 1e6]       # RF voltages [V]
+    dphi = [0, np.pi]    # Phase modulation/offset
+    gamma_t = 55.759505  # Transition gamma
+    alpha = 1./gamma_t/gamma_t        # First order mom. comp. factor
+    N_t = 2000          # Number of turns to track
+
+    def make_tracker(self, solver, **kwargs):
+        ring = Ring(self.C, self.alpha, np.linspace(
+            self.p_i, self.p_f, self.N_t + 1), Proton(), self.N_t)
+        np.random.seed(2)
+        phi_noise = 1e-3 * np.random.randn(2, self.N_t + 1)
+        rf = RFStation(ring, self.h, self.V, self.dphi, n_rf=2,
+                       phi_noise=phi_noise)
+        beam = Beam(ring, self.N_p, 1e9)
+        bigaussian(ring, rf, beam, 1e-10, reinsertion=True, seed=1)
+        tracker = RingAndRFTracker(rf, beam, solver=solver, **kwargs)
+        return beam, rf, tracker
+
+    def compare_track_turns(self, solver, n_turns=50):
+        beam, rf, tracker = self.make_tracker(solver)
+        self.assertTrue(tracker.batch_tracking_possible())
+        beam_ref, rf_ref, tracker_ref = self.make_tracker(solver)
+
+        tracker.track_turns(n_turns)
+        for i in range(n_turns):
+            tracker_ref.track()
+
+        self.assertEqual(rf.counter[0], n_turns)
+        self.assertEqual(beam.energy, beam_ref.energy)
+        np.testing.assert_array_equal(rf.phi_rf, rf_ref.phi_rf)
+        np.testing.assert_allclose(beam.dE, beam_ref.dE,
+                                   rtol=1e-12, atol=0)
+        np.testing.assert_allclose(beam.dt, beam_ref.dt,
+                                   rtol=1e-12, atol=0)
+
+    def test_track_turns_simple(self):
+        self.compare_track_turns('simple')
+
+    def test_track_turns_exact(self):
+        self.compare_track_turns('exact')
+
+    def test_track_turns_legacy(self):
+        self.compare_track_turns('legacy')
+
+    def test_track_turns_fallback(self):
+        beam, rf, tracker = self.make_tracker('simple', periodicity=True)
+        self.assertFalse(tracker.batch_tracking_possible())
+        tracker.track_turns(3)
+        self.assertEqual(rf.counter[0], 3)
+
+    def test_track_turns_beyond_last_turn(self):
+        beam, rf, tracker = self.make_tracker('simple')
+        with self.assertRaises(RuntimeError):
+            tracker.track_turns(self.N_t + 1)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -0,0 +1,83 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for Worker.allreduce_histogram, with a single process.
+
+Run as python test_allreduce_histogram.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+try:
+    from blond.utils.mpi_config import Worker, timing
+except ImportError:
+    Worker = None
+
+
+@unittest.skipIf(Worker is None, 'mpi4py not available')
+class TestAllreduceHistogram(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.worker = Worker()
+        self.rng = np.random.default_rng(1)
+
+    def histogram(self, n_bins, n_particles):
+        x = self.rng.normal(n_bins / 2, n_bins / 8, n_particles).astype(int)
+        return np.bincount(np.clip(x, 0, n_bins - 1),
+                           minlength=n_bins).astype(float)
+
+    def reduce(self, n_bins, n_particles):
+        histogram = self.histogram(n_bins, n_particles)
+        reference = histogram.copy()
+        self.worker.allreduce_histogram(histogram)
+        np.testing.assert_array_equal(histogram, reference)
+        return self.worker._histogram_plans[(self.worker.intercomm.py2f(),
+                                             n_bins)]
+
+    def test_dense(self):
+        plan = self.reduce(1000, 20000)
+        self.assertEqual(plan[0], 'dense')
+        # The next reductions use the plan, or fall back to the exact
+        # reduction when the counts no longer fit its type
+        for n_particles in [20000, 20000, 10**6]:
+            plan = self.reduce(1000, n_particles)
+        self.assertEqual(plan, ('dense', np.dtype(np.uint16)))
+
+    def test_sparse(self):
+        plan = self.reduce(100000, 1000)
+        self.assertEqual(plan[0], 'sparse')
+        for n_particles in [1000, 1000, 5000]:
+            plan = self.reduce(100000, n_particles)
+        self.assertEqual(plan[0], 'sparse')
+
+    def test_bytes(self):
+        if not hasattr(timing, 'counters'):
+            self.skipTest('timing layer without counters')
+        before = dict(timing.counters)
+        self.reduce(1000, 20000)
+        self.reduce(1000, 20000)
+        key = 'comm:histogram_bytes:uint8'
+        self.assertEqual(timing.counters[key] - before.get(key, 0),
+                         1000 + 1001)
+        key = 'comm:histogram_bytes_saved:uint8'
+        self.assertEqual(timing.counters[key] - before.get(key, 0),
+                         2 * 4000 - 1000 - 1001)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
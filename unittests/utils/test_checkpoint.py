@@ -0,0 +1,136 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the Checkpoint class.
+
+Run as python test_checkpoint.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+from blond.beam.distributions import bigaussian
+from blond.beam.profile import Profile, CutOptions
+from blond.impedances.impedance import InducedVoltageFreq, TotalInducedVoltage
+from blond.impedances.impedance_sources import Resonators
+from blond.llrf.beam_feedback import BeamFeedback
+from blond.trackers.tracker import RingAndRFTracker
+from blond.utils.checkpoint import Checkpoint
+from blond.utils.track_iteration import TrackIteration
+
+
+def add_noise(track_map, turn, beam, generator):
+    # Random kicks from the global and from a private generator
+    beam.dE += np.random.normal(0, 1e3, len(beam.dE))
+    beam.dE += generator.normal(0, 1e3, len(beam.dE))
+
+
+class Simulation(object):
+
+    def __init__(self, n_turns):
+        self.ring = Ring(6911.5038, 1./17.95142852**2, 25.92e9, Proton(),
+                         n_turns)
+        self.rf_station = RFStation(self.ring, 4620, 4.5e6, 0)
+        self.beam = Beam(self.ring, 10000, 1e11)
+        bigaussian(self.ring, self.rf_station, self.beam, 0.5e-9/4,
+                   seed=1234)
+        self.beam.dt += 0.1e-9
+        self.profile = Profile(self.beam, CutOptions(
+            cut_left=0, cut_right=self.rf_station.t_rf[0, 0], n_slices=64))
+        self.phase_loop = BeamFeedback(self.ring, self.rf_station,
+                                       self.profile,
+                                       {'machine': 'SPS_RL', 'PL_gain': 1000})
+        resonators = Resonators(1e5, 200e6, 20)
+        induced_voltage = InducedVoltageFreq(
+            self.beam, self.profile, [resonators], 1e6, multi_turn_wake=True,
+            RFParams=self.rf_station)
+        self.total_induced_voltage = TotalInducedVoltage(
+            self.beam, self.profile, [induced_voltage])
+        self.tracker = RingAndRFTracker(
+            self.rf_station, self.beam, Profile=self.profile,
+            BeamFeedback=self.phase_loop,
+            TotalInducedVoltage=self.total_induced_voltage)
+        self.generator = np.random.default_rng(5)
+        np.random.seed(3)
+
+        self.objects = {'beam': self.beam, 'rf_station': self.rf_station,
+                        'profile': self.profile,
+                        'phase_loop': self.phase_loop,
+                        'induced_voltage': self.total_induced_voltage,
+                        'noise': self}
+
+    def track_iteration(self, init_turn=0):
+        track_iteration = TrackIteration(
+            [self.profile.track, self.total_induced_voltage.track,
+             self.tracker.track], initTurn=init_turn)
+        track_iteration.add_function(add_noise, 1, self.beam, self.generator)
+        return track_iteration
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'checkpoint')
+
+    # Run after every test
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_bit_identical_restart(self):
+        reference = Simulation(60)
+        reference.track_iteration()(50)
+
+        first = Simulation(60)
+        track_iteration = first.track_iteration()
+        track_iteration.add_checkpoint(
+            Checkpoint(self.filename, first.objects, every=20))
+        track_iteration(30)
+        self.assertTrue(os.path.isfile(self.filename + '.h5'))
+
+        # Resumed from the checkpoint of turn 20
+        second = Simulation(60)
+        turn = Checkpoint(self.filename, second.objects).restore()
+        self.assertEqual(turn, 20)
+        second.track_iteration(turn)(30)
+
+        np.testing.assert_array_equal(second.beam.dt, reference.beam.dt)
+        np.testing.assert_array_equal(second.beam.dE, reference.beam.dE)
+        np.testing.assert_array_equal(second.rf_station.phi_rf[:, 50],
+                                      reference.rf_station.phi_rf[:, 50])
+        np.testing.assert_array_equal(
+            second.total_induced_voltage.induced_voltage,
+            reference.total_induced_voltage.induced_voltage)
+
+    def test_walltime(self):
+        simulation = Simulation(60)
+        track_iteration = simulation.track_iteration()
+        track_iteration.add_checkpoint(
+            Checkpoint(self.filename, simulation.objects, walltime=0))
+
+        self.assertEqual(len(list(track_iteration)), 1)
+        self.assertTrue(os.path.isfile(self.filename + '.h5'))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
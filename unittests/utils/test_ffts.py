@@ -14,10 +14,15 @@ Unittest for utils.bmath
 """
 
 import unittest
+import os
+import shutil
+import tempfile
 import numpy as np
 # import inspect
 from numpy import fft
 from blond.utils import bmath as bm
+from blond.utils import butils_wrap
+from blond.utils import fft_plans
 
 
 class TestFFTS(unittest.TestCase):
@@ -321,6 +326,89 @@ class TestFFTS(unittest.TestCase):
         except ZeroDivisionError as e:
             self.assertTrue(True, 'This testcase should raise a ZeroDivisionError')
 
+
+class TestFFTWEnabled(unittest.TestCase):
+
+    def tearDown(self):
+        bm.update_active_dict(bm._CPU_func_dict)
+
+    def test_fftw_enabled(self):
+        bm.use_fftw()
+        self.assertEqual(fft_plans.fftw_enabled(),
+                         butils_wrap.fftw_available())
+        bm.update_active_dict(bm._CPU_func_dict)
+        self.assertFalse(fft_plans.fftw_enabled())
+        self.assertEqual(fft_plans.plan_simulation(), [])
+
+
+@unittest.skipUnless(butils_wrap.fftw_available(), 'Not compiled with FFTW')
+class TestFFTPlans(unittest.TestCase):
+
+    def setUp(self):
+        bm.use_fftw()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_plan_statistics(self):
+        n = 1234
+        stats = bm.fft_plan_statistics()
+        bm.plan_rfft(n)
+        bm.plan_irfft(n)
+        planned = bm.fft_plan_statistics()
+        self.assertEqual(planned['misses'], stats['misses'] + 2)
+        self.assertEqual(planned['plans'], stats['plans'] + 2)
+
+        s = np.random.randn(n)
+        res = bm.irfft(bm.rfft(s))
+        np.testing.assert_almost_equal(res, s, 8)
+        stats = bm.fft_plan_statistics()
+        self.assertEqual(stats['hits'], planned['hits'] + 2)
+        self.assertEqual(stats['misses'], planned['misses'])
+
+    def test_wisdom_file(self):
+        filename = os.path.join(self.directory, 'wisdom')
+        self.assertFalse(fft_plans.load_wisdom(filename))
+        fft_plans.plan_ffts([4000, 777])
+        self.assertTrue(fft_plans.save_wisdom(filename))
+        self.assertTrue(os.path.exists(fft_plans.wisdom_file(filename)))
+        self.assertTrue(fft_plans.load_wisdom(filename))
+        # Saving again merges with the wisdom in the file
+        self.assertTrue(fft_plans.save_wisdom(filename))
+        self.assertEqual(os.listdir(self.directory),
+                         [os.path.basename(fft_plans.wisdom_file(filename))])
+
+    def test_plan_simulation(self):
+        from blond.input_parameters.ring import Ring
+        from blond.beam.beam import Beam, Proton
+        from blond.beam.profile import Profile, CutOptions
+        from blond.impedances.impedance import (InducedVoltageFreq,
+                                                TotalInducedVoltage)
+        from blond.impedances.impedance_sources import Resonators
+
+        ring = Ring(2*np.pi*25, 1/4.4**2, 1.4e9, Proton(), 10)
+        beam = Beam(ring, 1000, 1e11)
+        beam.dt[:] = np.linspace(0, 1e-6, 1000)
+        profile = Profile(beam, CutOptions(cut_left=0, cut_right=2e-6,
+                                           n_slices=300))
+        induced_voltage = InducedVoltageFreq(
+            beam, profile, [Resonators(1e4, 5e6, 10)],
+            frequency_resolution=2e5)
+        total = TotalInducedVoltage(beam, profile, [induced_voltage])
+
+        sizes = fft_plans.simulation_fft_sizes(profile, total)
+        self.assertEqual(sizes, sorted({300, induced_voltage.n_fft}))
+        filename = os.path.join(self.directory, 'wisdom')
+        fft_plans.plan_simulation(profile, total, filename)
+        self.assertTrue(os.path.exists(fft_plans.wisdom_file(filename)))
+
+        stats = bm.fft_plan_statistics()
+        profile.track()
+        total.induced_voltage_sum()
+        self.assertEqual(bm.fft_plan_statistics()['misses'], stats['misses'])
+
+
 if __name__ == '__main__':
 
     unittest.main()
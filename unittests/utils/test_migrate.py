@@ -0,0 +1,92 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the migration of particles by Worker.migrate, with a single
+process sending the particles to itself.
+
+Run as python test_migrate.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.beam.beam import Beam, StoredBeam, Proton
+from blond.input_parameters.ring import Ring
+try:
+    from mpi4py import MPI
+    from blond.utils.mpi_config import Worker
+except ImportError:
+    Worker = None
+
+
+@unittest.skipIf(Worker is None, 'mpi4py not available')
+class TestMigrate(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.worker = Worker()
+        self.ring = Ring(6911.5038, 1./17.95142852**2, 450e9, Proton(), 200)
+
+    def fill(self, beam, first_id):
+        n = beam.n_macroparticles
+        beam.dt[:] = np.arange(first_id, first_id + n)
+        beam.dE[:] = -beam.dt
+        beam.id[:] = np.arange(first_id, first_id + n)
+
+    def migrate(self, sender, receiver):
+        self.fill(sender, 1)
+        self.fill(receiver, 1001)
+        # Small messages to itself complete before they are received
+        self.worker.migrate(sender, [(0, 100)], True, MPI.COMM_SELF)
+        self.worker.migrate(receiver, [(0, 100)], False, MPI.COMM_SELF)
+
+        for beam, n in [(sender, 900), (receiver, 1100)]:
+            self.assertEqual(beam.n_macroparticles, n)
+            for name in ['dt', 'dE', 'id']:
+                self.assertEqual(len(getattr(beam, name)), n)
+        np.testing.assert_array_equal(sender.id, np.arange(1, 901))
+        np.testing.assert_array_equal(receiver.id[:1000],
+                                      np.arange(1001, 2001))
+        np.testing.assert_array_equal(receiver.id[1000:],
+                                      np.arange(901, 1001))
+        np.testing.assert_array_equal(receiver.dt, receiver.id)
+        np.testing.assert_array_equal(receiver.dE, -receiver.dt)
+
+    def test_beam(self):
+        self.migrate(Beam(self.ring, 1000, 1e9), Beam(self.ring, 1000, 1e9))
+
+    def test_stored_beam(self):
+        sender = StoredBeam(self.ring, 1000, 1e9)
+        receiver = StoredBeam(self.ring, 1000, 1e9, capacity=1200)
+        buffers = [beam.particles._coordinates for beam in [sender, receiver]]
+        self.migrate(sender, receiver)
+        # The particles are moved within the stores
+        self.assertIs(sender.particles._coordinates, buffers[0])
+        self.assertIs(receiver.particles._coordinates, buffers[1])
+
+    def test_beam_spare_capacity(self):
+        beam = Beam(self.ring, 1000, 1e9)
+        self.worker.resize_particles(beam, 1050)
+        buffer = beam.dt.base
+        self.assertGreaterEqual(len(buffer), 1100)
+        self.worker.resize_particles(beam, 900)
+        self.worker.resize_particles(beam, 1100)
+        self.assertIs(beam.dt.base, buffer)
+        self.assertEqual(beam.n_macroparticles, 1100)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
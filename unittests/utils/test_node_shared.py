@@ -0,0 +1,100 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the node-shared objects of the Worker, with a single process.
+
+Run as python test_node_shared.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+try:
+    from blond.utils.mpi_config import Worker
+except ImportError:
+    Worker = None
+
+
+class Holder(object):
+
+    def __init__(self, beam, values):
+        self.beam = beam
+        self.values = values * 2
+        self.small = np.zeros(3)
+
+
+@unittest.skipIf(Worker is None, 'mpi4py not available')
+class TestNodeShared(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.worker = Worker()
+        self.n_turns = 1000
+        self.momentum = np.linspace(26e9, 27e9, self.n_turns+1)
+
+    def ring(self):
+        return Ring(6911.56, 1e-3, self.momentum, Proton(), self.n_turns)
+
+    def in_window(self, array, index=-1):
+        return np.shares_memory(array, self.worker._shared_windows[index][1])
+
+    def test_ring(self):
+        ring = self.worker.node_shared(self.ring)
+        reference = self.ring()
+        for name in ['momentum', 'beta', 'energy', 't_rev', 'cycle_time',
+                     'eta_0']:
+            np.testing.assert_array_equal(getattr(ring, name),
+                                          getattr(reference, name))
+            self.assertTrue(self.in_window(getattr(ring, name)))
+            self.assertFalse(getattr(ring, name).flags.writeable)
+        self.assertEqual(ring.n_turns, self.n_turns)
+
+    def test_rf_station(self):
+        voltage = np.linspace(4e6, 5e6, self.n_turns+1)
+        ring = self.worker.node_shared(self.ring)
+        rf_station = self.worker.node_shared(
+            RFStation, ring, [4620], [voltage], [0],
+            private=['phi_rf', 'omega_rf', 'dphi_rf'])
+        reference = RFStation(self.ring(), [4620], [voltage], [0])
+
+        # The programs of the Ring are not copied again
+        self.assertTrue(self.in_window(rf_station.beta, 0))
+        self.assertTrue(np.shares_memory(rf_station.beta, ring.beta))
+        self.assertTrue(self.in_window(rf_station.voltage))
+        for name in ['voltage', 'omega_rf_d', 'phi_s', 'Q_s']:
+            np.testing.assert_array_equal(getattr(rf_station, name),
+                                          getattr(reference, name))
+        # The private programs stay writable
+        self.assertFalse(self.in_window(rf_station.phi_rf))
+        rf_station.phi_rf[:, 1] += 1
+
+    def test_arguments(self):
+        ring = self.worker.node_shared(self.ring)
+        beam = Beam(ring, 1000, 1e11)
+        holder = self.worker.node_shared(Holder, beam, np.arange(1000.))
+        # The arguments are the ones of the process
+        self.assertIs(holder.beam, beam)
+        np.testing.assert_array_equal(holder.values, 2*np.arange(1000.))
+        self.assertTrue(self.in_window(holder.values))
+        # Small arrays are copied
+        self.assertTrue(holder.small.flags.writeable)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,100 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the TaskGraph class, with a single process.
+
+Run as python test_task_graph.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+try:
+    from blond.utils.mpi_config import Worker, TaskGraph
+except ImportError:
+    Worker = None
+
+
+class Results(object):
+    pass
+
+
+@unittest.skipIf(Worker is None, 'mpi4py not available')
+class TestTaskGraph(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.worker = Worker()
+        self.results = Results()
+        self.results.voltage = None
+        self.results.sums = []
+        self.turn = 0
+
+    def voltage(self):
+        self.results.voltage = np.arange(4.) + self.turn
+
+    def total(self):
+        self.results.sums.append(np.sum(self.results.voltage))
+
+    def test_levels(self):
+        graph = TaskGraph(self.worker, {'impedance': 1, 'rf': 2})
+        graph.add_stage('profile', lambda: None)
+        graph.add_stage('induced_voltage', lambda: None, group='impedance',
+                        after=['profile'])
+        graph.add_stage('feedback', lambda: None, group='impedance',
+                        after=['induced_voltage'])
+        graph.add_stage('rf_voltage', lambda: None, group='rf')
+        graph.add_stage('track', lambda: None,
+                        after=['feedback', 'rf_voltage'])
+        graph.run()
+
+        self.assertEqual([[stage['name'] for stage in level]
+                          for level in graph.levels],
+                         [['profile', 'induced_voltage', 'feedback',
+                           'rf_voltage'], ['track']])
+        # A single process takes part in all the groups
+        self.assertEqual(graph.groups, {'impedance': [0], 'rf': [0]})
+
+    def test_outputs(self):
+        graph = TaskGraph(self.worker, {'impedance': 1})
+        graph.add_stage('voltage', self.voltage, group='impedance',
+                        outputs=[(self.results, 'voltage')])
+        graph.add_stage('total', self.total, after=['voltage'])
+        for self.turn in range(3):
+            graph.run()
+
+        self.assertEqual(self.results.sums, [6., 10., 14.])
+        win, array = graph.stages['voltage']['windows'][0]
+        # Double-buffered: turn 2 written over turn 0
+        np.testing.assert_array_equal(array, [np.arange(4.) + 2,
+                                              np.arange(4.) + 1])
+
+    def test_errors(self):
+        graph = TaskGraph(self.worker, {'impedance': 1})
+        graph.add_stage('voltage', self.voltage, group='impedance')
+        with self.assertRaises(RuntimeError):
+            graph.add_stage('voltage', self.voltage, group='impedance')
+        with self.assertRaises(RuntimeError):
+            graph.add_stage('rf_voltage', self.voltage, group='rf')
+        with self.assertRaises(RuntimeError):
+            graph.add_stage('total', self.total, after=['track'])
+        with self.assertRaises(RuntimeError):
+            graph.add_stage('total', self.total,
+                            outputs=[(self.results, 'voltage')])
+
+
+if __name__ == '__main__':
+
+    unittest.main()